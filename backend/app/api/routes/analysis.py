@@ -3,16 +3,18 @@
 Rutas para análisis emocional y comunicativo del texto.
 """
 
-import json
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
+from app.core.config import settings
 from app.schemas.analysis import AnalysisResult, AnalysisRequest
 from app.schemas.message import MessageCreate
 from app.dependencies import get_current_user
-from app.db.models import Usuario, Analisis, Mensaje
-from sqlalchemy import desc
-from app.services.analysis_service import analyze_text, process_complete_analysis, generate_recommendations, generate_summary, perform_deep_analysis
+from app.db.models import Usuario, Analisis, Mensaje, SesionChat
+from sqlalchemy import desc, select
+from app.services.analysis_service import analyze_text, process_complete_analysis, generate_recommendations, generate_summary, get_deep_analysis
+from app.services.export_service import iter_export_records, export_response
 
 router = APIRouter()
 
@@ -90,8 +92,8 @@ def get_last_analysis(
             "priority": last_analysis.prioridad,
             "alert": last_analysis.alerta,
             "alert_reason": last_analysis.razon_alerta,
-            "emotion_distribution": json.loads(last_analysis.distribucion_emociones) if last_analysis.distribucion_emociones else [],
-            "style_distribution": json.loads(last_analysis.distribucion_estilos) if last_analysis.distribucion_estilos else [],
+            "emotion_distribution": last_analysis.distribucion_emociones or [],
+            "style_distribution": last_analysis.distribucion_estilos or [],
             "text": last_message_with_analysis.texto  # <-- Aseguramos que el texto del mensaje esté presente
         }
         
@@ -166,17 +168,20 @@ def get_analysis_history(
 
 @router.get("/deep")
 def deep_analysis(
+    limit: Optional[int] = Query(None, ge=1, le=settings.DEEP_ANALYSIS_MAX_WINDOW,
+                                 description="Mensajes a analizar (por defecto DEEP_ANALYSIS_WINDOW)"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
-    Endpoint para análisis profundo de los últimos 10 mensajes del usuario.
+    Endpoint para análisis profundo de los últimos `limit` mensajes del usuario.
+    El resultado se cachea por usuario y se actualiza incrementalmente con los mensajes nuevos.
     - Limpieza completa de texto
     - Análisis individual y promedio
     - Datos para gráficos (radar, barras, tabla)
     """
     try:
-        result = perform_deep_analysis(db, getattr(current_user, 'id'))
+        result = get_deep_analysis(db, getattr(current_user, 'id'), limit)
         
         # Si no hay mensajes para analizar, devolver 404
         if "status_code" in result and result["status_code"] == 404:
@@ -187,3 +192,21 @@ def deep_analysis(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en análisis profundo: {str(e)}")
+
+
+@router.get("/export")
+def export_analysis_history(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False, description="Comprimir la descarga con gzip"),
+    desde_sesion: int = Query(0, ge=0, description="Reanudar tras el mensaje (desde_sesion, desde_id)"),
+    desde_id: int = Query(0, ge=0),
+    db: Session = Depends(get_read_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Exportación en streaming del historial de análisis del usuario (sus mensajes analizados
+    en sesiones de chat), en NDJSON o CSV.
+    """
+    sesiones = select(SesionChat.id).where(SesionChat.usuario_id == getattr(current_user, 'id'))
+    records = iter_export_records(db, sesiones, (desde_sesion, desde_id), solo_analisis=True)
+    return export_response(records, formato, gzip, "analisis")
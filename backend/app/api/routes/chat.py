@@ -3,22 +3,23 @@
 Rutas para el manejo del chat y análisis emocional del mensaje.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Path
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Path, Query, Response
+from sqlalchemy.orm import Session, selectinload
+from app.db.session import get_db, get_read_db
 from app.schemas.chat import ChatMessage, ChatResponse, ChatSessionCreate, ChatSessionResponse
 from app.services.chat_service import generate_bot_reply, save_chat_and_analysis, generate_report_for_session
 from app.dependencies import get_current_user
 from app.db.models import Usuario, SesionChat, Mensaje
-from app.db import crud
+from app.db import crud, search
+from app.db.pagination import decode_cursor, NEXT_CURSOR_HEADER
+from app.db.archive import read_session_messages
 from app.schemas.message import Message, MessageCreate
 from app.schemas.analysis_record import AnalysisRecord
 from fastapi import status
 from app.services.analysis_service import analyze_text
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from sqlalchemy import func
-from app.services.chat_service import create_notification
 
 router = APIRouter()
 
@@ -70,13 +71,18 @@ def get_chat_history(
 
 @router.get("/session/{session_id}/messages", response_model=List[dict])
 def get_session_messages(
+    response: Response,
     session_id: int = Path(..., description="ID de la sesión"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Tamaño de página; sin él se devuelve la sesión completa"),
+    cursor: Optional[str] = Query(None, description=f"Cursor de paginación (cabecera {NEXT_CURSOR_HEADER})"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
-    Obtiene todos los mensajes de una sesión específica.
+    Obtiene los mensajes de una sesión específica en orden cronológico.
+    Con `limit` pagina por cursor; el siguiente se devuelve en la cabecera X-Next-Cursor.
     """
+    decode_cursor(cursor)  # 422 si el cursor no es válido
     # Verificar que la sesión existe y el usuario tiene acceso
     session = db.query(SesionChat).filter(SesionChat.id == session_id).first()
     if not session:
@@ -86,8 +92,13 @@ def get_session_messages(
     if session.usuario_id != current_user.id and session.tutor_id != current_user.id:
         raise HTTPException(status_code=403, detail="No tienes permisos para acceder a esta sesión")
     
-    # Obtener mensajes de la sesión
-    messages = db.query(Mensaje).filter(Mensaje.sesion_id == session_id).order_by(Mensaje.creado_en.asc()).all()
+    # Obtener mensajes de la sesión (desde su segmento si está archivada)
+    messages, next_cursor = read_session_messages(
+        db, session_id, cursor, limit,
+        options=(selectinload(Mensaje.usuario), selectinload(Mensaje.analisis))
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     # Formatear respuesta
     formatted_messages = []
@@ -301,29 +312,30 @@ def end_session(
     except Exception as e:
         print(f"Error generando reporte automático: {e}")
 
-    # Notificar al estudiante
-    create_notification(
-        db,
-        usuario_id=session.usuario_id,
-        titulo="Sesión de chat cerrada",
-        mensaje="El tutor ha cerrado la sesión. Puedes consultar el reporte.",
-        tipo="chat",
-        metadatos={"sesion_id": session.id}
-    )
-    # Notificar al tutor sobre el reporte
-    create_notification(
-        db,
-        usuario_id=session.tutor_id,
-        titulo="Reporte generado",
-        mensaje=f"Se ha generado un reporte para la sesión con el estudiante {session.usuario_id}.",
-        tipo="reporte",
-        metadatos={"sesion_id": session.id}
-    )
+    # Notificar al estudiante y al tutor (reporte) en un solo commit
+    crud.create_notifications_bulk(db, [
+        {
+            "usuario_id": session.usuario_id,
+            "titulo": "Sesión de chat cerrada",
+            "mensaje": "El tutor ha cerrado la sesión. Puedes consultar el reporte.",
+            "tipo": "chat",
+            "metadatos": {"sesion_id": session.id},
+            "enviada": True
+        },
+        {
+            "usuario_id": session.tutor_id,
+            "titulo": "Reporte generado",
+            "mensaje": f"Se ha generado un reporte para la sesión con el estudiante {session.usuario_id}.",
+            "tipo": "reporte",
+            "metadatos": {"sesion_id": session.id},
+            "enviada": True
+        },
+    ])
     return session
 
 @router.get("/stats", response_model=dict)
 def get_chat_stats(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -452,27 +464,23 @@ def get_unread_messages(
 def search_messages(
     q: str,
     session_id: int = None,
-    db: Session = Depends(get_db),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
-    Busca mensajes por contenido.
+    Busca mensajes por contenido (texto completo, sin distinguir tildes ni mayúsculas).
+    Los resultados vienen ordenados por relevancia e incluyen un snippet resaltado.
     """
-    query = db.query(Mensaje).join(SesionChat).filter(
-        (SesionChat.usuario_id == current_user.id) | (SesionChat.tutor_id == current_user.id),
-        Mensaje.texto.contains(q)
-    )
-    
-    if session_id:
-        query = query.filter(Mensaje.sesion_id == session_id)
-    
-    mensajes = query.order_by(Mensaje.creado_en.desc()).limit(50).all()
-    
+    resultados = search.search_messages(db, q, current_user.id, session_id=session_id, limit=limit)
+
     formatted_messages = []
-    for message in mensajes:
+    for message, rank, snippet in resultados:
         formatted_message = {
             "id": message.id,
             "contenido": message.texto,
+            "snippet": snippet,
+            "rank": rank,
             "timestamp": message.creado_en.isoformat(),
             "es_tutor": message.remitente == "tutor",
             "usuario_id": message.usuario_id,
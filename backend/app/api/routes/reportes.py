@@ -2,11 +2,11 @@
 Rutas para gestión de reportes de sesiones.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from app.db.session import get_db
+from app.db.session import get_async_db, get_async_read_db
 from app.dependencies import get_current_user
 from app.schemas.reporte import (
     ReporteResponse, 
@@ -15,7 +15,8 @@ from app.schemas.reporte import (
     ReporteUpdate
 )
 from app.services.reporte_service import reporte_service
-from app.db import crud
+from app.db import crud_async
+from app.db.pagination import decode_cursor, split_page
 from app.core.logging import logger
 
 router = APIRouter()
@@ -25,7 +26,7 @@ router = APIRouter()
 async def generar_reporte(
     request: GenerarReporteRequest,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Genera un reporte de sesión usando Gemini.
@@ -39,7 +40,7 @@ async def generar_reporte(
             )
         
         # Verificar que la sesión existe y pertenece al tutor
-        sesion = crud.get_chat_session(db, request.sesion_id)
+        sesion = await crud_async.get_chat_session(db, request.sesion_id)
         if not sesion:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -53,7 +54,7 @@ async def generar_reporte(
             )
         
         # Verificar que la sesión no tenga reporte previo
-        reportes_existentes = crud.get_reportes_by_sesion(db, request.sesion_id)
+        reportes_existentes = await crud_async.get_reportes_by_sesion(db, request.sesion_id)
         if reportes_existentes:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -69,7 +70,7 @@ async def generar_reporte(
         )
         
         # Obtener el reporte completo
-        reporte = crud.get_reporte(db, resultado["reporte_id"])
+        reporte = await crud_async.get_reporte(db, resultado["reporte_id"])
         
         logger.info(f"Reporte generado exitosamente", data={
             "reporte_id": reporte.id,
@@ -94,38 +95,43 @@ async def listar_reportes(
     pagina: int = 1,
     por_pagina: int = 20,
     sesion_id: Optional[int] = None,
+    cursor: Optional[str] = Query(None, description="Cursor de la página anterior (`siguiente_cursor`); tiene prioridad sobre `pagina`"),
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Lista reportes según el rol del usuario.
     """
+    decode_cursor(cursor)  # 422 si el cursor no es válido
     try:
-        offset = (pagina - 1) * por_pagina
+        # Con cursor la página se busca por keyset; `pagina` queda para clientes antiguos
+        offset = 0 if cursor else (pagina - 1) * por_pagina
         
         if current_user.rol.value == "tutor":
             # Tutores ven sus propios reportes
-            reportes = crud.get_reportes_by_tutor(
-                db, current_user.id, limit=por_pagina, offset=offset
+            reportes = await crud_async.get_reportes_by_tutor(
+                db, current_user.id, limit=por_pagina + 1, offset=offset, cursor=cursor
             )
-            total = len(crud.get_reportes_by_tutor(db, current_user.id, limit=1000))
+            total = len(await crud_async.get_reportes_by_tutor(db, current_user.id, limit=1000))
         elif current_user.rol.value == "estudiante":
             # Estudiantes ven reportes visibles sobre ellos
-            reportes = crud.get_reportes_by_estudiante(
-                db, current_user.id, limit=por_pagina, offset=offset
+            reportes = await crud_async.get_reportes_by_estudiante(
+                db, current_user.id, limit=por_pagina + 1, offset=offset, cursor=cursor
             )
-            total = len(crud.get_reportes_by_estudiante(db, current_user.id, limit=1000))
+            total = len(await crud_async.get_reportes_by_estudiante(db, current_user.id, limit=1000))
         else:
             # Admins ven todos los reportes
             # TODO: Implementar función para obtener todos los reportes
             reportes = []
             total = 0
         
+        reportes, siguiente_cursor = split_page(reportes, por_pagina)
         return ReporteListResponse(
             reportes=reportes,
             total=total,
             pagina=pagina,
-            por_pagina=por_pagina
+            por_pagina=por_pagina,
+            siguiente_cursor=siguiente_cursor
         )
         
     except Exception as e:
@@ -140,13 +146,13 @@ async def listar_reportes(
 async def obtener_reporte(
     reporte_id: int,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtiene un reporte específico.
     """
     try:
-        reporte = crud.get_reporte(db, reporte_id)
+        reporte = await crud_async.get_reporte(db, reporte_id)
         if not reporte:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -184,7 +190,7 @@ async def actualizar_reporte(
     reporte_id: int,
     reporte_update: ReporteUpdate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Actualiza un reporte (solo tutores).
@@ -198,7 +204,7 @@ async def actualizar_reporte(
             )
         
         # Verificar que el reporte existe y pertenece al tutor
-        reporte = crud.get_reporte(db, reporte_id)
+        reporte = await crud_async.get_reporte(db, reporte_id)
         if not reporte:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -213,7 +219,7 @@ async def actualizar_reporte(
         
         # Actualizar el reporte
         update_data = reporte_update.model_dump(exclude_unset=True)
-        reporte_actualizado = crud.update_reporte(db, reporte_id, update_data)
+        reporte_actualizado = await crud_async.update_reporte(db, reporte_id, update_data)
         
         logger.info(f"Reporte actualizado", data={
             "reporte_id": reporte_id,
@@ -236,7 +242,7 @@ async def actualizar_reporte(
 async def eliminar_reporte(
     reporte_id: int,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Elimina un reporte (solo tutores).
@@ -250,7 +256,7 @@ async def eliminar_reporte(
             )
         
         # Verificar que el reporte existe y pertenece al tutor
-        reporte = crud.get_reporte(db, reporte_id)
+        reporte = await crud_async.get_reporte(db, reporte_id)
         if not reporte:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -264,7 +270,7 @@ async def eliminar_reporte(
             )
         
         # Eliminar el reporte
-        crud.delete_reporte(db, reporte_id)
+        await crud_async.delete_reporte(db, reporte_id)
         
         logger.info(f"Reporte eliminado", data={
             "reporte_id": reporte_id,
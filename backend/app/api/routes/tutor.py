@@ -3,12 +3,16 @@
 Rutas específicas para tutores - Panel robusto de gestión de sesiones de chat.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Path, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Path, Query, Body, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, and_, or_, desc
-from app.db.session import get_db
+from sqlalchemy import func, and_, or_, desc, select
+from app.db.session import get_db, get_read_db, begin_read_snapshot
+from app.db.pagination import decode_cursor, NEXT_CURSOR_HEADER
+from app.db.archive import load_archived_messages
 from app.dependencies import get_current_user
-from app.db.models import Usuario, SesionChat, Mensaje, Analisis, Alerta, Notificacion, Intervencion, RolUsuario
+from app.db.models import Usuario, SesionChat, Mensaje, Analisis, Alerta, Notificacion, Intervencion, RolUsuario, EstadisticasSesion
 from app.schemas.tutor import (
     TutorDashboardResponse, 
     SessionListResponse, 
@@ -16,24 +20,39 @@ from app.schemas.tutor import (
     SessionStatsResponse,
     AlertListResponse,
     InterventionCreate,
-    InterventionResponse
+    InterventionResponse,
+    AnalysisSearchResponse,
+    SimilarMessagesResponse
 )
 from app.services.tutor_service import (
     get_tutor_dashboard_data,
     get_session_analytics,
     generate_session_report,
-    create_intervention
+    create_intervention,
+    search_student_analyses,
+    list_tutor_sessions,
+    list_tutor_alerts,
+    list_tutor_notifications,
+    list_tutor_students,
+    get_activity_report
 )
-from typing import List, Optional
-from datetime import datetime, timedelta
+from app.services.similarity_service import get_similarity_index, find_similar_messages
+from app.services.timeline_service import get_student_timeline
+from app.services.export_service import iter_export_records, export_response
+from typing import List, Optional, Set
+from datetime import date, datetime, timedelta
 import json
+import hashlib
 
 router = APIRouter()
 
+# Rango máximo de /reports (la serie diaria crece con el rango, no con el volumen)
+MAX_REPORT_DAYS = 366 * 3
+
 
 @router.get("/dashboard", response_model=TutorDashboardResponse)
 def get_tutor_dashboard(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -45,51 +64,91 @@ def get_tutor_dashboard(
     return get_tutor_dashboard_data(db, current_user.id)
 
 
+def _etag(payload) -> str:
+    """ETag fuerte del contenido JSON (ya codificado con jsonable_encoder)."""
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return f'"{hashlib.sha1(body.encode("utf-8")).hexdigest()}"'
+
+
+def _if_none_match(header: Optional[str]) -> Set[str]:
+    # Lista separada por comas; la comparación débil ignora el prefijo W/
+    return {tag.strip().removeprefix("W/") for tag in (header or "").split(",") if tag.strip()}
+
+
+@router.get("/overview")
+def get_tutor_overview(
+    request: Request,
+    db: Session = Depends(get_read_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Dashboard, alertas, notificaciones, sesiones y estudiantes del tutor en una sola respuesta,
+    con la primera página por defecto de cada endpoint individual.
+
+    Alertas, notificaciones, sesiones y estudiantes se leen uno tras otro dentro de una
+    transacción de lectura explícita (`begin_read_snapshot`): todas ven la misma instantánea.
+    No se leen en paralelo porque cada lector necesitaría su propia conexión y, con ella, su
+    propia instantánea. El dashboard sale de `dashboard_cache`, calculado en una petición
+    anterior, y puede ser hasta `CACHE_TTL` más antiguo ante cambios que no invalidan la caché.
+
+    La respuesta lleva un ETag global y `etags` por sección: si `If-None-Match` contiene el
+    ETag global se responde 304; las secciones cuyo ETag venga en la cabecera se devuelven
+    como null para que el cliente reutilice su copia. Cada sección se lee, serializa y hashea
+    igualmente en cada petición: el ETag ahorra transferencia, no trabajo del servidor.
+    """
+    if current_user.rol != RolUsuario.TUTOR:
+        raise HTTPException(status_code=403, detail="Acceso denegado. Solo para tutores.")
+
+    begin_read_snapshot(db)
+    secciones = {
+        "dashboard": lambda: get_tutor_dashboard_data(db, current_user.id),
+        "alertas": lambda: list_tutor_alerts(db, current_user.id),
+        "notificaciones": lambda: list_tutor_notifications(db, current_user.id)[0],
+        "sesiones": lambda: list_tutor_sessions(db, current_user.id)[0],
+        "estudiantes": lambda: list_tutor_students(db, current_user.id),
+    }
+    conocidos = _if_none_match(request.headers.get("if-none-match"))
+
+    datos, etags = {}, {}
+    for nombre, leer in secciones.items():
+        contenido = jsonable_encoder(leer())
+        etags[nombre] = _etag(contenido)
+        datos[nombre] = None if etags[nombre] in conocidos else contenido
+
+    etag = _etag(etags)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in conocidos or "*" in conocidos:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"etags": etags, **datos}, headers=headers)
+
+
 @router.get("/sessions", response_model=List[SessionListResponse])
 def get_tutor_sessions(
+    response: Response,
     estado: Optional[str] = Query(None, description="Filtrar por estado: activa, cerrada, pausada"),
     estudiante_id: Optional[int] = Query(None, description="Filtrar por estudiante específico"),
     fecha_inicio: Optional[str] = Query(None, description="Fecha de inicio (YYYY-MM-DD)"),
     fecha_fin: Optional[str] = Query(None, description="Fecha de fin (YYYY-MM-DD)"),
     limit: int = Query(20, description="Número máximo de sesiones"),
     offset: int = Query(0, description="Offset para paginación"),
+    cursor: Optional[str] = Query(None, description=f"Cursor de paginación (cabecera {NEXT_CURSOR_HEADER}); tiene prioridad sobre offset"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
     Lista de sesiones de chat del tutor con filtros avanzados.
+    El cursor de la siguiente página se devuelve en la cabecera X-Next-Cursor.
     """
     if current_user.rol != RolUsuario.TUTOR:
         raise HTTPException(status_code=403, detail="Acceso denegado. Solo para tutores.")
+    decode_cursor(cursor)  # 422 si el cursor no es válido
     try:
-        query = db.query(SesionChat).filter(SesionChat.tutor_id == current_user.id)
-        if estado:
-            query = query.filter(SesionChat.estado == estado)
-        if estudiante_id:
-            query = query.filter(SesionChat.usuario_id == estudiante_id)
-        if fecha_inicio:
-            query = query.filter(SesionChat.iniciada_en >= fecha_inicio)
-        if fecha_fin:
-            query = query.filter(SesionChat.iniciada_en <= fecha_fin + " 23:59:59")
-        sessions = query.options(
-            joinedload(SesionChat.usuario),
-            joinedload(SesionChat.mensajes)
-        ).order_by(desc(SesionChat.iniciada_en)).offset(offset).limit(limit).all()
-        result = []
-        for s in sessions:
-            result.append({
-                "id": s.id,
-                "usuario_id": s.usuario_id,
-                "estudiante_nombre": s.usuario.nombre if s.usuario else "",
-                "estudiante_email": s.usuario.email if s.usuario else "",
-                "estado": s.estado,
-                "mensajes_count": s.mensajes_count,
-                "duracion_total": s.duracion_total,
-                "iniciada_en": s.iniciada_en,
-                "pausada_en": s.pausada_en,
-                "finalizada_en": s.finalizada_en,
-                "ultimo_mensaje": s.mensajes[-1].texto if s.mensajes else ""
-            })
+        result, next_cursor = list_tutor_sessions(
+            db, current_user.id, estado=estado, estudiante_id=estudiante_id,
+            fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, limit=limit, offset=offset, cursor=cursor
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         return result
     except Exception as e:
         print(f"Error in get_tutor_sessions: {e}")
@@ -189,7 +248,7 @@ def get_session_detail(
 @router.get("/sessions/{session_id}/stats", response_model=SessionStatsResponse)
 def get_session_statistics(
     session_id: int = Path(..., description="ID de la sesión"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -368,19 +427,9 @@ def get_tutor_alerts(
     if current_user.rol != RolUsuario.TUTOR:
         raise HTTPException(status_code=403, detail="Acceso denegado. Solo para tutores.")
     
-    query = db.query(Alerta).filter(Alerta.tutor_asignado == current_user.id)
-    
-    if nivel_urgencia:
-        query = query.filter(Alerta.nivel_urgencia == nivel_urgencia)
-    if revisada is not None:
-        query = query.filter(Alerta.revisada == revisada)
-    
-    alerts = query.options(
-        joinedload(Alerta.usuario),
-        joinedload(Alerta.analisis)
-    ).order_by(desc(Alerta.creado_en)).offset(offset).limit(limit).all()
-    
-    return alerts
+    return list_tutor_alerts(
+        db, current_user.id, nivel_urgencia=nivel_urgencia, revisada=revisada, limit=limit, offset=offset
+    )
 
 
 @router.post("/alerts/{alert_id}/review")
@@ -434,7 +483,7 @@ def create_intervention_endpoint(
 
 @router.get("/students", response_model=List[dict])
 def get_tutor_students(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -443,61 +492,90 @@ def get_tutor_students(
     if current_user.rol != RolUsuario.TUTOR:
         raise HTTPException(status_code=403, detail="Acceso denegado. Solo para tutores.")
     
-    # Obtener estudiantes únicos que han tenido sesiones con este tutor
-    students = db.query(Usuario).join(SesionChat, Usuario.id == SesionChat.usuario_id).filter(
+    return list_tutor_students(db, current_user.id)
+
+
+@router.get("/analysis/search", response_model=AnalysisSearchResponse)
+def search_analyses(
+    emocion: Optional[List[str]] = Query(None, description="Emociones (repetible)"),
+    prioridad: Optional[List[str]] = Query(None, description="Prioridades (repetible)"),
+    alerta: Optional[bool] = Query(None),
+    min_score: Optional[float] = Query(None, ge=0, le=100, description="Score mínimo de la emoción (%)"),
+    dias: int = Query(14, ge=1, le=365, description="Últimos N días (si no se indica `desde`)"),
+    desde: Optional[date] = Query(None),
+    hasta: Optional[date] = Query(None),
+    estudiante_id: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None, description="Cursor de la página anterior (`siguiente_cursor`)"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_read_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Búsqueda por facetas (emoción, prioridad, alerta) sobre los análisis de los estudiantes
+    del tutor en un rango de días, con conteos por faceta y latencia de cada consulta.
+    """
+    if current_user.rol != RolUsuario.TUTOR:
+        raise HTTPException(status_code=403, detail="Acceso denegado. Solo para tutores.")
+
+    decode_cursor(cursor)  # 422 si el cursor no es válido
+    hasta = hasta or date.today()
+    desde = desde or hasta - timedelta(days=dias - 1)
+    if desde > hasta:
+        raise HTTPException(status_code=400, detail="`desde` no puede ser posterior a `hasta`")
+
+    return search_student_analyses(
+        db, current_user.id, desde, hasta,
+        emociones=emocion, prioridades=prioridad, alerta=alerta, min_score=min_score,
+        estudiante_id=estudiante_id, cursor=cursor, limit=limit
+    )
+
+
+@router.get("/messages/{mensaje_id}/similar", response_model=SimilarMessagesResponse)
+def similar_messages(
+    mensaje_id: int = Path(..., description="Mensaje de referencia"),
+    k: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """Mensajes de los estudiantes del tutor más parecidos al indicado (índice LSH de similitud)."""
+    if current_user.rol != RolUsuario.TUTOR:
+        raise HTTPException(status_code=403, detail="Acceso denegado. Solo para tutores.")
+
+    index = get_similarity_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Índice de similitud no disponible")
+
+    mensaje = db.get(Mensaje, mensaje_id)
+    propio = mensaje is not None and db.query(SesionChat.id).filter(
         SesionChat.tutor_id == current_user.id,
-        Usuario.rol == RolUsuario.ESTUDIANTE
-    ).distinct().all()
-    
-    return [
-        {
-            "id": student.id,
-            "nombre": f"{student.nombre} {student.apellido or ''}",
-            "email": student.email,
-            "institucion": student.institucion,
-            "grado_academico": student.grado_academico,
-            "ultimo_acceso": student.ultimo_acceso,
-            "sesiones_count": db.query(SesionChat).filter(
-                SesionChat.usuario_id == student.id,
-                SesionChat.tutor_id == current_user.id
-            ).count()
-        }
-        for student in students
-    ]
+        SesionChat.usuario_id == mensaje.usuario_id
+    ).first() is not None
+    if not propio:
+        raise HTTPException(status_code=404, detail="Mensaje no encontrado")
+
+    return find_similar_messages(db, index, current_user.id, mensaje, k=k)
 
 
 @router.get("/notifications", response_model=List[dict])
 def get_tutor_notifications(
+    response: Response,
     leida: Optional[bool] = Query(None, description="Filtrar por estado de lectura"),
     limit: int = Query(20, description="Número máximo de notificaciones"),
+    cursor: Optional[str] = Query(None, description=f"Cursor de paginación (cabecera {NEXT_CURSOR_HEADER})"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
     Notificaciones del tutor.
+    El cursor de la siguiente página se devuelve en la cabecera X-Next-Cursor.
     """
     if current_user.rol != RolUsuario.TUTOR:
         raise HTTPException(status_code=403, detail="Acceso denegado. Solo para tutores.")
     
-    query = db.query(Notificacion).filter(Notificacion.usuario_id == current_user.id)
-    
-    if leida is not None:
-        query = query.filter(Notificacion.leida == leida)
-    
-    notifications = query.order_by(desc(Notificacion.creado_en)).limit(limit).all()
-    
-    return [
-        {
-            "id": notif.id,
-            "titulo": notif.titulo,
-            "mensaje": notif.mensaje,
-            "tipo": notif.tipo,
-            "leida": notif.leida,
-            "creado_en": notif.creado_en,
-            "metadatos": notif.metadatos
-        }
-        for notif in notifications
-    ]
+    notifications, next_cursor = list_tutor_notifications(db, current_user.id, leida=leida, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return notifications
 
 
 @router.post("/notifications/{notification_id}/read")
@@ -614,11 +692,15 @@ def get_session_messages(
     if not session:
         raise HTTPException(status_code=404, detail="Sesión no encontrada")
     
-    messages = db.query(Mensaje).filter(
-        Mensaje.sesion_id == session_id
-    ).options(
-        joinedload(Mensaje.analisis)
-    ).order_by(desc(Mensaje.creado_en)).offset(offset).limit(limit).all()
+    archived = load_archived_messages(db, session_id)
+    if archived is not None:
+        messages = list(reversed(archived))[offset:offset + limit]
+    else:
+        messages = db.query(Mensaje).filter(
+            Mensaje.sesion_id == session_id
+        ).options(
+            joinedload(Mensaje.analisis)
+        ).order_by(desc(Mensaje.creado_en)).offset(offset).limit(limit).all()
     
     return [
         {
@@ -784,9 +866,58 @@ def mark_alert_as_read(
 
 # Endpoints para funcionalidades avanzadas
 
+@router.get("/reports")
+def get_activity_report_route(
+    desde: Optional[date] = Query(None, description="Inicio del rango (por defecto, hace 29 días)"),
+    hasta: Optional[date] = Query(None, description="Fin del rango, incluido (por defecto, hoy)"),
+    granularidad: str = Query("dia", pattern="^(dia|semana|mes)$"),
+    db: Session = Depends(get_read_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Reporte de actividad del tutor en un rango arbitrario, agregado por día, semana o mes.
+    """
+    if current_user.rol != RolUsuario.TUTOR:
+        raise HTTPException(status_code=403, detail="Acceso denegado. Solo para tutores.")
+
+    hasta = hasta or date.today()
+    desde = desde or hasta - timedelta(days=29)
+    if desde > hasta:
+        raise HTTPException(status_code=400, detail="`desde` no puede ser posterior a `hasta`")
+    if (hasta - desde).days > MAX_REPORT_DAYS:
+        raise HTTPException(status_code=400, detail=f"El rango no puede superar {MAX_REPORT_DAYS} días")
+
+    return get_activity_report(db, current_user.id, desde, hasta, granularidad)
+
+
+@router.get("/export/sessions")
+def export_sessions_route(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False, description="Comprimir la descarga con gzip"),
+    estudiante_id: Optional[int] = Query(None, description="Solo las sesiones de este estudiante"),
+    solo_analisis: bool = Query(False, description="Solo mensajes con análisis"),
+    desde_sesion: int = Query(0, ge=0, description="Reanudar tras el mensaje (desde_sesion, desde_id)"),
+    desde_id: int = Query(0, ge=0),
+    db: Session = Depends(get_read_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Exportación en streaming de las transcripciones (mensajes y análisis) de las sesiones
+    del tutor, en NDJSON o CSV, incluidas las sesiones archivadas.
+    """
+    if current_user.rol != RolUsuario.TUTOR:
+        raise HTTPException(status_code=403, detail="Acceso denegado. Solo para tutores.")
+
+    sesiones = select(SesionChat.id).where(SesionChat.tutor_id == current_user.id)
+    if estudiante_id is not None:
+        sesiones = sesiones.where(SesionChat.usuario_id == estudiante_id)
+    records = iter_export_records(db, sesiones, (desde_sesion, desde_id), solo_analisis)
+    return export_response(records, formato, gzip, "sesiones")
+
+
 @router.get("/reports/weekly")
 def get_weekly_report(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -795,51 +926,36 @@ def get_weekly_report(
     if current_user.rol != RolUsuario.TUTOR:
         raise HTTPException(status_code=403, detail="Acceso denegado. Solo para tutores.")
     
-    # Calcular fechas para la semana actual
-    today = datetime.now()
+    # Semana actual (lunes a domingo)
+    today = date.today()
     start_of_week = today - timedelta(days=today.weekday())
     end_of_week = start_of_week + timedelta(days=6)
     
-    # Estadísticas de la semana
-    sesiones_semana = db.query(SesionChat).filter(
-        SesionChat.tutor_id == current_user.id,
-        SesionChat.iniciada_en >= start_of_week,
-        SesionChat.iniciada_en <= end_of_week
-    ).all()
-    
-    total_mensajes = sum(s.mensajes_count for s in sesiones_semana)
-    sesiones_activas = len([s for s in sesiones_semana if s.estado == "activa"])
-    alertas_semana = db.query(Alerta).filter(
-        Alerta.tutor_asignado == current_user.id,
-        Alerta.creado_en >= start_of_week,
-        Alerta.creado_en <= end_of_week
-    ).count()
+    report = get_activity_report(db, current_user.id, start_of_week, end_of_week, "dia")
+    estadisticas = report["estadisticas"]
     
     return {
         "periodo": {
-            "inicio": start_of_week.isoformat(),
-            "fin": end_of_week.isoformat()
+            "inicio": datetime.combine(start_of_week, datetime.min.time()).isoformat(),
+            "fin": datetime.combine(end_of_week, datetime.min.time()).isoformat()
         },
         "estadisticas": {
-            "total_sesiones": len(sesiones_semana),
-            "sesiones_activas": sesiones_activas,
-            "total_mensajes": total_mensajes,
-            "alertas_generadas": alertas_semana,
-            "promedio_mensajes_por_sesion": total_mensajes / len(sesiones_semana) if sesiones_semana else 0
+            "total_sesiones": estadisticas["total_sesiones"],
+            "sesiones_activas": estadisticas["sesiones_activas"],
+            "total_mensajes": estadisticas["total_mensajes"],
+            "alertas_generadas": estadisticas["alertas_generadas"],
+            "promedio_mensajes_por_sesion": estadisticas["promedio_mensajes_por_sesion"]
         },
         "sesiones_por_dia": [
-            {
-                "fecha": (start_of_week + timedelta(days=i)).strftime("%Y-%m-%d"),
-                "sesiones": len([s for s in sesiones_semana if s.iniciada_en.date() == (start_of_week + timedelta(days=i)).date()])
-            }
-            for i in range(7)
+            {"fecha": dia["inicio"], "sesiones": dia["sesiones"]}
+            for dia in report["series"]
         ]
     }
 
 
 @router.get("/reports/monthly")
 def get_monthly_report(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -848,49 +964,66 @@ def get_monthly_report(
     if current_user.rol != RolUsuario.TUTOR:
         raise HTTPException(status_code=403, detail="Acceso denegado. Solo para tutores.")
     
-    # Calcular fechas para el mes actual
-    today = datetime.now()
+    # Mes actual
+    today = date.today()
     start_of_month = today.replace(day=1)
-    if today.month == 12:
-        end_of_month = today.replace(year=today.year + 1, month=1, day=1) - timedelta(days=1)
-    else:
-        end_of_month = today.replace(month=today.month + 1, day=1) - timedelta(days=1)
-    
-    # Estadísticas del mes
-    sesiones_mes = db.query(SesionChat).filter(
-        SesionChat.tutor_id == current_user.id,
-        SesionChat.iniciada_en >= start_of_month,
-        SesionChat.iniciada_en <= end_of_month
-    ).all()
+    end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
     
-    total_mensajes = sum(s.mensajes_count for s in sesiones_mes)
-    estudiantes_unicos = len(set(s.usuario_id for s in sesiones_mes))
-    alertas_mes = db.query(Alerta).filter(
-        Alerta.tutor_asignado == current_user.id,
-        Alerta.creado_en >= start_of_month,
-        Alerta.creado_en <= end_of_month
-    ).count()
+    report = get_activity_report(db, current_user.id, start_of_month, end_of_month, "mes")
+    estadisticas = report["estadisticas"]
     
     return {
         "periodo": {
-            "inicio": start_of_month.isoformat(),
-            "fin": end_of_month.isoformat()
+            "inicio": datetime.combine(start_of_month, datetime.min.time()).isoformat(),
+            "fin": datetime.combine(end_of_month, datetime.min.time()).isoformat()
         },
         "estadisticas": {
-            "total_sesiones": len(sesiones_mes),
-            "estudiantes_atendidos": estudiantes_unicos,
-            "total_mensajes": total_mensajes,
-            "alertas_generadas": alertas_mes,
-            "promedio_mensajes_por_sesion": total_mensajes / len(sesiones_mes) if sesiones_mes else 0,
-            "promedio_sesiones_por_estudiante": len(sesiones_mes) / estudiantes_unicos if estudiantes_unicos > 0 else 0
+            "total_sesiones": estadisticas["total_sesiones"],
+            "estudiantes_atendidos": estadisticas["estudiantes_atendidos"],
+            "total_mensajes": estadisticas["total_mensajes"],
+            "alertas_generadas": estadisticas["alertas_generadas"],
+            "promedio_mensajes_por_sesion": estadisticas["promedio_mensajes_por_sesion"],
+            "promedio_sesiones_por_estudiante": estadisticas["promedio_sesiones_por_estudiante"]
         }
     }
 
 
+@router.get("/students/{student_id}/timeline")
+def get_student_timeline_route(
+    student_id: int = Path(..., description="ID del estudiante"),
+    desde: Optional[datetime] = Query(None, description="Inicio del rango (por defecto, hace 90 días)"),
+    hasta: Optional[datetime] = Query(None, description="Fin del rango, excluido (por defecto, ahora)"),
+    puntos: int = Query(200, ge=10, le=2000, description="Máximo de puntos de la serie"),
+    db: Session = Depends(get_read_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Trayectoria emocional del estudiante (scores medios, emoción y estilo dominantes, alertas)
+    con la resolución más fina que cabe en `puntos`.
+    """
+    if current_user.rol != RolUsuario.TUTOR:
+        raise HTTPException(status_code=403, detail="Acceso denegado. Solo para tutores.")
+
+    student = db.query(Usuario.id).join(SesionChat, Usuario.id == SesionChat.usuario_id).filter(
+        Usuario.id == student_id,
+        SesionChat.tutor_id == current_user.id,
+        Usuario.rol == RolUsuario.ESTUDIANTE
+    ).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Estudiante no encontrado")
+
+    hasta = hasta or datetime.now()
+    desde = desde or hasta - timedelta(days=90)
+    if desde >= hasta:
+        raise HTTPException(status_code=400, detail="`desde` debe ser anterior a `hasta`")
+
+    return get_student_timeline(db, student_id, desde, hasta, puntos)
+
+
 @router.get("/students/{student_id}/progress")
 def get_student_progress(
     student_id: int = Path(..., description="ID del estudiante"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -920,20 +1053,17 @@ def get_student_progress(
     sesiones_completadas = len([s for s in sesiones if s.estado == "cerrada"])
     total_mensajes = sum(s.mensajes_count for s in sesiones)
     
-    # Análisis de emociones y estilos (si hay análisis disponibles)
+    # Análisis de emociones y estilos: suma de los agregados de estas sesiones (session_stats)
     emociones = {}
     estilos = {}
-    
-    for sesion in sesiones:
-        mensajes = db.query(Mensaje).filter(Mensaje.sesion_id == sesion.id).all()
-        for mensaje in mensajes:
-            if mensaje.analisis:
-                # mensaje.analisis es una relación de uno a uno, no una lista
-                analisis = mensaje.analisis
-                if analisis.emocion:
-                    emociones[analisis.emocion] = emociones.get(analisis.emocion, 0) + 1
-                if analisis.estilo:
-                    estilos[analisis.estilo] = estilos.get(analisis.estilo, 0) + 1
+    stats_sesiones = db.query(EstadisticasSesion).filter(
+        EstadisticasSesion.sesion_id.in_([s.id for s in sesiones])
+    ).all() if sesiones else []
+    for stats in stats_sesiones:
+        for emocion, conteo in (stats.emociones or {}).items():
+            emociones[emocion] = emociones.get(emocion, 0) + conteo
+        for estilo, conteo in (stats.estilos or {}).items():
+            estilos[estilo] = estilos.get(estilo, 0) + conteo
     
     return {
         "estudiante": {
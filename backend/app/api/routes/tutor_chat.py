@@ -3,16 +3,18 @@
 Rutas para el chat entre estudiantes y tutores.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Path
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.schemas.chat import ChatSessionCreate, ChatSessionResponse
 from app.dependencies import get_current_user
 from app.db.models import Usuario, SesionChat, Mensaje, RolUsuario
 from app.db import crud
+from app.db.pagination import decode_cursor, NEXT_CURSOR_HEADER
+from app.db.archive import read_session_messages
 from app.schemas.message import Message, MessageCreate
 from sqlalchemy import func
-from typing import List
+from typing import List, Optional
 
 router = APIRouter()
 
@@ -182,22 +184,27 @@ def send_message_to_tutor_session(
 
 @router.get("/session/{session_id}/messages", response_model=List[Message])
 def get_tutor_session_messages(
+    response: Response,
     session_id: int = Path(..., description="ID de la sesión"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Tamaño de página; sin él se devuelve la sesión completa"),
+    cursor: Optional[str] = Query(None, description=f"Cursor de paginación (cabecera {NEXT_CURSOR_HEADER})"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
-    Obtiene todos los mensajes de una sesión de chat con tutor.
+    Obtiene los mensajes de una sesión de chat con tutor en orden cronológico.
+    Con `limit` pagina por cursor; el siguiente se devuelve en la cabecera X-Next-Cursor.
     """
+    decode_cursor(cursor)  # 422 si el cursor no es válido
     session = db.query(SesionChat).filter(SesionChat.id == session_id).first()
     if not session:
         raise HTTPException(status_code=404, detail="Sesión no encontrada")
     # Verificar que el usuario sea el estudiante o el tutor de la sesión
     if session.usuario_id != current_user.id and session.tutor_id != current_user.id:
         raise HTTPException(status_code=403, detail="No tienes permisos para ver mensajes de esta sesión")
-    mensajes = db.query(Mensaje).filter(
-        Mensaje.sesion_id == session_id
-    ).order_by(Mensaje.creado_en.asc()).all()
+    mensajes, next_cursor = read_session_messages(db, session_id, cursor, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     # Asegurar que metadatos sea un dict
     mensajes_response = []
     for m in mensajes:
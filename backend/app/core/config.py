@@ -29,6 +29,17 @@ class Settings(BaseSettings):
     DATABASE_POOL_SIZE: int = 10
     DATABASE_MAX_OVERFLOW: int = 20
     DATABASE_POOL_TIMEOUT: int = 30
+    # Réplica de solo lectura para analítica y reportes (vacía = todo va a la primaria)
+    DATABASE_READ_URL: Optional[str] = None
+    DATABASE_READ_RETRY_SECONDS: int = 30
+
+    # Perfil de SQLite (WAL, un único escritor y lectores de solo lectura)
+    SQLITE_OPTIMIZED: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # 256MB
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_READ_POOL_SIZE: int = 8
     
     # Configuración de seguridad
     SECRET_KEY: str = "psichat-2024-<algún_valor_aleatorio>"
@@ -66,6 +77,7 @@ class Settings(BaseSettings):
     # Configuración de caché
     CACHE_ENABLED: bool = True
     CACHE_TTL: int = 300  # 5 minutos
+    CACHE_MAX_ENTRIES: int = 1000  # Propietarios por caché de snapshots (LRU)
     REDIS_URL: str = ""
     
     # Configuración de notificaciones
@@ -80,11 +92,41 @@ class Settings(BaseSettings):
     ANALYSIS_BATCH_SIZE: int = 10
     ANALYSIS_TIMEOUT: int = 30
     ENABLE_DEEP_ANALYSIS: bool = True
+    DEEP_ANALYSIS_WINDOW: int = 10  # Mensajes del análisis profundo por defecto
+    DEEP_ANALYSIS_MAX_WINDOW: int = 500
+    ANALYSIS_COMPACT_DISTRIBUTIONS: bool = False  # Distribuciones como float32 empaquetado
+    
+    # Archivado de sesiones cerradas (segmentos JSONL comprimidos)
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_AFTER_DAYS: int = 90
+    ARCHIVE_BATCH_SIZE: int = 50  # Sesiones por ejecución
+    ARCHIVE_THROTTLE_SECONDS: float = 0.2  # Pausa entre sesiones
+    ARCHIVE_INTERVAL_SECONDS: int = 3600
+    
+    # Exportación en streaming (NDJSON/CSV)
+    EXPORT_BATCH_SIZE: int = 500  # Filas por lectura del cursor y por bloque enviado
+    
+    # Búsqueda de mensajes similares (LSH sobre vectores TF-IDF del modelo de emociones)
+    SIMILARITY_INDEX_ENABLED: bool = False
+    SIMILARITY_INDEX_DIR: str = "similarity_index"
+    SIMILARITY_DIM: int = 256  # Dimensiones tras la proyección aleatoria
+    SIMILARITY_TABLES: int = 16  # Tablas hash
+    SIMILARITY_BITS: int = 8  # Bits por firma (cubetas por tabla = 2^bits)
     
     # Configuración de monitoreo
     ENABLE_METRICS: bool = True
     METRICS_PORT: int = 9090
-    
+
+    # Configuración de WebSocket
+    WS_TYPING_INTERVAL: float = 1.0  # segundos mínimos entre frames de escritura por (sesión, usuario)
+    WS_TYPING_IDLE_TIMEOUT: float = 3.0  # segundos sin teclear antes de emitir "dejó de escribir"
+    WS_MAX_FRAMES_PER_SECOND: float = 20.0  # frames entrantes sostenidos por conexión
+    WS_FRAME_BURST: int = 40  # ráfaga máxima de frames entrantes por conexión
+    WS_REPLAY_BUFFER_SIZE: int = 200  # frames recientes guardados por sesión para reanudar
+    WS_REPLAY_MAX_SESSIONS: int = 1000  # sesiones con buffer de reanudación en memoria
+    WS_RESUME_PAGE_SIZE: int = 50  # mensajes por página al reanudar desde base de datos
+
     @field_validator("SECRET_KEY")
     @classmethod
     def validate_secret_key(cls, v):
@@ -9,6 +9,7 @@ from datetime import datetime
 from typing import Optional
 import json
 from functools import wraps
+import inspect
 import traceback
 from app.core.config import settings
 import os
@@ -208,6 +209,16 @@ def log_api_request(func):
 
 def log_database_operation(func):
     """Decorador para loggear operaciones de base de datos - solo errores."""
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Database Error: {func.__name__} failed", error=e)
+                raise
+        return async_wrapper
+
     @wraps(func)
     def wrapper(*args, **kwargs):
         try:
@@ -9,8 +9,9 @@ from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
-from app.db import crud
+from app.db.session import AsyncSessionLocal
+from app.db import crud_async
+from app.db.cache import dashboard_cache, deep_analysis_cache
 from app.core.logging import logger
 import threading
 from collections import defaultdict, deque
@@ -182,32 +183,27 @@ class SystemMonitor:
     async def _save_metrics(self, metrics: SystemMetrics):
         """Guarda métricas en la base de datos."""
         try:
-            db = SessionLocal()
-            
-            # Guardar métricas del sistema
-            crud.create_metric(
-                db, "sistema", "cpu_usage", metrics.cpu_percent, "porcentaje"
-            )
-            crud.create_metric(
-                db, "sistema", "memory_usage", metrics.memory_percent, "porcentaje"
-            )
-            crud.create_metric(
-                db, "sistema", "disk_usage", metrics.disk_usage_percent, "porcentaje"
-            )
-            crud.create_metric(
-                db, "sistema", "active_connections", metrics.active_connections, "conexiones"
-            )
-            crud.create_metric(
-                db, "sistema", "requests_per_minute", metrics.requests_per_minute, "requests"
-            )
-            crud.create_metric(
-                db, "sistema", "error_rate", metrics.error_rate, "porcentaje"
-            )
-            crud.create_metric(
-                db, "sistema", "avg_response_time", metrics.response_time_avg, "segundos"
-            )
-            
-            db.close()
+            async with AsyncSessionLocal() as db:
+                # Guardar métricas del sistema en un único INSERT/commit
+                valores = [
+                    ("cpu_usage", metrics.cpu_percent, "porcentaje"),
+                    ("memory_usage", metrics.memory_percent, "porcentaje"),
+                    ("disk_usage", metrics.disk_usage_percent, "porcentaje"),
+                    ("active_connections", metrics.active_connections, "conexiones"),
+                    ("requests_per_minute", metrics.requests_per_minute, "requests"),
+                    ("error_rate", metrics.error_rate, "porcentaje"),
+                    ("avg_response_time", metrics.response_time_avg, "segundos"),
+                ]
+                # Aciertos/fallos acumulados de las cachés en proceso
+                caches = [
+                    {"tipo_metrica": "cache", "nombre": f"{nombre}_{evento}", "valor": float(total), "unidad": "accesos"}
+                    for nombre, cache in (("dashboard", dashboard_cache), ("deep_analysis", deep_analysis_cache))
+                    for evento, total in cache.stats.items()
+                ]
+                await crud_async.create_metrics_bulk(db, [
+                    {"tipo_metrica": "sistema", "nombre": nombre, "valor": valor, "unidad": unidad}
+                    for nombre, valor, unidad in valores
+                ] + caches)
         except Exception as e:
             logger.error(f"Error guardando métricas: {e}")
     
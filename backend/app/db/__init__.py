@@ -3,7 +3,11 @@ Módulo de base de datos de PsiChat.
 """
 
 from .models import Base
-from .session import SessionLocal, get_db
+from .session import SessionLocal, get_db, AsyncSessionLocal, get_async_db
 from . import crud
+from . import crud_async
+from . import stats  # Registra el mantenimiento de las tablas de agregados
+from . import search  # Registra el índice de texto completo de mensajes
+from . import cache  # Registra la invalidación de los snapshots del dashboard
 
-__all__ = ["Base", "SessionLocal", "get_db", "crud"] 
\ No newline at end of file
+__all__ = ["Base", "SessionLocal", "get_db", "AsyncSessionLocal", "get_async_db", "crud", "crud_async"] 
\ No newline at end of file
@@ -0,0 +1,296 @@
+"""
+Archivado frío de sesiones cerradas.
+
+Los mensajes y análisis de sesiones cerradas hace más de `ARCHIVE_AFTER_DAYS` días se
+mueven a un segmento JSONL comprimido por sesión, particionado por mes de cierre
+(`ARCHIVE_DIR/YYYY-MM/sesion_<id>.jsonl.gz`), y se registran en `segmentos_archivo`.
+Las tablas calientes quedan acotadas a las sesiones recientes.
+
+Las lecturas de historial y reportes pasan por `load_archived_messages` /
+`read_session_messages`, que sirven la sesión desde su segmento de forma transparente.
+Los agregados de `session_stats` se conservan (el borrado no pasa por el ORM).
+Los análisis referenciados por alertas se quedan también en caliente para no romper la FK.
+"""
+
+import os
+import gzip
+import json
+import time
+import asyncio
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import DateTime, Date, delete, select, inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.db.models import Mensaje, Analisis, Alerta, SesionChat, SegmentoArchivo, Usuario
+from app.db.pagination import decode_cursor, split_page, apply_keyset
+
+
+def _columns(model) -> List[Tuple[str, Any]]:
+    return [(attr.key, attr.columns[0].type) for attr in inspect(model).column_attrs]
+
+
+def _dump(obj, columns) -> Dict[str, Any]:
+    record = {}
+    for key, _ in columns:
+        value = getattr(obj, key)
+        record[key] = value.isoformat() if isinstance(value, (datetime, date)) else value
+    return record
+
+
+def _load(record: Dict[str, Any], columns) -> Dict[str, Any]:
+    values = {}
+    for key, type_ in columns:
+        value = record.get(key)
+        if value is not None and isinstance(type_, DateTime):
+            value = datetime.fromisoformat(value)
+        elif value is not None and isinstance(type_, Date):
+            value = date.fromisoformat(value)
+        values[key] = value
+    return values
+
+
+def segment_path(relative: str) -> str:
+    return os.path.join(settings.ARCHIVE_DIR, relative)
+
+
+@lru_cache(maxsize=32)
+def _read_segment(path: str) -> Tuple[Dict[str, Any], ...]:
+    """Registros de un segmento; los segmentos son inmutables y se cachean por ruta."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return tuple(json.loads(line) for line in f if line.strip())
+
+
+def iter_segment(relative: str) -> Iterator[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """Pares (mensaje, análisis) de un segmento con los tipos de columna restaurados."""
+    mensaje_columns, analisis_columns = _columns(Mensaje), _columns(Analisis)
+    for record in _read_segment(segment_path(relative)):
+        analisis = record.get("analisis")
+        yield _load(record["mensaje"], mensaje_columns), _load(analisis, analisis_columns) if analisis else None
+
+
+def stream_segment(relative: str, after_id: Optional[int] = None
+                   ) -> Iterator[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """
+    Como `iter_segment`, pero leyendo el gzip línea a línea y sin pasar por la caché:
+    la memoria no depende del tamaño del segmento (exportaciones).
+
+    Los registros salen en el orden en que se escribieron, (creado_en, id). Con `after_id`
+    se reanuda justo después del mensaje con ese id; si no está en el segmento, se
+    devuelven los de id mayor.
+    """
+    path = segment_path(relative)
+    mensaje_columns, analisis_columns = _columns(Mensaje), _columns(Analisis)
+
+    def lines():
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def rows(records):
+        for record in records:
+            analisis = record.get("analisis")
+            yield _load(record["mensaje"], mensaje_columns), _load(analisis, analisis_columns) if analisis else None
+
+    if after_id is None:
+        yield from rows(lines())
+        return
+    records = lines()
+    for record in records:
+        if record["mensaje"]["id"] == after_id:
+            yield from rows(records)
+            return
+    # El id no está en el segmento: segunda pasada por id
+    yield from rows(r for r in lines() if r["mensaje"]["id"] > after_id)
+
+
+def load_archived_messages(db: Session, sesion_id: int) -> Optional[List[SimpleNamespace]]:
+    """
+    Mensajes de una sesión archivada en orden (creado_en, id), o None si está en caliente.
+    Cada mensaje expone los mismos atributos que `Mensaje`, con `analisis` y `usuario`.
+    """
+    segmento = db.get(SegmentoArchivo, sesion_id)
+    if segmento is None:
+        return None
+
+    rows = list(iter_segment(segmento.ruta))
+    usuario_ids = {mensaje["usuario_id"] for mensaje, _ in rows}
+    usuarios = {u.id: u for u in db.query(Usuario).filter(Usuario.id.in_(usuario_ids))} if usuario_ids else {}
+
+    mensajes = []
+    for mensaje, analisis in rows:
+        mensajes.append(SimpleNamespace(
+            **mensaje,
+            analisis=SimpleNamespace(**analisis) if analisis else None,
+            usuario=usuarios.get(mensaje["usuario_id"])
+        ))
+    return mensajes
+
+
+def read_session_messages(db: Session, sesion_id: int, cursor: Optional[str] = None,
+                          limit: Optional[int] = None, options=()) -> Tuple[list, Optional[str]]:
+    """
+    Mensajes de una sesión en orden cronológico desde la tabla o su segmento archivado.
+    Con `limit` pagina por cursor `(creado_en, id)` y devuelve también el cursor siguiente.
+    """
+    archived = load_archived_messages(db, sesion_id)
+    if archived is not None:
+        position = decode_cursor(cursor)
+        rows = [m for m in archived if position is None or (m.creado_en, m.id) > position]
+        return (rows, None) if limit is None else split_page(rows[:limit + 1], limit)
+
+    query = apply_keyset(
+        db.query(Mensaje).filter(Mensaje.sesion_id == sesion_id).options(*options),
+        Mensaje.creado_en, Mensaje.id, cursor, descending=False
+    )
+    if limit is None:
+        return query.all(), None
+    return split_page(query.limit(limit + 1).all(), limit)
+
+
+def archive_session(db: Session, sesion: SesionChat) -> SegmentoArchivo:
+    """Escribe el segmento de una sesión y borra sus filas calientes en una transacción."""
+    cerrada = sesion.finalizada_en or datetime.now()
+    particion = cerrada.strftime("%Y-%m")
+    relative = os.path.join(particion, f"sesion_{sesion.id}.jsonl.gz")
+    path = segment_path(relative)
+
+    rows = db.query(Mensaje, Analisis).outerjoin(
+        Analisis, Mensaje.id == Analisis.mensaje_id
+    ).filter(Mensaje.sesion_id == sesion.id).order_by(Mensaje.creado_en, Mensaje.id).all()
+
+    mensaje_columns, analisis_columns = _columns(Mensaje), _columns(Analisis)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for mensaje, analisis in rows:
+            record = {
+                "mensaje": _dump(mensaje, mensaje_columns),
+                "analisis": _dump(analisis, analisis_columns) if analisis else None
+            }
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    os.replace(tmp_path, path)
+
+    try:
+        # Análisis con alertas (y sus mensajes) se mantienen en caliente por la FK alertas.analisis_id
+        analisis_ids = [analisis.id for _, analisis in rows if analisis]
+        retenidos = set(db.scalars(
+            select(Alerta.analisis_id).where(Alerta.analisis_id.in_(analisis_ids))
+        )) if analisis_ids else set()
+        mensajes_retenidos = {mensaje.id for mensaje, analisis in rows if analisis and analisis.id in retenidos}
+
+        borrar_analisis = [aid for aid in analisis_ids if aid not in retenidos]
+        borrar_mensajes = [mensaje.id for mensaje, _ in rows if mensaje.id not in mensajes_retenidos]
+        if borrar_analisis:
+            db.execute(delete(Analisis).where(Analisis.id.in_(borrar_analisis)).execution_options(synchronize_session=False))
+        if borrar_mensajes:
+            db.execute(delete(Mensaje).where(Mensaje.id.in_(borrar_mensajes)).execution_options(synchronize_session=False))
+        # Las filas borradas ya no existen en la tabla: fuera del identity map
+        for mensaje, analisis in rows:
+            if mensaje.id not in mensajes_retenidos:
+                db.expunge(mensaje)
+                if analisis is not None and analisis in db:
+                    db.expunge(analisis)
+
+        segmento = SegmentoArchivo(
+            sesion_id=sesion.id, particion=particion, ruta=relative,
+            total_mensajes=len(rows), total_analisis=len(analisis_ids), tamano_bytes=os.path.getsize(path)
+        )
+        db.add(segmento)
+        db.commit()
+    except Exception:
+        db.rollback()
+        os.remove(path)
+        raise
+
+    return segmento
+
+
+def archive_closed_sessions(db: Session, older_than_days: Optional[int] = None, max_sessions: Optional[int] = None,
+                            throttle_seconds: Optional[float] = None) -> Dict[str, int]:
+    """Archiva un lote de sesiones cerradas antes del límite, pausando entre sesiones."""
+    older_than_days = settings.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    max_sessions = settings.ARCHIVE_BATCH_SIZE if max_sessions is None else max_sessions
+    throttle_seconds = settings.ARCHIVE_THROTTLE_SECONDS if throttle_seconds is None else throttle_seconds
+    limite = datetime.now() - timedelta(days=older_than_days)
+
+    sesiones = db.query(SesionChat).outerjoin(
+        SegmentoArchivo, SegmentoArchivo.sesion_id == SesionChat.id
+    ).filter(
+        SesionChat.estado == "cerrada",
+        SesionChat.finalizada_en < limite,
+        SegmentoArchivo.sesion_id.is_(None)
+    ).order_by(SesionChat.finalizada_en).limit(max_sessions).all()
+
+    result = {"sesiones": 0, "mensajes": 0, "errores": 0}
+    for i, sesion in enumerate(sesiones):
+        if i and throttle_seconds:
+            time.sleep(throttle_seconds)
+        try:
+            segmento = archive_session(db, sesion)
+            result["sesiones"] += 1
+            result["mensajes"] += segmento.total_mensajes
+        except Exception as e:
+            result["errores"] += 1
+            logger.error("Error archivando sesión", error=e, data={"sesion_id": sesion.id})
+
+    if result["sesiones"] or result["errores"]:
+        logger.info("Lote de archivado completado", data=result)
+    return result
+
+
+class ArchiveWorker:
+    """Tarea de fondo que archiva sesiones cerradas en lotes periódicos."""
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Inicia el archivado periódico."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            logger.info("Archivado de sesiones iniciado")
+
+    async def stop(self):
+        """Detiene el archivado periódico."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Archivado de sesiones detenido")
+
+    def run_once(self) -> Dict[str, int]:
+        """Archiva un lote en una sesión de base de datos propia."""
+        if self.session_factory is None:
+            from app.db.session import SessionLocal
+            self.session_factory = SessionLocal
+        db = self.session_factory()
+        try:
+            return archive_closed_sessions(db)
+        finally:
+            db.close()
+
+    async def _loop(self):
+        while True:
+            try:
+                # El lote es bloqueante (IO de disco y SQL síncrono): fuera del event loop
+                await asyncio.to_thread(self.run_once)
+                await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error en loop de archivado: {e}")
+                await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
+
+
+archive_worker = ArchiveWorker()
@@ -0,0 +1,184 @@
+"""
+Cachés en proceso invalidadas por eventos: snapshots del dashboard del tutor y
+ventanas del análisis profundo por usuario.
+
+Los listeners `after_flush` anotan en `session.info` qué tutores quedan afectados por
+cada escritura (sesiones, mensajes, alertas, intervenciones y notificaciones) y
+`after_commit` invalida sus snapshots; un rollback descarta las anotaciones.
+`CACHE_TTL` acota la antigüedad de un snapshot frente a cambios que no pasan por el
+ORM ni por `mark_*_changed` (p. ej. el paso de los días en "estudiantes activos").
+
+Cada propietario lleva una versión que se incrementa al invalidar: un snapshot calculado
+mientras se confirmaba una escritura que lo afecta no se guarda. Cada caché guarda como
+mucho `CACHE_MAX_ENTRIES` propietarios: al guardar se descartan los caducados y, si no
+basta, los usados hace más tiempo (LRU).
+
+El análisis profundo se actualiza por su clave (último mensaje y análisis del usuario) al
+llegar mensajes nuevos; aquí solo se invalida cuando se modifican o borran análisis o
+mensajes que pueden estar ya sumados en la ventana.
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import SesionChat, Mensaje, Alerta, Intervencion, Notificacion, Analisis
+
+_PENDING = "dashboard_tutores"
+_PENDING_DEEP = "analisis_profundo_usuarios"
+
+
+class SnapshotCache:
+    """Snapshots por propietario (tutor o usuario) con TTL, versión de invalidación y contadores."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Orden de uso: el primero es el menos reciente
+        self._items: "OrderedDict[int, Tuple[float, Hashable, Any]]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self.stats: Counter = Counter()
+
+    def version(self, owner_id: int) -> int:
+        return self._versions.get(owner_id, 0)
+
+    def entry(self, owner_id: int) -> Optional[Tuple[Hashable, Any]]:
+        """(clave, snapshot) vigente del propietario sea cual sea la clave, o None."""
+        with self._lock:
+            item = self._items.get(owner_id)
+            if item is None:
+                return None
+            if time.monotonic() - item[0] > settings.CACHE_TTL:
+                del self._items[owner_id]
+                return None
+            self._items.move_to_end(owner_id)
+        return item[1], item[2]
+
+    def get(self, owner_id: int, key: Hashable) -> Optional[Any]:
+        """Snapshot vigente del propietario para `key` (p. ej. el día), o None."""
+        entry = self.entry(owner_id)
+        self.record("hits" if entry is not None and entry[0] == key else "misses")
+        return entry[1] if entry is not None and entry[0] == key else None
+
+    def set(self, owner_id: int, key: Hashable, value: Any, version: int) -> None:
+        """Guarda el snapshot si no hubo invalidaciones desde `version`."""
+        with self._lock:
+            if self.version(owner_id) != version:
+                return
+            ahora = time.monotonic()
+            for caducado in [oid for oid, item in self._items.items() if ahora - item[0] > settings.CACHE_TTL]:
+                del self._items[caducado]
+            self._items[owner_id] = (ahora, key, value)
+            self._items.move_to_end(owner_id)
+            while len(self._items) > settings.CACHE_MAX_ENTRIES:
+                self._items.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, owner_ids: Iterable[int]) -> None:
+        with self._lock:
+            for owner_id in owner_ids:
+                self._versions[owner_id] = self.version(owner_id) + 1
+                self._items.pop(owner_id, None)
+
+    def record(self, event: str) -> None:
+        """Cuenta un acceso (`hits`, `misses`, ...) para las métricas del monitor."""
+        self.stats[event] += 1
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._versions.clear()
+            self.stats.clear()
+
+
+dashboard_cache = SnapshotCache()
+deep_analysis_cache = SnapshotCache()
+
+
+def mark_tutors_changed(session: Session, tutor_ids: Iterable[Optional[int]]) -> None:
+    """Invalida el dashboard de estos tutores al confirmar la transacción."""
+    session.info.setdefault(_PENDING, set()).update(tid for tid in tutor_ids if tid is not None)
+
+
+def mark_sessions_changed(session: Session, sesion_ids: Iterable[Optional[int]]) -> None:
+    """Como `mark_tutors_changed`, a partir de sesiones (para escrituras fuera del ORM)."""
+    sesion_ids = {sid for sid in sesion_ids if sid is not None}
+    if sesion_ids:
+        mark_tutors_changed(session, _tutors_of(session, sesion_ids))
+
+
+def _tutors_of(session: Session, sesion_ids: Set[int]) -> Set[Optional[int]]:
+    # Primero el identity map; solo se consulta la base por las sesiones no cargadas
+    tutores, pendientes = set(), []
+    for sesion_id in sesion_ids:
+        sesion = session.identity_map.get(inspect(SesionChat).identity_key_from_primary_key((sesion_id,)))
+        if sesion is not None:
+            tutores.add(sesion.tutor_id)
+        else:
+            pendientes.append(sesion_id)
+    if pendientes:
+        tutores.update(
+            tid for (tid,) in session.query(SesionChat.tutor_id).filter(SesionChat.id.in_(pendientes)).distinct()
+        )
+    return tutores
+
+
+def _previous(obj, attr: str) -> Set[Optional[int]]:
+    """Valor actual y anterior de `attr` (una sesión reasignada afecta a ambos tutores)."""
+    history = inspect(obj).attrs[attr].history
+    return {getattr(obj, attr), *history.deleted}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session: Session, flush_context) -> None:
+    tutores: Set[Optional[int]] = set()
+    sesiones: Set[Optional[int]] = set()
+    usuarios: Set[Optional[int]] = set()
+    for obj in (*session.new, *session.deleted):
+        # Editar un mensaje (p. ej. marcarlo leído) no cambia el dashboard; crearlo o borrarlo sí
+        if isinstance(obj, Mensaje):
+            sesiones.add(obj.sesion_id)
+    # Los análisis y mensajes nuevos entran por la clave del análisis profundo; los cambios y borrados no
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, Analisis) or (isinstance(obj, Mensaje) and obj in session.deleted):
+            usuarios.add(obj.usuario_id)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, SesionChat):
+            tutores |= _previous(obj, "tutor_id")
+        elif isinstance(obj, Alerta):
+            tutores |= _previous(obj, "tutor_asignado")
+        elif isinstance(obj, Intervencion):
+            tutores.add(obj.tutor_id)
+        elif isinstance(obj, Notificacion):
+            tutores.add(obj.usuario_id)
+    if tutores:
+        mark_tutors_changed(session, tutores)
+    if sesiones:
+        mark_sessions_changed(session, sesiones)
+    if usuarios:
+        session.info.setdefault(_PENDING_DEEP, set()).update(uid for uid in usuarios if uid is not None)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate(session: Session) -> None:
+    tutores = session.info.pop(_PENDING, None)
+    if tutores:
+        dashboard_cache.invalidate(tutores)
+    usuarios = session.info.pop(_PENDING_DEEP, None)
+    if usuarios:
+        deep_analysis_cache.invalidate(usuarios)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session: Session, previous_transaction) -> None:
+    # Solo al deshacer la transacción externa (no un SAVEPOINT)
+    if not session.in_transaction():
+        session.info.pop(_PENDING, None)
+        session.info.pop(_PENDING_DEEP, None)
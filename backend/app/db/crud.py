@@ -3,18 +3,21 @@ Funciones CRUD para todas las entidades de la base de datos con manejo robusto d
 """
 
 from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from sqlalchemy import and_, or_, desc, asc, func
+from sqlalchemy import and_, or_, desc, asc, func, insert, select
 from datetime import datetime, timedelta
-import json
 
 from app.db import models
 from app.schemas.user import UserCreate, UserUpdate
 from app.schemas.message import MessageCreate
-from app.schemas.analysis_record import AnalysisRecord
+from app.schemas.analysis_record import AnalysisRecord, AnalysisCreate
 from app.core.exceptions import DatabaseError, NotFoundError, ValidationError
 from app.core.logging import logger, log_database_operation
+from app.db.pagination import apply_keyset
+from app.db.archive import load_archived_messages
+from app.db.stats import apply_inserted_messages, apply_inserted_analyses
+from app.db.cache import mark_sessions_changed, mark_tutors_changed
 from passlib.context import CryptContext
 from app.services.user_service import determinar_rol_por_email
 
@@ -221,12 +224,43 @@ def create_message(db: Session, message: MessageCreate) -> models.Mensaje:
 
 
 @log_database_operation
-def get_messages_by_user(db: Session, user_id: int, limit: int = 50, offset: int = 0) -> List[models.Mensaje]:
-    """Obtiene mensajes de un usuario."""
+def create_messages_bulk(db: Session, messages: List[MessageCreate]) -> List[int]:
+    """
+    Inserta varios mensajes con un único INSERT multi-fila y un commit.
+    Devuelve los ids en el orden de entrada; los agregados se actualizan en la misma transacción.
+    """
+    if not messages:
+        return []
+    try:
+        ahora = db.execute(select(func.now())).scalar()
+        rows = []
+        for message in messages:
+            row = message.model_dump()
+            row["metadatos"] = row.pop("metadata", None)
+            row["creado_en"] = ahora
+            rows.append(row)
+        ids = list(db.scalars(
+            insert(models.Mensaje).returning(models.Mensaje.id, sort_by_parameter_order=True), rows
+        ))
+        apply_inserted_messages(db, rows)
+        mark_sessions_changed(db, {row["sesion_id"] for row in rows})
+        db.commit()
+        logger.info("Mensajes creados en bloque", data={"count": len(ids)})
+        return ids
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Error al crear mensajes en bloque", error=e, data={"count": len(messages)})
+        raise DatabaseError("Error al crear mensajes")
+
+
+@log_database_operation
+def get_messages_by_user(db: Session, user_id: int, limit: int = 50, offset: int = 0, cursor: Optional[str] = None) -> List[models.Mensaje]:
+    """Obtiene mensajes de un usuario (más recientes primero); `cursor` pagina por keyset."""
     try:
-        return db.query(models.Mensaje).filter(
-            models.Mensaje.usuario_id == user_id
-        ).order_by(desc(models.Mensaje.creado_en)).offset(offset).limit(limit).all()
+        query = db.query(models.Mensaje).filter(models.Mensaje.usuario_id == user_id)
+        return apply_keyset(
+            query, models.Mensaje.creado_en, models.Mensaje.id, cursor
+        ).offset(offset).limit(limit).all()
     except SQLAlchemyError as e:
         logger.error("Error al obtener mensajes del usuario", error=e, data={"user_id": user_id})
         raise DatabaseError("Error al obtener mensajes")
@@ -244,6 +278,26 @@ def get_chat_history(db: Session, user_id: int, limit: int = 20) -> List[models.
         raise DatabaseError("Error al obtener historial de chat")
 
 
+@log_database_operation
+def get_session_messages_page(db: Session, session_id: int, after_id: Optional[int] = None, limit: int = 50) -> List[models.Mensaje]:
+    """
+    Obtiene una página de mensajes de una sesión en orden ascendente.
+    Con `after_id` devuelve los siguientes a ese mensaje; sin él, los últimos `limit`.
+    """
+    try:
+        query = db.query(models.Mensaje).options(
+            joinedload(models.Mensaje.analisis)
+        ).filter(models.Mensaje.sesion_id == session_id)
+
+        if after_id is not None:
+            return query.filter(models.Mensaje.id > after_id).order_by(asc(models.Mensaje.id)).limit(limit).all()
+
+        return list(reversed(query.order_by(desc(models.Mensaje.id)).limit(limit).all()))
+    except SQLAlchemyError as e:
+        logger.error("Error al obtener página de mensajes de sesión", error=e, data={"session_id": session_id})
+        raise DatabaseError("Error al obtener mensajes de la sesión")
+
+
 @log_database_operation
 def get_message_count_by_user(db: Session, user_id: int) -> int:
     """Obtiene el número total de mensajes de un usuario."""
@@ -258,7 +312,6 @@ def get_message_count_by_user(db: Session, user_id: int) -> int:
 def get_messages_with_analysis_by_user(db: Session, user_id: int, limit: int = 20) -> List[Dict]:
     """Obtiene mensajes de un usuario junto con su análisis asociado."""
     try:
-        import json
         results = db.query(models.Mensaje, models.Analisis).outerjoin(
             models.Analisis, models.Mensaje.id == models.Analisis.mensaje_id
         ).filter(
@@ -292,27 +345,18 @@ def get_messages_with_analysis_by_user(db: Session, user_id: int, limit: int = 2
                 })
                 
                 # Distribuciones de emociones y estilos
-                try:
-                    if analysis.distribucion_emociones:
-                        result_item["emotion_distribution"] = json.loads(analysis.distribucion_emociones) if isinstance(analysis.distribucion_emociones, str) else analysis.distribucion_emociones
-                    if analysis.distribucion_estilos:
-                        result_item["style_distribution"] = json.loads(analysis.distribucion_estilos) if isinstance(analysis.distribucion_estilos, str) else analysis.distribucion_estilos
-                except (json.JSONDecodeError, TypeError):
-                    result_item["emotion_distribution"] = []
-                    result_item["style_distribution"] = []
+                if analysis.distribucion_emociones:
+                    result_item["emotion_distribution"] = analysis.distribucion_emociones
+                if analysis.distribucion_estilos:
+                    result_item["style_distribution"] = analysis.distribucion_estilos
                 
                 # Recomendaciones y resumen
-                try:
-                    if analysis.recomendaciones:
-                        result_item["recommendations"] = json.loads(analysis.recomendaciones) if isinstance(analysis.recomendaciones, str) else analysis.recomendaciones
-                    if analysis.resumen:
-                        result_item["summary"] = json.loads(analysis.resumen) if isinstance(analysis.resumen, str) else analysis.resumen
-                    if analysis.insights_detallados:
-                        result_item["detailed_insights"] = json.loads(analysis.insights_detallados) if isinstance(analysis.insights_detallados, str) else analysis.insights_detallados
-                except (json.JSONDecodeError, TypeError):
-                    result_item["recommendations"] = {}
-                    result_item["summary"] = {}
-                    result_item["detailed_insights"] = {}
+                if analysis.recomendaciones:
+                    result_item["recommendations"] = analysis.recomendaciones
+                if analysis.resumen:
+                    result_item["summary"] = analysis.resumen
+                if analysis.insights_detallados:
+                    result_item["detailed_insights"] = analysis.insights_detallados
             
             formatted_results.append(result_item)
         return formatted_results
@@ -340,6 +384,27 @@ def create_analysis(db: Session, record: AnalysisRecord) -> models.Analisis:
         raise DatabaseError("Error al crear análisis")
 
 
+@log_database_operation
+def create_analyses_bulk(db: Session, records: List[AnalysisCreate]) -> List[int]:
+    """Inserta varios análisis en una transacción; devuelve los ids en el orden de entrada."""
+    if not records:
+        return []
+    try:
+        ahora = db.execute(select(func.now())).scalar()
+        rows = [{**record.model_dump(exclude={"id", "creado_en"}), "creado_en": ahora} for record in records]
+        ids = list(db.scalars(
+            insert(models.Analisis).returning(models.Analisis.id, sort_by_parameter_order=True), rows
+        ))
+        apply_inserted_analyses(db, rows)
+        db.commit()
+        logger.info("Análisis creados en bloque", data={"count": len(ids)})
+        return ids
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Error al crear análisis en bloque", error=e, data={"count": len(records)})
+        raise DatabaseError("Error al crear análisis")
+
+
 @log_database_operation
 def get_analysis_by_message(db: Session, mensaje_id: int) -> Optional[models.Analisis]:
     """Obtiene análisis por mensaje."""
@@ -411,13 +476,33 @@ def create_notification(db: Session, user_id: int, titulo: str, mensaje: str, ti
 
 
 @log_database_operation
-def get_user_notifications(db: Session, user_id: int, limit: int = 50, unread_only: bool = False) -> List[models.Notificacion]:
-    """Obtiene notificaciones de un usuario."""
+def create_notifications_bulk(db: Session, notifications: List[Dict[str, Any]]) -> int:
+    """
+    Inserta varias notificaciones en una transacción.
+    Cada elemento usa los nombres de columna de `Notificacion` (usuario_id, titulo, mensaje, tipo, ...).
+    """
+    if not notifications:
+        return 0
+    try:
+        db.execute(insert(models.Notificacion), notifications)
+        mark_tutors_changed(db, {n["usuario_id"] for n in notifications})
+        db.commit()
+        logger.info("Notificaciones creadas en bloque", data={"count": len(notifications)})
+        return len(notifications)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Error al crear notificaciones en bloque", error=e, data={"count": len(notifications)})
+        raise DatabaseError("Error al crear notificaciones")
+
+
+@log_database_operation
+def get_user_notifications(db: Session, user_id: int, limit: int = 50, unread_only: bool = False, cursor: Optional[str] = None) -> List[models.Notificacion]:
+    """Obtiene notificaciones de un usuario (más recientes primero); `cursor` pagina por keyset."""
     try:
         query = db.query(models.Notificacion).filter(models.Notificacion.usuario_id == user_id)
         if unread_only:
             query = query.filter(models.Notificacion.leida == False)
-        return query.order_by(desc(models.Notificacion.creado_en)).limit(limit).all()
+        return apply_keyset(query, models.Notificacion.creado_en, models.Notificacion.id, cursor).limit(limit).all()
     except SQLAlchemyError as e:
         logger.error("Error al obtener notificaciones del usuario", error=e, data={"user_id": user_id})
         raise DatabaseError("Error al obtener notificaciones")
@@ -561,6 +646,21 @@ def create_metric(db: Session, tipo_metrica: str, nombre: str, valor: float, uni
         raise DatabaseError("Error al crear métrica")
 
 
+@log_database_operation
+def create_metrics_bulk(db: Session, metrics: List[Dict[str, Any]]) -> int:
+    """Inserta varias métricas (tipo_metrica, nombre, valor, unidad, contexto) en una transacción."""
+    if not metrics:
+        return 0
+    try:
+        db.execute(insert(models.Metricas), metrics)
+        db.commit()
+        return len(metrics)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Error al crear métricas en bloque", error=e, data={"count": len(metrics)})
+        raise DatabaseError("Error al crear métricas")
+
+
 @log_database_operation
 def get_metrics_by_type(db: Session, tipo_metrica: str, limit: int = 100) -> List[models.Metricas]:
     """Obtiene métricas por tipo."""
@@ -612,23 +712,25 @@ def get_reportes_by_sesion(db: Session, sesion_id: int) -> List[models.Reporte]:
 
 
 @log_database_operation
-def get_reportes_by_tutor(db: Session, tutor_id: int, limit: int = 50, offset: int = 0) -> List[models.Reporte]:
-    """Obtiene reportes por tutor."""
+def get_reportes_by_tutor(db: Session, tutor_id: int, limit: int = 50, offset: int = 0, cursor: Optional[str] = None) -> List[models.Reporte]:
+    """Obtiene reportes por tutor; `cursor` pagina por keyset."""
     try:
-        return db.query(models.Reporte).filter(models.Reporte.tutor_id == tutor_id).order_by(desc(models.Reporte.creado_en)).offset(offset).limit(limit).all()
+        query = db.query(models.Reporte).filter(models.Reporte.tutor_id == tutor_id)
+        return apply_keyset(query, models.Reporte.creado_en, models.Reporte.id, cursor).offset(offset).limit(limit).all()
     except SQLAlchemyError as e:
         logger.error("Error al obtener reportes por tutor", error=e, data={"tutor_id": tutor_id})
         raise DatabaseError("Error al buscar reportes")
 
 
 @log_database_operation
-def get_reportes_by_estudiante(db: Session, estudiante_id: int, limit: int = 50, offset: int = 0) -> List[models.Reporte]:
-    """Obtiene reportes por estudiante."""
+def get_reportes_by_estudiante(db: Session, estudiante_id: int, limit: int = 50, offset: int = 0, cursor: Optional[str] = None) -> List[models.Reporte]:
+    """Obtiene reportes por estudiante; `cursor` pagina por keyset."""
     try:
-        return db.query(models.Reporte).filter(
+        query = db.query(models.Reporte).filter(
             models.Reporte.estudiante_id == estudiante_id,
             models.Reporte.visible_estudiante == True
-        ).order_by(desc(models.Reporte.creado_en)).offset(offset).limit(limit).all()
+        )
+        return apply_keyset(query, models.Reporte.creado_en, models.Reporte.id, cursor).offset(offset).limit(limit).all()
     except SQLAlchemyError as e:
         logger.error("Error al obtener reportes por estudiante", error=e, data={"estudiante_id": estudiante_id})
         raise DatabaseError("Error al buscar reportes")
@@ -675,13 +777,17 @@ def delete_reporte(db: Session, reporte_id: int) -> bool:
 
 @log_database_operation
 def get_mensajes_sesion_para_reporte(db: Session, sesion_id: int) -> List[Dict[str, Any]]:
-    """Obtiene mensajes de una sesión con análisis para generar reporte."""
-    try:
-        mensajes = db.query(models.Mensaje, models.Analisis).outerjoin(
-            models.Analisis, models.Mensaje.id == models.Analisis.mensaje_id
-        ).filter(
-            models.Mensaje.sesion_id == sesion_id
-        ).order_by(models.Mensaje.creado_en).all()
+    """Obtiene mensajes de una sesión con análisis para generar reporte (también si está archivada)."""
+    try:
+        archived = load_archived_messages(db, sesion_id)
+        if archived is not None:
+            mensajes = [(mensaje, mensaje.analisis) for mensaje in archived]
+        else:
+            mensajes = db.query(models.Mensaje, models.Analisis).outerjoin(
+                models.Analisis, models.Mensaje.id == models.Analisis.mensaje_id
+            ).filter(
+                models.Mensaje.sesion_id == sesion_id
+            ).order_by(models.Mensaje.creado_en).all()
         
         resultado = []
         for mensaje, analisis in mensajes:
@@ -0,0 +1,317 @@
+"""
+Variantes async de las funciones CRUD de uso frecuente (WebSocket, reportes, métricas).
+Mismas firmas y manejo de errores que `app.db.crud`, sobre `AsyncSession`.
+"""
+
+from typing import List, Optional, Dict, Any
+from sqlalchemy import select, insert, desc, asc
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.db import models
+from app.schemas.message import MessageCreate
+from app.schemas.analysis_record import AnalysisRecord
+from app.core.exceptions import DatabaseError, NotFoundError
+from app.core.logging import logger, log_database_operation
+from app.db.pagination import apply_keyset
+from app.db.archive import load_archived_messages
+
+
+# ==================== USUARIOS ====================
+
+@log_database_operation
+async def get_user(db: AsyncSession, user_id: int) -> Optional[models.Usuario]:
+    """Obtiene un usuario por ID."""
+    try:
+        return await db.get(models.Usuario, user_id)
+    except SQLAlchemyError as e:
+        logger.error("Error al obtener usuario por ID", error=e, data={"user_id": user_id})
+        raise DatabaseError("Error al buscar usuario")
+
+
+# ==================== SESIONES DE CHAT ====================
+
+@log_database_operation
+async def get_chat_session(db: AsyncSession, session_id: int) -> Optional[models.SesionChat]:
+    """Obtiene una sesión de chat por ID."""
+    try:
+        return await db.get(models.SesionChat, session_id)
+    except SQLAlchemyError as e:
+        logger.error("Error al obtener sesión de chat", error=e, data={"session_id": session_id})
+        raise DatabaseError("Error al buscar sesión de chat")
+
+
+@log_database_operation
+async def update_chat_session(db: AsyncSession, session_id: int, update_data: Dict[str, Any]) -> Optional[models.SesionChat]:
+    """Actualiza una sesión de chat."""
+    try:
+        session = await get_chat_session(db, session_id)
+        if not session:
+            raise NotFoundError("Sesión de chat")
+
+        for field, value in update_data.items():
+            setattr(session, field, value)
+
+        await db.commit()
+        await db.refresh(session)
+        logger.info("Sesión de chat actualizada exitosamente", data={"session_id": session_id})
+        return session
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("Error al actualizar sesión de chat", error=e, data={"session_id": session_id})
+        raise DatabaseError("Error al actualizar sesión de chat")
+
+
+# ==================== MENSAJES ====================
+
+@log_database_operation
+async def create_message(db: AsyncSession, message: MessageCreate) -> models.Mensaje:
+    """Crea un nuevo mensaje."""
+    try:
+        db_message = models.Mensaje(**message.model_dump())
+        db.add(db_message)
+        await db.commit()
+        await db.refresh(db_message)
+        logger.info("Mensaje creado exitosamente", data={"message_id": db_message.id, "user_id": db_message.usuario_id})
+        return db_message
+    except SQLAlchemyError as e:
+        await db.rollback()
+        user_id = getattr(message, 'usuario_id', None)
+        logger.error("Error al crear mensaje", error=e, data={"user_id": user_id})
+        raise DatabaseError("Error al crear mensaje")
+
+
+@log_database_operation
+async def get_session_messages_page(db: AsyncSession, session_id: int, after_id: Optional[int] = None, limit: int = 50) -> List[models.Mensaje]:
+    """
+    Obtiene una página de mensajes de una sesión en orden ascendente.
+    Con `after_id` devuelve los siguientes a ese mensaje; sin él, los últimos `limit`.
+    """
+    try:
+        query = select(models.Mensaje).options(
+            joinedload(models.Mensaje.analisis)
+        ).where(models.Mensaje.sesion_id == session_id)
+
+        if after_id is not None:
+            result = await db.execute(query.where(models.Mensaje.id > after_id).order_by(asc(models.Mensaje.id)).limit(limit))
+            return list(result.scalars().all())
+
+        result = await db.execute(query.order_by(desc(models.Mensaje.id)).limit(limit))
+        return list(reversed(result.scalars().all()))
+    except SQLAlchemyError as e:
+        logger.error("Error al obtener página de mensajes de sesión", error=e, data={"session_id": session_id})
+        raise DatabaseError("Error al obtener mensajes de la sesión")
+
+
+@log_database_operation
+async def get_mensajes_sesion_para_reporte(db: AsyncSession, sesion_id: int) -> List[Dict[str, Any]]:
+    """Obtiene mensajes de una sesión con análisis para generar reporte (también si está archivada)."""
+    try:
+        archived = await db.run_sync(load_archived_messages, sesion_id)
+        if archived is not None:
+            mensajes = [(mensaje, mensaje.analisis) for mensaje in archived]
+        else:
+            result = await db.execute(
+                select(models.Mensaje, models.Analisis).outerjoin(
+                    models.Analisis, models.Mensaje.id == models.Analisis.mensaje_id
+                ).where(
+                    models.Mensaje.sesion_id == sesion_id
+                ).order_by(models.Mensaje.creado_en)
+            )
+            mensajes = result.all()
+
+        resultado = []
+        for mensaje, analisis in mensajes:
+            mensaje_data = {
+                "id": mensaje.id,
+                "texto": mensaje.texto,
+                "remitente": mensaje.remitente,
+                "creado_en": mensaje.creado_en.isoformat(),
+                "analisis": None
+            }
+
+            if analisis:
+                mensaje_data["analisis"] = {
+                    "emocion": analisis.emocion,
+                    "emocion_score": analisis.emocion_score,
+                    "estilo": analisis.estilo,
+                    "estilo_score": analisis.estilo_score,
+                    "prioridad": analisis.prioridad,
+                    "alerta": analisis.alerta,
+                    "razon_alerta": analisis.razon_alerta
+                }
+
+            resultado.append(mensaje_data)
+
+        return resultado
+    except SQLAlchemyError as e:
+        logger.error("Error al obtener mensajes para reporte", error=e, data={"sesion_id": sesion_id})
+        raise DatabaseError("Error al obtener mensajes para reporte")
+
+
+# ==================== ANÁLISIS ====================
+
+@log_database_operation
+async def create_analysis(db: AsyncSession, record: AnalysisRecord) -> models.Analisis:
+    """Crea un nuevo análisis."""
+    try:
+        db_analysis = models.Analisis(**record.model_dump())
+        db.add(db_analysis)
+        await db.commit()
+        await db.refresh(db_analysis)
+        logger.info("Análisis creado exitosamente", data={"analysis_id": db_analysis.id, "user_id": db_analysis.usuario_id})
+        return db_analysis
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("Error al crear análisis", error=e, data={"user_id": record.usuario_id})
+        raise DatabaseError("Error al crear análisis")
+
+
+# ==================== MÉTRICAS ====================
+
+@log_database_operation
+async def create_metric(db: AsyncSession, tipo_metrica: str, nombre: str, valor: float, unidad: Optional[str] = None, contexto: Optional[Dict[str, Any]] = None) -> models.Metricas:
+    """Crea una nueva métrica."""
+    try:
+        db_metric = models.Metricas(
+            tipo_metrica=tipo_metrica,
+            nombre=nombre,
+            valor=valor,
+            unidad=unidad,
+            contexto=contexto
+        )
+        db.add(db_metric)
+        await db.commit()
+        await db.refresh(db_metric)
+        return db_metric
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("Error al crear métrica", error=e, data={"tipo_metrica": tipo_metrica, "nombre": nombre})
+        raise DatabaseError("Error al crear métrica")
+
+
+@log_database_operation
+async def create_metrics_bulk(db: AsyncSession, metrics: List[Dict[str, Any]]) -> int:
+    """Inserta varias métricas (tipo_metrica, nombre, valor, unidad, contexto) en una transacción."""
+    if not metrics:
+        return 0
+    try:
+        await db.execute(insert(models.Metricas), metrics)
+        await db.commit()
+        return len(metrics)
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("Error al crear métricas en bloque", error=e, data={"count": len(metrics)})
+        raise DatabaseError("Error al crear métricas")
+
+
+# ==================== REPORTES ====================
+
+@log_database_operation
+async def create_reporte(db: AsyncSession, reporte_data: Dict[str, Any]) -> models.Reporte:
+    """Crea un nuevo reporte."""
+    try:
+        db_reporte = models.Reporte(**reporte_data)
+        db.add(db_reporte)
+        await db.commit()
+        await db.refresh(db_reporte)
+        logger.info("Reporte creado exitosamente", data={"reporte_id": db_reporte.id, "sesion_id": db_reporte.sesion_id})
+        return db_reporte
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("Error al crear reporte", error=e, data={"sesion_id": reporte_data.get("sesion_id")})
+        raise DatabaseError("Error al crear reporte")
+
+
+@log_database_operation
+async def get_reporte(db: AsyncSession, reporte_id: int) -> Optional[models.Reporte]:
+    """Obtiene un reporte por ID."""
+    try:
+        return await db.get(models.Reporte, reporte_id)
+    except SQLAlchemyError as e:
+        logger.error("Error al obtener reporte", error=e, data={"reporte_id": reporte_id})
+        raise DatabaseError("Error al buscar reporte")
+
+
+@log_database_operation
+async def get_reportes_by_sesion(db: AsyncSession, sesion_id: int) -> List[models.Reporte]:
+    """Obtiene reportes por sesión."""
+    try:
+        result = await db.execute(
+            select(models.Reporte).where(models.Reporte.sesion_id == sesion_id).order_by(desc(models.Reporte.creado_en))
+        )
+        return list(result.scalars().all())
+    except SQLAlchemyError as e:
+        logger.error("Error al obtener reportes por sesión", error=e, data={"sesion_id": sesion_id})
+        raise DatabaseError("Error al buscar reportes")
+
+
+@log_database_operation
+async def get_reportes_by_tutor(db: AsyncSession, tutor_id: int, limit: int = 50, offset: int = 0, cursor: Optional[str] = None) -> List[models.Reporte]:
+    """Obtiene reportes por tutor; `cursor` pagina por keyset."""
+    try:
+        query = select(models.Reporte).where(models.Reporte.tutor_id == tutor_id)
+        result = await db.execute(
+            apply_keyset(query, models.Reporte.creado_en, models.Reporte.id, cursor).offset(offset).limit(limit)
+        )
+        return list(result.scalars().all())
+    except SQLAlchemyError as e:
+        logger.error("Error al obtener reportes por tutor", error=e, data={"tutor_id": tutor_id})
+        raise DatabaseError("Error al buscar reportes")
+
+
+@log_database_operation
+async def get_reportes_by_estudiante(db: AsyncSession, estudiante_id: int, limit: int = 50, offset: int = 0, cursor: Optional[str] = None) -> List[models.Reporte]:
+    """Obtiene reportes por estudiante; `cursor` pagina por keyset."""
+    try:
+        query = select(models.Reporte).where(
+            models.Reporte.estudiante_id == estudiante_id,
+            models.Reporte.visible_estudiante == True
+        )
+        result = await db.execute(
+            apply_keyset(query, models.Reporte.creado_en, models.Reporte.id, cursor).offset(offset).limit(limit)
+        )
+        return list(result.scalars().all())
+    except SQLAlchemyError as e:
+        logger.error("Error al obtener reportes por estudiante", error=e, data={"estudiante_id": estudiante_id})
+        raise DatabaseError("Error al buscar reportes")
+
+
+@log_database_operation
+async def update_reporte(db: AsyncSession, reporte_id: int, update_data: Dict[str, Any]) -> Optional[models.Reporte]:
+    """Actualiza un reporte."""
+    try:
+        reporte = await get_reporte(db, reporte_id)
+        if not reporte:
+            raise NotFoundError("Reporte")
+
+        for field, value in update_data.items():
+            setattr(reporte, field, value)
+
+        await db.commit()
+        await db.refresh(reporte)
+        logger.info("Reporte actualizado exitosamente", data={"reporte_id": reporte_id})
+        return reporte
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("Error al actualizar reporte", error=e, data={"reporte_id": reporte_id})
+        raise DatabaseError("Error al actualizar reporte")
+
+
+@log_database_operation
+async def delete_reporte(db: AsyncSession, reporte_id: int) -> bool:
+    """Elimina un reporte."""
+    try:
+        reporte = await get_reporte(db, reporte_id)
+        if not reporte:
+            return False
+
+        await db.delete(reporte)
+        await db.commit()
+        logger.info("Reporte eliminado exitosamente", data={"reporte_id": reporte_id})
+        return True
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("Error al eliminar reporte", error=e, data={"reporte_id": reporte_id})
+        raise DatabaseError("Error al eliminar reporte")
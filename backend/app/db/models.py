@@ -3,12 +3,14 @@ Definición de modelos ORM para la base de datos usando SQLAlchemy.
 Incluye todos los modelos necesarios para PsiChat.
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean, Enum, JSON, Index
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, Float, Boolean, Enum, JSON, Index
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func
 from datetime import datetime
 import enum
 
+from app.db.types import DistributionJSON
+
 Base = declarative_base()
 
 
@@ -93,9 +95,12 @@ class Mensaje(Base):
     
     # Índices
     __table_args__ = (
-        Index('idx_mensaje_usuario', 'usuario_id'),
         Index('idx_mensaje_creado', 'creado_en'),
         Index('idx_mensaje_remitente', 'remitente'),
+        # Compuestos para las consultas calientes (filtro + orden por fecha)
+        Index('idx_mensaje_usuario_remitente_creado', 'usuario_id', 'remitente', 'creado_en'),
+        Index('idx_mensaje_sesion_creado', 'sesion_id', 'creado_en'),
+        Index('idx_mensaje_usuario_creado', 'usuario_id', 'creado_en'),
     )
 
 
@@ -112,12 +117,12 @@ class Analisis(Base):
     # Análisis emocional
     emocion = Column(String(100), nullable=True)
     emocion_score = Column(Float, nullable=True)
-    distribucion_emociones = Column(JSON, nullable=True)  # Distribución completa de emociones
+    distribucion_emociones = Column(DistributionJSON, nullable=True)  # Distribución completa de emociones
     
     # Análisis de estilo
     estilo = Column(String(100), nullable=True)
     estilo_score = Column(Float, nullable=True)
-    distribucion_estilos = Column(JSON, nullable=True)  # Distribución completa de estilos
+    distribucion_estilos = Column(DistributionJSON, nullable=True)  # Distribución completa de estilos
     
     # Evaluación de prioridad
     prioridad = Column(String(50), nullable=True)  # crítica, alta, media, baja, normal
@@ -144,10 +149,8 @@ class Analisis(Base):
     # Índices
     __table_args__ = (
         Index('idx_analisis_mensaje', 'mensaje_id'),
-        Index('idx_analisis_usuario', 'usuario_id'),
-        Index('idx_analisis_emocion', 'emocion'),
-        Index('idx_analisis_prioridad', 'prioridad'),
-        Index('idx_analisis_alerta', 'alerta'),
+        # Búsqueda por facetas: estudiantes + rango de fechas, con las columnas de faceta cubiertas
+        Index('idx_analisis_usuario_creado_facetas', 'usuario_id', 'creado_en', 'emocion', 'prioridad', 'alerta', 'emocion_score'),
         Index('idx_analisis_creado', 'creado_en'),
     )
 
@@ -182,7 +185,7 @@ class Notificacion(Base):
     
     # Índices
     __table_args__ = (
-        Index('idx_notificacion_usuario', 'usuario_id'),
+        Index('idx_notificacion_usuario_creado', 'usuario_id', 'creado_en'),
         Index('idx_notificacion_tipo', 'tipo'),
         Index('idx_notificacion_leida', 'leida'),
         Index('idx_notificacion_creado', 'creado_en'),
@@ -231,8 +234,8 @@ class Alerta(Base):
         Index('idx_alerta_usuario', 'usuario_id'),
         Index('idx_alerta_urgencia', 'nivel_urgencia'),
         Index('idx_alerta_revisada', 'revisada'),
-        Index('idx_alerta_tutor', 'tutor_asignado'),
         Index('idx_alerta_creado', 'creado_en'),
+        Index('idx_alerta_tutor_revisada_creado', 'tutor_asignado', 'revisada', 'creado_en'),
     )
 
 
@@ -275,7 +278,7 @@ class Intervencion(Base):
     # Índices
     __table_args__ = (
         Index('idx_intervencion_usuario', 'usuario_id'),
-        Index('idx_intervencion_tutor', 'tutor_id'),
+        Index('idx_intervencion_tutor_creado', 'tutor_id', 'creado_en'),
         Index('idx_intervencion_alerta', 'alerta_id'),
         Index('idx_intervencion_sesion', 'sesion_id'),
         Index('idx_intervencion_tipo', 'tipo_intervencion'),
@@ -312,8 +315,8 @@ class SesionChat(Base):
     
     # Índices
     __table_args__ = (
-        Index('idx_sesion_usuario', 'usuario_id'),
-        Index('idx_sesion_tutor', 'tutor_id'),
+        Index('idx_sesion_tutor_iniciada', 'tutor_id', 'iniciada_en'),
+        Index('idx_sesion_usuario_estado_tutor', 'usuario_id', 'estado', 'tutor_id'),
         Index('idx_sesion_estado', 'estado'),
         Index('idx_sesion_iniciada', 'iniciada_en'),
     )
@@ -359,8 +362,8 @@ class Reporte(Base):
     # Índices
     __table_args__ = (
         Index('idx_reporte_sesion', 'sesion_id'),
-        Index('idx_reporte_tutor', 'tutor_id'),
-        Index('idx_reporte_estudiante', 'estudiante_id'),
+        Index('idx_reporte_tutor_creado', 'tutor_id', 'creado_en'),
+        Index('idx_reporte_estudiante_creado', 'estudiante_id', 'creado_en'),
         Index('idx_reporte_estado', 'estado'),
         Index('idx_reporte_creado', 'creado_en'),
     )
@@ -392,3 +395,102 @@ class Metricas(Base):
         Index('idx_metrica_nombre', 'nombre'),
         Index('idx_metrica_creado', 'creado_en'),
     )
+
+
+class EstadisticasSesion(Base):
+    """
+    Agregados por sesión (histogramas y conteos) mantenidos al escribir mensajes y análisis.
+    Ver `app.db.stats`.
+    """
+    __tablename__ = "session_stats"
+
+    sesion_id = Column(Integer, ForeignKey("sesiones_chat.id"), primary_key=True)
+    
+    # Conteos de mensajes
+    total_mensajes = Column(Integer, default=0, nullable=False)
+    mensajes_estudiante = Column(Integer, default=0, nullable=False)
+    mensajes_tutor = Column(Integer, default=0, nullable=False)
+    mensajes_por_hora = Column(JSON, nullable=True)  # {hora: conteo}
+    primer_mensaje_en = Column(DateTime, nullable=True)
+    ultimo_mensaje_en = Column(DateTime, nullable=True)
+    
+    # Histogramas de análisis
+    analisis_count = Column(Integer, default=0, nullable=False)
+    emociones = Column(JSON, nullable=True)  # {emocion: conteo}
+    estilos = Column(JSON, nullable=True)  # {estilo: conteo}
+    prioridades = Column(JSON, nullable=True)  # {prioridad: conteo}
+    alertas = Column(Integer, default=0, nullable=False)
+    recomendaciones = Column(JSON, nullable=True)  # Hasta 10 recomendaciones únicas
+    
+    actualizado_en = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class EstadisticasEstudianteDiarias(Base):
+    """
+    Agregados diarios por estudiante mantenidos al escribir mensajes y análisis.
+    Ver `app.db.stats`.
+    """
+    __tablename__ = "student_daily_stats"
+
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), primary_key=True)
+    fecha = Column(Date, primary_key=True)
+    
+    total_mensajes = Column(Integer, default=0, nullable=False)
+    analisis_count = Column(Integer, default=0, nullable=False)
+    emociones = Column(JSON, nullable=True)
+    estilos = Column(JSON, nullable=True)
+    prioridades = Column(JSON, nullable=True)
+    alertas = Column(Integer, default=0, nullable=False)
+    
+    actualizado_en = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+    
+    # Índices
+    __table_args__ = (
+        Index('idx_student_daily_fecha', 'fecha'),
+    )
+
+
+class SerieEmocionalEstudiante(Base):
+    """
+    Serie emocional por estudiante agregada por hora, día y semana (inicio del periodo),
+    mantenida al escribir análisis. Los puntos por mensaje son las filas de `analisis`.
+    Ver `app.db.stats` y `app.services.timeline_service`.
+    """
+    __tablename__ = "student_emotion_rollups"
+
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), primary_key=True)
+    resolucion = Column(String(10), primary_key=True)  # hora, dia, semana
+    inicio = Column(DateTime, primary_key=True)
+    
+    analisis_count = Column(Integer, default=0, nullable=False)
+    alertas = Column(Integer, default=0, nullable=False)
+    emociones = Column(JSON, nullable=True)  # {emocion: conteo}
+    estilos = Column(JSON, nullable=True)  # {estilo: conteo}
+    # Sumas y conteos de scores (los análisis sin score no cuentan en la media)
+    emocion_score_suma = Column(Float, default=0.0, nullable=False)
+    emocion_score_n = Column(Integer, default=0, nullable=False)
+    estilo_score_suma = Column(Float, default=0.0, nullable=False)
+    estilo_score_n = Column(Integer, default=0, nullable=False)
+    
+    actualizado_en = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class SegmentoArchivo(Base):
+    """
+    Sesión cerrada cuyos mensajes y análisis se movieron a un segmento JSONL comprimido.
+    Ver `app.db.archive`.
+    """
+    __tablename__ = "segmentos_archivo"
+
+    sesion_id = Column(Integer, ForeignKey("sesiones_chat.id"), primary_key=True)
+    particion = Column(String(7), nullable=False)  # YYYY-MM de cierre de la sesión
+    ruta = Column(String(500), nullable=False)  # Relativa a ARCHIVE_DIR
+    total_mensajes = Column(Integer, default=0, nullable=False)
+    total_analisis = Column(Integer, default=0, nullable=False)
+    tamano_bytes = Column(Integer, default=0, nullable=False)
+    archivado_en = Column(DateTime, default=func.now(), nullable=False)
+    
+    # Índices
+    __table_args__ = (
+        Index('idx_segmento_particion', 'particion'),
+    )
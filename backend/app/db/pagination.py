@@ -0,0 +1,68 @@
+"""
+Paginación por cursor (keyset) sobre `(timestamp, id)`.
+
+El cursor es opaco para el cliente (base64 de la posición del último elemento).
+A diferencia de `offset`, el coste de una página no crece con la profundidad y las
+inserciones concurrentes no desplazan ni duplican elementos entre páginas.
+"""
+
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple, TypeVar
+
+from sqlalchemy import tuple_
+
+from app.core.exceptions import ValidationError
+
+T = TypeVar("T")
+
+# Cabecera con el cursor siguiente en endpoints que devuelven una lista plana
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Codifica la posición `(timestamp, id)` como cursor opaco."""
+    payload = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Decodifica un cursor; lanza ValidationError si no es válido."""
+    if not cursor:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(payload)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValidationError("Cursor de paginación inválido")
+
+
+def apply_keyset(query, timestamp_column, id_column, cursor: Optional[str], descending: bool = True):
+    """
+    Ordena una Query/Select por `(timestamp, id)` y filtra a partir del cursor.
+    El orden es total (el id desempata), por lo que las páginas son estables.
+    En SQLite la comparación es textual: requiere timestamps en un único formato (ver `app.db.sqlite`).
+    """
+    position = decode_cursor(cursor)
+    if position is not None:
+        key = tuple_(timestamp_column, id_column)
+        query = query.filter(key < position if descending else key > position)
+
+    if descending:
+        return query.order_by(timestamp_column.desc(), id_column.desc())
+    return query.order_by(timestamp_column.asc(), id_column.asc())
+
+
+def split_page(rows: Sequence[T], limit: int, timestamp_attr: str = "creado_en") -> Tuple[List[T], Optional[str]]:
+    """
+    Separa una consulta hecha con `limit + 1` en (página, cursor siguiente).
+    El cursor es None cuando no quedan más elementos.
+    """
+    page = list(rows[:limit])
+    if len(rows) <= limit or not page:
+        return page, None
+    last = page[-1]
+    return page, encode_cursor(getattr(last, timestamp_attr), last.id)
@@ -0,0 +1,129 @@
+"""
+Búsqueda de texto completo sobre `mensajes`.
+
+- SQLite: tabla virtual FTS5 `mensajes_fts` de contenido externo (sin duplicar el texto)
+  con el tokenizador `unicode61 remove_diacritics 2`, sincronizada por triggers.
+- PostgreSQL: índice GIN sobre `to_tsvector('es_unaccent', texto)`; la configuración
+  `es_unaccent` aplica `unaccent` + diccionario `simple` (mismos términos que en SQLite).
+
+En ambos casos los términos quedan en minúsculas y sin tildes, igual que `limpiar_texto`,
+y la consulta se normaliza de la misma forma. Resultados ordenados por relevancia con snippet.
+"""
+
+import html
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+
+from sqlalchemy import DDL, event, func, literal_column, or_, table, column
+from sqlalchemy.orm import Session, joinedload
+
+from app.db.models import Mensaje, SesionChat
+
+# Marcas del fragmento resaltado y longitud del snippet (en tokens)
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_TOKENS = 12
+# El motor marca con caracteres de control; se sustituyen tras escapar el texto
+_SEL_START = "\x02"
+_SEL_END = "\x03"
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS mensajes_fts USING fts5("
+    "texto, content='mensajes', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS mensajes_fts_ai AFTER INSERT ON mensajes BEGIN "
+    "INSERT INTO mensajes_fts(rowid, texto) VALUES (new.id, new.texto); END",
+    "CREATE TRIGGER IF NOT EXISTS mensajes_fts_ad AFTER DELETE ON mensajes BEGIN "
+    "INSERT INTO mensajes_fts(mensajes_fts, rowid, texto) VALUES ('delete', old.id, old.texto); END",
+    "CREATE TRIGGER IF NOT EXISTS mensajes_fts_au AFTER UPDATE OF texto ON mensajes BEGIN "
+    "INSERT INTO mensajes_fts(mensajes_fts, rowid, texto) VALUES ('delete', old.id, old.texto); "
+    "INSERT INTO mensajes_fts(rowid, texto) VALUES (new.id, new.texto); END",
+    # Reindexa desde `mensajes` (índice vacío o desincronizado)
+    "INSERT INTO mensajes_fts(mensajes_fts) VALUES ('rebuild')",
+]
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "DO $$ BEGIN "
+    "IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_unaccent') THEN "
+    "CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = simple); "
+    "ALTER TEXT SEARCH CONFIGURATION es_unaccent ALTER MAPPING FOR hword, hword_part, word WITH unaccent, simple; "
+    "END IF; END $$",
+    "CREATE INDEX IF NOT EXISTS idx_mensaje_texto_fts ON mensajes USING GIN (to_tsvector('es_unaccent', texto))",
+]
+
+for _statement in SQLITE_DDL:
+    event.listen(Mensaje.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _statement in POSTGRES_DDL:
+    event.listen(Mensaje.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+event.listen(Mensaje.__table__, "after_drop", DDL("DROP TABLE IF EXISTS mensajes_fts").execute_if(dialect="sqlite"))
+
+_fts = table("mensajes_fts", column("rowid"))
+
+
+def search_terms(q: str) -> List[str]:
+    """Términos de la consulta normalizados como `limpiar_texto` (minúsculas, sin tildes)."""
+    texto = unicodedata.normalize("NFD", q or "")
+    texto = texto.encode("ascii", "ignore").decode("utf-8").lower()
+    return re.findall(r"\w+", texto)
+
+
+def _fts5_query(terms: List[str]) -> str:
+    # Cada término entre comillas (sin operadores FTS5 del usuario) y como prefijo
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _tsquery(terms: List[str]) -> str:
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def _highlight(snippet: Optional[str]) -> str:
+    """Escapa el HTML del texto del mensaje y convierte las marcas del motor en `<mark>`."""
+    texto = html.escape(snippet or "", quote=False)
+    return texto.replace(_SEL_START, SNIPPET_START).replace(_SEL_END, SNIPPET_END)
+
+
+def search_messages(db: Session, q: str, user_id: int, session_id: Optional[int] = None,
+                    limit: int = 50) -> List[Tuple[Mensaje, float, str]]:
+    """
+    Mensajes de las sesiones del usuario (como estudiante o tutor) que contienen todos
+    los términos de `q`. Devuelve (mensaje, relevancia, snippet), más relevantes primero;
+    el snippet es HTML escapado con las coincidencias entre `<mark>`.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return []
+
+    query = db.query(Mensaje).join(SesionChat, Mensaje.sesion_id == SesionChat.id).filter(
+        or_(SesionChat.usuario_id == user_id, SesionChat.tutor_id == user_id)
+    ).options(joinedload(Mensaje.usuario))
+    if session_id:
+        query = query.filter(Mensaje.sesion_id == session_id)
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        fts = literal_column("mensajes_fts")
+        # bm25: menor es mejor; se invierte para exponer una relevancia creciente
+        rank = -func.bm25(fts)
+        snippet = func.snippet(fts, 0, _SEL_START, _SEL_END, "…", SNIPPET_TOKENS)
+        query = query.join(_fts, _fts.c.rowid == Mensaje.id).filter(fts.op("MATCH")(_fts5_query(terms)))
+    elif dialect == "postgresql":
+        vector = func.to_tsvector(literal_column("'es_unaccent'"), Mensaje.texto)
+        tsquery = func.to_tsquery(literal_column("'es_unaccent'"), _tsquery(terms))
+        rank = func.ts_rank(vector, tsquery)
+        snippet = func.ts_headline(
+            literal_column("'es_unaccent'"), Mensaje.texto, tsquery,
+            f"StartSel={_SEL_START}, StopSel={_SEL_END}, MaxWords={SNIPPET_TOKENS}, MinWords=3"
+        )
+        query = query.filter(vector.op("@@")(tsquery))
+    else:
+        # Sin índice de texto completo: LIKE por término, sin ranking
+        rank = literal_column("0.0")
+        snippet = Mensaje.texto
+        for term in terms:
+            query = query.filter(Mensaje.texto.ilike(f"%{term}%"))
+
+    rows = query.add_columns(rank.label("rank"), snippet.label("snippet")).order_by(
+        rank.desc(), Mensaje.creado_en.desc(), Mensaje.id.desc()
+    ).limit(limit).all()
+    return [(mensaje, float(rank_value or 0.0), _highlight(snippet_value)) for mensaje, rank_value, snippet_value in rows]
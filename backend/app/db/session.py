@@ -2,21 +2,85 @@
 Configuración de sesión de base de datos.
 """
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import time
+from typing import Callable
+
+from sqlalchemy import create_engine, literal, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.core.config import settings
+from app.core.logging import logger
+from app.db.sqlite import is_sqlite_file, create_sqlite_engines, install_sqlite_pragmas, SQLiteRoutingSession
+
+# Perfil SQLite (WAL + escritor único + lectores de solo lectura) para bases en disco
+SQLITE_PROFILE = settings.SQLITE_OPTIMIZED and is_sqlite_file(settings.DATABASE_URL)
+
+if SQLITE_PROFILE:
+    read_engine, engine = create_sqlite_engines(
+        settings.DATABASE_URL,
+        create_engine,
+        connect_args={"check_same_thread": False}
+    )
+    # `engine` es el escritor: create_all y scripts de mantenimiento escriben por él
+    SessionLocal = sessionmaker(
+        class_=SQLiteRoutingSession,
+        autocommit=False,
+        autoflush=False,
+        info={"sqlite_reader": read_engine, "sqlite_writer": engine}
+    )
+else:
+    # Crear engine de base de datos
+    engine = create_engine(
+        settings.DATABASE_URL,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        echo=False  # Disabled SQL query logging
+    )
+    read_engine = engine
+
+    # Crear sesión local
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
 
-# Crear engine de base de datos
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_size=settings.DATABASE_POOL_SIZE,
-    max_overflow=settings.DATABASE_MAX_OVERFLOW,
-    pool_timeout=settings.DATABASE_POOL_TIMEOUT,
-    echo=False  # Disabled SQL query logging
-)
+def get_async_database_url(url: str) -> str:
+    """Traduce la URL síncrona al driver async equivalente (aiosqlite / asyncpg)."""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    return url
 
-# Crear sesión local
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _create_async_engine():
+    """Engine async paralelo al síncrono, sobre la misma base de datos."""
+    return create_async_engine(
+        get_async_database_url(settings.DATABASE_URL),
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        echo=False
+    )
+
+
+# Sesión async; expire_on_commit=False para poder leer atributos tras el commit sin I/O implícito
+if SQLITE_PROFILE:
+    async_read_engine, async_engine = create_sqlite_engines(
+        get_async_database_url(settings.DATABASE_URL),
+        create_async_engine
+    )
+    AsyncSessionLocal = async_sessionmaker(
+        class_=AsyncSession,
+        sync_session_class=SQLiteRoutingSession,
+        autoflush=False,
+        expire_on_commit=False,
+        info={"sqlite_reader": async_read_engine.sync_engine, "sqlite_writer": async_engine.sync_engine}
+    )
+else:
+    async_engine = _create_async_engine()
+    async_read_engine = async_engine
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 
 def get_db():
@@ -26,3 +90,126 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency para obtener sesión async de base de datos (rutas `async def`)."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def create_replica_engine(url: str, create: Callable[..., object] = create_engine):
+    """Engine de solo lectura para la réplica (`create_engine` o `create_async_engine`)."""
+    if url.startswith("sqlite"):
+        kwargs = {} if "+aiosqlite" in url else {"connect_args": {"check_same_thread": False}}
+        replica = create(url, pool_size=settings.SQLITE_READ_POOL_SIZE, max_overflow=settings.DATABASE_MAX_OVERFLOW,
+                         pool_timeout=settings.DATABASE_POOL_TIMEOUT, echo=False, **kwargs)
+        install_sqlite_pragmas(getattr(replica, "sync_engine", replica), read_only=True)
+        return replica
+    return create(
+        url,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_pre_ping=True,
+        echo=False
+    )
+
+
+class ReadReplica:
+    """
+    Sesiones de solo lectura sobre la réplica, con fallback a la primaria.
+    Si la réplica no acepta conexiones se marca caída durante `retry_seconds` y
+    las lecturas van a la primaria hasta el siguiente intento.
+    """
+
+    def __init__(self, primary, replica=None, retry_seconds: float = 30):
+        self.primary = primary
+        self.replica = replica
+        self.retry_seconds = retry_seconds
+        self._down_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return self.replica is not None and time.monotonic() >= self._down_until
+
+    def _mark_down(self, error: Exception) -> None:
+        self._down_until = time.monotonic() + self.retry_seconds
+        logger.warning("Réplica de lectura no disponible, usando la primaria",
+                       data={"error": str(error), "retry_seconds": self.retry_seconds})
+
+    def session(self):
+        """Sesión síncrona en la réplica (con su conexión ya abierta) o en la primaria."""
+        if self.available:
+            db = self.replica()
+            try:
+                db.connection()
+                return db
+            except SQLAlchemyError as e:
+                db.close()
+                self._mark_down(e)
+        return self.primary()
+
+    async def async_session(self):
+        """Equivalente async de `session`."""
+        if self.available:
+            db = self.replica()
+            try:
+                await db.connection()
+                return db
+            except SQLAlchemyError as e:
+                await db.close()
+                self._mark_down(e)
+        return self.primary()
+
+
+if settings.DATABASE_READ_URL:
+    replica_engine = create_replica_engine(settings.DATABASE_READ_URL)
+    async_replica_engine = create_replica_engine(get_async_database_url(settings.DATABASE_READ_URL), create_async_engine)
+    read_replica = ReadReplica(
+        SessionLocal,
+        sessionmaker(bind=replica_engine, autocommit=False, autoflush=False),
+        settings.DATABASE_READ_RETRY_SECONDS
+    )
+    async_read_replica = ReadReplica(
+        AsyncSessionLocal,
+        async_sessionmaker(bind=async_replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False),
+        settings.DATABASE_READ_RETRY_SECONDS
+    )
+else:
+    read_replica = ReadReplica(SessionLocal)
+    async_read_replica = ReadReplica(AsyncSessionLocal)
+
+
+def get_read_db():
+    """Dependency de solo lectura (analítica, reportes, búsqueda): réplica con fallback a la primaria."""
+    db = read_replica.session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def begin_read_snapshot(db: Session) -> None:
+    """
+    Fija una única instantánea para las lecturas siguientes de `db`: `BEGIN` explícito en
+    SQLite (pysqlite no lo envía antes de un SELECT) y REPEATABLE READ en PostgreSQL.
+    Se llama antes de la primera consulta de la sesión.
+    """
+    # Una consulta de lectura: con SQLiteRoutingSession se obtiene la conexión lectora
+    lectura = {"clause": select(literal(1))}
+    if db.get_bind(**lectura).dialect.name == "postgresql":
+        db.connection(bind_arguments=lectura, execution_options={"isolation_level": "REPEATABLE READ"})
+        return
+    connection = db.connection(bind_arguments=lectura)
+    if connection.dialect.name == "sqlite" and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN")
+
+
+async def get_async_read_db():
+    """Dependency async de solo lectura: réplica con fallback a la primaria."""
+    db = await async_read_replica.async_session()
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -0,0 +1,196 @@
+"""
+Perfil de producción para SQLite: WAL, pragmas y separación lector/escritor.
+
+SQLite admite un único escritor a la vez. En lugar de que cada conexión del pool
+compita por el lock (y falle con "database is locked"), todas las escrituras pasan
+por un engine con una sola conexión; el pool de SQLAlchemy actúa como la cola que
+serializa a los escritores. Las lecturas usan un pool de conexiones de solo lectura
+que, gracias a WAL, no bloquean ni son bloqueadas por el escritor.
+"""
+
+import threading
+from collections import deque
+from typing import Callable, List, Tuple
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql import functions
+from sqlalchemy.sql.elements import TextClause
+
+from app.core.config import settings
+
+_READ_STATEMENTS = ("select", "with", "explain")
+
+
+@compiles(functions.now, "sqlite")
+def _sqlite_now(element, compiler, **kw):
+    """
+    `func.now()` con el mismo formato de texto que DateTime de SQLAlchemy (con microsegundos).
+    CURRENT_TIMESTAMP omite la fracción y, al comparar como texto, `12:00:00` < `12:00:00.000000`:
+    mezclar ambos formatos rompe la igualdad y el orden de los cursores `(timestamp, id)`.
+    """
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+def is_sqlite_file(url: str) -> bool:
+    """Indica si la URL apunta a una base SQLite en disco (no `:memory:`)."""
+    if not url.startswith("sqlite"):
+        return False
+    database = url.split("://", 1)[-1].lstrip("/")
+    return bool(database) and ":memory:" not in database and "mode=memory" not in database
+
+
+def sqlite_pragmas(read_only: bool = False) -> List[str]:
+    """Pragmas aplicados a cada conexión nueva del perfil."""
+    pragmas = [
+        f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}",
+        f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}",
+        "PRAGMA foreign_keys=ON",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        # Después de journal_mode: cambiarlo escribe en la cabecera del archivo
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+
+def install_sqlite_pragmas(engine: Engine, read_only: bool = False) -> None:
+    """Registra los pragmas en el evento `connect` del engine (síncrono o `async_engine.sync_engine`)."""
+    pragmas = sqlite_pragmas(read_only)
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+class _FifoTurnstile:
+    """Lock con entrega en orden de llegada: al liberar, el turno pasa directamente al primero en espera."""
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._waiters = deque()
+        self._held = False
+
+    def acquire(self, timeout: float) -> bool:
+        with self._mutex:
+            if not self._held and not self._waiters:
+                self._held = True
+                return True
+            turn = threading.Event()
+            self._waiters.append(turn)
+        if turn.wait(timeout):
+            return True
+        with self._mutex:
+            if turn.is_set():  # el turno llegó justo al expirar
+                return True
+            self._waiters.remove(turn)
+            return False
+
+    def release(self) -> None:
+        with self._mutex:
+            if self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self._held = False
+
+
+class SQLiteWriterPool(QueuePool):
+    """
+    Pool de una sola conexión para el escritor con cola FIFO.
+    `QueuePool` no es justo: el hilo que devuelve la conexión puede recuperarla antes
+    que los que esperan, y un escritor frecuente (mensajes) deja sin turno a otro
+    ocasional (métricas). Aquí la conexión se entrega en orden de llegada.
+    """
+
+    def __init__(self, creator, pool_size: int = 1, max_overflow: int = 0, **kw):
+        super().__init__(creator, pool_size=1, max_overflow=0, **kw)
+        self._turns = _FifoTurnstile()
+
+    def _do_get(self):
+        if not self._turns.acquire(self._timeout):
+            raise exc.TimeoutError(
+                f"Tiempo de espera agotado ({self._timeout}s) esperando la conexión de escritura de SQLite"
+            )
+        try:
+            return super()._do_get()
+        except BaseException:
+            self._turns.release()
+            raise
+
+    def _do_return_conn(self, record):
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self._turns.release()
+
+
+def create_sqlite_engines(url: str, create: Callable[..., object], **kwargs) -> Tuple[object, object]:
+    """
+    Crea el par (lector, escritor) para una URL SQLite.
+    `create` es `create_engine` o `create_async_engine`; el escritor tiene una única
+    conexión y las peticiones concurrentes esperan su turno en la cola del pool
+    (FIFO con `SQLiteWriterPool` en el engine síncrono; el async usa la cola de asyncio).
+    """
+    writer_kwargs = dict(kwargs)
+    if "+aiosqlite" not in url:
+        writer_kwargs["poolclass"] = SQLiteWriterPool
+    reader = create(
+        url,
+        pool_size=settings.SQLITE_READ_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        echo=False,
+        **kwargs
+    )
+    writer = create(
+        url,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        echo=False,
+        **writer_kwargs
+    )
+    install_sqlite_pragmas(getattr(reader, "sync_engine", reader), read_only=True)
+    install_sqlite_pragmas(getattr(writer, "sync_engine", writer), read_only=False)
+    return reader, writer
+
+
+def _is_write(clause) -> bool:
+    if isinstance(clause, UpdateBase):
+        return True
+    if isinstance(clause, TextClause):
+        return not clause.text.lstrip().lower().startswith(_READ_STATEMENTS)
+    return False
+
+
+class SQLiteRoutingSession(Session):
+    """
+    Sesión que envía flush y DML al engine escritor y las consultas al lector.
+    Una vez que la transacción escribe, permanece en el escritor hasta el commit
+    o rollback para leer sus propios cambios.
+    Los engines se pasan vía `sessionmaker(info={"sqlite_reader": ..., "sqlite_writer": ...})`.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        writer = self.info["sqlite_writer"]
+        if self.info.get("sqlite_writing") or self._flushing or _is_write(clause):
+            self.info["sqlite_writing"] = True
+            return writer
+        return self.info["sqlite_reader"]
+
+
+@event.listens_for(SQLiteRoutingSession, "after_commit")
+@event.listens_for(SQLiteRoutingSession, "after_rollback")
+def _release_writer(session):
+    session.info.pop("sqlite_writing", None)
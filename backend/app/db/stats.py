@@ -0,0 +1,333 @@
+"""
+Tablas de agregados (`session_stats`, `student_daily_stats`, `student_emotion_rollups`)
+mantenidas al escribir.
+
+Un listener `before_flush` aplica cada Mensaje y Analisis nuevo, modificado o eliminado
+a los agregados de su sesión, del día del estudiante y de su serie emocional por hora,
+día y semana, dentro de la misma transacción. Los mensajes cuentan en el día de su
+`Mensaje.creado_en` y los análisis en el de su `Analisis.creado_en`, la misma columna
+que filtran las consultas sobre `analisis`. Así las estadísticas de sesión, el progreso
+y la trayectoria del estudiante se leen sin recorrer `mensajes` ni `analisis`.
+`rebuild_stats` regenera las tablas desde los datos crudos.
+
+Cada fila de agregados se lee con `SELECT … FOR UPDATE`; si aún no existe se crea a cero
+con `INSERT … ON CONFLICT DO NOTHING` (SAVEPOINT en otros motores) y se vuelve a leer, de
+modo que dos transacciones que escriben a la vez la primera fila de una sesión, día o
+periodo no chocan por la clave primaria.
+
+Las escrituras masivas que no pasan por el ORM (`insert()` directo) no disparan el
+listener: deben llamar a `apply_inserted_messages` / `apply_inserted_analyses` en la
+misma transacción, o `rebuild_stats` después.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, inspect, insert, select, func, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.models import (
+    Mensaje, Analisis, EstadisticasSesion, EstadisticasEstudianteDiarias, SerieEmocionalEstudiante, SegmentoArchivo
+)
+from app.db.archive import iter_segment
+from app.core.logging import logger
+
+# Máximo de recomendaciones únicas guardadas por sesión
+MAX_RECOMENDACIONES = 10
+
+# Campos de Analisis que afectan a los agregados
+ANALYSIS_FIELDS = (
+    "emocion", "estilo", "prioridad", "alerta", "recomendaciones", "mensaje_id", "usuario_id",
+    "emocion_score", "estilo_score", "creado_en"
+)
+
+# Resoluciones de la serie emocional: inicio del periodo que contiene cada instante
+ROLLUP_RESOLUTIONS = {
+    "hora": lambda t: t.replace(minute=0, second=0, microsecond=0),
+    "dia": lambda t: datetime.combine(t.date(), time.min),
+    "semana": lambda t: datetime.combine(t.date() - timedelta(days=t.weekday()), time.min),
+}
+
+# Valores iniciales de una fila de agregados nueva
+_ZEROS = {
+    EstadisticasSesion: {"total_mensajes": 0, "analisis_count": 0, "alertas": 0, "mensajes_estudiante": 0, "mensajes_tutor": 0},
+    EstadisticasEstudianteDiarias: {"total_mensajes": 0, "analisis_count": 0, "alertas": 0},
+    SerieEmocionalEstudiante: {
+        "analisis_count": 0, "alertas": 0,
+        "emocion_score_suma": 0.0, "emocion_score_n": 0, "estilo_score_suma": 0.0, "estilo_score_n": 0
+    },
+}
+
+
+def extract_recomendaciones(valor: Any) -> List[str]:
+    """Recomendaciones en texto de un Analisis (lista o dict de textos)."""
+    if isinstance(valor, list):
+        return [rec for rec in valor if isinstance(rec, str)]
+    if isinstance(valor, dict):
+        return [rec for rec in valor.values() if isinstance(rec, str)]
+    return []
+
+
+def _bump(histograma: Optional[Dict[str, int]], clave: Any, delta: int) -> Dict[str, int]:
+    """Devuelve una copia del histograma con `clave` incrementada (elimina conteos a cero)."""
+    resultado = dict(histograma or {})
+    clave = str(clave)
+    conteo = resultado.get(clave, 0) + delta
+    if conteo > 0:
+        resultado[clave] = conteo
+    else:
+        resultado.pop(clave, None)
+    return resultado
+
+
+class _Aggregates:
+    """Filas de agregados tocadas durante un flush (o una reconstrucción)."""
+
+    def __init__(self, session: Session, load: bool = True):
+        self.session = session
+        self.load = load
+        self.sesiones: Dict[int, EstadisticasSesion] = {}
+        self.diarias: Dict[Tuple[int, date], EstadisticasEstudianteDiarias] = {}
+        self.series: Dict[Tuple[int, str, datetime], SerieEmocionalEstudiante] = {}
+
+    def _lock_row(self, model, pk: Dict[str, Any]):
+        # Bloquea la fila (en bases que lo soportan) para no perder incrementos concurrentes
+        return self.session.query(model).filter_by(**pk).with_for_update().populate_existing().one_or_none()
+
+    def _insert_missing(self, model, pk: Dict[str, Any]) -> None:
+        """Crea la fila a cero si no existe; si otra transacción la crea a la vez, no hace nada."""
+        values = {**pk, **_ZEROS[model]}
+        dialect = self.session.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert_ = postgresql_insert if dialect == "postgresql" else sqlite_insert
+            self.session.execute(insert_(model).values(**values).on_conflict_do_nothing())
+            return
+        try:
+            with self.session.begin_nested():
+                self.session.execute(insert(model).values(**values))
+        except IntegrityError:
+            pass
+
+    def _get(self, model, key, cache, **pk):
+        row = cache.get(key)
+        if row is None:
+            if self.load:
+                row = self._lock_row(model, pk)
+                if row is None:
+                    # Primera escritura de la fila: se inserta sin conflicto y se bloquea la que quede
+                    self._insert_missing(model, pk)
+                    row = self._lock_row(model, pk)
+            else:
+                row = model(**pk, **_ZEROS[model])
+                self.session.add(row)
+            cache[key] = row
+        return row
+
+    def sesion(self, sesion_id: int) -> EstadisticasSesion:
+        return self._get(EstadisticasSesion, sesion_id, self.sesiones, sesion_id=sesion_id)
+
+    def diaria(self, usuario_id: int, fecha: date) -> EstadisticasEstudianteDiarias:
+        return self._get(EstadisticasEstudianteDiarias, (usuario_id, fecha), self.diarias, usuario_id=usuario_id, fecha=fecha)
+
+    def serie(self, usuario_id: int, resolucion: str, inicio: datetime) -> SerieEmocionalEstudiante:
+        return self._get(SerieEmocionalEstudiante, (usuario_id, resolucion, inicio), self.series,
+                         usuario_id=usuario_id, resolucion=resolucion, inicio=inicio)
+
+    def apply_message(self, sesion_id: Optional[int], usuario_id: int, remitente: str, creado_en: datetime, delta: int) -> None:
+        """Suma (delta=1) o resta (delta=-1) un mensaje a los agregados."""
+        if sesion_id is not None:
+            stats = self.sesion(sesion_id)
+            stats.total_mensajes += delta
+            if remitente == "user":
+                stats.mensajes_estudiante += delta
+            elif remitente == "tutor":
+                stats.mensajes_tutor += delta
+            stats.mensajes_por_hora = _bump(stats.mensajes_por_hora, creado_en.hour, delta)
+            if delta > 0:
+                if stats.primer_mensaje_en is None or creado_en < stats.primer_mensaje_en:
+                    stats.primer_mensaje_en = creado_en
+                if stats.ultimo_mensaje_en is None or creado_en > stats.ultimo_mensaje_en:
+                    stats.ultimo_mensaje_en = creado_en
+        if remitente == "user":
+            self.diaria(usuario_id, creado_en.date()).total_mensajes += delta
+
+    def apply_analysis(self, values: Dict[str, Any], sesion_id: Optional[int], creado_en: datetime, delta: int) -> None:
+        """Suma o resta un análisis a los agregados de su sesión y de su día (`creado_en` del análisis)."""
+        targets = [self.diaria(values["usuario_id"], creado_en.date())]
+        if sesion_id is not None:
+            targets.append(self.sesion(sesion_id))
+
+        for stats in targets:
+            stats.analisis_count += delta
+            if values["emocion"]:
+                stats.emociones = _bump(stats.emociones, values["emocion"], delta)
+            if values["estilo"]:
+                stats.estilos = _bump(stats.estilos, values["estilo"], delta)
+            if values["prioridad"]:
+                stats.prioridades = _bump(stats.prioridades, values["prioridad"], delta)
+            if values["alerta"]:
+                stats.alertas += delta
+
+        for resolucion, periodo in ROLLUP_RESOLUTIONS.items():
+            serie = self.serie(values["usuario_id"], resolucion, periodo(creado_en))
+            serie.analisis_count += delta
+            if values["emocion"]:
+                serie.emociones = _bump(serie.emociones, values["emocion"], delta)
+            if values["estilo"]:
+                serie.estilos = _bump(serie.estilos, values["estilo"], delta)
+            if values["alerta"]:
+                serie.alertas += delta
+            if values.get("emocion_score") is not None:
+                serie.emocion_score_suma += delta * values["emocion_score"]
+                serie.emocion_score_n += delta
+            if values.get("estilo_score") is not None:
+                serie.estilo_score_suma += delta * values["estilo_score"]
+                serie.estilo_score_n += delta
+
+        if delta > 0 and sesion_id is not None:
+            stats = self.sesion(sesion_id)
+            recomendaciones = list(stats.recomendaciones or [])
+            for rec in extract_recomendaciones(values["recomendaciones"]):
+                if len(recomendaciones) >= MAX_RECOMENDACIONES:
+                    break
+                if rec not in recomendaciones:
+                    recomendaciones.append(rec)
+            stats.recomendaciones = recomendaciones
+
+
+def _current(analisis: Analisis) -> Dict[str, Any]:
+    return {field: getattr(analisis, field) for field in ANALYSIS_FIELDS}
+
+
+def _previous(analisis: Analisis) -> Dict[str, Any]:
+    """Valores de un Analisis antes de las modificaciones pendientes."""
+    state = inspect(analisis)
+    if state.unloaded.intersection(ANALYSIS_FIELDS):
+        # Expirado tras un commit: sin historial, se cargan los valores de la base
+        getattr(analisis, next(iter(state.unloaded.intersection(ANALYSIS_FIELDS))))
+    values = {}
+    for field in ANALYSIS_FIELDS:
+        history = state.attrs[field].history
+        if history.deleted:
+            values[field] = history.deleted[0]
+        elif history.unchanged:
+            values[field] = history.unchanged[0]
+        else:
+            values[field] = None
+    return values
+
+
+def _apply_analysis(session: Session, aggregates: _Aggregates, analisis: Analisis, values: Dict[str, Any], delta: int) -> None:
+    """Resuelve el mensaje del análisis (cargado o pendiente) y aplica sus valores."""
+    mensaje = analisis.__dict__.get("mensaje")
+    if mensaje is None or (values["mensaje_id"] is not None and mensaje.id != values["mensaje_id"]):
+        mensaje = session.get(Mensaje, values["mensaje_id"]) if values["mensaje_id"] is not None else None
+    if mensaje is not None:
+        aggregates.apply_analysis(values, mensaje.sesion_id, values["creado_en"], delta)
+
+
+@event.listens_for(Session, "before_flush")
+def _maintain_stats(session: Session, flush_context, instances) -> None:
+    """Aplica los Mensaje/Analisis pendientes del flush a las tablas de agregados."""
+    pending = [obj for obj in session.new if isinstance(obj, (Mensaje, Analisis))]
+    changed = [obj for obj in session.dirty if isinstance(obj, Analisis) and session.is_modified(obj)]
+    deleted = [obj for obj in session.deleted if isinstance(obj, (Mensaje, Analisis))]
+    if not (pending or changed or deleted):
+        return
+
+    aggregates = _Aggregates(session)
+    with session.no_autoflush:
+        # creado_en lo asignaría el INSERT con func.now(); se fija antes con el mismo reloj de la base
+        if any(not isinstance(obj.creado_en, datetime) for obj in pending):
+            ahora = session.execute(select(func.now())).scalar()
+            for obj in pending:
+                if not isinstance(obj.creado_en, datetime):
+                    obj.creado_en = ahora
+
+        for obj in pending:
+            if isinstance(obj, Mensaje):
+                aggregates.apply_message(obj.sesion_id, obj.usuario_id, obj.remitente, obj.creado_en, 1)
+            else:
+                _apply_analysis(session, aggregates, obj, _current(obj), 1)
+
+        for obj in changed:
+            _apply_analysis(session, aggregates, obj, _previous(obj), -1)
+            _apply_analysis(session, aggregates, obj, _current(obj), 1)
+
+        for obj in deleted:
+            if isinstance(obj, Mensaje):
+                aggregates.apply_message(obj.sesion_id, obj.usuario_id, obj.remitente, obj.creado_en, -1)
+            else:
+                _apply_analysis(session, aggregates, obj, _previous(obj), -1)
+
+
+def apply_inserted_messages(session: Session, rows: List[Dict[str, Any]]) -> None:
+    """Aplica a los agregados mensajes insertados sin pasar por el flush (requieren `creado_en`)."""
+    aggregates = _Aggregates(session)
+    for row in rows:
+        aggregates.apply_message(row.get("sesion_id"), row["usuario_id"], row.get("remitente", "user"), row["creado_en"], 1)
+    # Un _Aggregates posterior recarga con populate_existing: los cambios deben estar ya en la base
+    session.flush()
+
+
+def apply_inserted_analyses(session: Session, rows: List[Dict[str, Any]]) -> None:
+    """Aplica a los agregados análisis insertados sin pasar por el flush (requieren `creado_en`)."""
+    mensaje_ids = {row["mensaje_id"] for row in rows}
+    mensajes = {
+        row.id: row for row in session.execute(
+            select(Mensaje.id, Mensaje.sesion_id).where(Mensaje.id.in_(mensaje_ids))
+        )
+    } if mensaje_ids else {}
+
+    aggregates = _Aggregates(session)
+    for row in rows:
+        mensaje = mensajes.get(row["mensaje_id"])
+        if mensaje is not None:
+            values = {field: row.get(field) for field in ANALYSIS_FIELDS}
+            aggregates.apply_analysis(values, mensaje.sesion_id, row["creado_en"], 1)
+    session.flush()
+
+
+def rebuild_stats(db: Session, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Regenera `session_stats`, `student_daily_stats` y `student_emotion_rollups` desde mensajes y análisis.
+    Recorre los datos en streaming con las mismas reglas que el mantenimiento incremental.
+    """
+    db.query(EstadisticasSesion).delete()
+    db.query(EstadisticasEstudianteDiarias).delete()
+    db.query(SerieEmocionalEstudiante).delete()
+
+    aggregates = _Aggregates(db, load=False)
+    # Las sesiones archivadas se leen de su segmento (completo); sus filas calientes retenidas se omiten
+    hot = or_(Mensaje.sesion_id.is_(None), Mensaje.sesion_id.notin_(select(SegmentoArchivo.sesion_id)))
+    mensajes = db.query(
+        Mensaje.sesion_id, Mensaje.usuario_id, Mensaje.remitente, Mensaje.creado_en
+    ).filter(hot).execution_options(yield_per=batch_size)
+    for sesion_id, usuario_id, remitente, creado_en in mensajes:
+        aggregates.apply_message(sesion_id, usuario_id, remitente, creado_en, 1)
+
+    analisis = db.query(
+        Analisis.usuario_id, Analisis.emocion, Analisis.estilo, Analisis.prioridad,
+        Analisis.alerta, Analisis.recomendaciones, Analisis.emocion_score, Analisis.estilo_score,
+        Analisis.creado_en, Mensaje.sesion_id
+    ).join(Mensaje, Analisis.mensaje_id == Mensaje.id).filter(hot).order_by(Analisis.id).execution_options(yield_per=batch_size)
+    for row in analisis:
+        aggregates.apply_analysis(row._asdict(), row.sesion_id, row.creado_en, 1)
+
+    for (ruta,) in db.query(SegmentoArchivo.ruta).all():
+        for mensaje, analisis_archivado in iter_segment(ruta):
+            aggregates.apply_message(mensaje["sesion_id"], mensaje["usuario_id"], mensaje["remitente"], mensaje["creado_en"], 1)
+            if analisis_archivado:
+                aggregates.apply_analysis(analisis_archivado, mensaje["sesion_id"], analisis_archivado["creado_en"], 1)
+
+    db.commit()
+    result = {
+        "session_stats": len(aggregates.sesiones),
+        "student_daily_stats": len(aggregates.diarias),
+        "student_emotion_rollups": len(aggregates.series),
+    }
+    logger.info("Agregados reconstruidos", data=result)
+    return result
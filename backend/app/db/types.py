@@ -0,0 +1,60 @@
+"""
+Tipos de columna personalizados.
+
+`DistributionJSON` guarda distribuciones `[(etiqueta, score), ...]` como JSON nativo.
+Con `ANALYSIS_COMPACT_DISTRIBUTIONS` se almacenan en formato compacto: las etiquetas
+como lista y los scores como array float32 empaquetado en base64 (4 bytes por score
+en lugar del texto decimal completo). La lectura siempre devuelve `[[etiqueta, score], ...]`.
+"""
+
+import base64
+from array import array
+from typing import Any, List, Optional
+
+from sqlalchemy.types import JSON, TypeDecorator
+
+from app.core.config import settings
+
+# Clave que identifica el formato compacto dentro del JSON
+COMPACT_KEY = "f32"
+
+
+def pack_distribution(distribution) -> dict:
+    """Convierte `[(etiqueta, score), ...]` al formato compacto."""
+    labels = [label for label, _ in distribution]
+    scores = array("f", (float(score) for _, score in distribution))
+    return {"labels": labels, COMPACT_KEY: base64.b64encode(scores.tobytes()).decode("ascii")}
+
+
+def unpack_distribution(value: dict) -> List[list]:
+    """Convierte el formato compacto a `[[etiqueta, score], ...]`."""
+    scores = array("f")
+    scores.frombytes(base64.b64decode(value[COMPACT_KEY]))
+    # float32 -> float: redondear para no exponer el ruido de precisión simple
+    return [[label, round(score, 6)] for label, score in zip(value["labels"], scores)]
+
+
+def is_distribution(value: Any) -> bool:
+    """True si el valor tiene forma de distribución `[(etiqueta, score), ...]`."""
+    return isinstance(value, (list, tuple)) and all(
+        isinstance(item, (list, tuple)) and len(item) == 2
+        and isinstance(item[0], str) and isinstance(item[1], (int, float))
+        for item in value
+    )
+
+
+class DistributionJSON(TypeDecorator):
+    """Columna JSON para distribuciones de emociones/estilos con almacenamiento compacto opcional."""
+
+    impl = JSON
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect) -> Optional[Any]:
+        if value and settings.ANALYSIS_COMPACT_DISTRIBUTIONS and is_distribution(value):
+            return pack_distribution(value)
+        return value
+
+    def process_result_value(self, value: Any, dialect) -> Optional[Any]:
+        if isinstance(value, dict) and COMPACT_KEY in value:
+            return unpack_distribution(value)
+        return value
@@ -68,10 +68,17 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.error("Error creando métrica de inicio", error=e)
     
+    # Archivado periódico de sesiones cerradas
+    if settings.ARCHIVE_ENABLED and settings.ENVIRONMENT != "testing":
+        from app.db.archive import archive_worker
+        await archive_worker.start()
+    
     yield
     
     # Shutdown
     logger.info("Cerrando PsiChat Backend...")
+    if settings.ARCHIVE_ENABLED and settings.ENVIRONMENT != "testing":
+        await archive_worker.stop()
 
 
 # Crear la aplicación FastAPI
@@ -22,6 +22,11 @@ except Exception as e:
     print(f"[WARN] No se pudo cargar el modelo de emoción: {e}")
     model = None
 
+def get_vectorizer():
+    """TfidfVectorizer del pipeline de emociones, o None si el modelo no está cargado."""
+    steps = getattr(model, "named_steps", None)
+    return steps.get("tfidf") if steps else None
+
 def predict_emotion(text: str) -> Tuple[str, float]:
     """
     Predice la emoción dominante y su score como porcentaje.
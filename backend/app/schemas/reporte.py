@@ -59,6 +59,7 @@ class ReporteListResponse(BaseModel):
     total: int
     pagina: int
     por_pagina: int
+    siguiente_cursor: Optional[str] = Field(None, description="Cursor para pedir la siguiente página")
 
 
 class GenerarReporteRequest(BaseModel):
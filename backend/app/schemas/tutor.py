@@ -112,6 +112,48 @@ class SessionStatsResponse(BaseModel):
     insights: Dict[str, Any]
 
 
+# Búsqueda por facetas sobre análisis
+class AnalysisSearchResult(BaseModel):
+    analisis_id: int
+    mensaje_id: int
+    sesion_id: Optional[int] = None
+    estudiante_id: int
+    texto: str
+    emocion: Optional[str] = None
+    emocion_score: Optional[float] = None
+    prioridad: Optional[str] = None
+    alerta: bool
+    creado_en: datetime
+
+
+class AnalysisSearchResponse(BaseModel):
+    resultados: List[AnalysisSearchResult]
+    total: int
+    siguiente_cursor: Optional[str] = None
+    # Conteos por valor de cada faceta con el resto de filtros aplicados
+    facetas: Dict[str, Dict[str, int]]
+    # "precalculado" (student_daily_stats) o "consulta" (GROUP BY sobre analisis)
+    origen_facetas: Dict[str, str]
+    latencia_ms: Dict[str, float]
+
+
+class SimilarMessage(BaseModel):
+    mensaje_id: int
+    estudiante_id: int
+    sesion_id: Optional[int] = None
+    texto: str
+    similitud: float  # Coseno entre vectores TF-IDF proyectados
+    creado_en: datetime
+
+
+class SimilarMessagesResponse(BaseModel):
+    mensaje_id: int
+    resultados: List[SimilarMessage]
+    # Mensajes puntuados tras filtrar por cubetas LSH y estudiantes del tutor
+    candidatos: int
+    latencia_ms: Dict[str, float]
+
+
 # Alertas
 class AlertListResponse(BaseModel):
     id: int
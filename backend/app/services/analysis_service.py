@@ -1,12 +1,16 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from app.models.emotion import predict_emotion, predict_all_emotions
 from app.models.style import predict_style, predict_all_styles
 from app.notifications.alerts import check_combined_alert
-import json
 import re
+import numpy as np
+from collections import Counter, deque
+from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, select, tuple_
 from app.db.models import Usuario, Analisis, Mensaje
+from app.db.cache import deep_analysis_cache
+from app.core.config import settings
 from app.schemas.message import MessageCreate
 
 
@@ -376,223 +380,294 @@ def process_complete_analysis(db: Session, user_id: int, message_text: str) -> D
         setattr(analisis, 'alerta', basic_analysis["alert"])
         setattr(analisis, 'razon_alerta', basic_analysis.get("alert_reason"))
         
-        # Guardar distribuciones como JSON
-        setattr(analisis, 'distribucion_emociones', json.dumps(basic_analysis.get("emotion_distribution", [])))
-        setattr(analisis, 'distribucion_estilos', json.dumps(basic_analysis.get("style_distribution", [])))
+        # Guardar distribuciones como JSON nativo
+        setattr(analisis, 'distribucion_emociones', basic_analysis.get("emotion_distribution", []))
+        setattr(analisis, 'distribucion_estilos', basic_analysis.get("style_distribution", []))
         
         # Guardar recomendaciones y resumen
-        setattr(analisis, 'recomendaciones', json.dumps(recommendations))
-        setattr(analisis, 'resumen', json.dumps(summary))
+        setattr(analisis, 'recomendaciones', recommendations)
+        setattr(analisis, 'resumen', summary)
         
         db.add(analisis)
         db.commit()
     
     return complete_analysis
 
-def perform_deep_analysis(db: Session, user_id: int) -> Dict[str, Any]:
+def _distribution_matrix(rows: List[Dict[str, Any]], dist_key: str, label_key: str, score_key: str):
     """
-    Realiza un análisis profundo de los últimos 10 mensajes del usuario.
-    - Usa los datos ya guardados en la base de datos
-    - Análisis individual y promedio
-    - Datos para gráficos (radar, barras, tabla)
+    Matriz densa (mensajes × etiquetas) con las distribuciones de cada análisis y la máscara
+    de etiquetas presentes. Las etiquetas son las de las distribuciones (o las principales si
+    no hay ninguna), ordenadas; un análisis sin distribución aporta solo su etiqueta principal.
+    """
+    index: Dict[str, int] = {}
+    filas, columnas, valores = [], [], []
+    sin_distribucion = []
+    for i, a in enumerate(rows):
+        distribucion = a.get(dist_key)
+        if not distribucion:
+            sin_distribucion.append(i)
+            continue
+        for label, score in distribucion:
+            filas.append(i)
+            columnas.append(index.setdefault(label, len(index)))
+            valores.append(score)
+
+    labels = list(index)
+    if not labels:
+        labels = list(dict.fromkeys(rows[i][label_key] for i in sin_distribucion if rows[i][label_key]))
+        index = {label: j for j, label in enumerate(labels)}
+    for i in sin_distribucion:
+        j = index.get(rows[i].get(label_key, "neutro"))
+        if j is not None:
+            filas.append(i)
+            columnas.append(j)
+            valores.append(rows[i].get(score_key, 0))
+
+    matriz = np.zeros((len(rows), len(labels)))
+    matriz[filas, columnas] = valores
+    presentes = np.zeros((len(rows), len(labels)), dtype=bool)
+    presentes[filas, columnas] = True
+    orden = sorted(range(len(labels)), key=labels.__getitem__)
+    return [labels[j] for j in orden], matriz[:, orden], presentes[:, orden]
+
+
+class _LabelSums:
+    """Suma de scores por etiqueta y número de distribuciones de la ventana en que aparece."""
+
+    def __init__(self, labels: List[str], sumas: np.ndarray, presencia: np.ndarray):
+        self.labels = list(labels)
+        self.index = {label: j for j, label in enumerate(self.labels)}
+        self.sumas = sumas.astype(float)
+        self.presencia = presencia.astype(int)
+
+    def copy(self) -> "_LabelSums":
+        return _LabelSums(self.labels, self.sumas, self.presencia)
+
+    def add(self, distribucion, signo: int) -> None:
+        for label, score in distribucion:
+            j = self.index.get(label)
+            if j is None:
+                j = self.index[label] = len(self.labels)
+                self.labels.append(label)
+                self.sumas = np.append(self.sumas, 0.0)
+                self.presencia = np.append(self.presencia, 0)
+            self.sumas[j] += signo * score
+            self.presencia[j] += signo
+
+    def averages(self, n: int) -> Dict[str, float]:
+        """Promedios (redondeados) de las etiquetas presentes, en orden alfabético."""
+        activas = sorted(np.flatnonzero(self.presencia > 0).tolist(), key=self.labels.__getitem__)
+        medias = np.round(self.sumas[activas] / n, 2) if activas else np.zeros(0)
+        return dict(zip((self.labels[j] for j in activas), medias.tolist()))
+
+
+class DeepAnalysisWindow:
     """
-    # 1. Recuperar los últimos 10 mensajes del usuario con sus análisis ya guardados
-    mensajes_con_analisis = db.query(Mensaje, Analisis).join(
+    Ventana de los últimos `size` mensajes del análisis profundo con sus agregados
+    (sumas por etiqueta, scores y prioridades), actualizable al llegar mensajes nuevos.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]], size: int):
+        self.size = size
+        self.rows = deque(rows)  # Del más reciente al más antiguo
+        emociones, m_emociones, p_emociones = _distribution_matrix(rows, "emotion_distribution", "emotion", "emotion_score")
+        estilos, m_estilos, p_estilos = _distribution_matrix(rows, "style_distribution", "style", "style_score")
+        self.emociones = _LabelSums(emociones, m_emociones.sum(axis=0), p_emociones.sum(axis=0))
+        self.estilos = _LabelSums(estilos, m_estilos.sum(axis=0), p_estilos.sum(axis=0))
+        self.emotion_score = float(sum(a.get("emotion_score", 0) for a in rows))
+        self.style_score = float(sum(a.get("style_score", 0) for a in rows))
+        self.prioridades = Counter(a.get("priority") for a in rows)
+        # Filas sumadas por su etiqueta principal (no se pueden restar) y filas sin análisis guardado
+        self.sin_distribucion = sum(1 for a in rows if not (a["emotion_distribution"] and a["style_distribution"]))
+        self.sin_analisis = sum(1 for a in rows if not a["analizado"])
+        self._result: Optional[Dict[str, Any]] = None
+
+    def can_extend(self, analisis_sin_cambios: bool) -> bool:
+        """
+        True si la ventana admite mensajes nuevos sin recalcular: sus filas tienen distribución
+        y, si hay análisis nuevos, ninguna fila se calculó sin análisis guardado.
+        """
+        return self.sin_distribucion == 0 and (self.sin_analisis == 0 or analisis_sin_cambios)
+
+    @property
+    def newest(self) -> Dict[str, Any]:
+        return self.rows[0]
+
+    def copy(self) -> "DeepAnalysisWindow":
+        window = object.__new__(DeepAnalysisWindow)
+        window.__dict__.update(self.__dict__)
+        window.rows = deque(self.rows)
+        window.emociones, window.estilos = self.emociones.copy(), self.estilos.copy()
+        window.prioridades = Counter(self.prioridades)
+        window._result = None
+        return window
+
+    def _apply(self, a: Dict[str, Any], signo: int) -> None:
+        self.emociones.add(a["emotion_distribution"], signo)
+        self.estilos.add(a["style_distribution"], signo)
+        self.emotion_score += signo * a.get("emotion_score", 0)
+        self.style_score += signo * a.get("style_score", 0)
+        self.prioridades[a.get("priority")] += signo
+        self.sin_analisis += signo * (not a["analizado"])
+
+    def extend(self, nuevas: List[Dict[str, Any]]) -> bool:
+        """
+        Añade mensajes más recientes (del más reciente al más antiguo) y descarta los que
+        salen de la ventana. Devuelve False si alguno no se puede sumar incrementalmente.
+        """
+        if not all(a["emotion_distribution"] and a["style_distribution"] for a in nuevas):
+            return False
+        for a in reversed(nuevas):
+            self.rows.appendleft(a)
+            self._apply(a, 1)
+        while len(self.rows) > self.size:
+            self._apply(self.rows.pop(), -1)
+        self._result = None
+        return True
+
+    def result(self) -> Dict[str, Any]:
+        if self._result is None:
+            self._result = self._build_result()
+        return self._result
+
+    def _build_result(self) -> Dict[str, Any]:
+        n = len(self.rows)
+        avg_emotions = self.emociones.averages(n)
+        avg_styles = self.estilos.averages(n)
+        # Insights: la etiqueta con mayor promedio (en empate, la primera en orden alfabético)
+        emocion_frecuente = max(avg_emotions.items(), key=lambda x: x[1])[0] if avg_emotions else "neutro"
+        estilo_frecuente = max(avg_styles.items(), key=lambda x: x[1])[0] if avg_styles else "neutro"
+
+        # Convertir el resultado al formato esperado por el frontend
+        return {
+            "total_messages": n,
+            "average_emotion_score": self.emotion_score / n,
+            "average_style_score": self.style_score / n,
+            "emotion_trend": [
+                {"date": a["fecha"], "emotion": a.get("emotion", "neutro"), "score": a.get("emotion_score", 0)}
+                for a in self.rows
+            ],
+            "style_trend": [
+                {"date": a["fecha"], "style": a.get("style", "neutro"), "score": a.get("style_score", 0)}
+                for a in self.rows
+            ],
+            "risk_assessment": {
+                "high_risk_messages": self.prioridades["alta"] + self.prioridades["crítica"],
+                "medium_risk_messages": self.prioridades["media"],
+                "low_risk_messages": self.prioridades["baja"] + self.prioridades["normal"]
+            },
+            "recommendations": generate_recommendations(
+                emocion_frecuente,
+                avg_emotions.get(emocion_frecuente, 0),
+                estilo_frecuente,
+                avg_styles.get(estilo_frecuente, 0),
+                "media"  # Prioridad promedio
+            ).get("immediate_actions", [])
+        }
+
+
+def _deep_rows(db: Session, user_id: int, limit: int, after: Optional[Tuple[datetime, int]] = None) -> List[Dict[str, Any]]:
+    """Últimos mensajes del usuario (posteriores a `after`) con las columnas de su análisis."""
+    query = db.query(
+        Mensaje.id, Mensaje.texto, Mensaje.creado_en, Analisis.emocion, Analisis.emocion_score, Analisis.estilo,
+        Analisis.estilo_score, Analisis.distribucion_emociones, Analisis.distribucion_estilos,
+        Analisis.prioridad, Analisis.alerta
+    ).join(
         Analisis, Mensaje.id == Analisis.mensaje_id, isouter=True
     ).filter(
         Mensaje.usuario_id == user_id,
         Mensaje.remitente == "user"
-    ).order_by(desc(Mensaje.creado_en)).limit(10).all()
+    )
+    if after is not None:
+        query = query.filter(tuple_(Mensaje.creado_en, Mensaje.id) > after)
+
+    rows = []
+    for row in query.order_by(desc(Mensaje.creado_en), desc(Mensaje.id)).limit(limit):
+        if row.distribucion_emociones and row.distribucion_estilos:
+            a = {
+                "emotion": row.emocion or "neutro",
+                "emotion_score": row.emocion_score or 0.0,
+                "style": row.estilo or "neutro",
+                "style_score": row.estilo_score or 0.0,
+                "emotion_distribution": row.distribucion_emociones,
+                "style_distribution": row.distribucion_estilos,
+                "priority": row.prioridad or "normal",
+                "alert": row.alerta or False,
+                "analizado": True
+            }
+        else:
+            # Si no hay análisis guardado, crear uno nuevo
+            a = {**analyze_text(row.texto), "analizado": False}
+        a.update(mensaje_id=row.id, creado_en=row.creado_en, fecha=row.creado_en.strftime("%Y-%m-%d"))
+        rows.append(a)
+    return rows
+
 
-    if not mensajes_con_analisis:
+def perform_deep_analysis(db: Session, user_id: int, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Realiza un análisis profundo de los últimos `limit` mensajes del usuario
+    (por defecto `DEEP_ANALYSIS_WINDOW`).
+    - Usa los datos ya guardados en la base de datos
+    - Promedios por etiqueta sobre una matriz (mensajes × etiquetas) con numpy
+    """
+    rows = _deep_rows(db, user_id, limit or settings.DEEP_ANALYSIS_WINDOW)
+    if not rows:
         return {"message": "No hay mensajes para analizar.", "status_code": 404}
+    return DeepAnalysisWindow(rows, limit or settings.DEEP_ANALYSIS_WINDOW).result()
 
-    # 2. Procesar los datos guardados en la base de datos
-    analisis_individual = []
-    mensajes = []
-    
-    for mensaje, analisis in mensajes_con_analisis:
-        mensajes.append(mensaje)
-        
-        if analisis and analisis.distribucion_emociones and analisis.distribucion_estilos:
-            # Usar datos guardados en la base de datos
-            try:
-                emotion_distribution = json.loads(analisis.distribucion_emociones) if isinstance(analisis.distribucion_emociones, str) else analisis.distribucion_emociones
-                style_distribution = json.loads(analisis.distribucion_estilos) if isinstance(analisis.distribucion_estilos, str) else analisis.distribucion_estilos
-                
-                analisis_individual.append({
-                    "emotion": analisis.emocion or "neutro",
-                    "emotion_score": analisis.emocion_score or 0.0,
-                    "style": analisis.estilo or "neutro",
-                    "style_score": analisis.estilo_score or 0.0,
-                    "emotion_distribution": emotion_distribution,
-                    "style_distribution": style_distribution,
-                    "priority": analisis.prioridad or "normal",
-                    "alert": analisis.alerta or False
-                })
-            except (json.JSONDecodeError, TypeError):
-                # Si hay error al parsear JSON, re-analizar el mensaje
-                basic_analysis = analyze_text(mensaje.texto)
-                analisis_individual.append(basic_analysis)
-        else:
-            # Si no hay análisis guardado, crear uno nuevo
-            basic_analysis = analyze_text(mensaje.texto)
-            analisis_individual.append(basic_analysis)
-
-    # 3. Calcular promedios de scores para emociones y estilos
-    # Obtener todas las emociones y estilos posibles
-    all_emotions = set()
-    all_styles = set()
-    for a in analisis_individual:
-        if "emotion_distribution" in a and a["emotion_distribution"]:
-            for emo, _ in a["emotion_distribution"]:
-                all_emotions.add(emo)
-        if "style_distribution" in a and a["style_distribution"]:
-            for sty, _ in a["style_distribution"]:
-                all_styles.add(sty)
-    
-    # Si no hay distribuciones, usar las emociones y estilos principales
-    if not all_emotions:
-        all_emotions = set(a["emotion"] for a in analisis_individual if a["emotion"])
-    if not all_styles:
-        all_styles = set(a["style"] for a in analisis_individual if a["style"])
-    
-    all_emotions = sorted(list(all_emotions))
-    all_styles = sorted(list(all_styles))
 
-    # Promedio de scores
-    avg_emotions = {emo: 0.0 for emo in all_emotions}
-    avg_styles = {sty: 0.0 for sty in all_styles}
-    
-    for a in analisis_individual:
-        if "emotion_distribution" in a and a["emotion_distribution"]:
-            emo_dict = dict(a["emotion_distribution"])
-            for emo in all_emotions:
-                avg_emotions[emo] += emo_dict.get(emo, 0)
-        else:
-            # Si no hay distribución, usar la emoción principal
-            emo = a.get("emotion", "neutro")
-            if emo in avg_emotions:
-                avg_emotions[emo] += a.get("emotion_score", 0)
-        
-        if "style_distribution" in a and a["style_distribution"]:
-            sty_dict = dict(a["style_distribution"])
-            for sty in all_styles:
-                avg_styles[sty] += sty_dict.get(sty, 0)
-        else:
-            # Si no hay distribución, usar el estilo principal
-            sty = a.get("style", "neutro")
-            if sty in avg_styles:
-                avg_styles[sty] += a.get("style_score", 0)
-    
-    # Calcular promedios
-    for emo in avg_emotions:
-        avg_emotions[emo] = round(avg_emotions[emo] / len(analisis_individual), 2)
-    for sty in avg_styles:
-        avg_styles[sty] = round(avg_styles[sty] / len(analisis_individual), 2)
-
-    # 4. Preparar datos para gráficos
-    # Radar: promedios
-    radar_data = {
-        "emotions": avg_emotions,
-        "styles": avg_styles
-    }
-    
-    # Barras: evolución por mensaje
-    barras_emociones = []
-    barras_estilos = []
-    for idx, a in enumerate(analisis_individual):
-        emo_data = {"mensaje": f"M{idx+1}"}
-        sty_data = {"mensaje": f"M{idx+1}"}
-        
-        if "emotion_distribution" in a and a["emotion_distribution"]:
-            emo_data.update(dict(a["emotion_distribution"]))
-        else:
-            emo_data[a.get("emotion", "neutro")] = a.get("emotion_score", 0)
-        
-        if "style_distribution" in a and a["style_distribution"]:
-            sty_data.update(dict(a["style_distribution"]))
+def _deep_cache_key(db: Session, user_id: int) -> Tuple[Optional[int], Optional[int]]:
+    """(último mensaje del usuario, último análisis) en una consulta sobre los índices por usuario."""
+    ultimo_mensaje = select(Mensaje.id).where(
+        Mensaje.usuario_id == user_id, Mensaje.remitente == "user"
+    ).order_by(desc(Mensaje.creado_en), desc(Mensaje.id)).limit(1).scalar_subquery()
+    ultimo_analisis = select(Analisis.id).where(
+        Analisis.usuario_id == user_id
+    ).order_by(desc(Analisis.creado_en), desc(Analisis.id)).limit(1).scalar_subquery()
+    return tuple(db.execute(select(ultimo_mensaje, ultimo_analisis)).one())
+
+
+def get_deep_analysis(db: Session, user_id: int, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Análisis profundo cacheado por usuario (`app.db.cache.deep_analysis_cache`).
+
+    La clave es el último mensaje y el último análisis del usuario: sin cambios se devuelve
+    el resultado guardado; con mensajes nuevos solo se leen esos y se suman a la ventana
+    (restando los que salen de ella). Si la ventana tenía mensajes sin análisis guardado
+    que pueden haberse analizado después, se recalcula entera.
+    """
+    limit = limit or settings.DEEP_ANALYSIS_WINDOW
+    if not settings.CACHE_ENABLED:
+        return perform_deep_analysis(db, user_id, limit)
+
+    version = deep_analysis_cache.version(user_id)
+    clave = (*_deep_cache_key(db, user_id), limit)
+    if clave[0] is None:
+        return {"message": "No hay mensajes para analizar.", "status_code": 404}
+
+    entrada = deep_analysis_cache.entry(user_id)
+    if entrada is not None and entrada[0] == clave:
+        deep_analysis_cache.record("hits")
+        return entrada[1].result()
+
+    window = None
+    if entrada is not None and entrada[0][2] == limit and entrada[1].can_extend(entrada[0][1] == clave[1]):
+        window = entrada[1].copy()
+        newest = window.newest
+        if window.extend(_deep_rows(db, user_id, limit, after=(newest["creado_en"], newest["mensaje_id"]))):
+            deep_analysis_cache.record("incremental")
         else:
-            sty_data[a.get("style", "neutro")] = a.get("style_score", 0)
-        
-        barras_emociones.append(emo_data)
-        barras_estilos.append(sty_data)
-
-    # Tabla: detalle por mensaje
-    tabla = []
-    for idx, (m, a) in enumerate(zip(mensajes, analisis_individual)):
-        tabla.append({
-            "mensaje": m.texto,
-            "emocion": a.get("emotion", "neutro"),
-            "emocion_score": a.get("emotion_score", 0),
-            "estilo": a.get("style", "neutro"),
-            "estilo_score": a.get("style_score", 0),
-            "distribucion_emociones": a.get("emotion_distribution", []),
-            "distribucion_estilos": a.get("style_distribution", [])
-        })
-
-    # Insights automáticos
-    insights = {}
-    if avg_emotions:
-        insights["emocion_mas_frecuente"] = max(avg_emotions.items(), key=lambda x: x[1])[0]
-    if avg_styles:
-        insights["estilo_mas_frecuente"] = max(avg_styles.items(), key=lambda x: x[1])[0]
-    if tabla:
-        insights["emocion_mas_alta"] = max(tabla, key=lambda x: x["emocion_score"])["emocion"]
-        insights["estilo_mas_alto"] = max(tabla, key=lambda x: x["estilo_score"])["estilo"]
-
-    # Preparar datos para el frontend - mantener como porcentajes
-    average_emotion_distribution = [{"emotion": emo, "score": score} for emo, score in avg_emotions.items()]
-    average_style_distribution = [{"style": sty, "score": score} for sty, score in avg_styles.items()]
-    
-    # Generar tendencias emocionales
-    emotion_trends = []
-    emotion_counts = {}
-    for a in analisis_individual:
-        emotion = a.get("emotion", "neutro")
-        emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-    
-    for emotion, count in emotion_counts.items():
-        emotion_trends.append({
-            "emotion": emotion,
-            "count": count,
-            "percentage": round((count / len(analisis_individual)) * 100, 1)
-        })
-    
-    # Convertir el resultado al formato esperado por el frontend
-    return {
-        "total_messages": len(analisis_individual),
-        "average_emotion_score": sum(a.get("emotion_score", 0) for a in analisis_individual) / len(analisis_individual) if analisis_individual else 0,
-        "average_style_score": sum(a.get("style_score", 0) for a in analisis_individual) / len(analisis_individual) if analisis_individual else 0,
-        "emotion_trend": [
-            {
-                "date": mensajes[i].creado_en.strftime("%Y-%m-%d"),
-                "emotion": a.get("emotion", "neutro"),
-                "score": a.get("emotion_score", 0)
-            }
-            for i, a in enumerate(analisis_individual)
-        ],
-        "style_trend": [
-            {
-                "date": mensajes[i].creado_en.strftime("%Y-%m-%d"),
-                "style": a.get("style", "neutro"),
-                "score": a.get("style_score", 0)
-            }
-            for i, a in enumerate(analisis_individual)
-        ],
-        "risk_assessment": {
-            "high_risk_messages": len([a for a in analisis_individual if a.get("priority") == "alta" or a.get("priority") == "crítica"]),
-            "medium_risk_messages": len([a for a in analisis_individual if a.get("priority") == "media"]),
-            "low_risk_messages": len([a for a in analisis_individual if a.get("priority") == "baja" or a.get("priority") == "normal"])
-        },
-        "recommendations": generate_recommendations(
-            insights.get("emocion_mas_frecuente", "neutro"),
-            avg_emotions.get(insights.get("emocion_mas_frecuente", "neutro"), 0),
-            insights.get("estilo_mas_frecuente", "neutro"),
-            avg_styles.get(insights.get("estilo_mas_frecuente", "neutro"), 0),
-            "media"  # Prioridad promedio
-        ).get("immediate_actions", [])
-    }
+            window = None
+
+    if window is None:
+        deep_analysis_cache.record("misses")
+        rows = _deep_rows(db, user_id, limit)
+        if not rows:
+            return {"message": "No hay mensajes para analizar.", "status_code": 404}
+        window = DeepAnalysisWindow(rows, limit)
+
+    deep_analysis_cache.set(user_id, clave, window, version)
+    return window.result()
 
 
 def generate_bot_reply(analysis: Dict[str, Any]) -> str:
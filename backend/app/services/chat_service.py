@@ -8,6 +8,8 @@ from sqlalchemy.orm import Session
 
 from app.services.analysis_service import analyze_text
 from app.db import crud
+from app.db.archive import load_archived_messages
+from app.services.similarity_service import index_messages
 from app.schemas.message import MessageCreate
 from app.schemas.analysis_record import AnalysisCreate, AnalysisRecord
 
@@ -232,7 +234,6 @@ def save_chat_and_analysis(
         
         # Crear el análisis asociado al mensaje del usuario
         from app.db.models import Analisis
-        import json
         
         # Obtener el análisis completo del texto
         complete_analysis = analyze_text(user_text)
@@ -263,16 +264,16 @@ def save_chat_and_analysis(
             mensaje_id=user_msg_db.id,
             emocion=meta["detected_emotion"],
             emocion_score=meta["emotion_score"],
-            distribucion_emociones=json.dumps(complete_analysis.get("emotion_distribution", [])),
+            distribucion_emociones=complete_analysis.get("emotion_distribution", []),
             estilo=meta["detected_style"],
             estilo_score=meta["style_score"],
-            distribucion_estilos=json.dumps(complete_analysis.get("style_distribution", [])),
+            distribucion_estilos=complete_analysis.get("style_distribution", []),
             prioridad=meta["priority"],
             alerta=meta["alert"],
             razon_alerta=meta["alert_reason"],
-            recomendaciones=json.dumps(recommendations),
-            resumen=json.dumps(summary),
-            insights_detallados=json.dumps(detailed_insights),
+            recomendaciones=recommendations,
+            resumen=summary,
+            insights_detallados=detailed_insights,
             modelo_utilizado="emotion_style_analysis_v2",
             confianza_analisis=0.85,
             tiempo_procesamiento=0.5
@@ -280,6 +281,7 @@ def save_chat_and_analysis(
         db.add(db_analysis)
         db.commit()
         db.refresh(db_analysis)
+        index_messages([(user_msg_db.id, user_id, user_msg_db.texto)])
         
         return {
             "user_message_id": user_msg_db.id,
@@ -302,7 +304,9 @@ def generate_report_for_session(session_id: int, db: Session):
     session = db.query(SesionChat).filter(SesionChat.id == session_id).first()
     if not session:
         raise Exception("Sesión no encontrada")
-    mensajes = db.query(Mensaje).filter(Mensaje.sesion_id == session_id).order_by(Mensaje.creado_en.asc()).all()
+    mensajes = load_archived_messages(db, session_id)
+    if mensajes is None:
+        mensajes = db.query(Mensaje).filter(Mensaje.sesion_id == session_id).order_by(Mensaje.creado_en.asc()).all()
     textos = [m.texto for m in mensajes]
     if not textos:
         resumen = "No hay mensajes en la sesión."
@@ -333,44 +337,45 @@ def create_notification(db: Session, usuario_id: int, titulo: str, mensaje: str,
     db.commit()
     return noti
 
+def _notification(usuario_id: int, titulo: str, mensaje: str, tipo: str, metadatos: dict) -> dict:
+    return {"usuario_id": usuario_id, "titulo": titulo, "mensaje": mensaje, "tipo": tipo, "metadatos": metadatos, "enviada": True}
+
 def notify_intervention(db: Session, intervencion):
-    # Notificar al estudiante y al tutor sobre la intervención
-    create_notification(
-        db,
-        usuario_id=intervencion.usuario_id,
-        titulo="Nueva intervención del tutor",
-        mensaje=f"El tutor ha realizado una intervención: {intervencion.mensaje[:50]}...",
-        tipo="intervencion",
-        metadatos={"intervencion_id": intervencion.id}
-    )
-    create_notification(
-        db,
-        usuario_id=intervencion.tutor_id,
-        titulo="Intervención registrada",
-        mensaje=f"Has realizado una intervención para el estudiante {intervencion.usuario_id}.",
-        tipo="intervencion",
-        metadatos={"intervencion_id": intervencion.id}
-    )
+    # Notificar al estudiante y al tutor sobre la intervención (un solo commit)
+    metadatos = {"intervencion_id": intervencion.id}
+    crud.create_notifications_bulk(db, [
+        _notification(
+            intervencion.usuario_id,
+            "Nueva intervención del tutor",
+            f"El tutor ha realizado una intervención: {intervencion.mensaje[:50]}...",
+            "intervencion", metadatos
+        ),
+        _notification(
+            intervencion.tutor_id,
+            "Intervención registrada",
+            f"Has realizado una intervención para el estudiante {intervencion.usuario_id}.",
+            "intervencion", metadatos
+        ),
+    ])
 
 def notify_alert(db: Session, alerta):
-    # Notificar al tutor asignado y al estudiante sobre la alerta
+    # Notificar al tutor asignado y al estudiante sobre la alerta (un solo commit)
+    metadatos = {"alerta_id": alerta.id}
+    notificaciones = []
     if alerta.tutor_asignado:
-        create_notification(
-            db,
-            usuario_id=alerta.tutor_asignado,
-            titulo="Nueva alerta emocional",
-            mensaje=f"Se ha generado una alerta para el estudiante {alerta.usuario_id}.",
-            tipo="alerta",
-            metadatos={"alerta_id": alerta.id}
-        )
-    create_notification(
-        db,
-        usuario_id=alerta.usuario_id,
-        titulo="Alerta generada",
-        mensaje="Se ha generado una alerta emocional en tu sesión.",
-        tipo="alerta",
-        metadatos={"alerta_id": alerta.id}
-    )
+        notificaciones.append(_notification(
+            alerta.tutor_asignado,
+            "Nueva alerta emocional",
+            f"Se ha generado una alerta para el estudiante {alerta.usuario_id}.",
+            "alerta", metadatos
+        ))
+    notificaciones.append(_notification(
+        alerta.usuario_id,
+        "Alerta generada",
+        "Se ha generado una alerta emocional en tu sesión.",
+        "alerta", metadatos
+    ))
+    crud.create_notifications_bulk(db, notificaciones)
 
 if __name__ == "__main__":
     # Mensaje actual del usuario
@@ -0,0 +1,141 @@
+# backend/app/services/export_service.py
+"""
+Exportación en streaming de transcripciones e historial de análisis.
+
+Las filas salen por sesión: las sesiones en caliente se leen con un cursor de servidor
+(`yield_per`) en orden de id y las archivadas línea a línea desde su segmento
+(`app.db.archive.stream_segment`) en el orden en que se escribieron, (creado_en, id), que
+coincide con el de id salvo mensajes insertados con fecha anterior. Ambos flujos se
+intercalan por sesión sin cargarlos en memoria. Cada registro lleva `sesion_id` e `id`, y
+`desde=(sesion_id, id)` reanuda justo después de él.
+"""
+
+import csv
+import heapq
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.archive import stream_segment
+from app.db.models import Mensaje, Analisis, SesionChat, SegmentoArchivo
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+MESSAGE_FIELDS = ("id", "sesion_id", "usuario_id", "remitente", "tipo_mensaje", "texto", "creado_en")
+ANALYSIS_FIELDS = (
+    "emocion", "emocion_score", "estilo", "estilo_score", "prioridad", "alerta", "razon_alerta",
+    "distribucion_emociones", "distribucion_estilos", "recomendaciones", "resumen", "modelo_utilizado",
+)
+EXPORT_FIELDS = MESSAGE_FIELDS + ANALYSIS_FIELDS
+
+
+def _value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+def _hot_records(db: Session, sesiones, desde: Tuple[int, int], solo_analisis: bool) -> Iterator[Dict[str, Any]]:
+    columns = [getattr(Mensaje, f) for f in MESSAGE_FIELDS] + [getattr(Analisis, f) for f in ANALYSIS_FIELDS]
+    query = select(*columns).outerjoin(
+        Analisis, Analisis.mensaje_id == Mensaje.id
+    ).where(
+        # IN sobre las sesiones (no JOIN) para recorrer idx_mensaje_sesion_creado en orden de sesión
+        Mensaje.sesion_id.in_(sesiones.where(~SesionChat.id.in_(select(SegmentoArchivo.sesion_id)))),
+        tuple_(Mensaje.sesion_id, Mensaje.id) > desde
+    ).order_by(Mensaje.sesion_id, Mensaje.id).execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    if solo_analisis:
+        query = query.where(Analisis.id.isnot(None))
+
+    for row in db.execute(query):
+        yield {field: _value(value) for field, value in zip(EXPORT_FIELDS, row)}
+
+
+def _archived_records(db: Session, sesiones, desde: Tuple[int, int], solo_analisis: bool) -> Iterator[Dict[str, Any]]:
+    segmentos = select(SegmentoArchivo.sesion_id, SegmentoArchivo.ruta).where(
+        SegmentoArchivo.sesion_id.in_(sesiones),
+        SegmentoArchivo.sesion_id >= desde[0]
+    ).order_by(SegmentoArchivo.sesion_id).execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+
+    for sesion_id, ruta in db.execute(segmentos):
+        # Un segmento es una sesión: se reanuda dentro del propio segmento, en su orden
+        for mensaje, analisis in stream_segment(ruta, desde[1] if sesion_id == desde[0] else None):
+            if solo_analisis and analisis is None:
+                continue
+            record = {field: _value(mensaje.get(field)) for field in MESSAGE_FIELDS}
+            record.update({field: _value((analisis or {}).get(field)) for field in ANALYSIS_FIELDS})
+            yield record
+
+
+def iter_export_records(db: Session, sesiones, desde: Optional[Tuple[int, int]] = None,
+                        solo_analisis: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Registros (mensaje + análisis) de las sesiones de `sesiones` (un SELECT de SesionChat.id),
+    por sesión y a partir de la posición `desde`, excluida.
+    """
+    desde = desde or (0, 0)
+    return heapq.merge(
+        _hot_records(db, sesiones, desde, solo_analisis),
+        _archived_records(db, sesiones, desde, solo_analisis),
+        # Una sesión está entera en caliente o entera archivada: basta intercalar por sesión
+        key=lambda r: r["sesion_id"]
+    )
+
+
+def _ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+
+def _csv(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for record in records:
+        # Listas y objetos (distribuciones, recomendaciones) como JSON dentro de la celda
+        writer.writerow([
+            json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v
+            for v in (record[f] for f in EXPORT_FIELDS)
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def stream_export(records: Iterable[Dict[str, Any]], formato: str, comprimir: bool = False) -> Iterator[bytes]:
+    """
+    Serializa los registros en NDJSON o CSV, opcionalmente en gzip, en bloques de
+    `EXPORT_BATCH_SIZE` filas: la memoria no depende del tamaño de la exportación.
+    """
+    lines = _csv(records) if formato == "csv" else _ndjson(records)
+    gzip = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if comprimir else None
+
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= settings.EXPORT_BATCH_SIZE:
+            chunk = "".join(batch).encode("utf-8")
+            batch.clear()
+            chunk = gzip.compress(chunk) if gzip else chunk
+            if chunk:
+                yield chunk
+    chunk = "".join(batch).encode("utf-8")
+    if gzip:
+        chunk = gzip.compress(chunk) + gzip.flush()
+    if chunk:
+        yield chunk
+
+
+def export_response(records: Iterable[Dict[str, Any]], formato: str, comprimir: bool, nombre: str) -> StreamingResponse:
+    """Respuesta de descarga en streaming (`<nombre>.ndjson|csv[.gz]`)."""
+    filename = f"{nombre}.{formato}" + (".gz" if comprimir else "")
+    return StreamingResponse(
+        stream_export(records, formato, comprimir),
+        media_type="application/gzip" if comprimir else EXPORT_FORMATS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -8,8 +8,8 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime
 from app.core.config import settings
 from app.core.logging import logger
-from app.db.session import SessionLocal
-from app.db import crud
+from app.db.session import AsyncSessionLocal
+from app.db import crud_async
 from app.schemas.reporte import ReporteCreate
 
 
@@ -23,19 +23,19 @@ class ReporteService:
     
     async def generar_reporte_sesion(self, sesion_id: int, tutor_id: int, notas_tutor: Optional[str] = None, motivo_finalizacion: Optional[str] = None) -> Dict[str, Any]:
         """Genera un reporte completo de una sesión usando Gemini."""
-        db = SessionLocal()
+        db = AsyncSessionLocal()
         try:
             # Obtener información de la sesión
-            sesion = crud.get_chat_session(db, sesion_id)
+            sesion = await crud_async.get_chat_session(db, sesion_id)
             if not sesion:
                 raise ValueError(f"Sesión {sesion_id} no encontrada")
             
             # Obtener mensajes con análisis
-            mensajes = crud.get_mensajes_sesion_para_reporte(db, sesion_id)
+            mensajes = await crud_async.get_mensajes_sesion_para_reporte(db, sesion_id)
             
             # Obtener información del tutor y estudiante
-            tutor = crud.get_user(db, tutor_id)
-            estudiante = crud.get_user(db, sesion.usuario_id)
+            tutor = await crud_async.get_user(db, tutor_id)
+            estudiante = await crud_async.get_user(db, sesion.usuario_id)
             
             if not tutor or not estudiante:
                 raise ValueError("Tutor o estudiante no encontrado")
@@ -76,10 +76,10 @@ class ReporteService:
                 }
             }
             
-            reporte = crud.create_reporte(db, reporte_data)
+            reporte = await crud_async.create_reporte(db, reporte_data)
             
             # Actualizar estado de la sesión
-            crud.update_chat_session(db, sesion_id, {
+            await crud_async.update_chat_session(db, sesion_id, {
                 "estado": "cerrada",
                 "finalizada_en": datetime.utcnow()
             })
@@ -99,7 +99,7 @@ class ReporteService:
             logger.error(f"Error generando reporte para sesión {sesion_id}: {e}")
             raise
         finally:
-            db.close()
+            await db.close()
     
     async def _generar_contenido_reporte(self, mensajes: List[Dict], tutor: Any, estudiante: Any, sesion: Any, notas_tutor: Optional[str], motivo_finalizacion: Optional[str]) -> str:
         """Genera el contenido del reporte usando Gemini."""
@@ -0,0 +1,358 @@
+# backend/app/services/similarity_service.py
+"""
+Búsqueda de mensajes similares con LSH sobre los vectores TF-IDF del modelo de emociones.
+
+Cada mensaje analizado se vectoriza con el `TfidfVectorizer` del pipeline de emociones,
+se proyecta a `SIMILARITY_DIM` dimensiones con una proyección aleatoria (conserva el
+coseno de forma aproximada) y se firma con `SIMILARITY_TABLES` tablas de hiperplanos
+aleatorios de `SIMILARITY_BITS` bits. Una consulta solo puntúa los mensajes que comparten
+cubeta con ella en alguna tabla (más las cubetas a un bit de distancia si faltan candidatos).
+
+El índice se guarda en `SIMILARITY_INDEX_DIR` como arrays binarios de solo-añadir
+(ids, estudiantes, vectores, firmas) que se cargan con `numpy.memmap`; `meta.json`
+registra cuántas filas son válidas y la huella del vectorizador. Si el modelo cambia,
+el índice se descarta y se reconstruye con `build_similarity_index.py`.
+
+Varios procesos (workers) pueden escribir en el mismo directorio: cada escritura toma
+un bloqueo exclusivo sobre `index.lock` (`fcntl.flock`) y, si otro proceso añadió filas
+desde la última carga, recarga antes de añadir. Sin `fcntl` (Windows) solo debe escribir
+un proceso; el resto puede consultar. Las consultas comparan el `count` de `meta.json`
+con el cargado y recargan si otro proceso añadió filas.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: un único proceso escritor
+    fcntl = None
+
+# (nombre de archivo, dtype, columnas) de cada array persistido; columnas None = vector 1D
+_ARRAYS = {
+    "ids": (np.int64, None),
+    "usuarios": (np.int64, None),
+    "vectores": (np.float32, "dim"),
+    "firmas": (np.uint32, "tables"),
+}
+
+# Por debajo de MIN_CANDIDATES * k candidatos se sondean también las cubetas a un bit de distancia
+MIN_CANDIDATES = 20
+
+# Las filas añadidas desde la última carga se consultan en memoria hasta este tamaño
+COMPACT_AFTER = 4096
+
+
+class SimilarityIndex:
+    """Índice LSH persistente de mensajes; seguro entre hilos y, con `fcntl`, entre procesos."""
+
+    def __init__(self, directory: str, vectorizer, dim: int = 256, tables: int = 16, bits: int = 8, seed: int = 13):
+        if not 1 <= bits <= 32:
+            raise ValueError("bits debe estar entre 1 y 32")
+        self.directory = directory
+        self.vectorizer = vectorizer
+        vocabulario = sorted((term, int(i)) for term, i in vectorizer.vocabulary_.items())
+        # Con un vocabulario menor que `dim` no se proyecta: se usa el TF-IDF tal cual
+        self.dim, self.tables, self.bits = min(dim, len(vocabulario)), tables, bits
+
+        rng = np.random.default_rng(seed)
+        if self.dim < len(vocabulario):
+            self._projection = (rng.standard_normal((len(vocabulario), self.dim)) / np.sqrt(self.dim)).astype(np.float32)
+        else:
+            self._projection = np.eye(self.dim, dtype=np.float32)
+        self._planes = rng.standard_normal((self.dim, tables * bits)).astype(np.float32)
+        self._weights = (np.uint32(1) << np.arange(bits, dtype=np.uint32))
+        self.fingerprint = hashlib.sha1(
+            json.dumps([vocabulario, dim, tables, bits, seed], ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with self._process_lock():
+            self._load()
+
+    # ---------- persistencia ----------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def _columns(self, spec) -> Tuple[int, ...]:
+        return () if spec is None else (getattr(self, spec),)
+
+    @contextmanager
+    def _process_lock(self):
+        """Bloqueo exclusivo entre procesos sobre `index.lock` (sin efecto si no hay `fcntl`)."""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, "index.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> Dict:
+        meta_path = os.path.join(self.directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return {}
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self) -> None:
+        tmp = os.path.join(self.directory, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"count": self.count, "fingerprint": self.fingerprint}, f)
+        os.replace(tmp, os.path.join(self.directory, "meta.json"))
+
+    def _load(self) -> None:
+        """
+        Mapea en memoria las filas válidas y prepara las tablas ordenadas por firma.
+        Se llama con el bloqueo entre procesos tomado.
+        """
+        meta = self._read_meta()
+
+        if meta.get("fingerprint") != self.fingerprint:
+            if meta:
+                logger.warning("Índice de similitud de otro vectorizador: se descarta", data={"directory": self.directory})
+            for name in _ARRAYS:
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            meta = {"count": 0}
+
+        self.count = meta["count"]
+        self._main = {}
+        for name, (dtype, spec) in _ARRAYS.items():
+            shape = (self.count,) + self._columns(spec)
+            # Filas escritas tras el último meta.json (escritura interrumpida): se recortan
+            # para que el siguiente append quede justo después de las válidas
+            size = self.count * int(np.prod(self._columns(spec), dtype=np.int64)) * np.dtype(dtype).itemsize
+            if os.path.exists(self._path(name)) and os.path.getsize(self._path(name)) > size:
+                os.truncate(self._path(name), size)
+            if self.count:
+                self._main[name] = np.memmap(self._path(name), dtype=dtype, mode="r", shape=shape)
+            else:
+                self._main[name] = np.empty(shape, dtype=dtype)
+
+        firmas = self._main["firmas"]
+        self._order = [np.argsort(firmas[:, t], kind="stable") for t in range(self.tables)]
+        self._sorted = [firmas[order, t] for t, order in enumerate(self._order)]
+        self._id_order = np.argsort(self._main["ids"], kind="stable")
+        self._sorted_ids = self._main["ids"][self._id_order]
+        self._tail = {name: [] for name in _ARRAYS}
+        self._tail_arrays = None
+
+    def _tail_view(self) -> Dict[str, np.ndarray]:
+        if self._tail_arrays is None:
+            self._tail_arrays = {
+                name: np.array(self._tail[name], dtype=dtype).reshape((-1,) + self._columns(spec))
+                for name, (dtype, spec) in _ARRAYS.items()
+            }
+        return self._tail_arrays
+
+    def refresh(self) -> bool:
+        """Recarga el índice si otro proceso lo cambió desde la última carga; indica si recargó."""
+        if self._read_meta().get("count", 0) == self.count:
+            return False
+        with self._lock, self._process_lock():
+            if self._read_meta().get("count", 0) != self.count:
+                self._load()
+        return True
+
+    # ---------- vectores ----------
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Vectores proyectados y normalizados (filas a cero si el texto no tiene términos conocidos)."""
+        from app.utils.text_processing import limpiar_texto
+
+        tfidf = self.vectorizer.transform([limpiar_texto(t) for t in texts])
+        vectors = np.asarray(tfidf @ self._projection, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    def _signatures(self, vectors: np.ndarray) -> np.ndarray:
+        bits = (vectors @ self._planes > 0).reshape(len(vectors), self.tables, self.bits)
+        return (bits * self._weights).sum(axis=2, dtype=np.uint64).astype(np.uint32)
+
+    def contains(self, mensaje_id: int) -> bool:
+        return self.vector(mensaje_id) is not None
+
+    def vector(self, mensaje_id: int) -> Optional[np.ndarray]:
+        """Vector indexado de un mensaje, o None si no está en el índice."""
+        i = np.searchsorted(self._sorted_ids, mensaje_id)
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == mensaje_id:
+            return np.asarray(self._main["vectores"][self._id_order[i]])
+        tail = self._tail_view()
+        hits = np.flatnonzero(tail["ids"] == mensaje_id)
+        return tail["vectores"][hits[0]] if len(hits) else None
+
+    # ---------- escritura ----------
+
+    def add(self, items: Iterable[Tuple[int, int, str]]) -> int:
+        """Indexa (mensaje_id, usuario_id, texto); omite los ya indexados y los textos sin términos."""
+        with self._lock, self._process_lock():
+            if self._read_meta().get("count", 0) != self.count:
+                # Otro proceso añadió filas (o descartó el índice) desde la última carga
+                self._load()
+            items = list({item[0]: item for item in items if not self.contains(item[0])}.values())
+            if not items:
+                return 0
+            vectors = self.embed([texto for _, _, texto in items])
+            keep = np.flatnonzero(np.linalg.norm(vectors, axis=1) > 0)
+            if not len(keep):
+                return 0
+
+            rows = {
+                "ids": np.array([items[i][0] for i in keep], dtype=np.int64),
+                "usuarios": np.array([items[i][1] for i in keep], dtype=np.int64),
+                "vectores": vectors[keep],
+                "firmas": self._signatures(vectors[keep]),
+            }
+            for name, values in rows.items():
+                with open(self._path(name), "ab") as f:
+                    f.write(np.ascontiguousarray(values).tobytes())
+                self._tail[name].extend(values)
+            self.count += len(keep)
+            self._write_meta()
+            self._tail_arrays = None
+
+            if len(self._tail["ids"]) >= COMPACT_AFTER:
+                self._load()
+            return len(keep)
+
+    # ---------- consulta ----------
+
+    def _candidates(self, firma: np.ndarray, probe: bool) -> Tuple[np.ndarray, np.ndarray]:
+        """Posiciones (principal, cola) que comparten cubeta; con `probe`, también a un bit de distancia."""
+        tail = self._tail_view()
+        main, extra = [], []
+        for t in range(self.tables):
+            codes = [firma[t]]
+            if probe:
+                codes += [firma[t] ^ np.uint32(1 << b) for b in range(self.bits)]
+            for code in codes:
+                lo, hi = np.searchsorted(self._sorted[t], code, side="left"), np.searchsorted(self._sorted[t], code, side="right")
+                main.append(self._order[t][lo:hi])
+                extra.append(np.flatnonzero(tail["firmas"][:, t] == code))
+        return np.unique(np.concatenate(main)) if main else np.empty(0, np.int64), np.unique(np.concatenate(extra))
+
+    def query(self, vector: np.ndarray, k: int = 10, usuarios: Optional[Sequence[int]] = None,
+              exclude: Optional[int] = None) -> Tuple[List[Tuple[int, float]], int]:
+        """
+        Top-k (mensaje_id, similitud coseno) de los estudiantes `usuarios` (None = todos).
+        Devuelve también el número de candidatos puntuados.
+        """
+        self.refresh()
+        vector = np.asarray(vector, dtype=np.float32)
+        firma = self._signatures(vector[None, :])[0]
+        scope = None if usuarios is None else np.asarray(list(usuarios), dtype=np.int64)
+        tail = self._tail_view()
+        segments = [self._main, tail]
+
+        def score(positions_by_segment):
+            ids, scores = [], []
+            for segment, positions in zip(segments, positions_by_segment):
+                if scope is not None and len(positions):
+                    positions = positions[np.isin(segment["usuarios"][positions], scope)]
+                if exclude is not None and len(positions):
+                    positions = positions[segment["ids"][positions] != exclude]
+                if len(positions):
+                    ids.append(segment["ids"][positions])
+                    scores.append(np.asarray(segment["vectores"][positions]) @ vector)
+            if not ids:
+                return np.empty(0, np.int64), np.empty(0, np.float32)
+            return np.concatenate(ids), np.concatenate(scores)
+
+        ids, scores = score(self._candidates(firma, probe=False))
+        if len(ids) < MIN_CANDIDATES * k:
+            ids, scores = score(self._candidates(firma, probe=True))
+        if len(ids) < k:
+            # Pocas coincidencias LSH: recorrido exacto del alcance
+            ids, scores = score([np.arange(len(segment["ids"])) for segment in segments])
+
+        top = np.argsort(-scores, kind="stable")[:k] if len(scores) <= 4 * k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(ids[i]), round(float(scores[i]), 4)) for i in top], len(ids)
+
+
+_index: Optional[SimilarityIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_similarity_index() -> Optional[SimilarityIndex]:
+    """Índice global (lazy); None si está desactivado o el modelo de emociones no está cargado."""
+    global _index
+    if not settings.SIMILARITY_INDEX_ENABLED:
+        return None
+    with _index_lock:
+        if _index is None:
+            from app.models.emotion import get_vectorizer
+
+            vectorizer = get_vectorizer()
+            if vectorizer is None:
+                return None
+            _index = SimilarityIndex(
+                settings.SIMILARITY_INDEX_DIR, vectorizer,
+                dim=settings.SIMILARITY_DIM, tables=settings.SIMILARITY_TABLES, bits=settings.SIMILARITY_BITS
+            )
+        return _index
+
+
+def index_messages(items: List[Tuple[int, int, str]]) -> int:
+    """Añade mensajes analizados al índice; los errores se registran sin interrumpir el flujo de chat."""
+    index = get_similarity_index()
+    if index is None or not items:
+        return 0
+    try:
+        return index.add(items)
+    except Exception as e:
+        logger.error("Error indexando mensajes para similitud", error=e, data={"count": len(items)})
+        return 0
+
+
+def find_similar_messages(db, index: SimilarityIndex, tutor_id: int, mensaje, k: int = 10) -> Dict:
+    """Mensajes de los estudiantes del tutor más parecidos a `mensaje`, con la latencia de la búsqueda."""
+    from sqlalchemy import select
+    from app.db.models import Mensaje, SesionChat
+
+    t0 = perf_counter()
+    alumnos = list(db.scalars(select(SesionChat.usuario_id).where(SesionChat.tutor_id == tutor_id).distinct()))
+    # Filas que otros workers hayan añadido (incluido, quizá, el propio mensaje)
+    index.refresh()
+    vector = index.vector(mensaje.id)
+    if vector is None:
+        vector = index.embed([mensaje.texto])[0]
+
+    t1 = perf_counter()
+    vecinos, candidatos = index.query(vector, k=k, usuarios=alumnos, exclude=mensaje.id) if vector.any() else ([], 0)
+    latencia_indice = round((perf_counter() - t1) * 1000, 3)
+
+    mensajes = {m.id: m for m in db.query(Mensaje).filter(Mensaje.id.in_([mid for mid, _ in vecinos]))} if vecinos else {}
+    resultados = [
+        {
+            "mensaje_id": mid,
+            "estudiante_id": mensajes[mid].usuario_id,
+            "sesion_id": mensajes[mid].sesion_id,
+            "texto": mensajes[mid].texto,
+            "similitud": similitud,
+            "creado_en": mensajes[mid].creado_en,
+        }
+        # Los mensajes archivados o borrados siguen en el índice pero ya no se devuelven
+        for mid, similitud in vecinos if mid in mensajes
+    ]
+    return {
+        "mensaje_id": mensaje.id,
+        "resultados": resultados,
+        "candidatos": candidatos,
+        "latencia_ms": {"indice": latencia_indice, "total": round((perf_counter() - t0) * 1000, 3)},
+    }
@@ -0,0 +1,136 @@
+# backend/app/services/timeline_service.py
+"""
+Serie emocional de un estudiante con resolución adaptada a un presupuesto de puntos.
+
+Los puntos por mensaje son las filas de `analisis`; las series por hora, día y semana
+se mantienen al escribir en `student_emotion_rollups` (`app.db.stats`). Ambos niveles
+ubican cada análisis por `Analisis.creado_en`. Para un rango se usa la resolución más fina
+que cabe en `puntos`: cada intento lee como mucho `puntos + 1` filas, así que el coste
+depende del presupuesto y no del histórico. Si ni la serie semanal cabe, se fusionan
+semanas consecutivas.
+
+Los análisis de sesiones archivadas ya no están en `analisis` pero sí en las series: si
+alguna sesión archivada del estudiante solapa el rango, se parte de la serie por hora.
+"""
+
+from datetime import datetime
+from math import ceil
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.db.models import Analisis, SerieEmocionalEstudiante, SesionChat, SegmentoArchivo
+from app.db.stats import ROLLUP_RESOLUTIONS
+
+
+def _mean(suma: float, n: int) -> Optional[float]:
+    return round(suma / n, 2) if n else None
+
+
+def _dominant(histograma: Optional[Dict[str, int]]) -> Optional[str]:
+    return max(histograma.items(), key=lambda x: x[1])[0] if histograma else None
+
+
+def _merge(filas: List[SerieEmocionalEstudiante]) -> Dict[str, Any]:
+    """Suma periodos consecutivos en un único punto."""
+    emociones: Dict[str, int] = {}
+    estilos: Dict[str, int] = {}
+    for fila in filas:
+        for emocion, conteo in (fila.emociones or {}).items():
+            emociones[emocion] = emociones.get(emocion, 0) + conteo
+        for estilo, conteo in (fila.estilos or {}).items():
+            estilos[estilo] = estilos.get(estilo, 0) + conteo
+    return {
+        "inicio": filas[0].inicio,
+        "analisis": sum(f.analisis_count for f in filas),
+        "emocion_score": _mean(sum(f.emocion_score_suma for f in filas), sum(f.emocion_score_n for f in filas)),
+        "estilo_score": _mean(sum(f.estilo_score_suma for f in filas), sum(f.estilo_score_n for f in filas)),
+        "emocion": _dominant(emociones),
+        "estilo": _dominant(estilos),
+        "alertas": sum(f.alertas for f in filas),
+    }
+
+
+def _raw_points(db: Session, usuario_id: int, desde: datetime, hasta: datetime, limit: int) -> List[Dict[str, Any]]:
+    filas = db.query(
+        Analisis.mensaje_id, Analisis.creado_en, Analisis.emocion, Analisis.emocion_score,
+        Analisis.estilo, Analisis.estilo_score, Analisis.alerta
+    ).filter(
+        Analisis.usuario_id == usuario_id,
+        Analisis.creado_en >= desde,
+        Analisis.creado_en < hasta
+    ).order_by(Analisis.creado_en, Analisis.id).limit(limit).all()
+    return [
+        {
+            "inicio": fila.creado_en,
+            "mensaje_id": fila.mensaje_id,
+            "analisis": 1,
+            "emocion_score": fila.emocion_score,
+            "estilo_score": fila.estilo_score,
+            "emocion": fila.emocion,
+            "estilo": fila.estilo,
+            "alertas": int(bool(fila.alerta)),
+        }
+        for fila in filas
+    ]
+
+
+def _archived_in_range(db: Session, usuario_id: int, desde: datetime, hasta: datetime) -> bool:
+    """Si alguna sesión archivada del estudiante puede tener análisis en [desde, hasta)."""
+    return db.query(SegmentoArchivo.sesion_id).join(
+        SesionChat, SesionChat.id == SegmentoArchivo.sesion_id
+    ).filter(
+        SesionChat.usuario_id == usuario_id,
+        SesionChat.iniciada_en < hasta,
+        or_(SesionChat.finalizada_en.is_(None), SesionChat.finalizada_en >= desde)
+    ).first() is not None
+
+
+def _rollups(db: Session, usuario_id: int, resolucion: str, desde: datetime, hasta: datetime,
+             limit: Optional[int] = None) -> List[SerieEmocionalEstudiante]:
+    # Incluye el periodo que contiene `desde` aunque empiece antes
+    query = db.query(SerieEmocionalEstudiante).filter(
+        SerieEmocionalEstudiante.usuario_id == usuario_id,
+        SerieEmocionalEstudiante.resolucion == resolucion,
+        SerieEmocionalEstudiante.inicio >= ROLLUP_RESOLUTIONS[resolucion](desde),
+        SerieEmocionalEstudiante.inicio < hasta,
+        SerieEmocionalEstudiante.analisis_count > 0
+    ).order_by(SerieEmocionalEstudiante.inicio)
+    return query.limit(limit).all() if limit is not None else query.all()
+
+
+def get_student_timeline(db: Session, usuario_id: int, desde: datetime, hasta: datetime, puntos: int = 200) -> Dict[str, Any]:
+    """
+    Serie emocional del estudiante en [desde, hasta) con como mucho `puntos` puntos.
+    `resolucion` indica la granularidad usada ("mensaje", "hora", "dia" o "semana") y
+    `agrupacion` cuántos periodos se fusionaron en cada punto. Si una sesión archivada
+    solapa el rango, la resolución mínima es "hora".
+    """
+    t0 = perf_counter()
+    resolucion, agrupacion = "mensaje", 1
+
+    # Con sesiones archivadas en el rango los puntos por mensaje estarían incompletos
+    archivado = _archived_in_range(db, usuario_id, desde, hasta)
+    serie = [] if archivado else _raw_points(db, usuario_id, desde, hasta, puntos + 1)
+    if archivado or len(serie) > puntos:
+        for resolucion in ROLLUP_RESOLUTIONS:
+            filas = _rollups(db, usuario_id, resolucion, desde, hasta, puntos + 1)
+            if len(filas) <= puntos:
+                break
+        else:
+            # Ni la serie semanal cabe: semanas consecutivas por punto
+            filas = _rollups(db, usuario_id, resolucion, desde, hasta)
+            agrupacion = ceil(len(filas) / puntos)
+        serie = [_merge(filas[i:i + agrupacion]) for i in range(0, len(filas), agrupacion)]
+
+    return {
+        "estudiante_id": usuario_id,
+        "desde": desde,
+        "hasta": hasta,
+        "resolucion": resolucion,
+        "agrupacion": agrupacion,
+        "puntos": serie,
+        "latencia_ms": round((perf_counter() - t0) * 1000, 3),
+    }
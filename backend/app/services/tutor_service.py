@@ -4,8 +4,15 @@ Servicios para el panel del tutor - Lógica de negocio robusta.
 """
 
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, and_, or_, desc, case
-from app.db.models import Usuario, SesionChat, Mensaje, Analisis, Alerta, Notificacion, Intervencion
+from sqlalchemy import func, and_, or_, desc, case, select
+from app.db.models import (
+    Usuario, SesionChat, Mensaje, Analisis, Alerta, Notificacion, Intervencion,
+    EstadisticasSesion, EstadisticasEstudianteDiarias, RolUsuario
+)
+from app.db.pagination import apply_keyset, split_page
+from app.db.cache import dashboard_cache
+from app.core.config import settings
+from app.core.logging import logger
 from app.schemas.tutor import (
     TutorDashboardResponse, 
     DashboardStats, 
@@ -13,31 +20,49 @@ from app.schemas.tutor import (
     RecentAlert,
     SessionStatsResponse,
     InterventionCreate,
-    InterventionResponse
+    InterventionResponse,
+    AnalysisSearchResponse
 )
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+from typing import Dict, List, Any, Optional, Tuple
 import json
 
+# Facetas de la búsqueda de análisis
+ANALYSIS_FACETS = ("emocion", "prioridad", "alerta")
+
 
 def get_tutor_dashboard_data(db: Session, tutor_id: int) -> TutorDashboardResponse:
     """
     Obtiene datos completos para el dashboard del tutor.
+
+    El snapshot se cachea por tutor y día (`app.db.cache`) y se invalida al confirmar
+    escrituras de sus sesiones, mensajes, alertas, intervenciones o notificaciones.
     """
-    # Estadísticas generales
     hoy = datetime.now().date()
+    if not settings.CACHE_ENABLED:
+        return _build_tutor_dashboard(db, tutor_id, hoy)
+
+    snapshot = dashboard_cache.get(tutor_id, hoy)
+    if snapshot is None:
+        version = dashboard_cache.version(tutor_id)
+        snapshot = _build_tutor_dashboard(db, tutor_id, hoy)
+        dashboard_cache.set(tutor_id, hoy, snapshot, version)
+    return snapshot
+
+
+def _build_tutor_dashboard(db: Session, tutor_id: int, hoy: date) -> TutorDashboardResponse:
+    # Rangos semiabiertos sobre las columnas (no func.date(col) == hoy) para usar los índices
+    inicio_hoy = datetime.combine(hoy, time.min)
+    inicio_manana = inicio_hoy + timedelta(days=1)
+    fecha_limite = datetime.now() - timedelta(days=7)
     
-    # Sesiones activas
-    sesiones_activas = db.query(SesionChat).filter(
-        SesionChat.tutor_id == tutor_id,
-        SesionChat.estado == "activa"
-    ).count()
-    
-    # Sesiones de hoy
-    sesiones_hoy = db.query(SesionChat).filter(
-        SesionChat.tutor_id == tutor_id,
-        func.date(SesionChat.iniciada_en) == hoy
-    ).count()
+    # Sesiones activas, de hoy y estudiantes activos (sesiones en los últimos 7 días) en una consulta
+    sesiones_activas, sesiones_hoy, estudiantes_activos = db.query(
+        func.count(case((SesionChat.estado == "activa", 1))),
+        func.count(case((and_(SesionChat.iniciada_en >= inicio_hoy, SesionChat.iniciada_en < inicio_manana), 1))),
+        func.count(func.distinct(case((SesionChat.iniciada_en >= fecha_limite, SesionChat.usuario_id)))),
+    ).filter(SesionChat.tutor_id == tutor_id).one()
     
     # Alertas pendientes
     alertas_pendientes = db.query(Alerta).filter(
@@ -45,23 +70,18 @@ def get_tutor_dashboard_data(db: Session, tutor_id: int) -> TutorDashboardRespon
         Alerta.revisada == False
     ).count()
     
-    # Estudiantes activos (con sesiones en los últimos 7 días)
-    fecha_limite = datetime.now() - timedelta(days=7)
-    estudiantes_activos = db.query(SesionChat.usuario_id).filter(
-        SesionChat.tutor_id == tutor_id,
-        SesionChat.iniciada_en >= fecha_limite
-    ).distinct().count()
-    
     # Mensajes de hoy
     mensajes_hoy = db.query(Mensaje).join(SesionChat).filter(
         SesionChat.tutor_id == tutor_id,
-        func.date(Mensaje.creado_en) == hoy
+        Mensaje.creado_en >= inicio_hoy,
+        Mensaje.creado_en < inicio_manana
     ).count()
     
     # Intervenciones de hoy
     intervenciones_hoy = db.query(Intervencion).filter(
         Intervencion.tutor_id == tutor_id,
-        func.date(Intervencion.creado_en) == hoy
+        Intervencion.creado_en >= inicio_hoy,
+        Intervencion.creado_en < inicio_manana
     ).count()
     
     stats = DashboardStats(
@@ -80,13 +100,15 @@ def get_tutor_dashboard_data(db: Session, tutor_id: int) -> TutorDashboardRespon
         SesionChat.tutor_id == tutor_id
     ).order_by(desc(SesionChat.iniciada_en)).limit(5).all()
     
+    # Último mensaje de cada sesión reciente en una sola consulta agrupada
+    ultimos_mensajes = dict(db.query(
+        Mensaje.sesion_id, func.max(Mensaje.creado_en)
+    ).filter(
+        Mensaje.sesion_id.in_([sesion.id for sesion in sesiones_recientes])
+    ).group_by(Mensaje.sesion_id).all()) if sesiones_recientes else {}
+    
     recent_sessions = []
     for sesion in sesiones_recientes:
-        # Obtener último mensaje
-        ultimo_mensaje = db.query(Mensaje).filter(
-            Mensaje.sesion_id == sesion.id
-        ).order_by(desc(Mensaje.creado_en)).first()
-        
         recent_sessions.append(RecentSession(
             id=sesion.id,
             estudiante_nombre=f"{sesion.usuario.nombre} {sesion.usuario.apellido or ''}",
@@ -94,7 +116,7 @@ def get_tutor_dashboard_data(db: Session, tutor_id: int) -> TutorDashboardRespon
             estado=sesion.estado,
             mensajes_count=sesion.mensajes_count,
             iniciada_en=sesion.iniciada_en,
-            ultimo_mensaje=ultimo_mensaje.creado_en if ultimo_mensaje else None
+            ultimo_mensaje=ultimos_mensajes.get(sesion.id)
         ))
     
     # Alertas recientes (últimas 5)
@@ -143,52 +165,19 @@ def get_session_analytics(db: Session, session_id: int, tutor_id: int) -> Sessio
     if not sesion:
         raise ValueError("Sesión no encontrada o no autorizada")
     
-    # Obtener todos los mensajes de la sesión con análisis
-    mensajes = db.query(Mensaje).options(
-        joinedload(Mensaje.analisis)
-    ).filter(Mensaje.sesion_id == session_id).all()
-    
-    # Estadísticas básicas
-    total_mensajes = len(mensajes)
-    mensajes_estudiante = len([m for m in mensajes if m.remitente == "user"])
-    mensajes_tutor = len([m for m in mensajes if m.remitente == "tutor"])
-    
-    # Análisis de emociones
-    emociones_detectadas = {}
-    estilos_comunicacion = {}
-    prioridades = {}
-    alertas_generadas = 0
-    recomendaciones = []
-    
-    for mensaje in mensajes:
-        if mensaje.analisis:
-            # Emociones
-            if mensaje.analisis.emocion:
-                emociones_detectadas[mensaje.analisis.emocion] = \
-                    emociones_detectadas.get(mensaje.analisis.emocion, 0) + 1
-            
-            # Estilos
-            if mensaje.analisis.estilo:
-                estilos_comunicacion[mensaje.analisis.estilo] = \
-                    estilos_comunicacion.get(mensaje.analisis.estilo, 0) + 1
-            
-            # Prioridades
-            if mensaje.analisis.prioridad:
-                prioridades[mensaje.analisis.prioridad] = \
-                    prioridades.get(mensaje.analisis.prioridad, 0) + 1
-            
-            # Alertas
-            if mensaje.analisis.alerta:
-                alertas_generadas += 1
-            
-            # Recomendaciones
-            if mensaje.analisis.recomendaciones:
-                if isinstance(mensaje.analisis.recomendaciones, list):
-                    recomendaciones.extend(mensaje.analisis.recomendaciones)
-                elif isinstance(mensaje.analisis.recomendaciones, dict):
-                    for rec in mensaje.analisis.recomendaciones.values():
-                        if isinstance(rec, str):
-                            recomendaciones.append(rec)
+    # Agregados mantenidos al escribir (app.db.stats); sin fila la sesión no tiene mensajes
+    stats = db.query(EstadisticasSesion).filter(EstadisticasSesion.sesion_id == session_id).first()
+    if stats is None:
+        stats = EstadisticasSesion(
+            sesion_id=session_id, total_mensajes=0, mensajes_estudiante=0, mensajes_tutor=0, alertas=0
+        )
+    
+    total_mensajes = stats.total_mensajes
+    emociones_detectadas = dict(stats.emociones or {})
+    estilos_comunicacion = dict(stats.estilos or {})
+    prioridades = dict(stats.prioridades or {})
+    alertas_generadas = stats.alertas
+    mensajes_por_hora = {int(hora): conteo for hora, conteo in (stats.mensajes_por_hora or {}).items()}
     
     # Insights adicionales
     insights = {
@@ -196,21 +185,23 @@ def get_session_analytics(db: Session, session_id: int, tutor_id: int) -> Sessio
         "estilo_dominante": max(estilos_comunicacion.items(), key=lambda x: x[1])[0] if estilos_comunicacion else None,
         "prioridad_maxima": max(prioridades.items(), key=lambda x: x[1])[0] if prioridades else None,
         "tasa_alertas": (alertas_generadas / total_mensajes * 100) if total_mensajes > 0 else 0,
-        "promedio_mensajes_por_hora": calcular_promedio_mensajes_por_hora(mensajes),
-        "patrones_temporales": analizar_patrones_temporales(mensajes)
+        "promedio_mensajes_por_hora": calcular_promedio_mensajes_por_hora(
+            total_mensajes, stats.primer_mensaje_en, stats.ultimo_mensaje_en
+        ),
+        "patrones_temporales": analizar_patrones_temporales(mensajes_por_hora)
     }
     
     return SessionStatsResponse(
         sesion_id=session_id,
         total_mensajes=total_mensajes,
-        mensajes_estudiante=mensajes_estudiante,
-        mensajes_tutor=mensajes_tutor,
+        mensajes_estudiante=stats.mensajes_estudiante,
+        mensajes_tutor=stats.mensajes_tutor,
         duracion_total=sesion.duracion_total,
         emociones_detectadas=emociones_detectadas,
         estilos_comunicacion=estilos_comunicacion,
         alertas_generadas=alertas_generadas,
         prioridades=prioridades,
-        recomendaciones=list(set(recomendaciones))[:10],  # Máximo 10 recomendaciones únicas
+        recomendaciones=list(stats.recomendaciones or []),  # Máximo 10 recomendaciones únicas
         insights=insights
     )
 
@@ -220,8 +211,7 @@ def generate_session_report(session_id: int, db: Session) -> Dict[str, Any]:
     Genera un reporte completo de una sesión.
     """
     sesion = db.query(SesionChat).options(
-        joinedload(SesionChat.usuario),
-        joinedload(SesionChat.mensajes).joinedload(Mensaje.analisis)
+        joinedload(SesionChat.usuario)
     ).filter(SesionChat.id == session_id).first()
     
     if not sesion:
@@ -345,30 +335,346 @@ def create_intervention(db: Session, intervention_data: InterventionCreate, tuto
     )
 
 
+def list_tutor_sessions(
+    db: Session, tutor_id: int, estado: Optional[str] = None, estudiante_id: Optional[int] = None,
+    fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
+    limit: int = 20, offset: int = 0, cursor: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Sesiones del tutor (más recientes primero) y cursor de la página siguiente."""
+    query = db.query(SesionChat).filter(SesionChat.tutor_id == tutor_id)
+    if estado:
+        query = query.filter(SesionChat.estado == estado)
+    if estudiante_id:
+        query = query.filter(SesionChat.usuario_id == estudiante_id)
+    if fecha_inicio:
+        query = query.filter(SesionChat.iniciada_en >= fecha_inicio)
+    if fecha_fin:
+        query = query.filter(SesionChat.iniciada_en <= fecha_fin + " 23:59:59")
+    query = apply_keyset(query, SesionChat.iniciada_en, SesionChat.id, cursor)
+    sessions = query.options(
+        joinedload(SesionChat.usuario),
+        joinedload(SesionChat.mensajes)
+    ).offset(0 if cursor else offset).limit(limit + 1).all()
+    sessions, next_cursor = split_page(sessions, limit, timestamp_attr="iniciada_en")
+    return [
+        {
+            "id": s.id,
+            "usuario_id": s.usuario_id,
+            "estudiante_nombre": s.usuario.nombre if s.usuario else "",
+            "estudiante_email": s.usuario.email if s.usuario else "",
+            "estado": s.estado,
+            "mensajes_count": s.mensajes_count,
+            "duracion_total": s.duracion_total,
+            "iniciada_en": s.iniciada_en,
+            "pausada_en": s.pausada_en,
+            "finalizada_en": s.finalizada_en,
+            "ultimo_mensaje": s.mensajes[-1].texto if s.mensajes else ""
+        }
+        for s in sessions
+    ], next_cursor
+
+
+def list_tutor_alerts(
+    db: Session, tutor_id: int, nivel_urgencia: Optional[str] = None, revisada: Optional[bool] = None,
+    limit: int = 20, offset: int = 0
+) -> List[Dict[str, Any]]:
+    """Alertas asignadas al tutor con los datos del estudiante (forma de AlertListResponse)."""
+    query = db.query(Alerta).filter(Alerta.tutor_asignado == tutor_id)
+    if nivel_urgencia:
+        query = query.filter(Alerta.nivel_urgencia == nivel_urgencia)
+    if revisada is not None:
+        query = query.filter(Alerta.revisada == revisada)
+    alerts = query.options(joinedload(Alerta.usuario)).order_by(desc(Alerta.creado_en)).offset(offset).limit(limit).all()
+    return [
+        {
+            "id": alerta.id,
+            "usuario_id": alerta.usuario_id,
+            "estudiante_nombre": f"{alerta.usuario.nombre} {alerta.usuario.apellido or ''}",
+            "estudiante_email": alerta.usuario.email,
+            "tipo_alerta": alerta.tipo_alerta,
+            "nivel_urgencia": alerta.nivel_urgencia,
+            "descripcion": alerta.descripcion,
+            "revisada": alerta.revisada,
+            "atendida": alerta.atendida,
+            "creado_en": alerta.creado_en,
+            "revisada_en": alerta.revisada_en,
+            "notas_tutor": alerta.notas_tutor,
+            "accion_tomada": alerta.accion_tomada
+        }
+        for alerta in alerts
+    ]
+
+
+def list_tutor_notifications(
+    db: Session, tutor_id: int, leida: Optional[bool] = None, limit: int = 20, cursor: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Notificaciones del tutor (más recientes primero) y cursor de la página siguiente."""
+    query = db.query(Notificacion).filter(Notificacion.usuario_id == tutor_id)
+    if leida is not None:
+        query = query.filter(Notificacion.leida == leida)
+    notifications = apply_keyset(query, Notificacion.creado_en, Notificacion.id, cursor).limit(limit + 1).all()
+    notifications, next_cursor = split_page(notifications, limit)
+    return [
+        {
+            "id": notif.id,
+            "titulo": notif.titulo,
+            "mensaje": notif.mensaje,
+            "tipo": notif.tipo,
+            "leida": notif.leida,
+            "creado_en": notif.creado_en,
+            "metadatos": notif.metadatos
+        }
+        for notif in notifications
+    ], next_cursor
+
+
+def list_tutor_students(db: Session, tutor_id: int) -> List[Dict[str, Any]]:
+    """Estudiantes con sesiones del tutor y su número de sesiones (una consulta)."""
+    students = db.query(Usuario, func.count(SesionChat.id)).join(
+        SesionChat, Usuario.id == SesionChat.usuario_id
+    ).filter(
+        SesionChat.tutor_id == tutor_id,
+        Usuario.rol == RolUsuario.ESTUDIANTE
+    ).group_by(Usuario.id).all()
+    return [
+        {
+            "id": student.id,
+            "nombre": f"{student.nombre} {student.apellido or ''}",
+            "email": student.email,
+            "institucion": student.institucion,
+            "grado_academico": student.grado_academico,
+            "ultimo_acceso": student.ultimo_acceso,
+            "sesiones_count": sesiones_count
+        }
+        for student, sesiones_count in students
+    ]
+
+
+# Granularidades de los reportes de actividad: inicio del periodo que contiene cada día
+REPORT_GRANULARITIES = {
+    "dia": lambda dia: dia,
+    "semana": lambda dia: dia - timedelta(days=dia.weekday()),
+    "mes": lambda dia: dia.replace(day=1),
+}
+
+
+def _as_date(valor) -> date:
+    # func.date devuelve texto en SQLite y date en PostgreSQL
+    return valor if isinstance(valor, date) else date.fromisoformat(str(valor))
+
+
+def get_activity_report(db: Session, tutor_id: int, desde: date, hasta: date, granularidad: str = "dia") -> Dict[str, Any]:
+    """
+    Actividad del tutor entre `desde` y `hasta` (incluidos) agregada por día, semana o mes.
+
+    Las sesiones se agrupan en SQL por (día, estudiante) y las alertas por día; en Python
+    solo se pliegan esas filas en los periodos pedidos, sin materializar sesiones.
+    """
+    periodo_de = REPORT_GRANULARITIES[granularidad]
+    inicio = datetime.combine(desde, time.min)
+    fin = datetime.combine(hasta + timedelta(days=1), time.min)
+
+    dia_sesion = func.date(SesionChat.iniciada_en)
+    filas_sesiones = db.query(
+        dia_sesion,
+        SesionChat.usuario_id,
+        func.count(SesionChat.id),
+        func.coalesce(func.sum(SesionChat.mensajes_count), 0),
+        func.count(case((SesionChat.estado == "activa", 1)))
+    ).filter(
+        SesionChat.tutor_id == tutor_id,
+        SesionChat.iniciada_en >= inicio,
+        SesionChat.iniciada_en < fin
+    ).group_by(dia_sesion, SesionChat.usuario_id).all()
+
+    dia_alerta = func.date(Alerta.creado_en)
+    filas_alertas = db.query(dia_alerta, func.count(Alerta.id)).filter(
+        Alerta.tutor_asignado == tutor_id,
+        Alerta.creado_en >= inicio,
+        Alerta.creado_en < fin
+    ).group_by(dia_alerta).all()
+
+    # Todos los periodos del rango, también los vacíos
+    series: Dict[date, Dict[str, Any]] = {}
+    dia = desde
+    while dia <= hasta:
+        series.setdefault(periodo_de(dia), {"sesiones": 0, "sesiones_activas": 0, "mensajes": 0, "alertas": 0, "estudiantes": set()})
+        dia += timedelta(days=1)
+
+    estudiantes = set()
+    for dia, usuario_id, sesiones, mensajes, activas in filas_sesiones:
+        periodo = series[periodo_de(_as_date(dia))]
+        periodo["sesiones"] += sesiones
+        periodo["sesiones_activas"] += activas
+        periodo["mensajes"] += int(mensajes)
+        periodo["estudiantes"].add(usuario_id)
+        estudiantes.add(usuario_id)
+    for dia, alertas in filas_alertas:
+        series[periodo_de(_as_date(dia))]["alertas"] += alertas
+
+    total_sesiones = sum(p["sesiones"] for p in series.values())
+    total_mensajes = sum(p["mensajes"] for p in series.values())
+    return {
+        "periodo": {"inicio": desde.isoformat(), "fin": hasta.isoformat(), "granularidad": granularidad},
+        "estadisticas": {
+            "total_sesiones": total_sesiones,
+            "sesiones_activas": sum(p["sesiones_activas"] for p in series.values()),
+            "estudiantes_atendidos": len(estudiantes),
+            "total_mensajes": total_mensajes,
+            "alertas_generadas": sum(p["alertas"] for p in series.values()),
+            "promedio_mensajes_por_sesion": total_mensajes / total_sesiones if total_sesiones else 0,
+            "promedio_sesiones_por_estudiante": total_sesiones / len(estudiantes) if estudiantes else 0
+        },
+        "series": [
+            {"inicio": periodo.isoformat(), **valores, "estudiantes": len(valores["estudiantes"])}
+            for periodo, valores in sorted(series.items())
+        ]
+    }
+
+
 # Funciones auxiliares
-def calcular_promedio_mensajes_por_hora(mensajes: List[Mensaje]) -> float:
+def _elapsed_ms(inicio: float) -> float:
+    return round((perf_counter() - inicio) * 1000, 3)
+
+
+def _facet_key(valor: Any) -> str:
+    return str(valor).lower() if isinstance(valor, bool) else str(valor)
+
+
+def _precomputed_facets(db: Session, alumnos, estudiante_id: Optional[int], desde: date, hasta: date) -> Dict[str, Dict[str, int]]:
+    """
+    Conteos por faceta sumando los histogramas diarios de `student_daily_stats`, que
+    agrupan por `Analisis.creado_en` como el filtro de rango de los resultados.
+    """
+    query = db.query(
+        EstadisticasEstudianteDiarias.emociones, EstadisticasEstudianteDiarias.prioridades,
+        EstadisticasEstudianteDiarias.alertas, EstadisticasEstudianteDiarias.analisis_count
+    ).filter(
+        EstadisticasEstudianteDiarias.usuario_id.in_(alumnos),
+        EstadisticasEstudianteDiarias.fecha >= desde,
+        EstadisticasEstudianteDiarias.fecha <= hasta
+    )
+    if estudiante_id is not None:
+        query = query.filter(EstadisticasEstudianteDiarias.usuario_id == estudiante_id)
+
+    facetas = {"emocion": {}, "prioridad": {}, "alerta": {"true": 0, "false": 0}}
+    for emociones, prioridades, alertas, analisis_count in query:
+        for faceta, histograma in (("emocion", emociones), ("prioridad", prioridades)):
+            for valor, conteo in (histograma or {}).items():
+                facetas[faceta][valor] = facetas[faceta].get(valor, 0) + conteo
+        facetas["alerta"]["true"] += alertas
+        facetas["alerta"]["false"] += analisis_count - alertas
+    facetas["alerta"] = {valor: conteo for valor, conteo in facetas["alerta"].items() if conteo}
+    return facetas
+
+
+def search_student_analyses(
+    db: Session,
+    tutor_id: int,
+    desde: date,
+    hasta: date,
+    emociones: Optional[List[str]] = None,
+    prioridades: Optional[List[str]] = None,
+    alerta: Optional[bool] = None,
+    min_score: Optional[float] = None,
+    estudiante_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50
+) -> AnalysisSearchResponse:
+    """
+    Búsqueda por facetas sobre los análisis de los estudiantes del tutor.
+
+    Cada faceta se cuenta con todos los filtros salvo el suyo (facetas disyuntivas).
+    Si ese conjunto es solo estudiantes + rango de días, los conteos salen precalculados
+    de `student_daily_stats`; si no, de un GROUP BY cubierto por `idx_analisis_usuario_creado_facetas`.
+    """
+    alumnos = select(SesionChat.usuario_id).where(SesionChat.tutor_id == tutor_id)
+    inicio = datetime.combine(desde, time.min)
+    fin = datetime.combine(hasta + timedelta(days=1), time.min)
+
+    base = [Analisis.usuario_id.in_(alumnos), Analisis.creado_en >= inicio, Analisis.creado_en < fin]
+    if estudiante_id is not None:
+        base.append(Analisis.usuario_id == estudiante_id)
+    if min_score is not None:
+        base.append(Analisis.emocion_score >= min_score)
+
+    filtros_faceta = {}
+    if emociones:
+        filtros_faceta["emocion"] = Analisis.emocion.in_(emociones)
+    if prioridades:
+        filtros_faceta["prioridad"] = Analisis.prioridad.in_(prioridades)
+    if alerta is not None:
+        filtros_faceta["alerta"] = Analisis.alerta == alerta
+
+    latencias = {}
+    t0 = perf_counter()
+    query = db.query(
+        Analisis.id, Analisis.mensaje_id, Analisis.usuario_id, Analisis.emocion, Analisis.emocion_score,
+        Analisis.prioridad, Analisis.alerta, Analisis.creado_en, Mensaje.texto, Mensaje.sesion_id
+    ).join(Mensaje, Analisis.mensaje_id == Mensaje.id).filter(*base, *filtros_faceta.values())
+    rows, siguiente_cursor = split_page(
+        apply_keyset(query, Analisis.creado_en, Analisis.id, cursor).limit(limit + 1).all(), limit
+    )
+    total = db.query(func.count(Analisis.id)).filter(*base, *filtros_faceta.values()).scalar()
+    latencias["resultados"] = _elapsed_ms(t0)
+
+    facetas, origen = {}, {}
+    precalculadas = None
+    for faceta in ANALYSIS_FACETS:
+        otros = [filtro for nombre, filtro in filtros_faceta.items() if nombre != faceta]
+        t0 = perf_counter()
+        if not otros and min_score is None:
+            if precalculadas is None:
+                precalculadas = _precomputed_facets(db, alumnos, estudiante_id, desde, hasta)
+            facetas[faceta] = precalculadas[faceta]
+            origen[faceta] = "precalculado"
+        else:
+            columna = getattr(Analisis, faceta)
+            conteos = db.query(columna, func.count(Analisis.id)).filter(*base, *otros).group_by(columna).all()
+            facetas[faceta] = {_facet_key(valor): conteo for valor, conteo in conteos if valor is not None}
+            origen[faceta] = "consulta"
+        latencias[faceta] = _elapsed_ms(t0)
+
+    logger.info("Búsqueda por facetas", data={
+        "tutor_id": tutor_id, "filtros": sorted(filtros_faceta) + (["min_score"] if min_score is not None else []),
+        "total": total, "latencia_ms": latencias
+    })
+
+    return AnalysisSearchResponse(
+        resultados=[
+            {
+                "analisis_id": row.id, "mensaje_id": row.mensaje_id, "sesion_id": row.sesion_id,
+                "estudiante_id": row.usuario_id, "texto": row.texto, "emocion": row.emocion,
+                "emocion_score": row.emocion_score, "prioridad": row.prioridad, "alerta": row.alerta,
+                "creado_en": row.creado_en
+            }
+            for row in rows
+        ],
+        total=total,
+        siguiente_cursor=siguiente_cursor,
+        facetas=facetas,
+        origen_facetas=origen,
+        latencia_ms=latencias
+    )
+
+
+def calcular_promedio_mensajes_por_hora(total_mensajes: int, primer_mensaje, ultimo_mensaje) -> float:
     """Calcula el promedio de mensajes por hora en la sesión."""
-    if not mensajes:
+    if not total_mensajes:
         return 0.0
     
-    if len(mensajes) < 2:
+    if total_mensajes < 2:
         return 1.0
     
-    tiempo_total = (mensajes[-1].creado_en - mensajes[0].creado_en).total_seconds() / 3600
-    return len(mensajes) / tiempo_total if tiempo_total > 0 else 0.0
+    tiempo_total = (ultimo_mensaje - primer_mensaje).total_seconds() / 3600
+    return total_mensajes / tiempo_total if tiempo_total > 0 else 0.0
 
 
-def analizar_patrones_temporales(mensajes: List[Mensaje]) -> Dict[str, Any]:
-    """Analiza patrones temporales en los mensajes."""
-    if not mensajes:
+def analizar_patrones_temporales(mensajes_por_hora: Dict[int, int]) -> Dict[str, Any]:
+    """Analiza patrones temporales a partir del histograma de mensajes por hora del día."""
+    if not mensajes_por_hora:
         return {}
     
-    # Agrupar mensajes por hora del día
-    mensajes_por_hora = {}
-    for mensaje in mensajes:
-        hora = mensaje.creado_en.hour
-        mensajes_por_hora[hora] = mensajes_por_hora.get(hora, 0) + 1
-    
     # Encontrar horas pico
     hora_pico = max(mensajes_por_hora.items(), key=lambda x: x[1])[0] if mensajes_por_hora else None
     
@@ -3,21 +3,317 @@ Servicio WebSocket para chat en tiempo real.
 """
 
 import json
+import time
 import asyncio
-from typing import Dict, Set, Optional, Any
+from typing import Dict, Set, Optional, Any, Tuple, Hashable, Callable, Awaitable
 from fastapi import WebSocket, WebSocketDisconnect
 from datetime import datetime, timedelta
+from app.core.config import settings
 from app.core.logging import logger
-from app.db.session import SessionLocal
-from app.db import crud
+from app.db.session import AsyncSessionLocal
+from app.db import crud_async
+from app.schemas.message import MessageCreate
+from app.schemas.analysis_record import AnalysisCreate
+from app.db.models import RolUsuario
 from app.services.analysis_service import analyze_text
+from app.services.similarity_service import index_messages
+from collections import OrderedDict, deque
 import traceback
 import weakref
 
 
+# Frames que se guardan para reanudar; escritura, pings y errores son efímeros
+REPLAYABLE_FRAME_TYPES = {
+    "chat_message",
+    "read_receipt",
+    "tutor_chat_message",
+    "tutor_read_receipt",
+    "session_status",
+    "analysis_update"
+}
+
+
+class FrameRateLimiter:
+    """
+    Limitador de frames entrantes por conexión (token bucket).
+    Se consulta antes de parsear el JSON para que un cliente ruidoso no consuma CPU.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[Hashable, Tuple[float, float]] = {}  # key -> (tokens, last_refill)
+        self.frames_accepted = 0
+        self.frames_dropped = 0
+        self.dropped_by_connection: Dict[Hashable, int] = {}
+
+    def allow(self, key: Hashable) -> bool:
+        """Consume un token para la conexión; False si el frame debe descartarse."""
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+
+        if tokens >= 1.0:
+            self._buckets[key] = (tokens - 1.0, now)
+            self.frames_accepted += 1
+            return True
+
+        self._buckets[key] = (tokens, now)
+        self.frames_dropped += 1
+        self.dropped_by_connection[key] = self.dropped_by_connection.get(key, 0) + 1
+        return False
+
+    def reset(self, key: Hashable):
+        """Olvida el estado de una conexión cerrada."""
+        self._buckets.pop(key, None)
+        self.dropped_by_connection.pop(key, None)
+
+    def get_stats(self) -> dict:
+        """Contadores para get_connection_stats."""
+        return {
+            "max_frames_per_second": self.rate,
+            "burst": self.burst,
+            "frames_accepted": self.frames_accepted,
+            "frames_dropped": self.frames_dropped,
+            "limited_connections": len(self.dropped_by_connection)
+        }
+
+
+class TypingDebouncer:
+    """
+    Agrupa los cambios de estado de escritura por (sesión, usuario).
+
+    Emite como máximo un frame por intervalo; el último estado recibido dentro
+    del intervalo se envía al cerrarse la ventana (trailing edge). Si el usuario
+    deja de teclear sin avisar, se emite "dejó de escribir" tras el timeout de inactividad.
+    """
+
+    def __init__(self, interval: float, idle_timeout: float):
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self._states: Dict[Hashable, Dict[str, Any]] = {}
+        self.frames_received = 0
+        self.frames_emitted = 0
+        self.frames_coalesced = 0
+
+    async def update(self, key: Hashable, is_typing: bool, emit: Callable[[bool], Awaitable[None]]):
+        """Registra un cambio de escritura y decide si emitirlo ahora, más tarde o descartarlo."""
+        self.frames_received += 1
+        loop = asyncio.get_running_loop()
+        state = self._states.get(key)
+        if state is None:
+            state = {"sent": False, "sent_at": 0.0, "desired": False, "emit": emit, "flush": None, "idle": None}
+            self._states[key] = state
+        state["desired"] = is_typing
+        state["emit"] = emit
+
+        # Reiniciar el temporizador de inactividad con cada pulsación
+        if state["idle"] is not None:
+            state["idle"].cancel()
+            state["idle"] = None
+        if is_typing:
+            state["idle"] = loop.call_later(self.idle_timeout, self._on_idle, key)
+
+        now = time.monotonic()
+        if is_typing == state["sent"] and (not is_typing or now - state["sent_at"] < self.interval):
+            self.frames_coalesced += 1
+            return
+
+        if now - state["sent_at"] >= self.interval:
+            await self._emit(key, state)
+        else:
+            self.frames_coalesced += 1
+            if state["flush"] is None:
+                delay = self.interval - (now - state["sent_at"])
+                state["flush"] = loop.call_later(delay, self._schedule_flush, key)
+
+    def _schedule_flush(self, key: Hashable):
+        state = self._states.get(key)
+        if state is None:
+            return
+        state["flush"] = None
+        if state["desired"] != state["sent"]:
+            asyncio.ensure_future(self._emit(key, state))
+
+    def _on_idle(self, key: Hashable):
+        state = self._states.get(key)
+        if state is None:
+            return
+        state["idle"] = None
+        state["desired"] = False
+        if state["flush"] is not None:
+            state["flush"].cancel()
+            state["flush"] = None
+        if state["sent"]:
+            asyncio.ensure_future(self._emit(key, state))
+        else:
+            self._states.pop(key, None)
+
+    async def _emit(self, key: Hashable, state: Dict[str, Any]):
+        is_typing = state["desired"]
+        state["sent"] = is_typing
+        state["sent_at"] = time.monotonic()
+        self.frames_emitted += 1
+        try:
+            await state["emit"](is_typing)
+        except Exception as e:
+            logger.error(f"Error emitiendo indicador de escritura {key}: {e}")
+        if not is_typing and state["idle"] is None and state["flush"] is None:
+            self._states.pop(key, None)
+
+    def discard(self, predicate: Callable[[Hashable], bool]):
+        """Cancela temporizadores y olvida las claves que cumplan el predicado."""
+        for key in [k for k in self._states if predicate(k)]:
+            state = self._states.pop(key)
+            for handle in (state["flush"], state["idle"]):
+                if handle is not None:
+                    handle.cancel()
+
+    def get_stats(self) -> dict:
+        """Contadores para get_connection_stats."""
+        return {
+            "interval_seconds": self.interval,
+            "frames_received": self.frames_received,
+            "frames_emitted": self.frames_emitted,
+            "frames_coalesced": self.frames_coalesced,
+            "pending_states": len(self._states)
+        }
+
+
+class PresenceRegistry:
+    """
+    Registro de presencia indexado por rol e institución.
+    Se mantiene en connect/disconnect para enrutar alertas sin consultar la base de datos.
+    """
+
+    def __init__(self):
+        self.profiles: Dict[int, Dict[str, Optional[str]]] = {}  # user_id -> {"rol", "institucion"}
+        self.by_role: Dict[str, Set[int]] = {}
+        self.by_institution: Dict[str, Set[int]] = {}
+
+    def register(self, user_id: int, rol: Optional[str], institucion: Optional[str] = None):
+        """Registra (o actualiza) la presencia de un usuario."""
+        self.unregister(user_id)
+        self.profiles[user_id] = {"rol": rol, "institucion": institucion}
+        if rol:
+            self.by_role.setdefault(rol, set()).add(user_id)
+        if institucion:
+            self.by_institution.setdefault(institucion, set()).add(user_id)
+
+    def unregister(self, user_id: int):
+        """Elimina a un usuario de todos los índices."""
+        profile = self.profiles.pop(user_id, None)
+        if not profile:
+            return
+        for index, key in ((self.by_role, profile["rol"]), (self.by_institution, profile["institucion"])):
+            if key and key in index:
+                index[key].discard(user_id)
+                if not index[key]:
+                    del index[key]
+
+    def get_profile(self, user_id: int) -> Optional[Dict[str, Optional[str]]]:
+        """Obtiene el perfil de presencia de un usuario conectado."""
+        return self.profiles.get(user_id)
+
+    def users_with_role(self, rol: str, institucion: Optional[str] = None) -> Set[int]:
+        """Usuarios conectados con un rol, opcionalmente filtrados por institución."""
+        users = self.by_role.get(rol, set())
+        if institucion is not None:
+            users = users & self.by_institution.get(institucion, set())
+        return set(users)
+
+    def get_stats(self) -> dict:
+        """Conteos por rol para get_connection_stats."""
+        return {rol: len(users) for rol, users in self.by_role.items()}
+
+
+class SessionReplayBuffer:
+    """
+    Buffer circular de frames recientes por sesión con números de secuencia crecientes.
+    Permite a un cliente que se reconecta recibir solo lo que se perdió (`last_seq`).
+    """
+
+    def __init__(self, size: int, max_sessions: int):
+        self.size = size
+        self.max_sessions = max_sessions
+        self._frames: "OrderedDict[int, deque]" = OrderedDict()
+        self._last_seq: Dict[int, int] = {}
+
+    def append(self, session_id: int, message: dict) -> dict:
+        """Asigna el siguiente número de secuencia al frame y lo guarda."""
+        seq = self._last_seq.get(session_id, 0) + 1
+        self._last_seq[session_id] = seq
+        frame = {**message, "seq": seq}
+
+        frames = self._frames.get(session_id)
+        if frames is None:
+            frames = self._frames[session_id] = deque(maxlen=self.size)
+        self._frames.move_to_end(session_id)
+        frames.append(frame)
+
+        # Descartar las sesiones menos recientes
+        while len(self._frames) > self.max_sessions:
+            old_session, _ = self._frames.popitem(last=False)
+            self._last_seq.pop(old_session, None)
+        return frame
+
+    def last_seq(self, session_id: int) -> int:
+        """Última secuencia emitida para la sesión (0 si no hay frames)."""
+        return self._last_seq.get(session_id, 0)
+
+    def since(self, session_id: int, last_seq: int) -> Optional[list]:
+        """
+        Frames posteriores a `last_seq`.
+        Devuelve None si el hueco ya no está en el buffer y hay que leer de base de datos.
+        """
+        current = self.last_seq(session_id)
+        if last_seq == current:
+            return []
+        if last_seq > current:
+            # Secuencias de otro proceso (reinicio del servidor)
+            return None
+
+        frames = self._frames.get(session_id)
+        if not frames or frames[0]["seq"] > last_seq + 1:
+            return None
+        return [frame for frame in frames if frame["seq"] > last_seq]
+
+    def get_stats(self) -> dict:
+        """Contadores para get_connection_stats."""
+        return {
+            "sessions": len(self._frames),
+            "frames": sum(len(frames) for frames in self._frames.values())
+        }
+
+
+class LatencyTracker:
+    """Latencias recientes por fase (en segundos) con percentiles para las estadísticas."""
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self._samples: Dict[str, deque] = {}
+
+    def record(self, phase: str, seconds: float):
+        """Registra una muestra de latencia."""
+        if phase not in self._samples:
+            self._samples[phase] = deque(maxlen=self.max_samples)
+        self._samples[phase].append(seconds)
+
+    def get_stats(self) -> dict:
+        """Percentiles p50/p95/p99 en milisegundos por fase."""
+        stats = {}
+        for phase, samples in self._samples.items():
+            ordered = sorted(samples)
+            if not ordered:
+                continue
+            pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+            stats[phase] = {"count": len(ordered), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+        return stats
+
+
 class ConnectionManager:
     """Gestor de conexiones WebSocket."""
-    
+
     def __init__(self):
         self.active_connections: Dict[int, WebSocket] = {}
         self.user_sessions: Dict[int, Dict[str, Any]] = {}
@@ -26,14 +322,22 @@ class ConnectionManager:
         self.connection_timeouts: Dict[int, asyncio.Task] = {}  # user_id -> timeout task
         self.cleanup_task: Optional[asyncio.Task] = None
         self.connection_states: Dict[int, bool] = {}  # user_id -> is_connected
-        
+
         # Configuración de timeouts
         self.connection_timeout = 300  # 5 minutos
         self.cleanup_interval = 60  # 1 minuto
-        
-        # Iniciar tarea de limpieza
-        self._start_cleanup_task()
-    
+
+        # Indicadores de escritura y límite de frames entrantes
+        self.typing_debouncer = TypingDebouncer(settings.WS_TYPING_INTERVAL, settings.WS_TYPING_IDLE_TIMEOUT)
+        self.rate_limiter = FrameRateLimiter(settings.WS_MAX_FRAMES_PER_SECOND, settings.WS_FRAME_BURST)
+        self.presence = PresenceRegistry()
+
+        # Buffers de reanudación por canal (chat principal y tutor-chat)
+        self.chat_replay = SessionReplayBuffer(settings.WS_REPLAY_BUFFER_SIZE, settings.WS_REPLAY_MAX_SESSIONS)
+        self.tutor_chat_replay = SessionReplayBuffer(settings.WS_REPLAY_BUFFER_SIZE, settings.WS_REPLAY_MAX_SESSIONS)
+
+        # La tarea de limpieza se inicia con la primera conexión, cuando ya hay un event loop
+
     def _start_cleanup_task(self):
         """Inicia la tarea de limpieza periódica."""
         if self.cleanup_task is None or self.cleanup_task.done():
@@ -66,19 +370,21 @@ class ConnectionManager:
         """Verifica si un usuario está conectado."""
         return user_id in self.active_connections and self.connection_states.get(user_id, False)
     
-    async def connect(self, websocket: WebSocket, user_id: int):
+    async def connect(self, websocket: WebSocket, user_id: int, rol: Optional[str] = None, institucion: Optional[str] = None):
         """Conecta un usuario al WebSocket."""
         # Limpiar conexión anterior si existe
         if user_id in self.active_connections:
             logger.warning(f"Usuario {user_id} ya tiene una conexión activa, limpiando...")
             self.disconnect(user_id)
         
+        self._start_cleanup_task()
         self.active_connections[user_id] = websocket
         self.connection_states[user_id] = True
         self.user_sessions[user_id] = {
             "connected_at": datetime.utcnow(),
             "last_activity": datetime.utcnow()
         }
+        self.presence.register(user_id, rol, institucion)
         
         # Cancelar timeout anterior si existe
         if user_id in self.connection_timeouts:
@@ -119,6 +425,7 @@ class ConnectionManager:
             del self.user_sessions[user_id]
         if user_id in self.connection_states:
             del self.connection_states[user_id]
+        self.presence.unregister(user_id)
         
         # Limpiar de tutor-chat connections
         for session_id in list(self.tutor_chat_connections.keys()):
@@ -133,6 +440,8 @@ class ConnectionManager:
                 self.typing_users[session_id].discard(user_id)
                 if not self.typing_users[session_id]:
                     del self.typing_users[session_id]
+        self.typing_debouncer.discard(lambda key: key[0] == "chat" and key[2] == user_id)
+        self.rate_limiter.reset(("chat", user_id))
         
         logger.info(f"Usuario {user_id} desconectado del WebSocket")
     
@@ -153,10 +462,13 @@ class ConnectionManager:
     
     async def broadcast_to_session(self, message: dict, session_id: int, exclude_user: Optional[int] = None):
         """Envía un mensaje a todos los usuarios en una sesión."""
-        db = SessionLocal()
+        if message.get("type") in REPLAYABLE_FRAME_TYPES:
+            message = self.chat_replay.append(session_id, message)
+
         try:
             # Obtener usuarios de la sesión
-            session = crud.get_chat_session(db, session_id)
+            async with AsyncSessionLocal() as db:
+                session = await crud_async.get_chat_session(db, session_id)
             if not session:
                 return
             
@@ -169,11 +481,16 @@ class ConnectionManager:
                     await self.send_personal_message(message, user_id)
         except Exception as e:
             logger.error(f"Error en broadcast_to_session: {e}")
-        finally:
-            db.close()
     
     async def send_typing_indicator(self, session_id: int, user_id: int, is_typing: bool):
-        """Envía indicador de escritura."""
+        """Envía indicador de escritura (agrupado por el debouncer)."""
+        await self.typing_debouncer.update(
+            ("chat", session_id, user_id), is_typing,
+            lambda typing: self._emit_typing_indicator(session_id, user_id, typing)
+        )
+
+    async def _emit_typing_indicator(self, session_id: int, user_id: int, is_typing: bool):
+        """Difunde un cambio de escritura ya filtrado por el debouncer."""
         if is_typing:
             if session_id not in self.typing_users:
                 self.typing_users[session_id] = set()
@@ -181,6 +498,8 @@ class ConnectionManager:
         else:
             if session_id in self.typing_users:
                 self.typing_users[session_id].discard(user_id)
+                if not self.typing_users[session_id]:
+                    del self.typing_users[session_id]
         
         message = {
             "type": "typing_indicator",
@@ -210,6 +529,7 @@ class ConnectionManager:
         if session_id not in self.tutor_chat_connections:
             self.tutor_chat_connections[session_id] = {}
         
+        self._start_cleanup_task()
         self.tutor_chat_connections[session_id][user_id] = websocket
         logger.info(f"Usuario {user_id} conectado a tutor-chat sesión {session_id}")
     
@@ -222,6 +542,8 @@ class ConnectionManager:
             if not self.tutor_chat_connections[session_id]:
                 del self.tutor_chat_connections[session_id]
             
+            self.typing_debouncer.discard(lambda key: key == ("tutor_chat", session_id, user_id))
+            self.rate_limiter.reset(("tutor_chat", session_id, user_id))
             logger.info(f"Usuario {user_id} desconectado de tutor-chat sesión {session_id}")
     
     def is_tutor_chat_connected(self, session_id: int, user_id: int) -> bool:
@@ -231,19 +553,40 @@ class ConnectionManager:
     
     async def send_tutor_chat_message(self, session_id: int, message: dict, exclude_user: Optional[int] = None):
         """Envía un mensaje a todos los usuarios en una sesión de tutor-chat."""
+        if message.get("type") in REPLAYABLE_FRAME_TYPES:
+            message = self.tutor_chat_replay.append(session_id, message)
+
         if session_id not in self.tutor_chat_connections:
             return
         
-        for user_id, websocket in self.tutor_chat_connections[session_id].items():
+        for user_id, websocket in list(self.tutor_chat_connections[session_id].items()):
             if user_id != exclude_user:
                 try:
                     await websocket.send_text(json.dumps(message))
                 except Exception as e:
                     logger.error(f"Error enviando mensaje tutor-chat a usuario {user_id}: {e}")
                     self.disconnect_from_tutor_chat(session_id, user_id)
+
+    async def send_tutor_chat_personal(self, session_id: int, user_id: int, message: dict):
+        """Envía un mensaje solo a un usuario de una sesión de tutor-chat."""
+        if not self.is_tutor_chat_connected(session_id, user_id):
+            return
+
+        try:
+            await self.tutor_chat_connections[session_id][user_id].send_text(json.dumps(message))
+        except Exception as e:
+            logger.error(f"Error enviando mensaje tutor-chat a usuario {user_id}: {e}")
+            self.disconnect_from_tutor_chat(session_id, user_id)
     
     async def send_tutor_chat_typing(self, session_id: int, user_id: int, is_typing: bool):
-        """Envía indicador de escritura en tutor-chat."""
+        """Envía indicador de escritura en tutor-chat (agrupado por el debouncer)."""
+        await self.typing_debouncer.update(
+            ("tutor_chat", session_id, user_id), is_typing,
+            lambda typing: self._emit_tutor_chat_typing(session_id, user_id, typing)
+        )
+
+    async def _emit_tutor_chat_typing(self, session_id: int, user_id: int, is_typing: bool):
+        """Difunde un cambio de escritura de tutor-chat ya filtrado por el debouncer."""
         message = {
             "type": "tutor_typing",
             "session_id": session_id,
@@ -258,6 +601,7 @@ class ConnectionManager:
         """Cierra todas las conexiones."""
         if self.cleanup_task:
             self.cleanup_task.cancel()
+        self.typing_debouncer.discard(lambda key: True)
         
         # Cancelar todos los timeouts
         for task in self.connection_timeouts.values():
@@ -275,16 +619,33 @@ class WebSocketService:
     
     def __init__(self):
         self.manager = ConnectionManager()
+        self.latency = LatencyTracker()
+        self.background_tasks: Set[asyncio.Task] = set()
     
+    async def _load_presence_profile(self, user_id: int) -> Dict[str, Optional[str]]:
+        """Lee rol e institución una sola vez por conexión para el registro de presencia."""
+        try:
+            async with AsyncSessionLocal() as db:
+                user = await crud_async.get_user(db, user_id)
+            if not user:
+                return {"rol": None, "institucion": None}
+            return {"rol": user.rol.value, "institucion": user.institucion}
+        except Exception as e:
+            logger.error(f"Error cargando perfil de presencia para usuario {user_id}: {e}")
+            return {"rol": None, "institucion": None}
+
     async def handle_websocket(self, websocket: WebSocket, user_id: int):
         """Maneja la conexión WebSocket de un usuario."""
-        await self.manager.connect(websocket, user_id)
+        profile = await self._load_presence_profile(user_id)
+        await self.manager.connect(websocket, user_id, profile["rol"], profile["institucion"])
         
         try:
             while self.manager.is_connected(user_id):
                 # Recibir mensaje del cliente con timeout
                 try:
                     data = await asyncio.wait_for(websocket.receive_text(), timeout=30.0)
+                    if not self.manager.rate_limiter.allow(("chat", user_id)):
+                        continue
                     message_data = json.loads(data)
                     
                     # Procesar mensaje según tipo
@@ -323,6 +684,8 @@ class WebSocketService:
                     logger.info(f"ESPERANDO mensaje de usuario {user_id} en sesión {session_id}")
                     data = await asyncio.wait_for(websocket.receive_text(), timeout=30.0)
                     logger.info(f"RECIBIDO mensaje de usuario {user_id}: {data[:100]}...")
+                    if not self.manager.rate_limiter.allow(("tutor_chat", session_id, user_id)):
+                        continue
                     
                     try:
                         message_data = json.loads(data)
@@ -365,6 +728,8 @@ class WebSocketService:
             await self.handle_read_receipt(user_id, message_data)
         elif message_type == "analysis_request":
             await self.handle_analysis_request(user_id, message_data)
+        elif message_type == "resume":
+            await self.handle_resume(user_id, message_data)
         elif message_type == "ping":
             # Responder a ping
             await self.manager.send_personal_message({
@@ -394,6 +759,8 @@ class WebSocketService:
         elif message_type == "session_status":
             logger.info(f"MANEJANDO session_status")
             await self.handle_session_status(session_id, user_id, message_data)
+        elif message_type == "resume":
+            await self.handle_tutor_chat_resume(session_id, user_id, message_data)
         elif message_type == "ping":
             # Responder a ping
             await self.manager.send_tutor_chat_message(session_id, {
@@ -412,30 +779,29 @@ class WebSocketService:
         if not session_id or not text:
             return
         
-        db = SessionLocal()
-        try:
+        async with AsyncSessionLocal() as db:
             # Guardar mensaje en base de datos
-            message = crud.create_message(db, {
-                "usuario_id": user_id,
-                "sesion_id": session_id,
-                "texto": text,
-                "remitente": "user"
-            })
+            message = await crud_async.create_message(db, MessageCreate(
+                usuario_id=user_id,
+                sesion_id=session_id,
+                texto=text,
+                remitente="user"
+            ))
             
-            # Analizar mensaje
-            analysis = analyze_text(text)
+            # Analizar mensaje (CPU, fuera del event loop)
+            analysis = await asyncio.to_thread(analyze_text, text)
             
             # Guardar análisis
-            crud.create_analysis(db, {
-                "mensaje_id": message.id,
-                "usuario_id": user_id,
-                "emocion": analysis.get("emotion"),
-                "emocion_score": analysis.get("emotion_score"),
-                "estilo": analysis.get("style"),
-                "estilo_score": analysis.get("style_score"),
-                "prioridad": analysis.get("priority"),
-                "alerta": analysis.get("alert", False)
-            })
+            await crud_async.create_analysis(db, AnalysisCreate(
+                mensaje_id=message.id,
+                usuario_id=user_id,
+                emocion=analysis.get("emotion"),
+                emocion_score=analysis.get("emotion_score"),
+                estilo=analysis.get("style"),
+                estilo_score=analysis.get("style_score"),
+                prioridad=analysis.get("priority"),
+                alerta=analysis.get("alert", False)
+            ))
             
             # Preparar mensaje para broadcast
             broadcast_message = {
@@ -452,14 +818,105 @@ class WebSocketService:
             
             # Enviar a todos los usuarios de la sesión
             await self.manager.broadcast_to_session(broadcast_message, session_id)
+            await asyncio.to_thread(index_messages, [(message.id, user_id, text)])
             
-            # Si hay alerta, notificar a tutores
+            # Si hay alerta, notificar al tutor de la sesión (o a los de la institución)
             if analysis.get("alert"):
-                await self.notify_tutors_alert(user_id, session_id, analysis)
-                
-        finally:
-            db.close()
+                sesion = await crud_async.get_chat_session(db, session_id)
+                await self.notify_tutors_alert(
+                    user_id, session_id, analysis,
+                    tutor_asignado=sesion.tutor_id if sesion else None
+                )
     
+    async def _build_resume_snapshot(self, session_id: int, last_seq: int, after_id: Optional[int]) -> dict:
+        """Página de mensajes desde base de datos cuando el hueco supera el buffer."""
+        page_size = settings.WS_RESUME_PAGE_SIZE
+        async with AsyncSessionLocal() as db:
+            messages = await crud_async.get_session_messages_page(db, session_id, after_id=after_id, limit=page_size + 1)
+
+        # En modo "después de" el elemento extra indica que quedan más páginas
+        has_more = after_id is not None and len(messages) > page_size
+        messages = messages[:page_size] if after_id is not None else messages[-page_size:]
+
+        return {
+            "type": "resume_snapshot",
+            "session_id": session_id,
+            "last_seq": last_seq,
+            "has_more": has_more,
+            "next_after_id": messages[-1].id if messages else after_id,
+            "messages": [
+                {
+                    "id": message.id,
+                    "user_id": message.usuario_id,
+                    "text": message.texto,
+                    "remitente": message.remitente,
+                    "timestamp": message.creado_en.isoformat(),
+                    "analysis": {
+                        "emotion": message.analisis.emocion,
+                        "emotion_score": message.analisis.emocion_score,
+                        "style": message.analisis.estilo,
+                        "style_score": message.analisis.estilo_score,
+                        "priority": message.analisis.prioridad,
+                        "alert": message.analisis.alerta
+                    } if message.analisis else None
+                }
+                for message in messages
+            ],
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+    async def _replay(self, replay: SessionReplayBuffer, session_id: int, message_data: dict,
+                      send: Callable[[dict], Awaitable[None]]):
+        """
+        Reenvía los frames posteriores a `last_seq`; si el buffer ya no los tiene,
+        envía una página de mensajes desde base de datos (`last_message_id` para paginar).
+        """
+        try:
+            last_seq = int(message_data.get("last_seq", 0))
+        except (TypeError, ValueError):
+            last_seq = 0
+        after_id = message_data.get("last_message_id")
+
+        frames = replay.since(session_id, last_seq)
+        current = replay.last_seq(session_id)
+        if frames is None:
+            await send(await self._build_resume_snapshot(session_id, current, after_id))
+            return
+
+        for frame in frames:
+            await send(frame)
+        await send({
+            "type": "resume_complete",
+            "session_id": session_id,
+            "last_seq": current,
+            "replayed": len(frames),
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+    async def handle_resume(self, user_id: int, message_data: dict):
+        """Maneja la reanudación del chat principal tras una reconexión."""
+        session_id = message_data.get("session_id")
+        if not session_id:
+            return
+
+        async with AsyncSessionLocal() as db:
+            session = await crud_async.get_chat_session(db, session_id)
+        if not session or user_id not in (session.usuario_id, session.tutor_id):
+            logger.warning(f"Usuario {user_id} intentó reanudar sesión ajena {session_id}")
+            return
+
+        await self._replay(
+            self.manager.chat_replay, session_id, message_data,
+            lambda frame: self.manager.send_personal_message(frame, user_id)
+        )
+
+    async def handle_tutor_chat_resume(self, session_id: int, user_id: int, message_data: dict):
+        """Maneja la reanudación de tutor-chat tras una reconexión."""
+        await self._replay(
+            self.manager.tutor_chat_replay, session_id, message_data,
+            lambda frame: self.manager.send_tutor_chat_personal(session_id, user_id, frame)
+        )
+
     async def handle_typing(self, user_id: int, message_data: dict):
         """Maneja indicador de escritura."""
         session_id = message_data.get("session_id")
@@ -511,29 +968,42 @@ class WebSocketService:
                 }
                 await self.manager.send_personal_message(error_response, user_id)
     
-    async def notify_tutors_alert(self, user_id: int, session_id: int, analysis: dict):
+    def get_alert_recipients(self, user_id: int, tutor_asignado: Optional[int] = None,
+                             institucion: Optional[str] = None) -> Set[int]:
+        """
+        Resuelve los tutores conectados que deben recibir una alerta.
+        Prioridad: tutor asignado (Alerta.tutor_asignado), tutores de la institución
+        del estudiante y, si no hay ninguno, todos los tutores conectados.
+        """
+        tutors = self.manager.presence.users_with_role(RolUsuario.TUTOR.value)
+        if tutor_asignado is not None and tutor_asignado in tutors:
+            return {tutor_asignado}
+
+        if institucion is None:
+            profile = self.manager.presence.get_profile(user_id)
+            institucion = profile["institucion"] if profile else None
+        if institucion:
+            same_institution = self.manager.presence.users_with_role(RolUsuario.TUTOR.value, institucion)
+            if same_institution:
+                return same_institution
+
+        return tutors
+
+    async def notify_tutors_alert(self, user_id: int, session_id: int, analysis: dict,
+                                  tutor_asignado: Optional[int] = None, institucion: Optional[str] = None):
         """Notifica a tutores sobre una alerta."""
-        db = SessionLocal()
-        try:
-            # Obtener tutores disponibles
-            tutors = crud.get_users_by_role(db, "tutor")
-            
-            alert_message = {
-                "type": "alert_notification",
-                "session_id": session_id,
-                "user_id": user_id,
-                "analysis": analysis,
-                "priority": analysis.get("priority", "normal"),
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            
-            # Enviar notificación a tutores conectados
-            for tutor in tutors:
-                if tutor.id in self.manager.active_connections:
-                    await self.manager.send_personal_message(alert_message, tutor.id)
-                    
-        finally:
-            db.close()
+        alert_message = {
+            "type": "alert_notification",
+            "session_id": session_id,
+            "user_id": user_id,
+            "analysis": analysis,
+            "priority": analysis.get("priority", "normal"),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+        # Enviar notificación a tutores conectados
+        for tutor_id in self.get_alert_recipients(user_id, tutor_asignado, institucion):
+            await self.manager.send_personal_message(alert_message, tutor_id)
     
     async def send_system_notification(self, user_id: int, notification: dict):
         """Envía una notificación del sistema."""
@@ -546,7 +1016,11 @@ class WebSocketService:
         await self.manager.send_personal_message(system_message, user_id)
     
     async def handle_tutor_chat_message(self, session_id: int, user_id: int, message_data: dict):
-        """Maneja un mensaje de tutor-chat."""
+        """
+        Maneja un mensaje de tutor-chat en dos fases: guarda y difunde el mensaje
+        de inmediato y deja el análisis para `_analyze_tutor_chat_message`.
+        """
+        received_at = time.monotonic()
         text = message_data.get("text")
         remitente = message_data.get("remitente", "user")
         
@@ -556,10 +1030,10 @@ class WebSocketService:
             logger.warning("Mensaje sin texto, ignorando")
             return
         
-        db = SessionLocal()
+        db = AsyncSessionLocal()
         try:
             # Verificar que el usuario tiene permisos para esta sesión
-            session = crud.get_chat_session(db, session_id)
+            session = await crud_async.get_chat_session(db, session_id)
             if not session:
                 logger.error(f"Sesión {session_id} no encontrada")
                 return
@@ -571,7 +1045,6 @@ class WebSocketService:
             logger.info(f"Guardando mensaje en base de datos...")
             
             # Crear objeto MessageCreate correctamente
-            from app.schemas.message import MessageCreate
             message_create = MessageCreate(
                 usuario_id=user_id,
                 sesion_id=session_id,
@@ -581,38 +1054,11 @@ class WebSocketService:
             )
             
             # Guardar mensaje en base de datos
-            message = crud.create_message(db, message_create)
+            message = await crud_async.create_message(db, message_create)
             logger.info(f"Mensaje guardado con ID: {message.id}")
             
-            # Si es mensaje del estudiante, analizar
-            analysis = None
-            if remitente == "user":
-                try:
-                    logger.info("Analizando mensaje del estudiante...")
-                    analysis = analyze_text(text)
-                    
-                    # Crear objeto AnalysisCreate correctamente
-                    from app.schemas.analysis_record import AnalysisCreate
-                    analysis_create = AnalysisCreate(
-                        mensaje_id=message.id,
-                        usuario_id=user_id,
-                        emocion=analysis.get("emotion"),
-                        emocion_score=analysis.get("emotion_score"),
-                        estilo=analysis.get("style"),
-                        estilo_score=analysis.get("style_score"),
-                        prioridad=analysis.get("priority"),
-                        alerta=analysis.get("alert", False),
-                        razon_alerta=analysis.get("alert_reason")
-                    )
-                    
-                    # Guardar análisis
-                    crud.create_analysis(db, analysis_create)
-                    logger.info(f"Análisis guardado: emoción={analysis.get('emotion')}, alerta={analysis.get('alert')}")
-                except Exception as e:
-                    logger.error(f"Error analizando mensaje: {e}")
-                    analysis = None
-            
-            # Preparar mensaje para broadcast
+            # Fase 1: difundir el mensaje sin esperar al análisis
+            analysis_pending = remitente == "user"
             broadcast_message = {
                 "type": "tutor_chat_message",
                 "session_id": session_id,
@@ -622,19 +1068,22 @@ class WebSocketService:
                     "text": text,
                     "remitente": remitente,
                     "timestamp": message.creado_en.isoformat(),
-                    "analysis": analysis
+                    "analysis": None,
+                    "analysis_pending": analysis_pending
                 }
             }
             
             logger.info(f"Enviando mensaje broadcast a sesión {session_id}")
             # Enviar a todos los usuarios de la sesión
             await self.manager.send_tutor_chat_message(session_id, broadcast_message)
+            self.latency.record("broadcast", time.monotonic() - received_at)
             logger.info(f"Mensaje broadcast enviado exitosamente")
             
-            # Si hay alerta, notificar al tutor
-            if analysis and analysis.get("alert") and session.tutor_id:
-                logger.info(f"Enviando alerta al tutor {session.tutor_id}")
-                await self.notify_tutor_alert(session.tutor_id, session_id, analysis)
+            # Fase 2: análisis y alertas en segundo plano
+            if analysis_pending:
+                self._track_task(asyncio.create_task(self._analyze_tutor_chat_message(
+                    session_id, user_id, message.id, text, session.tutor_id, received_at
+                )))
                 
         except Exception as e:
             logger.error(f"ERROR en handle_tutor_chat_message: {e}")
@@ -649,7 +1098,51 @@ class WebSocketService:
             }
             await self.manager.send_tutor_chat_message(session_id, error_message)
         finally:
-            db.close()
+            await db.close()
+    
+    async def _analyze_tutor_chat_message(self, session_id: int, user_id: int, message_id: int,
+                                          text: str, tutor_id: Optional[int], received_at: float):
+        """Analiza un mensaje ya difundido, envía `analysis_update` y dispara la alerta al tutor."""
+        try:
+            # El modelo es CPU; se ejecuta fuera del event loop
+            analysis = await asyncio.to_thread(analyze_text, text)
+            
+            async with AsyncSessionLocal() as db:
+                await crud_async.create_analysis(db, AnalysisCreate(
+                    mensaje_id=message_id,
+                    usuario_id=user_id,
+                    emocion=analysis.get("emotion"),
+                    emocion_score=analysis.get("emotion_score"),
+                    estilo=analysis.get("style"),
+                    estilo_score=analysis.get("style_score"),
+                    prioridad=analysis.get("priority"),
+                    alerta=analysis.get("alert", False),
+                    razon_alerta=analysis.get("alert_reason")
+                ))
+            logger.info(f"Análisis guardado: emoción={analysis.get('emotion')}, alerta={analysis.get('alert')}")
+            
+            await self.manager.send_tutor_chat_message(session_id, {
+                "type": "analysis_update",
+                "session_id": session_id,
+                "message_id": message_id,
+                "analysis": analysis,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+            self.latency.record("analysis", time.monotonic() - received_at)
+            await asyncio.to_thread(index_messages, [(message_id, user_id, text)])
+            
+            # Si hay alerta, notificar al tutor
+            if analysis.get("alert") and tutor_id:
+                logger.info(f"Enviando alerta al tutor {tutor_id}")
+                await self.notify_tutor_alert(tutor_id, session_id, analysis)
+                self.latency.record("alert", time.monotonic() - received_at)
+        except Exception as e:
+            logger.error(f"Error analizando mensaje {message_id} de sesión {session_id}: {e}")
+    
+    def _track_task(self, task: asyncio.Task):
+        """Mantiene una referencia a la tarea en segundo plano hasta que termine."""
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
     
     async def handle_tutor_typing(self, session_id: int, user_id: int, message_data: dict):
         """Maneja indicador de escritura en tutor-chat."""
@@ -708,11 +1201,22 @@ class WebSocketService:
             "connected_users": self.manager.get_user_count(),
             "active_sessions": len(self.manager.typing_users),
             "total_connections": len(self.manager.active_connections),
-            "tutor_chat_sessions": len(self.manager.tutor_chat_connections)
+            "tutor_chat_sessions": len(self.manager.tutor_chat_connections),
+            "typing": self.manager.typing_debouncer.get_stats(),
+            "rate_limit": self.manager.rate_limiter.get_stats(),
+            "presence": self.manager.presence.get_stats(),
+            "replay": {
+                "chat": self.manager.chat_replay.get_stats(),
+                "tutor_chat": self.manager.tutor_chat_replay.get_stats()
+            },
+            "latency": self.latency.get_stats(),
+            "pending_analyses": len(self.background_tasks)
         }
     
     async def shutdown(self):
         """Cierra el servicio WebSocket."""
+        for task in list(self.background_tasks):
+            task.cancel()
         await self.manager.shutdown()
         logger.info("WebSocketService shutdown completado")
 
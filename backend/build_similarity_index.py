@@ -0,0 +1,42 @@
+# backend/build_similarity_index.py
+"""
+Script para construir (o completar) el índice de similitud de mensajes a partir de los
+mensajes ya analizados. Ejecutarlo al activar SIMILARITY_INDEX_ENABLED o tras cambiar el
+modelo de emociones (el índice de otro vectorizador se descarta al cargarlo).
+Los mensajes que ya están en el índice se omiten.
+"""
+
+import argparse
+
+from app.db.session import SessionLocal
+from app.db.models import Analisis, Mensaje
+from app.services.similarity_service import get_similarity_index
+
+
+def build(batch_size: int = 2000):
+    index = get_similarity_index()
+    if index is None:
+        print("❌ Índice desactivado (SIMILARITY_INDEX_ENABLED) o modelo de emociones no cargado.")
+        return
+
+    print(f"🛠️  Indexando mensajes analizados en {index.directory}...")
+    db = SessionLocal()
+    added, last_id = 0, 0
+    try:
+        while True:
+            rows = db.query(Mensaje.id, Mensaje.usuario_id, Mensaje.texto).join(
+                Analisis, Analisis.mensaje_id == Mensaje.id
+            ).filter(Mensaje.id > last_id).order_by(Mensaje.id).limit(batch_size).all()
+            if not rows:
+                break
+            added += index.add([tuple(row) for row in rows])
+            last_id = rows[-1].id
+    finally:
+        db.close()
+    print(f"✅ {added} mensajes añadidos; {index.count} en el índice.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construye el índice de similitud de mensajes")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    build(parser.parse_args().batch_size)
@@ -0,0 +1,108 @@
+# backend/bulk_write_benchmark.py
+"""
+Benchmark de escritura: filas/segundo con inserciones fila a fila frente a en bloque.
+
+Sobre una base SQLite temporal compara `crud.create_metric` / `create_notification` /
+`create_message` (un commit por fila) con `create_metrics_bulk` / `create_notifications_bulk` /
+`create_messages_bulk` (un INSERT multi-fila y un commit por lote).
+
+Uso:
+    python bulk_write_benchmark.py --rows 5000 --batch-size 500
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+
+def rows_per_second(fn, rows: int) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return round(rows / (time.perf_counter() - t0), 1)
+
+
+def run_benchmark(rows: int, batch_size: int) -> dict:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.db import crud
+    from app.db.models import Base, Usuario, SesionChat, RolUsuario, EstadoUsuario
+    from app.schemas.message import MessageCreate
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bulk.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    try:
+        user = Usuario(email="bulk@bench.test", nombre="Benchmark", hashed_password="x",
+                       rol=RolUsuario.ESTUDIANTE, estado=EstadoUsuario.ACTIVO)
+        db.add(user)
+        db.commit()
+        sesion = SesionChat(usuario_id=user.id, estado="activa")
+        db.add(sesion)
+        db.commit()
+        user_id, sesion_id = user.id, sesion.id
+
+        def batches(make):
+            for start in range(0, rows, batch_size):
+                yield [make(i) for i in range(start, min(start + batch_size, rows))]
+
+        metric = lambda i: {"tipo_metrica": "bench", "nombre": f"m{i % 7}", "valor": float(i), "unidad": "u"}
+        notification = lambda i: {"usuario_id": user_id, "titulo": "Bench", "mensaje": f"n{i}", "tipo": "sistema"}
+        message = lambda i: MessageCreate(texto=f"mensaje {i}", usuario_id=user_id, sesion_id=sesion_id)
+
+        cases = {
+            "metricas": (
+                lambda: [crud.create_metric(db, **metric(i)) for i in range(rows)],
+                lambda: [crud.create_metrics_bulk(db, batch) for batch in batches(metric)],
+            ),
+            "notificaciones": (
+                lambda: [crud.create_notification(db, user_id, "Bench", f"n{i}", "sistema") for i in range(rows)],
+                lambda: [crud.create_notifications_bulk(db, batch) for batch in batches(notification)],
+            ),
+            "mensajes": (
+                lambda: [crud.create_message(db, message(i)) for i in range(rows)],
+                lambda: [crud.create_messages_bulk(db, batch) for batch in batches(message)],
+            ),
+        }
+
+        results = {}
+        for name, (single, bulk) in cases.items():
+            single_rate = rows_per_second(single, rows)
+            db.expunge_all()
+            bulk_rate = rows_per_second(bulk, rows)
+            results[name] = {
+                "single_rows_per_sec": single_rate,
+                "bulk_rows_per_sec": bulk_rate,
+                "speedup": round(bulk_rate / single_rate, 1) if single_rate else None,
+            }
+    finally:
+        db.close()
+        engine.dispose()
+
+    return {"rows": rows, "batch_size": batch_size, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escritura fila a fila vs en bloque")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--output", help="ruta donde guardar el reporte JSON")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.rows, args.batch_size)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Add composite indexes for hot queries
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+# (nombre, tabla, columnas) de los índices compuestos nuevos
+COMPOSITE_INDEXES = [
+    ('idx_mensaje_usuario_remitente_creado', 'mensajes', ['usuario_id', 'remitente', 'creado_en']),
+    ('idx_mensaje_sesion_creado', 'mensajes', ['sesion_id', 'creado_en']),
+    ('idx_sesion_usuario_estado_tutor', 'sesiones_chat', ['usuario_id', 'estado', 'tutor_id']),
+    ('idx_alerta_tutor_revisada_creado', 'alertas', ['tutor_asignado', 'revisada', 'creado_en']),
+]
+
+# Índices de una columna que son prefijo de un compuesto: solo encarecen las escrituras
+REDUNDANT_INDEXES = [
+    ('idx_mensaje_usuario', 'mensajes', ['usuario_id']),
+    ('idx_sesion_usuario', 'sesiones_chat', ['usuario_id']),
+    ('idx_alerta_tutor', 'alertas', ['tutor_asignado']),
+]
+
+
+def upgrade():
+    for name, table, columns in COMPOSITE_INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+    for name, table, _ in REDUNDANT_INDEXES:
+        op.drop_index(name, table_name=table, if_exists=True)
+    # Actualizar estadísticas para que el planificador elija los índices nuevos
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute(sa.text('ANALYZE'))
+
+
+def downgrade():
+    for name, table, columns in REDUNDANT_INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+    for name, table, _ in reversed(COMPOSITE_INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,66 @@
+"""Add (owner, timestamp) indexes for keyset pagination and normalize SQLite timestamps
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+# (nombre, tabla, columnas): cada listado paginado por cursor recorre uno de estos índices
+KEYSET_INDEXES = [
+    ('idx_mensaje_usuario_creado', 'mensajes', ['usuario_id', 'creado_en']),
+    ('idx_notificacion_usuario_creado', 'notificaciones', ['usuario_id', 'creado_en']),
+    ('idx_sesion_tutor_iniciada', 'sesiones_chat', ['tutor_id', 'iniciada_en']),
+    ('idx_reporte_tutor_creado', 'reportes', ['tutor_id', 'creado_en']),
+    ('idx_reporte_estudiante_creado', 'reportes', ['estudiante_id', 'creado_en']),
+]
+
+# Índices de una columna que pasan a ser prefijo de los anteriores
+REDUNDANT_INDEXES = [
+    ('idx_notificacion_usuario', 'notificaciones', ['usuario_id']),
+    ('idx_sesion_tutor', 'sesiones_chat', ['tutor_id']),
+    ('idx_reporte_tutor', 'reportes', ['tutor_id']),
+    ('idx_reporte_estudiante', 'reportes', ['estudiante_id']),
+    # Creados por la migración 004 con op.f()
+    ('ix_reportes_tutor', 'reportes', ['tutor_id']),
+    ('ix_reportes_estudiante', 'reportes', ['estudiante_id']),
+]
+
+# Columnas de orden de los cursores. En SQLite, las filas creadas con CURRENT_TIMESTAMP
+# quedaron sin microsegundos; se normalizan al formato de DateTime para que la
+# comparación textual `(timestamp, id)` sea coherente.
+KEYSET_TIMESTAMPS = [
+    ('mensajes', 'creado_en'),
+    ('notificaciones', 'creado_en'),
+    ('sesiones_chat', 'iniciada_en'),
+    ('reportes', 'creado_en'),
+]
+
+
+def upgrade():
+    for name, table, columns in KEYSET_INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+    for name, table, _ in REDUNDANT_INDEXES:
+        op.drop_index(name, table_name=table, if_exists=True)
+    if op.get_bind().dialect.name == 'sqlite':
+        for table, column in KEYSET_TIMESTAMPS:
+            op.execute(sa.text(
+                f"UPDATE {table} SET {column} = {column} || '.000000' WHERE length({column}) = 19"
+            ))
+        op.execute(sa.text('ANALYZE'))
+
+
+def downgrade():
+    for name, table, columns in REDUNDANT_INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+    for name, table, _ in reversed(KEYSET_INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
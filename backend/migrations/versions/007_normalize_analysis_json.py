@@ -0,0 +1,63 @@
+"""Normalize double-encoded JSON in analisis
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+# Columnas JSON que se guardaban con json.dumps (cadena JSON dentro de la columna JSON)
+JSON_COLUMNS = ['distribucion_emociones', 'distribucion_estilos', 'recomendaciones', 'resumen', 'insights_detallados']
+
+BATCH_SIZE = 1000
+
+analisis = sa.table('analisis', sa.column('id', sa.Integer), *[sa.column(name, sa.JSON) for name in JSON_COLUMNS])
+
+
+def _decode(value):
+    """Deshace la doble codificación; deja intactos los valores ya nativos."""
+    while isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            break
+    return value
+
+
+def upgrade():
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(analisis).where(analisis.c.id > last_id).order_by(analisis.c.id).limit(BATCH_SIZE)
+        ).mappings().all()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+
+        updates = []
+        for row in rows:
+            changed = {name: _decode(row[name]) for name in JSON_COLUMNS if isinstance(row[name], str)}
+            if changed:
+                updates.append({'_id': row['id'], **{name: changed.get(name, row[name]) for name in JSON_COLUMNS}})
+        if updates:
+            bind.execute(
+                analisis.update().where(analisis.c.id == sa.bindparam('_id')),
+                updates
+            )
+
+
+def downgrade():
+    # Los valores nativos son válidos para ambas versiones del código; no se vuelve a doble codificar
+    pass
@@ -0,0 +1,59 @@
+"""Add session_stats and student_daily_stats aggregate tables
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18 12:00:00.000000
+
+Tras aplicar la migración, poblar las tablas con `python rebuild_stats.py`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def _histogram_columns():
+    return [
+        sa.Column('analisis_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('emociones', sa.JSON(), nullable=True),
+        sa.Column('estilos', sa.JSON(), nullable=True),
+        sa.Column('prioridades', sa.JSON(), nullable=True),
+        sa.Column('alertas', sa.Integer(), nullable=False, server_default='0'),
+    ]
+
+
+def upgrade():
+    op.create_table(
+        'session_stats',
+        sa.Column('sesion_id', sa.Integer(), sa.ForeignKey('sesiones_chat.id'), primary_key=True),
+        sa.Column('total_mensajes', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('mensajes_estudiante', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('mensajes_tutor', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('mensajes_por_hora', sa.JSON(), nullable=True),
+        sa.Column('primer_mensaje_en', sa.DateTime(), nullable=True),
+        sa.Column('ultimo_mensaje_en', sa.DateTime(), nullable=True),
+        *_histogram_columns(),
+        sa.Column('recomendaciones', sa.JSON(), nullable=True),
+        sa.Column('actualizado_en', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'student_daily_stats',
+        sa.Column('usuario_id', sa.Integer(), sa.ForeignKey('usuarios.id'), primary_key=True),
+        sa.Column('fecha', sa.Date(), primary_key=True),
+        sa.Column('total_mensajes', sa.Integer(), nullable=False, server_default='0'),
+        *_histogram_columns(),
+        sa.Column('actualizado_en', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        if_not_exists=True,
+    )
+    op.create_index('idx_student_daily_fecha', 'student_daily_stats', ['fecha'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('idx_student_daily_fecha', table_name='student_daily_stats', if_exists=True)
+    op.drop_table('student_daily_stats', if_exists=True)
+    op.drop_table('session_stats', if_exists=True)
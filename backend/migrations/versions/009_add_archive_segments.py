@@ -0,0 +1,36 @@
+"""Add segmentos_archivo for cold storage of closed sessions
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'segmentos_archivo',
+        sa.Column('sesion_id', sa.Integer(), sa.ForeignKey('sesiones_chat.id'), primary_key=True),
+        sa.Column('particion', sa.String(length=7), nullable=False),
+        sa.Column('ruta', sa.String(length=500), nullable=False),
+        sa.Column('total_mensajes', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_analisis', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('tamano_bytes', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('archivado_en', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        if_not_exists=True,
+    )
+    op.create_index('idx_segmento_particion', 'segmentos_archivo', ['particion'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    # Los segmentos en disco no se restauran automáticamente a las tablas calientes
+    op.drop_index('idx_segmento_particion', table_name='segmentos_archivo', if_exists=True)
+    op.drop_table('segmentos_archivo', if_exists=True)
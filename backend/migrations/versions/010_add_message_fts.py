@@ -0,0 +1,56 @@
+"""Add full-text search index for mensajes (FTS5 on SQLite, GIN tsvector on PostgreSQL)
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS mensajes_fts USING fts5("
+    "texto, content='mensajes', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS mensajes_fts_ai AFTER INSERT ON mensajes BEGIN "
+    "INSERT INTO mensajes_fts(rowid, texto) VALUES (new.id, new.texto); END",
+    "CREATE TRIGGER IF NOT EXISTS mensajes_fts_ad AFTER DELETE ON mensajes BEGIN "
+    "INSERT INTO mensajes_fts(mensajes_fts, rowid, texto) VALUES ('delete', old.id, old.texto); END",
+    "CREATE TRIGGER IF NOT EXISTS mensajes_fts_au AFTER UPDATE OF texto ON mensajes BEGIN "
+    "INSERT INTO mensajes_fts(mensajes_fts, rowid, texto) VALUES ('delete', old.id, old.texto); "
+    "INSERT INTO mensajes_fts(rowid, texto) VALUES (new.id, new.texto); END",
+    # Indexa los mensajes existentes
+    "INSERT INTO mensajes_fts(mensajes_fts) VALUES ('rebuild')",
+]
+
+POSTGRES_UPGRADE = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "DO $$ BEGIN "
+    "IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_unaccent') THEN "
+    "CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = simple); "
+    "ALTER TEXT SEARCH CONFIGURATION es_unaccent ALTER MAPPING FOR hword, hword_part, word WITH unaccent, simple; "
+    "END IF; END $$",
+    "CREATE INDEX IF NOT EXISTS idx_mensaje_texto_fts ON mensajes USING GIN (to_tsvector('es_unaccent', texto))",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    statements = {"sqlite": SQLITE_UPGRADE, "postgresql": POSTGRES_UPGRADE}.get(dialect, [])
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for trigger in ("mensajes_fts_ai", "mensajes_fts_ad", "mensajes_fts_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS mensajes_fts")
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS idx_mensaje_texto_fts")
+        op.execute("DROP TEXT SEARCH CONFIGURATION IF EXISTS es_unaccent")
@@ -0,0 +1,44 @@
+"""Add covering index for faceted analysis search
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+FACET_INDEX = (
+    'idx_analisis_usuario_creado_facetas', 'analisis',
+    ['usuario_id', 'creado_en', 'emocion', 'prioridad', 'alerta', 'emocion_score']
+)
+
+# Prefijo del índice nuevo (usuario_id) y facetas de baja cardinalidad sueltas: el planificador
+# las prefiere sin estadísticas y recorre todo el histórico de esa faceta; solo encarecen las escrituras
+REDUNDANT_INDEXES = [
+    ('idx_analisis_usuario', 'analisis', ['usuario_id']),
+    ('idx_analisis_emocion', 'analisis', ['emocion']),
+    ('idx_analisis_prioridad', 'analisis', ['prioridad']),
+    ('idx_analisis_alerta', 'analisis', ['alerta']),
+]
+
+
+def upgrade():
+    name, table, columns = FACET_INDEX
+    op.create_index(name, table, columns, unique=False, if_not_exists=True)
+    for redundant, table, _ in REDUNDANT_INDEXES:
+        op.drop_index(redundant, table_name=table, if_exists=True)
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute(sa.text('ANALYZE'))
+
+
+def downgrade():
+    for name, table, columns in REDUNDANT_INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+    op.drop_index(FACET_INDEX[0], table_name=FACET_INDEX[1], if_exists=True)
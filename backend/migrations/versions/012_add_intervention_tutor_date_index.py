@@ -0,0 +1,31 @@
+"""Index interventions by tutor and date for the tutor dashboard
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+# "Intervenciones de hoy" filtra por tutor y rango de creado_en; el índice compuesto
+# sustituye al de solo tutor_id (su prefijo)
+NEW_INDEX = ('idx_intervencion_tutor_creado', 'intervenciones', ['tutor_id', 'creado_en'])
+OLD_INDEX = ('idx_intervencion_tutor', 'intervenciones', ['tutor_id'])
+
+
+def upgrade():
+    name, table, columns = NEW_INDEX
+    op.create_index(name, table, columns, unique=False, if_not_exists=True)
+    op.drop_index(OLD_INDEX[0], table_name=OLD_INDEX[1], if_exists=True)
+
+
+def downgrade():
+    name, table, columns = OLD_INDEX
+    op.create_index(name, table, columns, unique=False, if_not_exists=True)
+    op.drop_index(NEW_INDEX[0], table_name=NEW_INDEX[1], if_exists=True)
@@ -0,0 +1,39 @@
+"""Add student_emotion_rollups (hourly/daily/weekly emotional timeline)
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-19 16:00:00.000000
+
+Tras aplicar la migración, poblar la tabla con `python rebuild_stats.py`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'student_emotion_rollups',
+        sa.Column('usuario_id', sa.Integer(), sa.ForeignKey('usuarios.id'), primary_key=True),
+        sa.Column('resolucion', sa.String(10), primary_key=True),
+        sa.Column('inicio', sa.DateTime(), primary_key=True),
+        sa.Column('analisis_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('alertas', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('emociones', sa.JSON(), nullable=True),
+        sa.Column('estilos', sa.JSON(), nullable=True),
+        sa.Column('emocion_score_suma', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('emocion_score_n', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('estilo_score_suma', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('estilo_score_n', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('actualizado_en', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table('student_emotion_rollups', if_exists=True)
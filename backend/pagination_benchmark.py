@@ -0,0 +1,114 @@
+# backend/pagination_benchmark.py
+"""
+Benchmark de paginación: offset/limit frente a cursor (keyset) a distintas profundidades.
+
+Siembra un usuario con N mensajes en una base SQLite temporal y mide la latencia de
+una página de `crud.get_messages_by_user` en cada profundidad, con `offset` y con `cursor`.
+Con offset la latencia crece con la profundidad; con cursor se mantiene constante.
+
+Uso:
+    python pagination_benchmark.py --messages 200000 --page-size 50
+    python pagination_benchmark.py --depths 0 1000 10000 100000 --repeat 20
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from statistics import median
+
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+
+def seed_messages(engine, count: int) -> int:
+    """Inserta un usuario y `count` mensajes suyos; varios comparten segundo para forzar desempates."""
+    from app.db.models import Usuario, Mensaje, RolUsuario, EstadoUsuario
+
+    with engine.begin() as conn:
+        user_id = conn.execute(Usuario.__table__.insert().values(
+            email="paginacion@bench.test", nombre="Benchmark", hashed_password="x",
+            rol=RolUsuario.ESTUDIANTE, estado=EstadoUsuario.ACTIVO
+        )).inserted_primary_key[0]
+        start = datetime(2024, 1, 1)
+        batch = 10000
+        for offset in range(0, count, batch):
+            conn.execute(Mensaje.__table__.insert(), [
+                {"usuario_id": user_id, "texto": f"mensaje {i}", "remitente": "user",
+                 "tipo_mensaje": "texto", "creado_en": start + timedelta(seconds=i // 3)}
+                for i in range(offset, min(offset + batch, count))
+            ])
+    return user_id
+
+
+def time_page(fn, repeat: int) -> float:
+    """Mediana en milisegundos de `repeat` ejecuciones."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return round(median(samples) * 1000, 3)
+
+
+def run_benchmark(messages: int, page_size: int, depths, repeat: int) -> dict:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.db import crud
+    from app.db.models import Base
+    from app.db.pagination import encode_cursor
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pagination.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    user_id = seed_messages(engine, messages)
+
+    db = sessionmaker(bind=engine)()
+    results = []
+    try:
+        for depth in depths:
+            if depth >= messages:
+                continue
+            # Cursor equivalente a la profundidad (preparación, no se mide)
+            anchor = crud.get_messages_by_user(db, user_id, limit=1, offset=depth - 1)[0] if depth else None
+            cursor = encode_cursor(anchor.creado_en, anchor.id) if anchor else None
+
+            offset_page = crud.get_messages_by_user(db, user_id, limit=page_size, offset=depth)
+            keyset_page = crud.get_messages_by_user(db, user_id, limit=page_size, cursor=cursor)
+            assert [m.id for m in offset_page] == [m.id for m in keyset_page], (depth, [m.id for m in offset_page][:5], [m.id for m in keyset_page][:5], anchor.id if anchor else None)
+
+            results.append({
+                "depth": depth,
+                "offset_ms": time_page(lambda: crud.get_messages_by_user(db, user_id, limit=page_size, offset=depth), repeat),
+                "cursor_ms": time_page(lambda: crud.get_messages_by_user(db, user_id, limit=page_size, cursor=cursor), repeat),
+            })
+            db.expunge_all()
+    finally:
+        db.close()
+        engine.dispose()
+
+    return {"messages": messages, "page_size": page_size, "repeat": repeat, "pages": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de paginación offset vs cursor")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1000, 10000, 50000, 90000])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", help="ruta donde guardar el reporte JSON")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.messages, args.page_size, args.depths, args.repeat)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
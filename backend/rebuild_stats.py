@@ -0,0 +1,25 @@
+# backend/rebuild_stats.py
+"""
+Script para regenerar las tablas de agregados (session_stats, student_daily_stats,
+student_emotion_rollups) a partir de mensajes y análisis. Ejecutarlo tras las migraciones
+008 y 013 o si se sospecha que los agregados se desviaron (p. ej. tras escrituras masivas
+fuera del ORM).
+"""
+
+from app.db.session import SessionLocal
+from app.db.stats import rebuild_stats
+
+
+def rebuild():
+    print("🛠️  Regenerando tablas de agregados...")
+    db = SessionLocal()
+    try:
+        result = rebuild_stats(db)
+    finally:
+        db.close()
+    print(f"✅ {result['session_stats']} sesiones, {result['student_daily_stats']} días de estudiante y "
+          f"{result['student_emotion_rollups']} periodos de serie emocional regenerados.")
+
+
+if __name__ == "__main__":
+    rebuild()
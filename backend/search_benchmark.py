@@ -0,0 +1,143 @@
+# backend/search_benchmark.py
+"""
+Benchmark de búsqueda de mensajes: LIKE '%q%' frente al índice FTS5.
+
+Siembra N mensajes en una base SQLite temporal (el índice se construye con los triggers
+de `app.db.search`) y mide la latencia de `search_messages` frente al LIKE con comodín
+inicial que usaba /chat/search. El vocabulario sigue una distribución de Zipf: unas pocas
+palabras muy frecuentes y una cola larga de términos poco comunes, como en un chat real.
+
+El LIKE recorre filas hasta llenar la página: es rápido con términos muy frecuentes y
+recorre la tabla entera con términos raros o inexistentes. FTS solo toca las filas que
+coinciden, pero las ordena todas por relevancia: su coste crece con `matches`.
+
+Uso:
+    python search_benchmark.py --messages 1000000
+    python search_benchmark.py --messages 200000 --queries ansiedad "examen final" --repeat 20
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from itertools import accumulate
+from statistics import median
+
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+VOCABULARIO = (
+    "hoy mañana siento estoy tengo mucho poco miedo ansiedad tristeza alegría cansancio "
+    "examen final tarea clase profesor compañeros familia casa dormir estudiar trabajo "
+    "nervioso tranquilo preocupado feliz solo ayuda hablar semana difícil fácil matemáticas "
+    "historia proyecto entrega nota aprobar suspender amigos problema tiempo noche día"
+).split()
+
+
+def build_vocabulary(size: int, seed: int):
+    """Palabras comunes más una cola de términos sintéticos, con pesos de Zipf (1/rango) acumulados."""
+    rng = random.Random(seed)
+    letras = "abcdefghijlmnoprstuvz"
+    cola = ["".join(rng.choices(letras, k=rng.randint(5, 10))) for _ in range(size)]
+    palabras = list(VOCABULARIO) + cola
+    return palabras, list(accumulate(1 / (rango + 1) for rango in range(len(palabras))))
+
+
+def seed_messages(engine, count: int, vocabulary_size: int = 20000, seed: int = 42) -> int:
+    """Inserta un estudiante con una sesión y `count` mensajes aleatorios."""
+    from app.db.models import Usuario, SesionChat, Mensaje, RolUsuario, EstadoUsuario
+
+    rng = random.Random(seed)
+    palabras, acumulados = build_vocabulary(vocabulary_size, seed)
+    with engine.begin() as conn:
+        user_id = conn.execute(Usuario.__table__.insert().values(
+            email="busqueda@bench.test", nombre="Benchmark", hashed_password="x",
+            rol=RolUsuario.ESTUDIANTE, estado=EstadoUsuario.ACTIVO
+        )).inserted_primary_key[0]
+        sesion_id = conn.execute(SesionChat.__table__.insert().values(
+            usuario_id=user_id, estado="activa"
+        )).inserted_primary_key[0]
+        batch = 10000
+        for offset in range(0, count, batch):
+            conn.execute(Mensaje.__table__.insert(), [
+                {"usuario_id": user_id, "sesion_id": sesion_id, "remitente": "user", "tipo_mensaje": "texto",
+                 "texto": " ".join(rng.choices(palabras, cum_weights=acumulados, k=rng.randint(5, 25)))}
+                for _ in range(offset, min(offset + batch, count))
+            ])
+    return user_id
+
+
+def time_query(fn, repeat: int) -> float:
+    """Mediana en milisegundos de `repeat` ejecuciones."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return round(median(samples) * 1000, 3)
+
+
+def run_benchmark(messages: int, queries, limit: int, repeat: int, vocabulary_size: int = 20000) -> dict:
+    from sqlalchemy import create_engine, or_, text
+    from sqlalchemy.orm import sessionmaker
+    from app.db import search
+    from app.db.models import Base, Mensaje, SesionChat
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'search.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    t0 = time.perf_counter()
+    user_id = seed_messages(engine, messages, vocabulary_size)
+    seed_seconds = round(time.perf_counter() - t0, 1)
+
+    def like(q):
+        # Consulta anterior de /chat/search (LIKE con comodín inicial)
+        return db.query(Mensaje).join(SesionChat).filter(
+            or_(SesionChat.usuario_id == user_id, SesionChat.tutor_id == user_id),
+            Mensaje.texto.contains(q)
+        ).order_by(Mensaje.creado_en.desc()).limit(limit).all()
+
+    db = sessionmaker(bind=engine)()
+    results = []
+    try:
+        for q in queries:
+            results.append({
+                "query": q,
+                "matches": db.execute(
+                    text("SELECT count(*) FROM mensajes_fts WHERE mensajes_fts MATCH :q"),
+                    {"q": search._fts5_query(search.search_terms(q))}
+                ).scalar(),
+                "like_ms": time_query(lambda: like(q), repeat),
+                "fts_ms": time_query(lambda: search.search_messages(db, q, user_id, limit=limit), repeat),
+            })
+            db.expunge_all()
+    finally:
+        db.close()
+        engine.dispose()
+
+    return {"messages": messages, "vocabulary": vocabulary_size, "seed_seconds": seed_seconds, "limit": limit, "repeat": repeat, "queries": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda LIKE vs FTS5")
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--queries", nargs="+", default=["hoy", "ansiedad", "examen final", "matemáticas difícil", "inexistente"])
+    parser.add_argument("--vocabulary", type=int, default=20000, help="términos de la cola de Zipf")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", help="ruta donde guardar el reporte JSON")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.messages, args.queries, args.limit, args.repeat, args.vocabulary)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
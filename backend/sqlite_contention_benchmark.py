@@ -0,0 +1,182 @@
+# backend/sqlite_contention_benchmark.py
+"""
+Benchmark de contención de escritura en SQLite.
+
+Lanza hilos escritores (mensajes de chat y métricas, como los guardados en segundo plano,
+los handlers de WebSocket y el bucle de monitoreo) y hilos lectores (páginas de mensajes)
+contra dos perfiles sobre bases temporales:
+  - legacy: engine único con pool, sin pragmas (journal en modo rollback).
+  - optimized: perfil de `app.db.sqlite` (WAL, escritor único, lectores de solo lectura).
+
+Reporta operaciones por segundo, percentiles de latencia y errores de bloqueo por perfil.
+
+Uso:
+    python sqlite_contention_benchmark.py --writers 8 --readers 8 --duration 10
+    python sqlite_contention_benchmark.py --profile optimized --max-lock-errors 0
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from typing import Dict, List
+
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.exceptions import DatabaseError
+from app.db import crud
+from app.db.models import Base
+from app.db.sqlite import create_sqlite_engines, SQLiteRoutingSession
+from app.schemas.message import MessageCreate
+from ws_load_test import seed_population, percentiles
+
+PROFILES = ("legacy", "optimized")
+
+
+def build_session_factory(profile: str, url: str):
+    """Devuelve (sessionmaker, engines) para el perfil indicado."""
+    if profile == "legacy":
+        engine = create_engine(
+            url,
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_MAX_OVERFLOW,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+            connect_args={"check_same_thread": False}
+        )
+        return sessionmaker(autocommit=False, autoflush=False, bind=engine), [engine]
+
+    reader, writer = create_sqlite_engines(url, create_engine, connect_args={"check_same_thread": False})
+    factory = sessionmaker(
+        class_=SQLiteRoutingSession,
+        autocommit=False,
+        autoflush=False,
+        info={"sqlite_reader": reader, "sqlite_writer": writer}
+    )
+    return factory, [reader, writer]
+
+
+def _worker(kind: str, factory, sessions, deadline: float, think_time: float,
+            results: Dict[str, list], lock: threading.Lock):
+    latencies: List[float] = []
+    errors = 0
+    db = factory()
+    try:
+        while time.perf_counter() < deadline:
+            session_id, student_id, _ = random.choice(sessions)
+            t0 = time.perf_counter()
+            try:
+                if kind == "write":
+                    crud.create_message(db, MessageCreate(
+                        texto="mensaje de benchmark", usuario_id=student_id,
+                        sesion_id=session_id, remitente="user"
+                    ))
+                elif kind == "metric":
+                    crud.create_metric(db, "benchmark", "contencion", random.random(), "ms")
+                else:
+                    crud.get_session_messages_page(db, session_id, limit=50)
+                    db.rollback()  # cerrar la transacción de lectura para no retener el snapshot
+            except DatabaseError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - t0)
+            if think_time:
+                time.sleep(random.uniform(0, 2 * think_time))
+    finally:
+        db.close()
+    with lock:
+        results[kind + "_latencies"].extend(latencies)
+        results[kind + "_errors"] += errors
+
+
+def run_profile(profile: str, writers: int, metric_writers: int, readers: int,
+                duration: float, students: int, think_time: float = 0.01) -> dict:
+    """Ejecuta el benchmark para un perfil sobre una base temporal nueva."""
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), f'{profile}.db')}"
+    factory, engines = build_session_factory(profile, url)
+    Base.metadata.create_all(bind=engines[-1])
+
+    db = factory()
+    try:
+        population = seed_population(db, students, max(1, students // 20))
+    finally:
+        db.close()
+
+    results = {f"{kind}_{metric}": ([] if metric == "latencies" else 0)
+               for kind in ("write", "metric", "read") for metric in ("latencies", "errors")}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    threads = (
+        [threading.Thread(target=_worker, args=("write", factory, population.sessions, deadline, think_time, results, lock))
+         for _ in range(writers)]
+        + [threading.Thread(target=_worker, args=("metric", factory, population.sessions, deadline, think_time, results, lock))
+           for _ in range(metric_writers)]
+        + [threading.Thread(target=_worker, args=("read", factory, population.sessions, deadline, think_time, results, lock))
+           for _ in range(readers)]
+    )
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    for engine in engines:
+        engine.dispose()
+
+    report = {"profile": profile, "elapsed_s": round(elapsed, 2)}
+    for kind in ("write", "metric", "read"):
+        samples = results[f"{kind}_latencies"]
+        report[kind] = {
+            "ops_per_second": round(len(samples) / elapsed, 1),
+            "lock_errors": results[f"{kind}_errors"],
+            "latency": percentiles(samples)
+        }
+    report["lock_errors"] = sum(report[kind]["lock_errors"] for kind in ("write", "metric", "read"))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de contención de SQLite de PsiChat")
+    parser.add_argument("--profile", choices=PROFILES + ("both",), default="both")
+    parser.add_argument("--writers", type=int, default=8, help="hilos que guardan mensajes")
+    parser.add_argument("--metric-writers", type=int, default=2, help="hilos que guardan métricas")
+    parser.add_argument("--readers", type=int, default=8, help="hilos que leen páginas de mensajes")
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos por perfil")
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--think-time", type=float, default=0.01,
+                        help="pausa media entre operaciones de cada hilo (0 = bucle cerrado, limitado por el GIL)")
+    parser.add_argument("--max-lock-errors", type=int, help="falla si el perfil optimizado los supera")
+    parser.add_argument("--output", help="ruta donde guardar el reporte JSON")
+    args = parser.parse_args()
+
+    profiles = PROFILES if args.profile == "both" else (args.profile,)
+    report = {
+        profile: run_profile(profile, args.writers, args.metric_writers, args.readers,
+                             args.duration, args.students, args.think_time)
+        for profile in profiles
+    }
+
+    failures = []
+    optimized = report.get("optimized")
+    if args.max_lock_errors is not None and optimized and optimized["lock_errors"] > args.max_lock_errors:
+        failures.append(f"lock_errors {optimized['lock_errors']} > {args.max_lock_errors}")
+    report["gate"] = {"passed": not failures, "failures": failures}
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
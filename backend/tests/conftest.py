@@ -5,9 +5,11 @@ Configuración de pytest y fixtures comunes para todos los tests.
 import pytest
 import os
 import sys
-from typing import Generator
+from typing import Generator, List
+from contextlib import contextmanager
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
@@ -20,7 +22,7 @@ os.environ["GEMINI_API_KEY"] = "test-key"
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.db.models import Base
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from app.core.config import settings
 from app.db.models import Usuario, RolUsuario, EstadoUsuario
 from app.core.security import get_password_hash
@@ -71,6 +73,7 @@ def client(db_session):
     
     # Override de la dependencia de base de datos
     app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_read_db] = lambda: db_session
     
     with TestClient(app) as test_client:
         yield test_client
@@ -78,6 +81,37 @@ def client(db_session):
     # Limpiar overrides
     app.dependency_overrides.clear()
 
+class QueryCounter:
+    """Registra las sentencias SQL ejecutadas para detectar consultas N+1."""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @contextmanager
+    def budget(self, max_queries: int):
+        """Falla si el bloque ejecuta más de `max_queries` consultas."""
+        start = len(self.statements)
+        yield self
+        executed = self.statements[start:]
+        assert len(executed) <= max_queries, (
+            f"Se ejecutaron {len(executed)} consultas (máximo {max_queries}):\n" + "\n".join(executed)
+        )
+
+@pytest.fixture
+def query_counter():
+    """Cuenta las consultas emitidas por cualquier engine durante el test."""
+    counter = QueryCounter()
+    event.listen(Engine, "before_cursor_execute", counter._record)
+    yield counter
+    event.remove(Engine, "before_cursor_execute", counter._record)
+
 @pytest.fixture
 def test_student(db_session):
     """Usuario estudiante de prueba."""
@@ -125,6 +159,22 @@ def test_admin(db_session):
     db_session.refresh(user)
     return user
 
+@pytest.fixture
+def authenticated_tutor(client, db_session):
+    """Tutor autenticado mediante override de get_current_user (email único)."""
+    import uuid
+    from app.main import app
+    from app.dependencies import get_current_user
+
+    user = Usuario(
+        email=f"tutor_{uuid.uuid4().hex[:8]}@test.com", nombre="Tutor", hashed_password="x",
+        rol=RolUsuario.TUTOR, estado=EstadoUsuario.ACTIVO
+    )
+    db_session.add(user)
+    db_session.commit()
+    app.dependency_overrides[get_current_user] = lambda: user
+    return user
+
 @pytest.fixture
 def auth_headers_student(client, db_session):
     """Headers de autenticación para estudiante."""
@@ -140,4 +140,137 @@ class TestAnalysis:
         response = client.post("/analysis/", json={"texto": low_priority_text}, headers=auth_headers_student)
         assert response.status_code == status.HTTP_200_OK
         data = response.json()
-        assert "priority" in data 
\ No newline at end of file
+        assert "priority" in data 
+
+class TestDeepAnalysis:
+    """Tests para perform_deep_analysis sobre matrices de distribuciones."""
+
+    def test_averages_window_and_risk(self, db_session, test_student):
+        """Test de promedios, evaluación de riesgo y ventana configurable."""
+        from datetime import datetime, timedelta
+        from app.db.models import Mensaje, Analisis
+        from app.services.analysis_service import perform_deep_analysis
+
+        filas = [
+            ([["tristeza", 80.0], ["alegría", 20.0]], [["formal", 100.0]], "alta"),
+            ([["tristeza", 40.0]], [["formal", 50.0], ["informal", 50.0]], "media"),
+            ([["alegría", 90.0], ["ansiedad", 10.0]], [["informal", 70.0]], "normal"),
+            ([["ansiedad", 100.0]], [["formal", 10.0]], "crítica"),
+        ]
+        base = datetime(2025, 3, 1, 12)
+        for i, (emociones, estilos, prioridad) in enumerate(filas):
+            mensaje = Mensaje(usuario_id=test_student.id, texto=f"m{i}", remitente="user",
+                              creado_en=base + timedelta(minutes=i))
+            db_session.add(mensaje)
+            db_session.flush()
+            db_session.add(Analisis(
+                mensaje_id=mensaje.id, usuario_id=test_student.id, emocion=emociones[0][0],
+                emocion_score=emociones[0][1], estilo=estilos[0][0], estilo_score=estilos[0][1],
+                distribucion_emociones=emociones, distribucion_estilos=estilos, prioridad=prioridad
+            ))
+        db_session.commit()
+
+        result = perform_deep_analysis(db_session, test_student.id, limit=4)
+        assert result["total_messages"] == 4
+        assert result["average_emotion_score"] == pytest.approx((80 + 40 + 90 + 100) / 4)
+        assert result["risk_assessment"] == {"high_risk_messages": 2, "medium_risk_messages": 1, "low_risk_messages": 1}
+        # El más reciente primero
+        assert [t["emotion"] for t in result["emotion_trend"]] == ["ansiedad", "alegría", "tristeza", "tristeza"]
+
+        result = perform_deep_analysis(db_session, test_student.id, limit=2)
+        assert result["total_messages"] == 2
+        assert result["average_style_score"] == pytest.approx((10 + 70) / 2)
+
+    def _add(self, db_session, user, i, analizar=True):
+        from app.db.models import Mensaje, Analisis
+
+        mensaje = Mensaje(usuario_id=user.id, texto=f"mensaje {i}", remitente="user")
+        db_session.add(mensaje)
+        db_session.flush()
+        if analizar:
+            self._analyze(db_session, user, mensaje.id, i)
+        db_session.commit()
+        return mensaje
+
+    def _analyze(self, db_session, user, mensaje_id, i):
+        from app.db.models import Analisis
+
+        emociones = [["tristeza", float(10 + i % 7)], ["alegría", float(i % 5)]] + ([["ansiedad", 3.5]] if i % 3 else [])
+        db_session.add(Analisis(
+            mensaje_id=mensaje_id, usuario_id=user.id, emocion="tristeza", emocion_score=float(10 + i % 7),
+            estilo="formal", estilo_score=float(i), distribucion_emociones=emociones,
+            distribucion_estilos=[["formal", float(i)], ["informal", 1.0]],
+            prioridad=["alta", "media", "normal"][i % 3]
+        ))
+        db_session.commit()
+
+    def _assert_matches_full(self, db_session, user, result, limit):
+        from app.services.analysis_service import perform_deep_analysis
+
+        full = perform_deep_analysis(db_session, user.id, limit)
+        for key in ("average_emotion_score", "average_style_score"):
+            assert result.pop(key) == pytest.approx(full.pop(key))
+        assert result == full
+
+    def test_cache_incremental_matches_full(self, db_session, test_student, monkeypatch, query_counter):
+        """Test de aciertos, actualización incremental e invalidación frente al recálculo completo."""
+        from app.core.config import settings
+        from app.db.cache import deep_analysis_cache
+        from app.db.models import Analisis
+        from app.services.analysis_service import get_deep_analysis
+
+        monkeypatch.setattr(settings, "CACHE_ENABLED", True)
+        deep_analysis_cache.clear()
+        for i in range(8):
+            self._add(db_session, test_student, i)
+
+        result = get_deep_analysis(db_session, test_student.id, 5)
+        self._assert_matches_full(db_session, test_student, dict(result), 5)
+        start = query_counter.count
+        assert get_deep_analysis(db_session, test_student.id, 5) == result
+        assert query_counter.count - start == 1  # Solo la clave
+        assert deep_analysis_cache.stats == {"misses": 1, "hits": 1}
+
+        # Mensajes nuevos: solo se leen esos y salen los más antiguos de la ventana
+        for i in range(8, 11):
+            self._add(db_session, test_student, i)
+        self._assert_matches_full(db_session, test_student, dict(get_deep_analysis(db_session, test_student.id, 5)), 5)
+        assert deep_analysis_cache.stats["incremental"] == 1
+
+        # Un mensaje sin análisis entra con análisis al vuelo; al guardarse su análisis se recalcula
+        mensaje = self._add(db_session, test_student, 11, analizar=False)
+        get_deep_analysis(db_session, test_student.id, 5)
+        assert deep_analysis_cache.stats["incremental"] == 2
+        self._analyze(db_session, test_student, mensaje.id, 11)
+        self._assert_matches_full(db_session, test_student, dict(get_deep_analysis(db_session, test_student.id, 5)), 5)
+        assert deep_analysis_cache.stats["misses"] == 2
+
+        # Modificar un análisis ya sumado invalida la ventana
+        analisis = db_session.query(Analisis).filter_by(mensaje_id=mensaje.id).one()
+        analisis.prioridad = "crítica"
+        db_session.commit()
+        result = get_deep_analysis(db_session, test_student.id, 5)
+        assert deep_analysis_cache.stats["misses"] == 3
+        assert result["risk_assessment"]["high_risk_messages"] == 2
+        self._assert_matches_full(db_session, test_student, dict(result), 5)
+
+    def test_cache_bounded_lru(self, monkeypatch):
+        """Test que la caché no supera CACHE_MAX_ENTRIES, expulsa el menos usado y descarta caducados."""
+        from app.core.config import settings
+        from app.db.cache import SnapshotCache
+
+        monkeypatch.setattr(settings, "CACHE_MAX_ENTRIES", 3)
+        cache = SnapshotCache()
+        for owner_id in range(1, 4):
+            cache.set(owner_id, "k", owner_id, cache.version(owner_id))
+        assert cache.entry(1) == ("k", 1)  # 1 pasa a ser el más reciente
+
+        for owner_id in range(4, 6):
+            cache.set(owner_id, "k", owner_id, cache.version(owner_id))
+        assert len(cache) == 3
+        assert [cache.get(owner_id, "k") for owner_id in range(1, 6)] == [1, None, None, 4, 5]
+        assert cache.stats["evictions"] == 2
+
+        monkeypatch.setattr(settings, "CACHE_TTL", -1)
+        cache.set(6, "k", 6, cache.version(6))
+        assert len(cache) == 1
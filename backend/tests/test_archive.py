@@ -0,0 +1,170 @@
+"""
+Tests del archivado frío de sesiones cerradas (app.db.archive).
+"""
+
+import os
+import pytest
+from datetime import datetime, timedelta
+from fastapi import status
+
+from app.core.config import settings
+from app.db import crud
+from app.db.archive import archive_session, archive_closed_sessions, read_session_messages, stream_segment, _read_segment
+from app.db.models import Mensaje, Analisis, Alerta, SesionChat, SegmentoArchivo, EstadisticasSesion
+from app.db.stats import rebuild_stats
+
+
+class TestArchive:
+    """Tests de segmentos de archivo y lectura transparente."""
+
+    @pytest.fixture(autouse=True)
+    def archive_dir(self, tmp_path, monkeypatch, db_session):
+        monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path))
+        yield tmp_path
+        # Los segmentos viven en tmp_path: no dejar referencias para otros tests
+        db_session.rollback()
+        db_session.query(SegmentoArchivo).delete()
+        db_session.commit()
+
+    def _closed_session(self, db_session, student, days_ago=120, messages=5):
+        sesion = SesionChat(
+            usuario_id=student.id, estado="cerrada",
+            iniciada_en=datetime.now() - timedelta(days=days_ago, hours=1),
+            finalizada_en=datetime.now() - timedelta(days=days_ago)
+        )
+        db_session.add(sesion)
+        db_session.flush()
+        base = datetime(2024, 3, 1, 10, 0, 0)
+        for i in range(messages):
+            mensaje = Mensaje(usuario_id=student.id, sesion_id=sesion.id, texto=f"mensaje {i}",
+                              remitente="user", creado_en=base + timedelta(seconds=i // 2))
+            db_session.add(mensaje)
+            db_session.flush()
+            db_session.add(Analisis(mensaje_id=mensaje.id, usuario_id=student.id, emocion="tristeza",
+                                    distribucion_emociones=[["tristeza", 0.9], ["neutral", 0.1]]))
+        db_session.commit()
+        return sesion
+
+    def test_archive_and_read_through(self, db_session, test_student, archive_dir):
+        """Test que la sesión archivada sale de las tablas y se lee igual desde el segmento."""
+        sesion = self._closed_session(db_session, test_student)
+        hot, _ = read_session_messages(db_session, sesion.id)
+        expected = [(m.id, m.texto, m.creado_en, m.analisis.emocion) for m in hot]
+
+        segmento = archive_session(db_session, sesion)
+        assert os.path.exists(archive_dir / segmento.ruta)
+        assert segmento.total_mensajes == 5
+        assert db_session.query(Mensaje).filter(Mensaje.sesion_id == sesion.id).count() == 0
+
+        cold, _ = read_session_messages(db_session, sesion.id)
+        assert [(m.id, m.texto, m.creado_en, m.analisis.emocion) for m in cold] == expected
+        assert cold[0].analisis.distribucion_emociones == [["tristeza", 0.9], ["neutral", 0.1]]
+        assert cold[0].usuario.id == test_student.id
+
+        # Paginación por cursor sobre el segmento
+        page, cursor = read_session_messages(db_session, sesion.id, limit=2)
+        rest, _ = read_session_messages(db_session, sesion.id, cursor=cursor)
+        assert [m.id for m in page + rest] == [row[0] for row in expected]
+
+        reporte = crud.get_mensajes_sesion_para_reporte(db_session, sesion.id)
+        assert [m["id"] for m in reporte] == [row[0] for row in expected]
+
+    def test_stream_segment_resumes_in_file_order(self, db_session, test_student):
+        """Test que el streaming no usa la caché, respeta el orden del segmento y reanuda dentro de él."""
+        sesion = self._closed_session(db_session, test_student, messages=4)
+        # Fechas al revés que los ids: el segmento queda en orden (creado_en, id), no de id
+        mensajes = db_session.query(Mensaje).filter(Mensaje.sesion_id == sesion.id).order_by(Mensaje.id).all()
+        for i, mensaje in enumerate(mensajes):
+            mensaje.creado_en = datetime(2024, 3, 1, 10, 0, 0) - timedelta(minutes=i)
+        db_session.commit()
+        ids = [m.id for m in reversed(mensajes)]
+        segmento = archive_session(db_session, sesion)
+
+        _read_segment.cache_clear()
+        assert [m["id"] for m, _ in stream_segment(segmento.ruta)] == ids
+        assert _read_segment.cache_info().currsize == 0
+
+        assert [m["id"] for m, _ in stream_segment(segmento.ruta, after_id=ids[1])] == ids[2:]
+        assert list(stream_segment(segmento.ruta, after_id=ids[-1])) == []
+        # Id ausente del segmento: se reanuda por id
+        assert [m["id"] for m, _ in stream_segment(segmento.ruta, after_id=min(ids) - 1)] == ids
+
+    def test_stats_survive_archival(self, db_session, test_student):
+        """Test que los agregados se conservan y rebuild_stats incluye los segmentos."""
+        sesion = self._closed_session(db_session, test_student)
+        archive_session(db_session, sesion)
+
+        stats = db_session.get(EstadisticasSesion, sesion.id)
+        assert stats.total_mensajes == 5 and stats.emociones == {"tristeza": 5}
+        rebuild_stats(db_session)
+        db_session.expire_all()
+        stats = db_session.get(EstadisticasSesion, sesion.id)
+        assert stats.total_mensajes == 5 and stats.emociones == {"tristeza": 5}
+
+    def test_alert_analyses_stay_hot(self, db_session, test_student):
+        """Test que los análisis con alertas (y sus mensajes) no se borran."""
+        sesion = self._closed_session(db_session, test_student, messages=3)
+        analisis = db_session.query(Analisis).join(Mensaje).filter(Mensaje.sesion_id == sesion.id).first()
+        db_session.add(Alerta(usuario_id=test_student.id, analisis_id=analisis.id, tipo_alerta="emocional",
+                              nivel_urgencia="alta", descripcion="test"))
+        db_session.commit()
+
+        archive_session(db_session, sesion)
+        assert db_session.query(Mensaje).filter(Mensaje.sesion_id == sesion.id).count() == 1
+        assert db_session.get(Analisis, analisis.id) is not None
+        assert len(read_session_messages(db_session, sesion.id)[0]) == 3
+
+    def test_batch_selects_old_closed_sessions(self, db_session, test_student):
+        """Test que el lote solo archiva sesiones cerradas antes del límite."""
+        viejas = [self._closed_session(db_session, test_student, messages=1) for _ in range(3)]
+        reciente = self._closed_session(db_session, test_student, days_ago=1, messages=1)
+
+        result = archive_closed_sessions(db_session, older_than_days=90, max_sessions=2, throttle_seconds=0)
+        assert result["sesiones"] == 2
+        archive_closed_sessions(db_session, older_than_days=90, throttle_seconds=0)
+
+        archivadas = {sid for (sid,) in db_session.query(SegmentoArchivo.sesion_id)}
+        assert {s.id for s in viejas} <= archivadas
+        assert reciente.id not in archivadas
+
+    def test_history_endpoint_reads_archive(self, client, db_session, test_student):
+        """Test que el historial de la sesión se sirve desde el segmento."""
+        from app.main import app
+        from app.dependencies import get_current_user
+
+        sesion = self._closed_session(db_session, test_student, messages=4)
+        archive_session(db_session, sesion)
+        app.dependency_overrides[get_current_user] = lambda: test_student
+
+        response = client.get(f"/chat/session/{sesion.id}/messages?limit=3")
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) == 3
+        assert response.json()[0]["analisis"]["emocion"] == "tristeza"
+        assert "X-Next-Cursor" in response.headers
+
+    def test_timeline_falls_back_to_rollups(self, db_session, test_student):
+        """Test que la serie emocional cuenta los análisis archivados usando las series por hora."""
+        from app.services.timeline_service import get_student_timeline
+
+        sesion = SesionChat(usuario_id=test_student.id, estado="cerrada",
+                            iniciada_en=datetime(2024, 3, 1, 9, 0), finalizada_en=datetime(2024, 3, 1, 12, 0))
+        db_session.add(sesion)
+        db_session.flush()
+        for i in range(4):
+            creado_en = datetime(2024, 3, 1, 10 + i // 2, 0)
+            mensaje = Mensaje(usuario_id=test_student.id, sesion_id=sesion.id, texto=f"mensaje {i}",
+                              remitente="user", creado_en=creado_en)
+            db_session.add(mensaje)
+            db_session.flush()
+            db_session.add(Analisis(mensaje_id=mensaje.id, usuario_id=test_student.id, emocion="tristeza",
+                                    emocion_score=50.0, creado_en=creado_en))
+        db_session.commit()
+
+        rango = (datetime(2024, 3, 1), datetime(2024, 3, 2))
+        timeline = get_student_timeline(db_session, test_student.id, *rango, puntos=50)
+        assert timeline["resolucion"] == "mensaje" and len(timeline["puntos"]) == 4
+
+        archive_session(db_session, sesion)
+        timeline = get_student_timeline(db_session, test_student.id, *rango, puntos=50)
+        assert timeline["resolucion"] == "hora"
+        assert [p["analisis"] for p in timeline["puntos"]] == [2, 2]
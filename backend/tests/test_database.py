@@ -2,12 +2,27 @@
 Tests para operaciones de base de datos CRUD.
 """
 
+import json
+import asyncio
 import pytest
-from app.db import crud
+from app.db import crud, crud_async
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal, get_async_database_url
+from app.db.sqlite import is_sqlite_file, create_sqlite_engines, SQLiteRoutingSession
+from app.db.pagination import encode_cursor, decode_cursor, split_page
+from app.core.exceptions import ValidationError
 from app.schemas.user import UserCreate
 from app.schemas.message import MessageCreate
 from app.schemas.analysis_record import AnalysisCreate
-from app.db.models import RolUsuario, EstadoUsuario
+from datetime import datetime, timedelta
+from app.db.models import (
+    Base, Mensaje, Analisis, Metricas, SesionChat, RolUsuario, EstadoUsuario,
+    EstadisticasSesion, EstadisticasEstudianteDiarias, SerieEmocionalEstudiante
+)
+from app.db.stats import rebuild_stats
 
 
 class TestDatabaseCRUD:
@@ -283,4 +298,623 @@ class TestDatabaseCRUD:
         from passlib.exc import UnknownHashError
         
         with pytest.raises(UnknownHashError):
-            verify_password(password, "invalid_hash") 
\ No newline at end of file
+            verify_password(password, "invalid_hash") 
+
+
+class TestAsyncDatabaseCRUD:
+    """Tests para las variantes async de CRUD."""
+
+    def test_async_database_url(self):
+        """Test traducción de URL al driver async."""
+        assert get_async_database_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+        assert get_async_database_url("postgresql://u:p@host/db") == "postgresql+asyncpg://u:p@host/db"
+
+    def test_async_message_and_analysis(self, test_student):
+        """Test crear mensaje y análisis y leerlos con AsyncSession."""
+        async def run():
+            async with AsyncSessionLocal() as db:
+                session = await crud_async.get_chat_session(db, 999999)
+                assert session is None
+
+                message = await crud_async.create_message(db, MessageCreate(
+                    usuario_id=test_student.id,
+                    texto="Mensaje async",
+                    remitente="user"
+                ))
+                await crud_async.create_analysis(db, AnalysisCreate(
+                    mensaje_id=message.id,
+                    usuario_id=test_student.id,
+                    emocion="alegria"
+                ))
+                user = await crud_async.get_user(db, test_student.id)
+                return message, user
+
+        message, user = asyncio.run(run())
+        assert message.id is not None
+        assert message.texto == "Mensaje async"
+        assert user.email == test_student.email
+
+    def test_async_visible_to_sync_session(self, db_session, test_student):
+        """Test que lo escrito con la sesión async es visible desde la síncrona."""
+        async def run():
+            async with AsyncSessionLocal() as db:
+                metric = await crud_async.create_metric(db, "test", "async_metric", 1.5, "unidad")
+                return metric.id
+
+        metric_id = asyncio.run(run())
+        metrics = crud.get_metrics_by_type(db_session, "test")
+        assert metric_id in [m.id for m in metrics]
+
+
+class TestSQLiteProfile:
+    """Tests para el perfil SQLite (WAL, escritor único, lectores de solo lectura)."""
+
+    @pytest.fixture
+    def engines(self, tmp_path):
+        reader, writer = create_sqlite_engines(
+            f"sqlite:///{tmp_path / 'perfil.db'}", create_engine,
+            connect_args={"check_same_thread": False}
+        )
+        Base.metadata.create_all(bind=writer)
+        yield reader, writer
+        reader.dispose()
+        writer.dispose()
+
+    @pytest.fixture
+    def routing_session(self, engines):
+        reader, writer = engines
+        factory = sessionmaker(
+            class_=SQLiteRoutingSession, autoflush=False,
+            info={"sqlite_reader": reader, "sqlite_writer": writer}
+        )
+        db = factory()
+        yield db
+        db.close()
+
+    def test_is_sqlite_file(self):
+        """Test detección de bases SQLite en disco."""
+        assert is_sqlite_file("sqlite:///./psichat.db")
+        assert is_sqlite_file("sqlite+aiosqlite:///./psichat.db")
+        assert not is_sqlite_file("sqlite://")
+        assert not is_sqlite_file("sqlite:///:memory:")
+        assert not is_sqlite_file("postgresql://u:p@host/db")
+
+    def test_pragmas_applied(self, engines):
+        """Test pragmas del escritor y del lector."""
+        reader, writer = engines
+        with writer.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+            assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == settings.SQLITE_BUSY_TIMEOUT_MS
+            assert conn.exec_driver_sql("PRAGMA query_only").scalar() == 0
+        with reader.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA query_only").scalar() == 1
+
+    def test_reader_rejects_writes(self, engines):
+        """Test que las conexiones de lectura son de solo lectura."""
+        reader, _ = engines
+        with reader.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("INSERT INTO metricas (tipo_metrica, nombre, valor) VALUES ('t', 'n', 1)"))
+
+    def test_routing_session(self, engines, routing_session):
+        """Test que las escrituras van al escritor y las lecturas al lector."""
+        reader, writer = engines
+        assert routing_session.get_bind() is reader
+        assert routing_session.get_bind(clause=text("SELECT 1")) is reader
+        assert routing_session.get_bind(clause=text("DELETE FROM metricas")) is writer
+
+        metric = crud.create_metric(routing_session, "test", "perfil", 2.0, "unidad")
+        assert metric.id is not None
+        assert routing_session.get_bind() is reader  # el commit libera el escritor
+        assert [m.id for m in crud.get_metrics_by_type(routing_session, "test")] == [metric.id]
+
+    def test_routing_session_sticky_until_commit(self, engines, routing_session):
+        """Test que una transacción que escribe lee sus propios cambios desde el escritor."""
+        reader, writer = engines
+        routing_session.add(Metricas(tipo_metrica="test", nombre="pendiente", valor=1.0))
+        routing_session.flush()
+        assert routing_session.get_bind() is writer
+        assert routing_session.query(Metricas).filter_by(nombre="pendiente").count() == 1
+        routing_session.rollback()
+        assert routing_session.get_bind() is reader
+        assert routing_session.query(Metricas).filter_by(nombre="pendiente").count() == 0
+
+    def test_read_snapshot(self, engines, routing_session):
+        """Test que begin_read_snapshot fija la instantánea frente a commits de otras conexiones."""
+        from sqlalchemy import insert
+        from app.db.session import begin_read_snapshot
+
+        _, writer = engines
+
+        def commit_metric(nombre):
+            with writer.begin() as conn:
+                conn.execute(insert(Metricas).values(tipo_metrica="snap", nombre=nombre, valor=1.0))
+
+        contar = lambda: routing_session.query(Metricas).filter_by(tipo_metrica="snap").count()
+        # Sin transacción explícita cada SELECT ve lo último confirmado
+        antes = contar()
+        commit_metric("a")
+        assert contar() == antes + 1
+        routing_session.rollback()
+
+        begin_read_snapshot(routing_session)
+        antes = contar()
+        commit_metric("b")
+        assert contar() == antes
+        routing_session.rollback()
+        assert contar() == antes + 1
+
+    def test_single_writer_connection(self, tmp_path, monkeypatch):
+        """Test que el escritor tiene una única conexión y el resto espera en cola."""
+        monkeypatch.setattr(settings, "DATABASE_POOL_TIMEOUT", 0.1)
+        reader, writer = create_sqlite_engines(
+            f"sqlite:///{tmp_path / 'escritor.db'}", create_engine,
+            connect_args={"check_same_thread": False}
+        )
+        try:
+            with writer.connect():
+                with pytest.raises(PoolTimeoutError):
+                    writer.connect()
+            with writer.connect() as conn:
+                assert conn.exec_driver_sql("SELECT 1").scalar() == 1
+        finally:
+            reader.dispose()
+            writer.dispose()
+
+
+class TestKeysetPagination:
+    """Tests para la paginación por cursor (creado_en, id)."""
+
+    def _collect(self, db, user_id, limit):
+        """Recorre todas las páginas de mensajes del usuario."""
+        seen, cursor = [], None
+        for _ in range(100):
+            rows = crud.get_messages_by_user(db, user_id, limit=limit + 1, cursor=cursor)
+            page, cursor = split_page(rows, limit)
+            seen.extend(m.id for m in page)
+            if cursor is None:
+                return seen
+        pytest.fail("La paginación no avanza: el cursor repite páginas")
+
+    def test_cursor_roundtrip(self):
+        """Test codificación y decodificación del cursor."""
+        timestamp = datetime(2024, 5, 1, 10, 30, 0, 123456)
+        cursor = encode_cursor(timestamp, 42)
+        assert "=" not in cursor
+        assert decode_cursor(cursor) == (timestamp, 42)
+        assert decode_cursor(None) is None
+
+    @pytest.mark.parametrize("cursor", ["no-es-un-cursor", "e30", "WyJ4Il0"])
+    def test_invalid_cursor(self, cursor):
+        """Test cursor malformado."""
+        with pytest.raises(ValidationError):
+            decode_cursor(cursor)
+
+    def test_pages_with_equal_timestamps(self, db_session, test_student):
+        """Test que el id desempata mensajes con el mismo creado_en (con y sin microsegundos)."""
+        same_second = datetime(2024, 1, 1, 12, 0, 0)
+        with_micro = datetime(2024, 1, 1, 12, 0, 0, 500000)
+        for i in range(7):
+            db_session.add(Mensaje(usuario_id=test_student.id, texto=f"m{i}", remitente="user",
+                                   creado_en=same_second if i % 2 else with_micro))
+        for i in range(5):
+            # creado_en por defecto (CURRENT_TIMESTAMP de SQLite, sin microsegundos)
+            db_session.add(Mensaje(usuario_id=test_student.id, texto=f"d{i}", remitente="user"))
+        db_session.commit()
+        expected = [m.id for m in crud.get_messages_by_user(db_session, test_student.id, limit=100)]
+        assert len(expected) == 12
+        assert self._collect(db_session, test_student.id, limit=3) == expected
+
+    def test_sqlite_now_matches_datetime_format(self, db_session, test_student):
+        """Test que func.now() guarda el mismo formato de texto que DateTime (con microsegundos)."""
+        db_session.add(Mensaje(usuario_id=test_student.id, texto="ahora", remitente="user"))
+        db_session.commit()
+        raw = db_session.execute(text(
+            "SELECT creado_en FROM mensajes WHERE usuario_id = :u"
+        ), {"u": test_student.id}).scalar()
+        assert len(raw) == 26
+        datetime.strptime(raw, "%Y-%m-%d %H:%M:%S.%f")
+
+    def test_stable_under_concurrent_inserts(self, db_session, test_student):
+        """Test que insertar mensajes nuevos entre páginas no duplica ni salta elementos."""
+        base = datetime(2024, 2, 1, 9, 0, 0)
+        for i in range(6):
+            db_session.add(Mensaje(usuario_id=test_student.id, texto=f"m{i}", remitente="user",
+                                   creado_en=base + timedelta(minutes=i)))
+        db_session.commit()
+        original = [m.id for m in crud.get_messages_by_user(db_session, test_student.id, limit=100)]
+
+        rows = crud.get_messages_by_user(db_session, test_student.id, limit=3)
+        page, cursor = split_page(rows, 2)
+        db_session.add(Mensaje(usuario_id=test_student.id, texto="nuevo", remitente="user",
+                               creado_en=base + timedelta(hours=1)))
+        db_session.commit()
+
+        rest = crud.get_messages_by_user(db_session, test_student.id, limit=100, cursor=cursor)
+        assert [m.id for m in page] + [m.id for m in rest] == original
+
+    def test_async_reportes_cursor(self, test_student):
+        """Test que la variante async acepta el cursor."""
+        cursor = encode_cursor(datetime(2030, 1, 1), 1)
+
+        async def run():
+            async with AsyncSessionLocal() as db:
+                return await crud_async.get_reportes_by_estudiante(db, test_student.id, cursor=cursor)
+
+        assert asyncio.run(run()) == []
+
+
+class TestAnalysisJSON:
+    """Tests para las columnas JSON nativas de Analisis."""
+
+    DISTRIBUTION = [["tristeza", 0.72], ["alegría", 0.18], ["neutral", 0.1]]
+
+    def _analisis(self, db_session, test_student, **values):
+        mensaje = Mensaje(usuario_id=test_student.id, texto="hola", remitente="user")
+        db_session.add(mensaje)
+        db_session.flush()
+        analisis = Analisis(mensaje_id=mensaje.id, usuario_id=test_student.id, **values)
+        db_session.add(analisis)
+        db_session.commit()
+        return analisis
+
+    def _raw(self, db_session, analisis_id, column):
+        return db_session.execute(
+            text(f"SELECT {column} FROM analisis WHERE id = :id"), {"id": analisis_id}
+        ).scalar()
+
+    def test_native_storage(self, db_session, test_student):
+        """Test que las distribuciones se guardan como JSON, no como cadena JSON."""
+        analisis = self._analisis(db_session, test_student, distribucion_emociones=self.DISTRIBUTION,
+                                  recomendaciones={"inmediatas": ["respirar"]})
+        assert json.loads(self._raw(db_session, analisis.id, "distribucion_emociones")) == self.DISTRIBUTION
+        assert json.loads(self._raw(db_session, analisis.id, "recomendaciones")) == {"inmediatas": ["respirar"]}
+
+    def test_compact_distributions(self, db_session, test_student, monkeypatch):
+        """Test formato compacto float32: más pequeño y transparente para los lectores."""
+        distribution = [[f"emocion_{i}", 1 / (i + 3)] for i in range(12)]
+        plain = self._analisis(db_session, test_student, distribucion_emociones=distribution)
+        monkeypatch.setattr(settings, "ANALYSIS_COMPACT_DISTRIBUTIONS", True)
+        compact = self._analisis(db_session, test_student, distribucion_emociones=distribution)
+
+        raw = self._raw(db_session, compact.id, "distribucion_emociones")
+        assert json.loads(raw)["labels"][0] == "emocion_0"
+        assert len(raw) < len(self._raw(db_session, plain.id, "distribucion_emociones"))
+
+        db_session.expire_all()
+        stored = db_session.get(Analisis, compact.id).distribucion_emociones
+        assert [label for label, _ in stored] == [label for label, _ in distribution]
+        assert all(abs(a[1] - b[1]) < 1e-6 for a, b in zip(stored, distribution))
+
+    def test_migration_normalizes_double_encoded(self, db_session, test_student):
+        """Test que la migración 007 deshace la doble codificación y respeta los valores nativos."""
+        import importlib.util
+        from pathlib import Path
+        from alembic.migration import MigrationContext
+        from alembic.operations import Operations
+
+        legacy = self._analisis(db_session, test_student)
+        native = self._analisis(db_session, test_student, distribucion_emociones=self.DISTRIBUTION)
+        db_session.execute(text(
+            "UPDATE analisis SET distribucion_emociones = :dist, resumen = :resumen WHERE id = :id"
+        ), {"dist": json.dumps(json.dumps(self.DISTRIBUTION)), "resumen": json.dumps(json.dumps({"a": 1})), "id": legacy.id})
+        db_session.commit()
+
+        path = Path(__file__).parent.parent / "migrations" / "versions" / "007_normalize_analysis_json.py"
+        spec = importlib.util.spec_from_file_location("migration_007", path)
+        migration = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(migration)
+        with db_session.get_bind().begin() as conn:
+            with Operations.context(MigrationContext.configure(conn)):
+                migration.upgrade()
+
+        db_session.expire_all()
+        assert db_session.get(Analisis, legacy.id).distribucion_emociones == self.DISTRIBUTION
+        assert db_session.get(Analisis, legacy.id).resumen == {"a": 1}
+        assert db_session.get(Analisis, native.id).distribucion_emociones == self.DISTRIBUTION
+
+
+class TestAggregateStats:
+    """Tests para las tablas de agregados mantenidas al escribir (app.db.stats)."""
+
+    def _session(self, db_session, test_student):
+        sesion = SesionChat(usuario_id=test_student.id, estado="activa")
+        db_session.add(sesion)
+        db_session.commit()
+        return sesion
+
+    def _message(self, db_session, test_student, sesion, remitente="user", **analisis):
+        mensaje = Mensaje(usuario_id=test_student.id, sesion_id=sesion.id, texto="hola", remitente=remitente)
+        db_session.add(mensaje)
+        db_session.flush()
+        if analisis:
+            db_session.add(Analisis(mensaje_id=mensaje.id, usuario_id=test_student.id, **analisis))
+        db_session.commit()
+        return mensaje
+
+    def _snapshot(self, db_session, sesion_id):
+        db_session.expire_all()
+        stats = db_session.get(EstadisticasSesion, sesion_id)
+        return {
+            "total": stats.total_mensajes, "estudiante": stats.mensajes_estudiante, "tutor": stats.mensajes_tutor,
+            "emociones": stats.emociones, "estilos": stats.estilos, "prioridades": stats.prioridades,
+            "alertas": stats.alertas, "recomendaciones": stats.recomendaciones, "horas": stats.mensajes_por_hora
+        }
+
+    def test_incremental_updates(self, db_session, test_student):
+        """Test que mensajes y análisis nuevos actualizan los agregados en la misma transacción."""
+        sesion = self._session(db_session, test_student)
+        self._message(db_session, test_student, sesion, emocion="tristeza", estilo="formal", prioridad="alta",
+                      alerta=True, recomendaciones=["Hablar con el tutor"])
+        self._message(db_session, test_student, sesion, emocion="tristeza", estilo="informal", prioridad="normal")
+        self._message(db_session, test_student, sesion, remitente="tutor")
+
+        snapshot = self._snapshot(db_session, sesion.id)
+        assert snapshot["total"] == 3 and snapshot["estudiante"] == 2 and snapshot["tutor"] == 1
+        assert snapshot["emociones"] == {"tristeza": 2}
+        assert snapshot["estilos"] == {"formal": 1, "informal": 1}
+        assert snapshot["alertas"] == 1
+        assert snapshot["recomendaciones"] == ["Hablar con el tutor"]
+
+        daily = db_session.query(EstadisticasEstudianteDiarias).filter_by(usuario_id=test_student.id).one()
+        assert daily.total_mensajes == 2
+        assert daily.emociones == {"tristeza": 2}
+
+    def test_update_and_delete_analysis(self, db_session, test_student):
+        """Test que modificar o borrar un análisis corrige los histogramas."""
+        sesion = self._session(db_session, test_student)
+        mensaje = self._message(db_session, test_student, sesion, emocion="tristeza", estilo="formal", alerta=True)
+
+        analisis = db_session.query(Analisis).filter_by(mensaje_id=mensaje.id).one()
+        analisis.emocion = "alegría"
+        analisis.alerta = False
+        db_session.commit()
+        snapshot = self._snapshot(db_session, sesion.id)
+        assert snapshot["emociones"] == {"alegría": 1}
+        assert snapshot["alertas"] == 0
+
+        db_session.delete(db_session.query(Analisis).filter_by(mensaje_id=mensaje.id).one())
+        db_session.commit()
+        snapshot = self._snapshot(db_session, sesion.id)
+        assert snapshot["emociones"] == {} and snapshot["estilos"] == {}
+
+    def test_rebuild_matches_incremental(self, db_session, test_student):
+        """Test que rebuild_stats reproduce los agregados incrementales."""
+        sesion = self._session(db_session, test_student)
+        for i in range(4):
+            self._message(db_session, test_student, sesion, remitente="user" if i % 2 else "tutor",
+                          emocion="ansiedad" if i % 2 else "neutral", prioridad="media", recomendaciones={"a": f"r{i % 2}"})
+        incremental = self._snapshot(db_session, sesion.id)
+
+        rebuild_stats(db_session)
+        assert self._snapshot(db_session, sesion.id) == incremental
+
+
+    def test_concurrent_first_writes(self, tmp_path, monkeypatch):
+        """Test que dos transacciones que crean a la vez las filas de agregados no chocan ni pierden la escritura."""
+        from app.db import stats
+        from app.db.models import Usuario
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as setup:
+            estudiante = Usuario(email="race@test.com", nombre="Race", hashed_password="x", rol=RolUsuario.ESTUDIANTE)
+            setup.add(estudiante)
+            setup.flush()
+            sesion = SesionChat(usuario_id=estudiante.id, estado="activa")
+            setup.add(sesion)
+            setup.commit()
+            estudiante_id, sesion_id = estudiante.id, sesion.id
+
+        def write(session):
+            mensaje = Mensaje(usuario_id=estudiante_id, sesion_id=sesion_id, texto="hola", remitente="user")
+            session.add(mensaje)
+            session.flush()
+            session.add(Analisis(mensaje_id=mensaje.id, usuario_id=estudiante_id, emocion="tristeza", emocion_score=50.0))
+            session.commit()
+
+        # La segunda transacción no encuentra las filas y, antes de crearlas, la primera las crea y confirma
+        original = stats._Aggregates._lock_row
+        rival = {"pending": True}
+
+        def lock_row(self, model, pk):
+            row = original(self, model, pk)
+            if row is None and rival.pop("pending", False):
+                with Session() as primera:
+                    write(primera)
+            return row
+
+        monkeypatch.setattr(stats._Aggregates, "_lock_row", lock_row)
+        with Session() as segunda:
+            write(segunda)
+
+        with Session() as check:
+            sesion_stats = check.get(EstadisticasSesion, sesion_id)
+            assert (sesion_stats.total_mensajes, sesion_stats.analisis_count) == (2, 2)
+            assert sesion_stats.emociones == {"tristeza": 2}
+            assert check.query(Mensaje).count() == 2
+            diaria, = check.query(EstadisticasEstudianteDiarias).all()
+            assert (diaria.total_mensajes, diaria.analisis_count) == (2, 2)
+            assert {(s.resolucion, s.analisis_count) for s in check.query(SerieEmocionalEstudiante)} == {
+                ("hora", 2), ("dia", 2), ("semana", 2)
+            }
+        engine.dispose()
+
+    def test_emotion_rollups(self, db_session, test_student):
+        """Test que las series por hora, día y semana siguen altas, cambios, bajas y rebuild_stats."""
+        sesion = self._session(db_session, test_student)
+        # Lunes 10:15 y 10:45, martes 09:00 (misma semana)
+        for creado_en, emocion, score in [(datetime(2025, 1, 6, 10, 15), "tristeza", 40.0),
+                                          (datetime(2025, 1, 6, 10, 45), "tristeza", 60.0),
+                                          (datetime(2025, 1, 7, 9, 0), "alegría", None)]:
+            mensaje = Mensaje(usuario_id=test_student.id, sesion_id=sesion.id, texto="hola", remitente="user",
+                              creado_en=creado_en)
+            db_session.add(mensaje)
+            db_session.flush()
+            db_session.add(Analisis(mensaje_id=mensaje.id, usuario_id=test_student.id, emocion=emocion,
+                                    emocion_score=score, alerta=score == 60.0, creado_en=creado_en))
+        db_session.commit()
+
+        def series():
+            db_session.expire_all()
+            filas = db_session.query(SerieEmocionalEstudiante).filter_by(usuario_id=test_student.id)
+            return {(f.resolucion, f.inicio): (f.analisis_count, f.emociones, f.emocion_score_suma,
+                                               f.emocion_score_n, f.alertas) for f in filas}
+
+        incremental = series()
+        assert incremental[("hora", datetime(2025, 1, 6, 10))] == (2, {"tristeza": 2}, 100.0, 2, 1)
+        assert incremental[("dia", datetime(2025, 1, 7))] == (1, {"alegría": 1}, 0.0, 0, 0)
+        assert incremental[("semana", datetime(2025, 1, 6))] == (3, {"tristeza": 2, "alegría": 1}, 100.0, 2, 1)
+
+        analisis = db_session.query(Analisis).filter_by(usuario_id=test_student.id, emocion_score=40.0).one()
+        analisis.emocion_score = 20.0
+        db_session.commit()
+        assert series()[("semana", datetime(2025, 1, 6))][2] == 80.0
+
+        db_session.delete(analisis)
+        db_session.commit()
+        incremental = series()
+        assert incremental[("dia", datetime(2025, 1, 6))] == (1, {"tristeza": 1}, 60.0, 1, 1)
+
+        rebuild_stats(db_session)
+        assert {k: v for k, v in series().items() if v[0]} == {k: v for k, v in incremental.items() if v[0]}
+
+
+class TestBulkWrites:
+    """Tests para las variantes de escritura en bloque de crud."""
+
+    def _commits(self, db_session):
+        commits = []
+        event.listen(db_session, "after_commit", lambda session: commits.append(1))
+        return commits
+
+    def test_messages_and_analyses_bulk(self, db_session, test_student):
+        """Test que los mensajes y análisis en bloque conservan el orden y actualizan los agregados."""
+        sesion = SesionChat(usuario_id=test_student.id, estado="activa")
+        db_session.add(sesion)
+        db_session.commit()
+
+        commits = self._commits(db_session)
+        ids = crud.create_messages_bulk(db_session, [
+            MessageCreate(usuario_id=test_student.id, sesion_id=sesion.id, texto=f"bloque {i}",
+                          remitente="user" if i % 2 == 0 else "bot", metadata={"i": i})
+            for i in range(5)
+        ])
+        crud.create_analyses_bulk(db_session, [
+            AnalysisCreate(mensaje_id=ids[0], usuario_id=test_student.id, emocion="tristeza", alerta=True),
+            AnalysisCreate(mensaje_id=ids[2], usuario_id=test_student.id, emocion="alegría", estilo="formal"),
+        ])
+        assert len(commits) == 2
+
+        mensajes = {m.id: m for m in db_session.query(Mensaje).filter(Mensaje.id.in_(ids))}
+        assert [mensajes[mid].texto for mid in ids] == [f"bloque {i}" for i in range(5)]
+        assert mensajes[ids[3]].metadatos == {"i": 3}
+
+        db_session.expire_all()
+        stats = db_session.get(EstadisticasSesion, sesion.id)
+        assert stats.total_mensajes == 5 and stats.mensajes_estudiante == 3
+        assert stats.emociones == {"tristeza": 1, "alegría": 1}
+        assert stats.alertas == 1
+        daily = db_session.query(EstadisticasEstudianteDiarias).filter_by(usuario_id=test_student.id).one()
+        assert daily.total_mensajes == 3 and daily.analisis_count == 2
+
+    def test_empty_batches(self, db_session):
+        """Test que un lote vacío no abre transacción ni falla."""
+        commits = self._commits(db_session)
+        assert crud.create_messages_bulk(db_session, []) == []
+        assert crud.create_notifications_bulk(db_session, []) == 0
+        assert crud.create_metrics_bulk(db_session, []) == 0
+        assert commits == []
+
+    def test_notify_alert_single_commit(self, db_session, test_student):
+        """Test que notify_alert crea las dos notificaciones con un solo commit."""
+        import uuid
+        from types import SimpleNamespace
+        from app.db.models import Notificacion, Usuario
+        from app.services.chat_service import notify_alert
+
+        test_tutor = Usuario(email=f"tutor_{uuid.uuid4().hex[:8]}@test.com", nombre="Tutor", hashed_password="x",
+                             rol=RolUsuario.TUTOR, estado=EstadoUsuario.ACTIVO)
+        db_session.add(test_tutor)
+        db_session.commit()
+
+        commits = self._commits(db_session)
+        alerta = SimpleNamespace(id=424242, usuario_id=test_student.id, tutor_asignado=test_tutor.id)
+        notify_alert(db_session, alerta)
+        assert len(commits) == 1
+
+        notificaciones = db_session.query(Notificacion).filter(
+            Notificacion.usuario_id.in_([test_student.id, test_tutor.id]), Notificacion.tipo == "alerta"
+        ).all()
+        assert {n.usuario_id for n in notificaciones} == {test_student.id, test_tutor.id}
+        assert all(n.metadatos == {"alerta_id": 424242} and n.enviada for n in notificaciones)
+
+    def test_async_metrics_bulk(self, db_session):
+        """Test que las métricas del monitor se guardan en un único lote async."""
+        async def run():
+            async with AsyncSessionLocal() as db:
+                return await crud_async.create_metrics_bulk(db, [
+                    {"tipo_metrica": "bulk_test", "nombre": f"m{i}", "valor": float(i), "unidad": "u"}
+                    for i in range(7)
+                ])
+
+        assert asyncio.run(run()) == 7
+        metrics = crud.get_metrics_by_type(db_session, "bulk_test")
+        assert {m.nombre for m in metrics} >= {f"m{i}" for i in range(7)}
+
+
+class TestReadReplica:
+    """Tests para el enrutado de lecturas a la réplica (get_read_db)."""
+
+    def _factory(self, engine, nombre):
+        Base.metadata.create_all(bind=engine)
+        factory = sessionmaker(bind=engine)
+        db = factory()
+        db.add(Metricas(tipo_metrica="origen", nombre=nombre, valor=1.0))
+        db.commit()
+        db.close()
+        return factory
+
+    def _origen(self, db):
+        return db.query(Metricas.nombre).filter(Metricas.tipo_metrica == "origen").scalar()
+
+    def test_reads_go_to_replica(self, tmp_path, monkeypatch):
+        """Test que get_read_db sirve la réplica y que ésta rechaza escrituras."""
+        from app.db import session as db_session_module
+        from app.db.session import ReadReplica, create_replica_engine, get_read_db
+
+        primary = self._factory(create_engine(f"sqlite:///{tmp_path / 'primaria.db'}"), "primaria")
+        replica_engine = create_replica_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+        replica = self._factory(create_engine(f"sqlite:///{tmp_path / 'replica.db'}"), "replica")
+        monkeypatch.setattr(db_session_module, "read_replica",
+                            ReadReplica(primary, sessionmaker(bind=replica_engine)))
+
+        dependency = get_read_db()
+        db = next(dependency)
+        try:
+            assert self._origen(db) == "replica"
+            with pytest.raises(OperationalError):
+                db.execute(text("DELETE FROM metricas"))
+        finally:
+            dependency.close()
+        replica_engine.dispose()
+
+    def test_fallback_to_primary(self, tmp_path):
+        """Test que sin réplica accesible se lee de la primaria y no se reintenta hasta el plazo."""
+        from app.db.session import ReadReplica, create_replica_engine
+
+        primary = self._factory(create_engine(f"sqlite:///{tmp_path / 'primaria.db'}"), "primaria")
+        replica_engine = create_replica_engine(f"sqlite:///{tmp_path / 'no_existe' / 'replica.db'}")
+        router = ReadReplica(primary, sessionmaker(bind=replica_engine), retry_seconds=60)
+
+        db = router.session()
+        assert self._origen(db) == "primaria"
+        db.close()
+        assert not router.available
+
+        # Sin réplica configurada también se usa la primaria
+        db = ReadReplica(primary).session()
+        assert self._origen(db) == "primaria"
+        db.close()
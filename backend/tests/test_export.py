@@ -0,0 +1,118 @@
+"""
+Tests de la exportación en streaming (app.services.export_service).
+"""
+
+import csv
+import gzip
+import io
+import json
+import uuid
+import pytest
+from datetime import datetime, timedelta
+from fastapi import status
+
+from app.core.config import settings
+from app.db.archive import archive_session
+from app.db.models import Usuario, Mensaje, Analisis, SesionChat, SegmentoArchivo, RolUsuario, EstadoUsuario
+from app.services.export_service import EXPORT_FIELDS
+
+
+class TestExport:
+    """Tests de los endpoints de exportación NDJSON/CSV."""
+
+    @pytest.fixture(autouse=True)
+    def archive_dir(self, tmp_path, monkeypatch, db_session):
+        monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path))
+        # Bloques pequeños para recorrer varios lotes del cursor y del stream
+        monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+        yield tmp_path
+        db_session.rollback()
+        db_session.query(SegmentoArchivo).delete()
+        db_session.commit()
+
+    def _session(self, db_session, student, tutor, messages=3, cerrada=False):
+        sesion = SesionChat(usuario_id=student.id, tutor_id=tutor.id, estado="cerrada" if cerrada else "activa",
+                            finalizada_en=datetime.now() - timedelta(days=200) if cerrada else None)
+        db_session.add(sesion)
+        db_session.flush()
+        for i in range(messages):
+            mensaje = Mensaje(usuario_id=student.id, sesion_id=sesion.id, texto=f"mensaje, \"{i}\"",
+                              remitente="user" if i % 2 == 0 else "bot")
+            db_session.add(mensaje)
+            db_session.flush()
+            if i % 2 == 0:
+                db_session.add(Analisis(mensaje_id=mensaje.id, usuario_id=student.id, emocion="tristeza",
+                                        emocion_score=70.0, distribucion_emociones=[["tristeza", 70.0], ["calma", 30.0]]))
+        db_session.commit()
+        return sesion
+
+    def _seed(self, db_session, test_student, tutor):
+        archivada = self._session(db_session, test_student, tutor, messages=4, cerrada=True)
+        archive_session(db_session, archivada)
+        sesiones = [archivada, self._session(db_session, test_student, tutor), self._session(db_session, test_student, tutor, messages=2)]
+        # Sesión de otro tutor: no se exporta
+        otro = Usuario(email=f"tutor_{uuid.uuid4().hex[:8]}@test.com", nombre="Otro", hashed_password="x",
+                       rol=RolUsuario.TUTOR, estado=EstadoUsuario.ACTIVO)
+        db_session.add(otro)
+        db_session.commit()
+        self._session(db_session, test_student, otro)
+        return sesiones
+
+    def _ndjson(self, response):
+        assert response.status_code == status.HTTP_200_OK, response.text
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    def test_ndjson_includes_archived_and_resumes(self, client, db_session, test_student, authenticated_tutor):
+        """Test que la exportación recorre sesiones en caliente y archivadas en orden y se reanuda por id."""
+        sesiones = self._seed(db_session, test_student, authenticated_tutor)
+
+        records = self._ndjson(client.get("/tutor/export/sessions"))
+        assert [r["sesion_id"] for r in records] == [sesiones[0].id] * 4 + [sesiones[1].id] * 3 + [sesiones[2].id] * 2
+        assert records == sorted(records, key=lambda r: (r["sesion_id"], r["id"]))
+        assert set(records[0]) == set(EXPORT_FIELDS)
+        assert records[0]["distribucion_emociones"] == [["tristeza", 70.0], ["calma", 30.0]]
+        assert records[1]["emocion"] is None
+
+        # Reanudar tras el quinto registro (primero de la segunda sesión)
+        ultimo = records[4]
+        rest = self._ndjson(client.get("/tutor/export/sessions", params={"desde_sesion": ultimo["sesion_id"], "desde_id": ultimo["id"]}))
+        assert rest == records[5:]
+
+        # Reanudar dentro de la sesión archivada
+        ultimo = records[1]
+        rest = self._ndjson(client.get("/tutor/export/sessions", params={"desde_sesion": ultimo["sesion_id"], "desde_id": ultimo["id"]}))
+        assert rest == records[2:]
+
+        solo = self._ndjson(client.get("/tutor/export/sessions", params={"solo_analisis": True}))
+        assert [r["id"] for r in solo] == [r["id"] for r in records if r["emocion"]]
+
+    def test_csv_gzip(self, client, db_session, test_student, authenticated_tutor):
+        """Test del CSV comprimido: cabecera fija, comillas y columnas JSON."""
+        sesiones = self._seed(db_session, test_student, authenticated_tutor)
+        response = client.get("/tutor/export/sessions", params={"formato": "csv", "gzip": True,
+                                                                 "estudiante_id": test_student.id})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/gzip"
+        assert 'filename="sesiones.csv.gz"' in response.headers["content-disposition"]
+
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.content).decode("utf-8"))))
+        assert tuple(rows[0]) == EXPORT_FIELDS
+        assert len(rows) == 9
+        assert rows[0]["texto"] == 'mensaje, "0"'
+        assert json.loads(rows[0]["distribucion_emociones"]) == [["tristeza", 70.0], ["calma", 30.0]]
+        assert {int(r["sesion_id"]) for r in rows} == {s.id for s in sesiones}
+
+    def test_student_analysis_history(self, client, db_session, test_student, authenticated_tutor):
+        """Test que el estudiante exporta solo sus mensajes analizados."""
+        from app.main import app
+        from app.dependencies import get_current_user
+
+        self._seed(db_session, test_student, authenticated_tutor)
+        app.dependency_overrides[get_current_user] = lambda: test_student
+        records = self._ndjson(client.get("/analysis/export"))
+        # 2 + 2 + 1 analizados en las sesiones con el tutor y 2 en la del otro tutor
+        assert len(records) == 7
+        assert all(r["usuario_id"] == test_student.id and r["emocion"] == "tristeza" for r in records)
+
+        response = client.get("/analysis/export", params={"formato": "xml"})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
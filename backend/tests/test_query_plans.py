@@ -0,0 +1,160 @@
+"""
+Tests de planes de consulta: las consultas calientes deben usar los índices compuestos.
+"""
+
+import pytest
+from datetime import datetime
+from sqlalchemy import desc, event, text
+
+from app.db.models import Mensaje, Analisis, SesionChat, Alerta, Notificacion, Reporte
+from app.db.pagination import apply_keyset, encode_cursor
+from app.services.analysis_service import perform_deep_analysis
+
+
+def explain(db, query) -> str:
+    """Devuelve el detalle de EXPLAIN QUERY PLAN de una consulta ORM."""
+    sql = str(query.statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True}))
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+class TestQueryPlans:
+    """Tests de EXPLAIN QUERY PLAN sobre las consultas calientes."""
+
+    def test_deep_analysis_messages(self, db_session):
+        """Mensaje(usuario_id, remitente) ORDER BY creado_en DESC (perform_deep_analysis)."""
+        query = db_session.query(Mensaje, Analisis).join(
+            Analisis, Mensaje.id == Analisis.mensaje_id, isouter=True
+        ).filter(
+            Mensaje.usuario_id == 1,
+            Mensaje.remitente == "user"
+        ).order_by(desc(Mensaje.creado_en)).limit(10)
+
+        plan = explain(db_session, query)
+        assert "idx_mensaje_usuario_remitente_creado" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_deep_analysis_uses_index(self, db_session):
+        """La consulta que emite perform_deep_analysis usa el índice compuesto."""
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if "FROM mensajes" in statement:
+                statements.append((statement, parameters))
+
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            perform_deep_analysis(db_session, 999999)
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+
+        assert statements
+        statement, parameters = statements[0]
+        plan = db_session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        assert "idx_mensaje_usuario_remitente_creado" in "\n".join(row[-1] for row in plan)
+
+    def test_session_messages(self, db_session):
+        """Mensaje(sesion_id) ORDER BY creado_en (carga de sesión)."""
+        query = db_session.query(Mensaje).filter(
+            Mensaje.sesion_id == 1
+        ).order_by(Mensaje.creado_en.asc())
+
+        plan = explain(db_session, query)
+        assert "idx_mensaje_sesion_creado" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_active_bot_session(self, db_session):
+        """SesionChat(usuario_id, estado, tutor_id) (save_chat_and_analysis)."""
+        query = db_session.query(SesionChat).filter(
+            SesionChat.usuario_id == 1,
+            SesionChat.estado == "activa",
+            SesionChat.tutor_id.is_(None)
+        )
+
+        plan = explain(db_session, query)
+        assert "idx_sesion_usuario_estado_tutor (usuario_id=? AND estado=? AND tutor_id=?)" in plan
+
+    @pytest.mark.parametrize("revisada", [False, True])
+    def test_tutor_alerts(self, db_session, revisada):
+        """Alerta(tutor_asignado, revisada) ORDER BY creado_en DESC (panel del tutor)."""
+        query = db_session.query(Alerta).filter(
+            Alerta.tutor_asignado == 1,
+            Alerta.revisada == revisada
+        ).order_by(desc(Alerta.creado_en)).limit(20)
+
+        plan = explain(db_session, query)
+        assert "idx_alerta_tutor_revisada_creado" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_pending_alerts_count(self, db_session):
+        """Conteo de alertas pendientes del tutor (tutor_service)."""
+        query = db_session.query(Alerta.id).filter(
+            Alerta.tutor_asignado == 1,
+            Alerta.revisada == False
+        )
+
+        plan = explain(db_session, query)
+        assert "COVERING INDEX idx_alerta_tutor_revisada_creado" in plan
+
+    def test_dashboard_today_ranges(self, db_session):
+        """Mensajes e intervenciones de hoy del tutor por rango de creado_en (dashboard)."""
+        from app.db.models import Intervencion
+
+        inicio, fin = datetime(2024, 1, 1), datetime(2024, 1, 2)
+        mensajes = db_session.query(Mensaje.id).join(SesionChat).filter(
+            SesionChat.tutor_id == 1, Mensaje.creado_en >= inicio, Mensaje.creado_en < fin
+        )
+        intervenciones = db_session.query(Intervencion.id).filter(
+            Intervencion.tutor_id == 1, Intervencion.creado_en >= inicio, Intervencion.creado_en < fin
+        )
+
+        assert "idx_mensaje_sesion_creado (sesion_id=? AND creado_en>? AND creado_en<?)" in explain(db_session, mensajes)
+        assert "idx_intervencion_tutor_creado (tutor_id=? AND creado_en>? AND creado_en<?)" in explain(db_session, intervenciones)
+
+    def test_activity_report_sessions(self, db_session):
+        """Sesiones del tutor agrupadas por (día, estudiante) en un rango (tutor_service.get_activity_report)."""
+        from sqlalchemy import func
+
+        dia = func.date(SesionChat.iniciada_en)
+        query = db_session.query(dia, SesionChat.usuario_id, func.count(SesionChat.id)).filter(
+            SesionChat.tutor_id == 1,
+            SesionChat.iniciada_en >= datetime(2024, 1, 1),
+            SesionChat.iniciada_en < datetime(2024, 4, 1)
+        ).group_by(dia, SesionChat.usuario_id)
+
+        plan = explain(db_session, query)
+        assert "idx_sesion_tutor_iniciada (tutor_id=? AND iniciada_en>? AND iniciada_en<?)" in plan
+
+    @pytest.mark.parametrize("model, owner, timestamp, index", [
+        (Mensaje, Mensaje.usuario_id, Mensaje.creado_en, "idx_mensaje_usuario_creado"),
+        (Mensaje, Mensaje.sesion_id, Mensaje.creado_en, "idx_mensaje_sesion_creado"),
+        (Notificacion, Notificacion.usuario_id, Notificacion.creado_en, "idx_notificacion_usuario_creado"),
+        (SesionChat, SesionChat.tutor_id, SesionChat.iniciada_en, "idx_sesion_tutor_iniciada"),
+        (Reporte, Reporte.tutor_id, Reporte.creado_en, "idx_reporte_tutor_creado"),
+        (Reporte, Reporte.estudiante_id, Reporte.creado_en, "idx_reporte_estudiante_creado"),
+    ])
+    def test_keyset_pages(self, db_session, model, owner, timestamp, index):
+        """Las páginas por cursor recorren el índice (dueño, timestamp) sin ordenar en memoria."""
+        cursor = encode_cursor(datetime(2024, 1, 1, 12, 0, 0), 100)
+        query = apply_keyset(db_session.query(model).filter(owner == 1), timestamp, model.id, cursor).limit(21)
+
+        plan = explain(db_session, query)
+        assert index in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_analysis_facet_counts(self, db_session):
+        """Conteo de una faceta sobre estudiantes + rango (tutor_service.search_student_analyses)."""
+        from sqlalchemy import func, select
+
+        alumnos = select(SesionChat.usuario_id).where(SesionChat.tutor_id == 1)
+        query = db_session.query(Analisis.emocion, func.count(Analisis.id)).filter(
+            Analisis.usuario_id.in_(alumnos),
+            Analisis.creado_en >= datetime(2024, 1, 1),
+            Analisis.creado_en < datetime(2024, 1, 15),
+            Analisis.prioridad == "alta",
+            Analisis.emocion_score >= 70
+        ).group_by(Analisis.emocion)
+
+        plan = explain(db_session, query)
+        assert "COVERING INDEX idx_analisis_usuario_creado_facetas" in plan
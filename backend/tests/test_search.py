@@ -0,0 +1,90 @@
+"""
+Tests de la búsqueda de texto completo de mensajes (app.db.search).
+"""
+
+import uuid
+import pytest
+from fastapi import status
+
+from app.db.models import Mensaje, SesionChat
+from app.db.search import search_messages, search_terms
+
+
+class TestMessageSearch:
+    """Tests del índice FTS y del endpoint /chat/search."""
+
+    @pytest.fixture
+    def marker(self):
+        # Palabra única por test: la base de test se comparte entre tests
+        return f"clave{uuid.uuid4().hex[:8]}"
+
+    def _session(self, db_session, student, textos):
+        sesion = SesionChat(usuario_id=student.id, estado="activa")
+        db_session.add(sesion)
+        db_session.flush()
+        mensajes = [Mensaje(usuario_id=student.id, sesion_id=sesion.id, texto=texto, remitente="user") for texto in textos]
+        db_session.add_all(mensajes)
+        db_session.commit()
+        return sesion, mensajes
+
+    def test_terms_match_limpiar_texto(self):
+        """Test que la consulta se normaliza sin tildes ni mayúsculas."""
+        assert search_terms("¿Ansiedad?  EXÁMENES, mañana") == ["ansiedad", "examenes", "manana"]
+        assert search_terms("   ") == []
+
+    def test_accent_insensitive_ranked_with_snippet(self, db_session, test_student, marker):
+        """Test que la búsqueda ignora tildes, ordena por relevancia y devuelve snippet."""
+        _, mensajes = self._session(db_session, test_student, [
+            f"Tengo ansiedad por los exámenes {marker}",
+            f"{marker} exámenes, exámenes y más exámenes",
+            f"Hoy estoy tranquilo {marker}",
+        ])
+
+        resultados = search_messages(db_session, f"EXAMENES {marker}", test_student.id)
+        assert [m.id for m, _, _ in resultados] == [mensajes[1].id, mensajes[0].id]
+        assert resultados[0][1] > resultados[1][1]
+        assert "<mark>exámenes</mark>" in resultados[0][2]
+
+        # Prefijo: "ansie" encuentra "ansiedad"
+        assert [m.id for m, _, _ in search_messages(db_session, f"ansie {marker}", test_student.id)] == [mensajes[0].id]
+
+    def test_snippet_escapes_html(self, db_session, test_student, marker):
+        """Test que el snippet escapa el HTML del mensaje y solo añade las marcas propias."""
+        self._session(db_session, test_student, [f"<script>alert(1)</script> & {marker} <b>"])
+
+        (_, _, snippet), = search_messages(db_session, marker, test_student.id)
+        assert "<script>" not in snippet and "<b>" not in snippet
+        assert f"&lt;script&gt;alert(1)&lt;/script&gt; &amp; <mark>{marker}</mark> &lt;b&gt;" in snippet
+
+    def test_index_follows_updates_and_deletes(self, db_session, test_student, marker):
+        """Test que los triggers mantienen el índice sincronizado."""
+        _, (mensaje,) = self._session(db_session, test_student, [f"texto original {marker}"])
+
+        mensaje.texto = f"texto corregido {marker}"
+        db_session.commit()
+        assert search_messages(db_session, f"original {marker}", test_student.id) == []
+        assert len(search_messages(db_session, f"corregido {marker}", test_student.id)) == 1
+
+        db_session.delete(mensaje)
+        db_session.commit()
+        assert search_messages(db_session, marker, test_student.id) == []
+
+    def test_only_own_sessions(self, db_session, test_student, marker):
+        """Test que no se devuelven mensajes de sesiones ajenas."""
+        self._session(db_session, test_student, [f"privado {marker}"])
+        assert search_messages(db_session, marker, test_student.id + 100000) == []
+
+    def test_search_endpoint(self, client, db_session, test_student, marker):
+        """Test que /chat/search devuelve resultados con snippet y datos del usuario."""
+        from app.main import app
+        from app.dependencies import get_current_user
+
+        sesion, (mensaje,) = self._session(db_session, test_student, [f"Me siento muy estresado {marker}"])
+        app.dependency_overrides[get_current_user] = lambda: test_student
+        response = client.get("/chat/search", params={"q": f"estresado {marker}", "session_id": sesion.id})
+
+        assert response.status_code == status.HTTP_200_OK
+        (resultado,) = response.json()
+        assert resultado["id"] == mensaje.id
+        assert "<mark>estresado</mark>" in resultado["snippet"]
+        assert resultado["usuario_email"] == test_student.email
@@ -0,0 +1,147 @@
+"""
+Tests del índice de similitud de mensajes (app.services.similarity_service).
+"""
+
+import uuid
+import numpy as np
+import pytest
+from fastapi import status
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.db.models import Mensaje, SesionChat, Usuario, RolUsuario, EstadoUsuario
+from app.services import similarity_service
+from app.services.similarity_service import SimilarityIndex
+
+CORPUS = [
+    "tengo ansiedad por el examen de matematicas",
+    "me siento triste y solo en casa",
+    "estoy feliz con mis amigos de clase",
+    "el profesor de historia me pone nervioso",
+    "no puedo dormir por la ansiedad del examen",
+    "mi familia me ayuda con la tarea",
+]
+
+
+@pytest.fixture
+def vectorizer():
+    return TfidfVectorizer().fit(CORPUS)
+
+
+@pytest.fixture
+def index(tmp_path, vectorizer):
+    return SimilarityIndex(str(tmp_path), vectorizer, dim=16, tables=4, bits=4)
+
+
+class TestSimilarityIndex:
+    """Tests del índice LSH persistente."""
+
+    def test_nearest_neighbours_and_scope(self, index):
+        """Test que devuelve los más parecidos, excluye el de origen y respeta el alcance."""
+        assert index.add([(i + 1, 10 + i % 2, texto) for i, texto in enumerate(CORPUS)]) == len(CORPUS)
+
+        vecinos, _ = index.query(index.vector(1), k=2, exclude=1)
+        assert vecinos[0][0] == 5  # "ansiedad ... examen"
+        assert all(mid != 1 for mid, _ in vecinos)
+
+        # Solo mensajes del estudiante 11 (ids pares)
+        vecinos, _ = index.query(index.vector(1), k=3, usuarios=[11])
+        assert {mid for mid, _ in vecinos} <= {2, 4, 6}
+
+    def test_incremental_add_and_memmap_reload(self, tmp_path, vectorizer, index):
+        """Test que las filas añadidas persisten, se recargan con memmap y no se duplican."""
+        index.add([(1, 10, CORPUS[0])])
+        index.add([(1, 10, CORPUS[0]), (2, 10, CORPUS[4]), (3, 10, "zzz sin vocabulario")])
+        assert index.count == 2
+
+        reloaded = SimilarityIndex(str(tmp_path), vectorizer, dim=16, tables=4, bits=4)
+        assert reloaded.count == 2
+        assert isinstance(reloaded._main["vectores"], np.memmap)
+        np.testing.assert_allclose(reloaded.vector(2), index.vector(2))
+        assert reloaded.query(reloaded.vector(1), k=1, exclude=1)[0][0][0] == 2
+
+    def test_interrupted_write_is_truncated(self, tmp_path, vectorizer, index):
+        """Test que las filas escritas tras meta.json se recortan antes del siguiente append."""
+        index.add([(1, 10, CORPUS[0])])
+        # Escritura interrumpida: bytes en los arrays sin actualizar meta.json
+        for name in ("ids", "usuarios", "vectores", "firmas"):
+            with open(tmp_path / f"{name}.bin", "ab") as f:
+                f.write(b"\xff" * 24)
+
+        reloaded = SimilarityIndex(str(tmp_path), vectorizer, dim=16, tables=4, bits=4)
+        assert reloaded.add([(2, 10, CORPUS[4])]) == 1
+
+        final = SimilarityIndex(str(tmp_path), vectorizer, dim=16, tables=4, bits=4)
+        assert final.count == 2
+        assert sorted(final._main["ids"].tolist()) == [1, 2]
+        np.testing.assert_allclose(final.vector(2), reloaded.vector(2))
+        assert final.query(final.vector(1), k=1, exclude=1)[0][0][0] == 2
+
+    def test_reloads_rows_added_by_other_process(self, tmp_path, vectorizer, index):
+        """Test que un escritor recarga las filas que otro añadió antes de escribir las suyas."""
+        other = SimilarityIndex(str(tmp_path), vectorizer, dim=16, tables=4, bits=4)
+        index.add([(1, 10, CORPUS[0])])
+        other.add([(2, 10, CORPUS[4])])
+
+        assert other.count == 2 and other.contains(1)
+        final = SimilarityIndex(str(tmp_path), vectorizer, dim=16, tables=4, bits=4)
+        assert sorted(final._main["ids"].tolist()) == [1, 2]
+
+    def test_query_sees_rows_added_by_other_process(self, tmp_path, vectorizer, index):
+        """Test que un proceso que solo consulta ve las filas que otro añadió."""
+        lector = SimilarityIndex(str(tmp_path), vectorizer, dim=16, tables=4, bits=4)
+        index.add([(i + 1, 10, texto) for i, texto in enumerate(CORPUS)])
+
+        vecinos, _ = lector.query(index.vector(1), k=2, exclude=1)
+        assert lector.count == len(CORPUS)
+        assert vecinos[0][0] == 5
+        assert lector.refresh() is False
+
+    def test_discarded_when_vectorizer_changes(self, tmp_path, index):
+        """Test que un índice de otro vectorizador no se reutiliza."""
+        index.add([(1, 10, CORPUS[0])])
+        other = TfidfVectorizer().fit(CORPUS + ["vocabulario distinto"])
+        assert SimilarityIndex(str(tmp_path), other, dim=16, tables=4, bits=4).count == 0
+
+    def test_similar_endpoint_scoped_to_tutor(self, client, db_session, test_student, index, monkeypatch):
+        """Test que /tutor/messages/{id}/similar solo devuelve mensajes de estudiantes del tutor."""
+        from app.main import app
+        from app.dependencies import get_current_user
+
+        tutor, otro = [
+            Usuario(email=f"{rol.value}_{uuid.uuid4().hex[:8]}@test.com", nombre="Similitud", hashed_password="x",
+                    rol=rol, estado=EstadoUsuario.ACTIVO)
+            for rol in (RolUsuario.TUTOR, RolUsuario.ESTUDIANTE)
+        ]
+        db_session.add_all([tutor, otro])
+        db_session.flush()
+        propia = SesionChat(usuario_id=test_student.id, tutor_id=tutor.id, estado="activa")
+        ajena = SesionChat(usuario_id=otro.id, estado="activa")
+        db_session.add_all([propia, ajena])
+        db_session.flush()
+        mensajes = [
+            Mensaje(usuario_id=test_student.id, sesion_id=propia.id, texto=CORPUS[0], remitente="user"),
+            Mensaje(usuario_id=test_student.id, sesion_id=propia.id, texto=CORPUS[4], remitente="user"),
+            Mensaje(usuario_id=otro.id, sesion_id=ajena.id, texto=CORPUS[4], remitente="user"),
+        ]
+        db_session.add_all(mensajes)
+        db_session.commit()
+        index.add([(m.id, m.usuario_id, m.texto) for m in mensajes])
+
+        monkeypatch.setattr(similarity_service.settings, "SIMILARITY_INDEX_ENABLED", True)
+        monkeypatch.setattr(similarity_service, "_index", index)
+        app.dependency_overrides[get_current_user] = lambda: tutor
+
+        response = client.get(f"/tutor/messages/{mensajes[0].id}/similar", params={"k": 5})
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [r["mensaje_id"] for r in data["resultados"]] == [mensajes[1].id]
+        assert data["resultados"][0]["similitud"] > 0
+        assert "indice" in data["latencia_ms"]
+
+        # Mensaje de un estudiante sin sesión con el tutor
+        response = client.get(f"/tutor/messages/{mensajes[2].id}/similar")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        monkeypatch.setattr(similarity_service.settings, "SIMILARITY_INDEX_ENABLED", False)
+        response = client.get(f"/tutor/messages/{mensajes[0].id}/similar")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
@@ -164,4 +164,354 @@ class TestTutor:
             elif method == "PUT":
                 response = client.put(endpoint, headers=auth_headers_student)
             
-            assert response.status_code == status.HTTP_403_FORBIDDEN 
\ No newline at end of file
+            assert response.status_code == status.HTTP_403_FORBIDDEN 
+
+class TestTutorQueryBudget:
+    """Las rutas del tutor emiten un número de consultas constante (sin N+1)."""
+
+    def _seed(self, db_session, tutor, students: int, sessions: int, messages: int):
+        """Crea estudiantes con sesiones del tutor, mensajes y un análisis por mensaje."""
+        import uuid
+        from app.db.models import Usuario, SesionChat, Mensaje, Analisis, RolUsuario, EstadoUsuario
+
+        created = []
+        for _ in range(students):
+            student = Usuario(
+                email=f"estudiante_{uuid.uuid4().hex[:8]}@test.com", nombre="Estudiante", hashed_password="x",
+                rol=RolUsuario.ESTUDIANTE, estado=EstadoUsuario.ACTIVO
+            )
+            db_session.add(student)
+            db_session.flush()
+            for _ in range(sessions):
+                sesion = SesionChat(usuario_id=student.id, tutor_id=tutor.id, estado="activa")
+                db_session.add(sesion)
+                db_session.flush()
+                for i in range(messages):
+                    mensaje = Mensaje(usuario_id=student.id, sesion_id=sesion.id, texto=f"m{i}", remitente="user")
+                    db_session.add(mensaje)
+                    db_session.flush()
+                    db_session.add(Analisis(
+                        mensaje_id=mensaje.id, usuario_id=student.id,
+                        emocion="tristeza" if i % 2 else "alegría", estilo="formal"
+                    ))
+            created.append(student)
+        db_session.commit()
+        return created
+
+    def _count(self, client, query_counter, url):
+        start = query_counter.count
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK, response.text
+        return query_counter.count - start, response.json()
+
+    def test_students_list_constant_queries(self, client, db_session, authenticated_tutor, query_counter):
+        """El listado de estudiantes no lanza un COUNT por estudiante."""
+        self._seed(db_session, authenticated_tutor, students=1, sessions=2, messages=0)
+        few, _ = self._count(client, query_counter, "/tutor/students")
+        self._seed(db_session, authenticated_tutor, students=5, sessions=3, messages=0)
+        many, data = self._count(client, query_counter, "/tutor/students")
+
+        assert many == few
+        assert len(data) == 6
+        assert sorted(s["sesiones_count"] for s in data) == [2, 3, 3, 3, 3, 3]
+
+    def test_student_progress_constant_queries(self, client, db_session, authenticated_tutor, query_counter):
+        """El progreso agrega emociones y estilos sin recorrer sesiones ni mensajes."""
+        student, = self._seed(db_session, authenticated_tutor, students=1, sessions=1, messages=2)
+        few, _ = self._count(client, query_counter, f"/tutor/students/{student.id}/progress")
+
+        other, = self._seed(db_session, authenticated_tutor, students=1, sessions=4, messages=4)
+        many, data = self._count(client, query_counter, f"/tutor/students/{other.id}/progress")
+
+        assert many == few
+        assert data["analisis"]["emociones_detectadas"] == {"tristeza": 8, "alegría": 8}
+        assert data["analisis"]["estilos_comunicacion"] == {"formal": 16}
+
+    def test_dashboard_constant_queries(self, client, db_session, authenticated_tutor, query_counter):
+        """El dashboard obtiene el último mensaje de todas las sesiones recientes de una vez."""
+        self._seed(db_session, authenticated_tutor, students=1, sessions=1, messages=1)
+        few, _ = self._count(client, query_counter, "/tutor/dashboard")
+        self._seed(db_session, authenticated_tutor, students=2, sessions=3, messages=2)
+        many, data = self._count(client, query_counter, "/tutor/dashboard")
+
+        assert many == few
+        assert all(s["ultimo_mensaje"] for s in data["sesiones_recientes"])
+
+    def test_dashboard_cached_until_invalidated(self, client, db_session, authenticated_tutor, query_counter, monkeypatch):
+        """El snapshot del dashboard se sirve sin consultas hasta que un commit lo invalida."""
+        from datetime import date
+        from app.core.config import settings
+        from app.db.cache import dashboard_cache
+        from app.db.models import Mensaje, SesionChat
+
+        monkeypatch.setattr(settings, "CACHE_ENABLED", True)
+        student, = self._seed(db_session, authenticated_tutor, students=1, sessions=1, messages=1)
+        first, data = self._count(client, query_counter, "/tutor/dashboard")
+        cached, again = self._count(client, query_counter, "/tutor/dashboard")
+        assert first > 0 and cached == 0
+        assert again == data
+
+        # Un mensaje nuevo en una sesión del tutor invalida su snapshot al confirmar
+        sesion = db_session.query(SesionChat).filter(SesionChat.usuario_id == student.id).one()
+        db_session.add(Mensaje(usuario_id=student.id, sesion_id=sesion.id, texto="nuevo", remitente="user"))
+        db_session.commit()
+        recomputed, data = self._count(client, query_counter, "/tutor/dashboard")
+        assert recomputed == first
+        assert data["stats"]["mensajes_hoy"] == again["stats"]["mensajes_hoy"] + 1
+
+        # Un rollback no invalida nada
+        sesion.estado = "pausada"
+        db_session.flush()
+        db_session.rollback()
+        assert dashboard_cache.get(authenticated_tutor.id, date.today()) is not None
+
+    def test_overview_matches_individual_endpoints(self, client, db_session, authenticated_tutor, query_counter):
+        """/tutor/overview devuelve las mismas secciones que los endpoints individuales."""
+        self._seed(db_session, authenticated_tutor, students=2, sessions=2, messages=1)
+        _, data = self._count(client, query_counter, "/tutor/overview")
+
+        assert data["estudiantes"] == client.get("/tutor/students").json()
+        assert data["sesiones"] == client.get("/tutor/sessions").json()
+        assert data["notificaciones"] == client.get("/tutor/notifications").json()
+        assert data["alertas"] == client.get("/tutor/alerts").json()
+        assert data["dashboard"]["stats"]["sesiones_activas"] == 4
+        assert set(data["etags"]) == {"dashboard", "alertas", "notificaciones", "sesiones", "estudiantes"}
+
+    def test_overview_etag(self, client, db_session, authenticated_tutor):
+        """If-None-Match: 304 sin cambios; las secciones conocidas vuelven como null."""
+        from app.db.models import Notificacion
+
+        self._seed(db_session, authenticated_tutor, students=1, sessions=1, messages=1)
+        response = client.get("/tutor/overview")
+        etag, etags = response.headers["etag"], response.json()["etags"]
+
+        response = client.get("/tutor/overview", headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers["etag"] == etag
+
+        db_session.add(Notificacion(usuario_id=authenticated_tutor.id, titulo="Aviso", mensaje="nuevo", tipo="sistema"))
+        db_session.commit()
+        response = client.get("/tutor/overview", headers={"If-None-Match": ", ".join(etags.values())})
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert response.headers["etag"] != etag
+        assert data["estudiantes"] is None and data["sesiones"] is None
+        assert [n["mensaje"] for n in data["notificaciones"]] == ["nuevo"]
+
+    def test_activity_reports_constant_queries(self, client, db_session, authenticated_tutor, query_counter):
+        """Los reportes agregan en SQL: mismas consultas con más sesiones, series por periodo."""
+        from datetime import date, datetime, timedelta
+        from app.db.models import SesionChat
+
+        self._seed(db_session, authenticated_tutor, students=1, sessions=1, messages=0)
+        few, _ = self._count(client, query_counter, "/tutor/reports/weekly")
+        self._seed(db_session, authenticated_tutor, students=3, sessions=2, messages=0)
+        many, weekly = self._count(client, query_counter, "/tutor/reports/weekly")
+
+        assert many == few
+        assert weekly["estadisticas"]["total_sesiones"] == 7
+        assert len(weekly["sesiones_por_dia"]) == 7
+        assert sum(d["sesiones"] for d in weekly["sesiones_por_dia"]) == 7
+
+        # Una sesión de hace 40 días: fuera del mes, dentro del rango trimestral por meses
+        student = db_session.query(SesionChat).filter(SesionChat.tutor_id == authenticated_tutor.id).first().usuario
+        antigua = date.today() - timedelta(days=40)
+        db_session.add(SesionChat(usuario_id=student.id, tutor_id=authenticated_tutor.id, estado="cerrada", mensajes_count=3,
+                                  iniciada_en=datetime.combine(antigua, datetime.min.time()) + timedelta(hours=10)))
+        db_session.commit()
+
+        response = client.get("/tutor/reports", params={
+            "desde": (date.today() - timedelta(days=89)).isoformat(), "granularidad": "mes"
+        })
+        assert response.status_code == status.HTTP_200_OK
+        report = response.json()
+        assert report["estadisticas"]["total_sesiones"] == 8
+        assert report["estadisticas"]["estudiantes_atendidos"] == 4
+        periodos = {p["inicio"]: p for p in report["series"]}
+        assert periodos[antigua.replace(day=1).isoformat()]["mensajes"] >= 3
+        assert periodos[date.today().replace(day=1).isoformat()]["sesiones_activas"] >= 7
+        assert all(p["inicio"].endswith("-01") for p in report["series"])
+
+        response = client.get("/tutor/reports", params={"desde": "2024-02-01", "hasta": "2024-01-01"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_student_timeline_resolution(self, client, db_session, authenticated_tutor, query_counter):
+        """La serie emocional baja de resolución según `puntos` con un número de consultas acotado."""
+        from datetime import datetime, timedelta
+        from app.db.models import SesionChat, Mensaje, Analisis
+
+        student, = self._seed(db_session, authenticated_tutor, students=1, sessions=1, messages=0)
+        sesion = db_session.query(SesionChat).filter_by(usuario_id=student.id).one()
+        # 30 análisis: dos por día (09:00 y 15:00) cada 8 días, cada día en una semana distinta
+        for i in range(30):
+            creado_en = datetime(2025, 1, 6) + timedelta(days=(i // 2) * 8, hours=9 + 6 * (i % 2))
+            mensaje = Mensaje(usuario_id=student.id, sesion_id=sesion.id, texto=f"m{i}", remitente="user",
+                              creado_en=creado_en)
+            db_session.add(mensaje)
+            db_session.flush()
+            db_session.add(Analisis(mensaje_id=mensaje.id, usuario_id=student.id, creado_en=creado_en,
+                                    emocion="tristeza" if i % 3 else "calma", emocion_score=float(i)))
+        db_session.commit()
+
+        url = f"/tutor/students/{student.id}/timeline"
+        rango = {"desde": "2025-01-01T00:00:00", "hasta": "2026-01-01T00:00:00"}
+        consultas, data = self._count(client, query_counter, url + "?puntos=30&desde=2025-01-01&hasta=2026-01-01")
+        assert data["resolucion"] == "mensaje" and len(data["puntos"]) == 30
+
+        response = client.get(url, params={**rango, "puntos": 20})
+        data = response.json()
+        assert data["resolucion"] == "dia" and len(data["puntos"]) == 15
+        assert data["puntos"][0]["analisis"] == 2 and data["puntos"][0]["emocion_score"] == 0.5
+
+        start = query_counter.count
+        data = client.get(url, params={**rango, "puntos": 10}).json()
+        assert query_counter.count - start <= consultas + 5
+        assert data["resolucion"] == "semana" and data["agrupacion"] == 2
+        assert len(data["puntos"]) == 8
+        assert sum(p["analisis"] for p in data["puntos"]) == 30
+        assert data["puntos"][0]["emocion_score"] == 1.5
+
+        response = client.get(url, params={"desde": "2025-02-01", "hasta": "2025-01-01"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        other, = self._seed(db_session, authenticated_tutor, students=1, sessions=0, messages=0)
+        response = client.get(f"/tutor/students/{other.id}/timeline")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_session_messages_eager_loading(self, client, db_session, authenticated_tutor, query_counter):
+        """Los mensajes de una sesión cargan usuario y análisis por lotes."""
+        student, = self._seed(db_session, authenticated_tutor, students=1, sessions=1, messages=10)
+        from app.db.models import SesionChat
+        sesion_id = db_session.query(SesionChat.id).filter(SesionChat.usuario_id == student.id).scalar()
+        db_session.expire_all()
+
+        with query_counter.budget(6):
+            response = client.get(f"/chat/session/{sesion_id}/messages")
+        assert response.status_code == status.HTTP_200_OK
+        assert all("analisis" in m and "usuario_email" in m for m in response.json())
+
+    def test_session_stats_from_aggregates(self, client, db_session, authenticated_tutor, query_counter):
+        """Las estadísticas de sesión se leen de session_stats sin recorrer mensajes ni análisis."""
+        from app.db.models import SesionChat
+        student, = self._seed(db_session, authenticated_tutor, students=1, sessions=1, messages=6)
+        sesion_id = db_session.query(SesionChat.id).filter(SesionChat.usuario_id == student.id).scalar()
+
+        start = query_counter.count
+        response = client.get(f"/tutor/sessions/{sesion_id}/stats")
+        assert response.status_code == status.HTTP_200_OK
+        assert not any("FROM mensajes" in sql or "FROM analisis" in sql for sql in query_counter.statements[start:])
+
+        data = response.json()
+        assert data["total_mensajes"] == 6
+        assert data["emociones_detectadas"] == {"tristeza": 3, "alegría": 3}
+        assert data["insights"]["patrones_temporales"]["total_horas_activas"] >= 1
+
+
+class TestAnalysisFacetSearch:
+    """Tests de la búsqueda por facetas sobre análisis (/tutor/analysis/search)."""
+
+    def _student(self, db_session, tutor, analyses):
+        """Estudiante con una sesión del tutor y un mensaje por análisis (emocion, score, prioridad, alerta)."""
+        import uuid
+        from app.db.models import Usuario, SesionChat, Mensaje, Analisis, RolUsuario, EstadoUsuario
+
+        student = Usuario(
+            email=f"estudiante_{uuid.uuid4().hex[:8]}@test.com", nombre="Estudiante", hashed_password="x",
+            rol=RolUsuario.ESTUDIANTE, estado=EstadoUsuario.ACTIVO
+        )
+        db_session.add(student)
+        db_session.flush()
+        sesion = SesionChat(usuario_id=student.id, tutor_id=tutor.id if tutor else None, estado="activa")
+        db_session.add(sesion)
+        db_session.flush()
+        for emocion, score, prioridad, alerta in analyses:
+            mensaje = Mensaje(usuario_id=student.id, sesion_id=sesion.id, texto=f"me siento {emocion}", remitente="user")
+            db_session.add(mensaje)
+            db_session.flush()
+            db_session.add(Analisis(mensaje_id=mensaje.id, usuario_id=student.id, emocion=emocion,
+                                    emocion_score=score, prioridad=prioridad, alerta=alerta))
+        db_session.commit()
+        return student
+
+    def _seed(self, db_session, tutor):
+        self._student(db_session, tutor, [
+            ("ansiedad", 85.0, "alta", True),
+            ("ansiedad", 60.0, "alta", False),
+            ("ansiedad", 90.0, "media", False),
+            ("tristeza", 75.0, "alta", True),
+            ("alegría", 95.0, "baja", False),
+        ])
+        # Estudiante sin sesiones con el tutor: fuera del alcance
+        self._student(db_session, None, [("ansiedad", 99.0, "alta", True)])
+
+    def test_filters_and_disjunctive_facets(self, client, db_session, authenticated_tutor):
+        """Test de filtros combinados y conteos de faceta sin su propio filtro."""
+        self._seed(db_session, authenticated_tutor)
+        response = client.get("/tutor/analysis/search", params={
+            "emocion": "ansiedad", "prioridad": "alta", "min_score": 70, "dias": 14
+        })
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+
+        assert data["total"] == 1
+        (resultado,) = data["resultados"]
+        assert (resultado["emocion"], resultado["emocion_score"], resultado["prioridad"]) == ("ansiedad", 85.0, "alta")
+        assert resultado["texto"] == "me siento ansiedad"
+
+        # emoción: prioridad=alta y score>=70 -> ansiedad 1, tristeza 1
+        assert data["facetas"]["emocion"] == {"ansiedad": 1, "tristeza": 1}
+        # prioridad: emoción=ansiedad y score>=70 -> alta 1, media 1
+        assert data["facetas"]["prioridad"] == {"alta": 1, "media": 1}
+        assert data["facetas"]["alerta"] == {"true": 1}
+        assert set(data["origen_facetas"].values()) == {"consulta"}
+        assert set(data["latencia_ms"]) == {"resultados", "emocion", "prioridad", "alerta"}
+
+    def test_precomputed_facets_match_query(self, client, db_session, authenticated_tutor):
+        """Test que los conteos precalculados coinciden con el GROUP BY sobre analisis."""
+        self._seed(db_session, authenticated_tutor)
+        precalculado = client.get("/tutor/analysis/search").json()
+        consulta = client.get("/tutor/analysis/search", params={"min_score": 0}).json()
+
+        assert set(precalculado["origen_facetas"].values()) == {"precalculado"}
+        assert set(consulta["origen_facetas"].values()) == {"consulta"}
+        assert precalculado["facetas"] == consulta["facetas"]
+        assert precalculado["facetas"]["emocion"] == {"ansiedad": 3, "tristeza": 1, "alegría": 1}
+        assert precalculado["facetas"]["alerta"] == {"true": 2, "false": 3}
+        assert precalculado["total"] == 5
+
+    def test_precomputed_facets_use_analysis_day(self, client, db_session, authenticated_tutor):
+        """Test que los conteos precalculados agrupan por el día del análisis, como los resultados."""
+        from datetime import datetime, timedelta
+        from app.db.models import SesionChat, Mensaje, Analisis
+
+        student = self._student(db_session, authenticated_tutor, [])
+        sesion = db_session.query(SesionChat).filter(SesionChat.usuario_id == student.id).one()
+        # Mensaje de hace 10 días analizado hoy: cuenta en el rango de hoy
+        mensaje = Mensaje(usuario_id=student.id, sesion_id=sesion.id, texto="hace días",
+                          remitente="user", creado_en=datetime.now() - timedelta(days=10))
+        db_session.add(mensaje)
+        db_session.flush()
+        db_session.add(Analisis(mensaje_id=mensaje.id, usuario_id=student.id, emocion="ansiedad",
+                                emocion_score=80.0, prioridad="alta", alerta=True))
+        db_session.commit()
+
+        params = {"desde": (datetime.now() - timedelta(days=2)).date().isoformat(),
+                  "hasta": datetime.now().date().isoformat()}
+        precalculado = client.get("/tutor/analysis/search", params=params).json()
+        consulta = client.get("/tutor/analysis/search", params={**params, "min_score": 0}).json()
+
+        assert precalculado["total"] == 1
+        assert precalculado["facetas"] == consulta["facetas"] == {
+            "emocion": {"ansiedad": 1}, "prioridad": {"alta": 1}, "alerta": {"true": 1}
+        }
+
+    def test_pagination_and_validation(self, client, db_session, authenticated_tutor):
+        """Test de paginación por cursor y validación del rango."""
+        self._seed(db_session, authenticated_tutor)
+        first = client.get("/tutor/analysis/search", params={"limit": 3}).json()
+        second = client.get("/tutor/analysis/search", params={"limit": 3, "cursor": first["siguiente_cursor"]}).json()
+        ids = [r["analisis_id"] for r in first["resultados"] + second["resultados"]]
+        assert len(ids) == len(set(ids)) == 5
+        assert second["siguiente_cursor"] is None
+
+        response = client.get("/tutor/analysis/search", params={"desde": "2026-02-01", "hasta": "2026-01-01"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
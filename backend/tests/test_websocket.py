@@ -0,0 +1,391 @@
+"""
+Tests para el servicio WebSocket.
+"""
+
+import asyncio
+import uuid
+import pytest
+from app.db.models import SesionChat, Mensaje, Usuario, RolUsuario, EstadoUsuario
+from app.services.websocket_service import (
+    FrameRateLimiter,
+    TypingDebouncer,
+    PresenceRegistry,
+    SessionReplayBuffer,
+    LatencyTracker,
+    ConnectionManager,
+    WebSocketService
+)
+
+
+class TestFrameRateLimiter:
+    """Tests para el limitador de frames entrantes."""
+
+    def test_allows_burst_then_drops(self):
+        """Test que se acepta la ráfaga y se descarta el exceso."""
+        limiter = FrameRateLimiter(rate=1.0, burst=5)
+        results = [limiter.allow("conn") for _ in range(8)]
+
+        assert results[:5] == [True] * 5
+        assert results[5:] == [False] * 3
+        stats = limiter.get_stats()
+        assert stats["frames_accepted"] == 5
+        assert stats["frames_dropped"] == 3
+        assert stats["limited_connections"] == 1
+
+    def test_connections_are_independent(self):
+        """Test que cada conexión tiene su propio bucket."""
+        limiter = FrameRateLimiter(rate=1.0, burst=1)
+        assert limiter.allow("a")
+        assert not limiter.allow("a")
+        assert limiter.allow("b")
+
+    def test_reset_forgets_connection(self):
+        """Test que reset libera el estado de la conexión."""
+        limiter = FrameRateLimiter(rate=1.0, burst=1)
+        limiter.allow("a")
+        limiter.allow("a")
+        limiter.reset("a")
+
+        assert limiter.allow("a")
+        assert limiter.get_stats()["limited_connections"] == 0
+
+
+class TestTypingDebouncer:
+    """Tests para el agrupador de indicadores de escritura."""
+
+    def test_burst_is_coalesced(self):
+        """Test que una ráfaga de pulsaciones produce un solo frame."""
+        async def run():
+            sent = []
+
+            async def emit(is_typing):
+                sent.append(is_typing)
+
+            debouncer = TypingDebouncer(interval=0.05, idle_timeout=10)
+            for _ in range(20):
+                await debouncer.update(("chat", 1, 1), True, emit)
+            return sent, debouncer.get_stats()
+
+        sent, stats = asyncio.run(run())
+        assert sent == [True]
+        assert stats["frames_received"] == 20
+        assert stats["frames_emitted"] == 1
+        assert stats["frames_coalesced"] == 19
+
+    def test_trailing_state_is_flushed(self):
+        """Test que el último estado dentro del intervalo se envía al cerrarse la ventana."""
+        async def run():
+            sent = []
+
+            async def emit(is_typing):
+                sent.append(is_typing)
+
+            debouncer = TypingDebouncer(interval=0.05, idle_timeout=10)
+            await debouncer.update(("chat", 1, 1), True, emit)
+            await debouncer.update(("chat", 1, 1), False, emit)
+            assert sent == [True]
+            await asyncio.sleep(0.1)
+            return sent
+
+        assert asyncio.run(run()) == [True, False]
+
+    def test_idle_timeout_emits_stop(self):
+        """Test que la inactividad emite 'dejó de escribir'."""
+        async def run():
+            sent = []
+
+            async def emit(is_typing):
+                sent.append(is_typing)
+
+            debouncer = TypingDebouncer(interval=0.01, idle_timeout=0.05)
+            await debouncer.update(("chat", 1, 1), True, emit)
+            await asyncio.sleep(0.1)
+            return sent, debouncer.get_stats()
+
+        sent, stats = asyncio.run(run())
+        assert sent == [True, False]
+        assert stats["pending_states"] == 0
+
+
+class TestConnectionManager:
+    """Tests para el gestor de conexiones."""
+
+    def test_init_without_event_loop(self):
+        """Test que el gestor puede crearse fuera de un event loop."""
+        manager = ConnectionManager()
+        assert manager.cleanup_task is None
+
+    def test_disconnect_cancels_typing_state(self):
+        """Test que desconectar limpia los temporizadores del usuario."""
+        async def run():
+            async def emit(is_typing):
+                pass
+
+            manager = ConnectionManager()
+            await manager.typing_debouncer.update(("chat", 1, 7), True, emit)
+            manager.rate_limiter.allow(("chat", 7))
+            manager.disconnect(7)
+            return manager
+
+        manager = asyncio.run(run())
+        assert manager.typing_debouncer.get_stats()["pending_states"] == 0
+        assert manager.rate_limiter.get_stats()["limited_connections"] == 0
+
+
+class TestPresenceRegistry:
+    """Tests para el registro de presencia por rol e institución."""
+
+    def test_register_and_unregister(self):
+        """Test que los índices se mantienen al conectar y desconectar."""
+        presence = PresenceRegistry()
+        presence.register(1, "tutor", "UNI")
+        presence.register(2, "tutor", "OTRA")
+        presence.register(3, "estudiante", "UNI")
+
+        assert presence.users_with_role("tutor") == {1, 2}
+        assert presence.users_with_role("tutor", "UNI") == {1}
+
+        presence.unregister(1)
+        assert presence.users_with_role("tutor") == {2}
+        assert presence.users_with_role("tutor", "UNI") == set()
+        assert presence.get_stats() == {"tutor": 1, "estudiante": 1}
+
+    def test_reregister_updates_indexes(self):
+        """Test que registrar de nuevo reemplaza el perfil anterior."""
+        presence = PresenceRegistry()
+        presence.register(1, "tutor", "UNI")
+        presence.register(1, "tutor", "OTRA")
+
+        assert presence.users_with_role("tutor", "UNI") == set()
+        assert presence.users_with_role("tutor", "OTRA") == {1}
+
+
+class TestAlertRouting:
+    """Tests para el enrutamiento de alertas a tutores conectados."""
+
+    def _service(self):
+        service = WebSocketService()
+        presence = service.manager.presence
+        presence.register(10, "tutor", "UNI")
+        presence.register(11, "tutor", "UNI")
+        presence.register(12, "tutor", "OTRA")
+        presence.register(20, "estudiante", "UNI")
+        return service
+
+    def test_assigned_tutor_first(self):
+        """Test que el tutor asignado conectado recibe la alerta en exclusiva."""
+        service = self._service()
+        assert service.get_alert_recipients(20, tutor_asignado=12) == {12}
+
+    def test_institution_routing(self):
+        """Test que sin asignación se notifica a los tutores de la institución."""
+        service = self._service()
+        assert service.get_alert_recipients(20) == {10, 11}
+
+    def test_fallback_to_all_tutors(self):
+        """Test que sin tutores de la institución se notifica a todos."""
+        service = self._service()
+        assert service.get_alert_recipients(20, tutor_asignado=99, institucion="NINGUNA") == {10, 11, 12}
+
+    def test_notify_without_database(self, monkeypatch):
+        """Test que notificar una alerta no consulta la base de datos."""
+        service = self._service()
+        sent = []
+
+        async def fake_send(message, user_id):
+            sent.append((message["type"], user_id))
+
+        def fail(*args, **kwargs):
+            raise AssertionError("no debe consultar la base de datos")
+
+        monkeypatch.setattr(service.manager, "send_personal_message", fake_send)
+        monkeypatch.setattr("app.services.websocket_service.AsyncSessionLocal", fail)
+        asyncio.run(service.notify_tutors_alert(20, 5, {"priority": "alta"}))
+
+        assert sorted(sent) == [("alert_notification", 10), ("alert_notification", 11)]
+
+    def test_chat_alert_goes_to_session_tutor(self, monkeypatch, db_session, test_student):
+        """Test que la alerta de un mensaje de chat llega solo al tutor asignado a la sesión."""
+        test_tutor = Usuario(email=f"tutor_{uuid.uuid4().hex[:8]}@test.com", nombre="Tutor", hashed_password="x",
+                             rol=RolUsuario.TUTOR, estado=EstadoUsuario.ACTIVO)
+        db_session.add(test_tutor)
+        db_session.commit()
+        session = SesionChat(usuario_id=test_student.id, tutor_id=test_tutor.id)
+        db_session.add(session)
+        db_session.commit()
+
+        service = WebSocketService()
+        presence = service.manager.presence
+        presence.register(test_tutor.id, "tutor", "UNI")
+        presence.register(test_tutor.id + 1000, "tutor", "UNI")
+        presence.register(test_student.id, "estudiante", "UNI")
+        sent = []
+
+        async def fake_send(message, user_id):
+            sent.append((message["type"], user_id))
+
+        async def fake_broadcast(message, session_id, exclude_user=None):
+            pass
+
+        monkeypatch.setattr(service.manager, "send_personal_message", fake_send)
+        monkeypatch.setattr(service.manager, "broadcast_to_session", fake_broadcast)
+        monkeypatch.setattr("app.services.websocket_service.analyze_text",
+                            lambda text: {"emotion": "tristeza", "priority": "alta", "alert": True})
+        asyncio.run(service.handle_chat_message(test_student.id, {"session_id": session.id, "text": "ayuda"}))
+
+        assert sent == [("alert_notification", test_tutor.id)]
+
+
+class TestSessionReplayBuffer:
+    """Tests para el buffer de reanudación por sesión."""
+
+    def test_sequence_and_delta(self):
+        """Test que solo se devuelven los frames posteriores a last_seq."""
+        buffer = SessionReplayBuffer(size=10, max_sessions=10)
+        for i in range(5):
+            frame = buffer.append(1, {"type": "chat_message", "n": i})
+        assert frame["seq"] == 5
+
+        assert [f["n"] for f in buffer.since(1, 3)] == [3, 4]
+        assert buffer.since(1, 5) == []
+
+    def test_gap_larger_than_buffer(self):
+        """Test que un hueco fuera del buffer pide lectura de base de datos."""
+        buffer = SessionReplayBuffer(size=3, max_sessions=10)
+        for i in range(6):
+            buffer.append(1, {"type": "chat_message"})
+
+        assert buffer.since(1, 1) is None
+        assert [f["seq"] for f in buffer.since(1, 3)] == [4, 5, 6]
+        assert buffer.since(1, 99) is None
+
+    def test_evicts_oldest_session(self):
+        """Test que se respeta el máximo de sesiones en memoria."""
+        buffer = SessionReplayBuffer(size=3, max_sessions=2)
+        buffer.append(1, {"type": "chat_message"})
+        buffer.append(2, {"type": "chat_message"})
+        buffer.append(3, {"type": "chat_message"})
+
+        assert buffer.last_seq(1) == 0
+        assert buffer.get_stats() == {"sessions": 2, "frames": 2}
+
+
+class TestResume:
+    """Tests para la reanudación de tutor-chat tras reconexión."""
+
+    def _capture(self, service, monkeypatch):
+        sent = []
+
+        async def fake_send(session_id, user_id, message):
+            sent.append(message)
+
+        monkeypatch.setattr(service.manager, "send_tutor_chat_personal", fake_send)
+        return sent
+
+    def test_replays_delta(self, monkeypatch):
+        """Test que se reenvían solo los frames perdidos."""
+        service = WebSocketService()
+        sent = self._capture(service, monkeypatch)
+
+        async def run():
+            for i in range(4):
+                await service.manager.send_tutor_chat_message(7, {"type": "tutor_chat_message", "n": i})
+            await service.manager.send_tutor_chat_message(7, {"type": "tutor_typing"})
+            await service.handle_tutor_chat_resume(7, 1, {"last_seq": 2})
+
+        asyncio.run(run())
+        assert [f.get("n") for f in sent[:-1]] == [2, 3]
+        assert sent[-1]["type"] == "resume_complete"
+        assert sent[-1]["last_seq"] == 4
+
+    def test_falls_back_to_database(self, monkeypatch, db_session, test_student):
+        """Test que un hueco fuera del buffer se resuelve con una página de base de datos."""
+        session = SesionChat(usuario_id=test_student.id)
+        db_session.add(session)
+        db_session.commit()
+        for i in range(3):
+            db_session.add(Mensaje(usuario_id=test_student.id, sesion_id=session.id, texto=f"m{i}"))
+        db_session.commit()
+
+        service = WebSocketService()
+        sent = self._capture(service, monkeypatch)
+
+        asyncio.run(service.handle_tutor_chat_resume(session.id, test_student.id, {"last_seq": 50}))
+
+        assert sent[0]["type"] == "resume_snapshot"
+        assert [m["text"] for m in sent[0]["messages"]] == ["m0", "m1", "m2"]
+        assert sent[0]["has_more"] is False
+
+
+class TestTutorChatTwoPhase:
+    """Tests para el flujo en dos fases de tutor-chat."""
+
+    def test_broadcast_before_analysis(self, monkeypatch, db_session, test_student):
+        """Test que el mensaje se difunde antes del análisis y luego llega analysis_update."""
+        session = SesionChat(usuario_id=test_student.id)
+        db_session.add(session)
+        db_session.commit()
+
+        service = WebSocketService()
+        sent = []
+
+        async def fake_broadcast(session_id, message, exclude_user=None):
+            sent.append(message)
+
+        def slow_analysis(text):
+            assert [m["type"] for m in sent] == ["tutor_chat_message"]
+            return {"emotion": "tristeza", "emotion_score": 0.9, "priority": "alta", "alert": False}
+
+        monkeypatch.setattr(service.manager, "send_tutor_chat_message", fake_broadcast)
+        monkeypatch.setattr("app.services.websocket_service.analyze_text", slow_analysis)
+
+        async def run():
+            await service.handle_tutor_chat_message(session.id, test_student.id, {"text": "hola"})
+            assert sent[0]["message"]["analysis_pending"] is True
+            await asyncio.gather(*service.background_tasks)
+
+        asyncio.run(run())
+        message_id = sent[0]["message"]["id"]
+        assert sent[1]["type"] == "analysis_update"
+        assert sent[1]["message_id"] == message_id
+        assert sent[1]["analysis"]["emotion"] == "tristeza"
+
+        latency = service.get_connection_stats()["latency"]
+        assert latency["broadcast"]["count"] == 1
+        assert latency["analysis"]["count"] == 1
+
+
+class TestLatencyTracker:
+    """Tests para el registro de latencias."""
+
+    def test_percentiles(self):
+        """Test de percentiles en milisegundos."""
+        tracker = LatencyTracker(max_samples=100)
+        for i in range(1, 101):
+            tracker.record("broadcast", i / 1000)
+
+        stats = tracker.get_stats()["broadcast"]
+        assert stats["count"] == 100
+        assert stats["p50_ms"] == 51.0
+        assert stats["p99_ms"] == 100.0
+
+
+@pytest.mark.slow
+class TestLoadHarness:
+    """Test de humo del generador de carga en proceso."""
+
+    def test_small_in_process_run(self, db_session):
+        """Test que una corrida pequeña conecta todos los sockets y mide fan-out."""
+        from argparse import Namespace
+        from ws_load_test import seed_population, run_load_test, check_thresholds
+
+        population = seed_population(db_session, students=3, tutors=1)
+        report = asyncio.run(run_load_test(population, duration=0.5, think_time=0.1))
+
+        assert report["connections"] == 10
+        assert report["connect_failures"] == 0
+        assert report["messages_sent"] > 0
+        assert report["fanout_latency"]["count"] > 0
+
+        gate = Namespace(max_p95_ms=0.0, max_loop_lag_ms=None, min_connect_rate=None, max_connect_failures=0)
+        assert len(check_thresholds(report, gate)) == 1
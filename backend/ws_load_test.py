@@ -0,0 +1,432 @@
+# backend/ws_load_test.py
+"""
+Generador de carga para los WebSocket de PsiChat.
+
+Simula N estudiantes y M tutores conectados a /ws/{user_id} y /ws/tutor-chat/{session_id}
+con una mezcla de mensajes, indicadores de escritura y confirmaciones de lectura, y reporta:
+velocidad de conexión, percentiles de latencia de fan-out, memoria por conexión y lag del event loop.
+
+Modos:
+  - En proceso (por defecto): maneja `WebSocketService` con sockets en memoria, sin red.
+    Usa una base SQLite temporal salvo que se indique --database-url.
+  - --url ws://localhost:8000: conexiones reales contra un servidor en marcha (requiere aiohttp).
+    El servidor debe usar la misma DATABASE_URL para que existan los usuarios sembrados.
+
+Uso:
+    python ws_load_test.py --students 1000 --tutors 50 --duration 30
+    python ws_load_test.py --students 200 --tutors 10 --max-p95-ms 250 --max-loop-lag-ms 100
+
+Termina con código 1 si se supera algún umbral, para usarlo como gate de regresión.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass
+class Population:
+    """Usuarios y sesiones sembrados para la prueba."""
+    student_ids: List[int]
+    tutor_ids: List[int]
+    sessions: List[Tuple[int, int, int]]  # (session_id, student_id, tutor_id)
+
+
+@dataclass
+class LoadStats:
+    """Mediciones acumuladas durante la prueba."""
+    connect_times: List[float] = field(default_factory=list)
+    connect_failures: int = 0
+    messages_sent: int = 0
+    typing_sent: int = 0
+    receipts_sent: int = 0
+    fanout_latencies: List[float] = field(default_factory=list)
+    analysis_latencies: List[float] = field(default_factory=list)
+    loop_lag: List[float] = field(default_factory=list)
+    pending: Dict[str, Tuple[float, int]] = field(default_factory=dict)  # nonce -> (t0, remitente)
+    pending_analysis: Dict[int, float] = field(default_factory=dict)  # message_id -> t0
+
+
+def percentiles(samples: List[float]) -> Optional[dict]:
+    """p50/p95/p99/max en milisegundos."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+    return {"count": len(ordered), "p50_ms": pick(0.50), "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+def seed_population(db, students: int, tutors: int) -> Population:
+    """Crea estudiantes, tutores y una sesión por estudiante asignada a un tutor."""
+    from app.db.models import Usuario, SesionChat, RolUsuario, EstadoUsuario
+    from app.core.security import get_password_hash
+
+    run_id = uuid.uuid4().hex[:8]
+    hashed = get_password_hash("carga123")  # bcrypt una sola vez
+
+    def make(prefix: str, count: int, rol: RolUsuario) -> List[Usuario]:
+        users = [
+            Usuario(email=f"{prefix}_{run_id}_{i}@carga.test", nombre=f"{prefix} {i}",
+                    hashed_password=hashed, rol=rol, estado=EstadoUsuario.ACTIVO,
+                    institucion=f"Institución {i % 5}")
+            for i in range(count)
+        ]
+        db.add_all(users)
+        db.flush()
+        return users
+
+    tutor_rows = make("tutor", tutors, RolUsuario.TUTOR)
+    student_rows = make("estudiante", students, RolUsuario.ESTUDIANTE)
+    session_rows = [
+        SesionChat(usuario_id=student.id, tutor_id=tutor_rows[i % tutors].id)
+        for i, student in enumerate(student_rows)
+    ]
+    db.add_all(session_rows)
+    db.commit()
+
+    return Population(
+        student_ids=[s.id for s in student_rows],
+        tutor_ids=[t.id for t in tutor_rows],
+        sessions=[(s.id, s.usuario_id, s.tutor_id) for s in session_rows]
+    )
+
+
+# ==================== TRANSPORTES ====================
+
+class InMemoryWebSocket:
+    """WebSocket en memoria con la interfaz que usa WebSocketService."""
+
+    def __init__(self):
+        self.inbound: asyncio.Queue = asyncio.Queue()
+        self.outbound: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+
+    async def receive_text(self) -> str:
+        from fastapi import WebSocketDisconnect
+        if self.closed:
+            # Mismo error que Starlette tras recibir el cierre
+            raise RuntimeError('Cannot call "receive" once a disconnect message has been received.')
+        data = await self.inbound.get()
+        if data is None:
+            self.closed = True
+            raise WebSocketDisconnect()
+        return data
+
+    async def send_text(self, data: str):
+        self.outbound.put_nowait(data)
+
+    async def close(self, code: int = 1000):
+        self.inbound.put_nowait(None)
+
+
+class InProcessClient:
+    """Cliente conectado directamente al servicio, sin red."""
+
+    def __init__(self, service, path: str, user_id: int, session_id: Optional[int] = None):
+        self.service = service
+        self.path = path
+        self.user_id = user_id
+        self.session_id = session_id
+        self.socket = InMemoryWebSocket()
+        self.task: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        manager = self.service.manager
+        if self.session_id is None:
+            self.task = asyncio.create_task(self.service.handle_websocket(self.socket, self.user_id))
+            connected = lambda: manager.is_connected(self.user_id)
+        else:
+            self.task = asyncio.create_task(
+                self.service.handle_tutor_chat_websocket(self.socket, self.session_id, self.user_id)
+            )
+            connected = lambda: manager.is_tutor_chat_connected(self.session_id, self.user_id)
+        while not connected():
+            if self.task.done():
+                raise ConnectionError(f"{self.path}: el servicio cerró la conexión")
+            await asyncio.sleep(0)
+
+    async def send(self, message: dict):
+        self.socket.inbound.put_nowait(json.dumps(message))
+
+    async def recv(self) -> Optional[dict]:
+        return json.loads(await self.socket.outbound.get())
+
+    async def close(self):
+        await self.socket.close()
+        if self.task:
+            await asyncio.wait([self.task], timeout=5)
+
+
+class NetworkClient:
+    """Cliente real sobre aiohttp contra un servidor en marcha."""
+
+    def __init__(self, http, base_url: str, path: str, token: str, handshake_type: str):
+        self.http = http
+        self.url = f"{base_url.rstrip('/')}{path}?token={token}"
+        self.path = path
+        self.handshake_type = handshake_type
+        self.ws = None
+
+    async def connect(self):
+        self.ws = await self.http.ws_connect(self.url, heartbeat=None)
+        frame = await self.recv()
+        if not frame or frame.get("type") != self.handshake_type:
+            raise ConnectionError(f"{self.path}: handshake inesperado {frame}")
+
+    async def send(self, message: dict):
+        await self.ws.send_str(json.dumps(message))
+
+    async def recv(self) -> Optional[dict]:
+        msg = await self.ws.receive()
+        if msg.type.name != "TEXT":
+            return None
+        return json.loads(msg.data)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+
+# ==================== SIMULACIÓN ====================
+
+async def _monitor_loop_lag(stats: LoadStats, stop: asyncio.Event, interval: float = 0.05):
+    """Mide el retraso del event loop respecto a un sleep fijo."""
+    while not stop.is_set():
+        start = time.monotonic()
+        await asyncio.sleep(interval)
+        stats.loop_lag.append(max(0.0, time.monotonic() - start - interval))
+
+
+async def _reader(client, user_id: int, stats: LoadStats, receipts: bool):
+    """Consume frames de una conexión y registra latencias de fan-out y análisis."""
+    while True:
+        try:
+            frame = await client.recv()
+        except Exception:
+            return
+        if frame is None:
+            return
+
+        frame_type = frame.get("type")
+        now = time.monotonic()
+        if frame_type == "tutor_chat_message":
+            message = frame.get("message", {})
+            sent = stats.pending.get(message.get("text"))
+            if sent and sent[1] != user_id:
+                stats.fanout_latencies.append(now - sent[0])
+                stats.pending_analysis.setdefault(message.get("id"), sent[0])
+                if receipts and random.random() < 0.5:
+                    await client.send({"type": "tutor_read_receipt", "message_id": message.get("id")})
+                    stats.receipts_sent += 1
+        elif frame_type == "analysis_update":
+            t0 = stats.pending_analysis.pop(frame.get("message_id"), None)
+            if t0 is not None:
+                stats.analysis_latencies.append(now - t0)
+
+
+async def _student(chat, main, user_id: int, session_id: int, stats: LoadStats,
+                   deadline: float, think_time: float):
+    """Estudiante: teclea, envía mensajes y a veces indicadores en el canal principal."""
+    counter = 0
+    while time.monotonic() < deadline:
+        await asyncio.sleep(random.expovariate(1.0 / think_time))
+        for _ in range(random.randint(3, 8)):
+            await chat.send({"type": "tutor_typing", "is_typing": True})
+            stats.typing_sent += 1
+            await asyncio.sleep(0.02)
+        if random.random() < 0.3:
+            await main.send({"type": "typing", "session_id": session_id, "is_typing": True})
+            stats.typing_sent += 1
+
+        counter += 1
+        text = f"carga {user_id}-{counter} {uuid.uuid4().hex[:6]}"
+        stats.pending[text] = (time.monotonic(), user_id)
+        await chat.send({"type": "tutor_chat_message", "text": text, "remitente": "user"})
+        await chat.send({"type": "tutor_typing", "is_typing": False})
+        stats.messages_sent += 1
+
+
+async def _connect(factory, stats: LoadStats, clients: list):
+    """Conecta un cliente midiendo el tiempo y registrando fallos."""
+    client = factory()
+    start = time.monotonic()
+    try:
+        await client.connect()
+    except Exception:
+        stats.connect_failures += 1
+        return None
+    stats.connect_times.append(time.monotonic() - start)
+    clients.append(client)
+    return client
+
+
+async def run_load_test(population: Population, duration: float, think_time: float = 2.0,
+                        url: Optional[str] = None, service=None, connect_concurrency: int = 200) -> dict:
+    """Ejecuta la simulación y devuelve el reporte."""
+    import psutil
+    from app.core.security import create_access_token
+
+    stats = LoadStats()
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(_monitor_loop_lag(stats, stop))
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+
+    http = None
+    if url:
+        import aiohttp
+        http = aiohttp.ClientSession()
+    else:
+        if service is None:
+            from app.services.websocket_service import WebSocketService
+            service = WebSocketService()
+
+    def factory(path: str, user_id: int, session_id: Optional[int] = None):
+        if http is None:
+            return lambda: InProcessClient(service, path, user_id, session_id)
+        token = create_access_token({"sub": str(user_id)})
+        handshake = "connection_established" if session_id is None else "tutor_chat_connected"
+        return lambda: NetworkClient(http, url, path, token, handshake)
+
+    # Fase de conexión: sockets principales de todos y tutor-chat por sesión para ambos extremos
+    specs = [(f"/ws/{uid}", uid, None) for uid in population.tutor_ids + population.student_ids]
+    for session_id, student_id, tutor_id in population.sessions:
+        specs.append((f"/ws/tutor-chat/{session_id}", student_id, session_id))
+        specs.append((f"/ws/tutor-chat/{session_id}", tutor_id, session_id))
+
+    clients: list = []
+    connected: Dict[Tuple[int, Optional[int]], object] = {}
+    semaphore = asyncio.Semaphore(connect_concurrency)
+
+    async def open_one(path, user_id, session_id):
+        async with semaphore:
+            client = await _connect(factory(path, user_id, session_id), stats, clients)
+            if client is not None:
+                connected[(user_id, session_id)] = client
+
+    connect_start = time.monotonic()
+    await asyncio.gather(*(open_one(*spec) for spec in specs))
+    connect_elapsed = time.monotonic() - connect_start
+    rss_connected = process.memory_info().rss
+
+    # Fase de tráfico
+    deadline = time.monotonic() + duration
+    tutor_ids = set(population.tutor_ids)
+    readers = [
+        asyncio.create_task(_reader(client, user_id, stats, receipts=user_id in tutor_ids))
+        for (user_id, session_id), client in connected.items()
+    ]
+    students = [
+        _student(connected[(student_id, session_id)], connected[(student_id, None)],
+                 student_id, session_id, stats, deadline, think_time)
+        for session_id, student_id, _ in population.sessions
+        if (student_id, session_id) in connected and (student_id, None) in connected
+    ]
+    await asyncio.gather(*students)
+    await asyncio.sleep(min(2.0, think_time))  # dejar llegar fan-out y análisis pendientes
+
+    # Cierre
+    stop.set()
+    await lag_task
+    await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+    for task in readers:
+        task.cancel()
+    if http is not None:
+        await http.close()
+
+    report = {
+        "mode": "network" if url else "in_process",
+        "connections": len(clients),
+        "connect_failures": stats.connect_failures,
+        "connect_rate_per_s": round(len(clients) / connect_elapsed, 1) if connect_elapsed else None,
+        "connect_latency": percentiles(stats.connect_times),
+        "messages_sent": stats.messages_sent,
+        "typing_frames_sent": stats.typing_sent,
+        "receipts_sent": stats.receipts_sent,
+        "fanout_latency": percentiles(stats.fanout_latencies),
+        "analysis_latency": percentiles(stats.analysis_latencies),
+        "event_loop_lag": percentiles(stats.loop_lag),
+        "memory_per_connection_kb": (
+            round((rss_connected - rss_before) / len(clients) / 1024, 2) if clients and not url else None
+        )
+    }
+    if service is not None:
+        report["service_stats"] = service.get_connection_stats()
+    return report
+
+
+def check_thresholds(report: dict, args) -> List[str]:
+    """Devuelve las violaciones de umbrales configurados."""
+    failures = []
+    fanout = report["fanout_latency"] or {}
+    lag = report["event_loop_lag"] or {}
+    if args.max_p95_ms is not None and fanout.get("p95_ms", float("inf")) > args.max_p95_ms:
+        failures.append(f"fan-out p95 {fanout.get('p95_ms')} ms > {args.max_p95_ms} ms")
+    if args.max_loop_lag_ms is not None and lag.get("p99_ms", float("inf")) > args.max_loop_lag_ms:
+        failures.append(f"lag p99 {lag.get('p99_ms')} ms > {args.max_loop_lag_ms} ms")
+    if args.min_connect_rate is not None and (report["connect_rate_per_s"] or 0) < args.min_connect_rate:
+        failures.append(f"conexiones/s {report['connect_rate_per_s']} < {args.min_connect_rate}")
+    if args.max_connect_failures is not None and report["connect_failures"] > args.max_connect_failures:
+        failures.append(f"fallos de conexión {report['connect_failures']} > {args.max_connect_failures}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de WebSocket de PsiChat")
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--tutors", type=int, default=25)
+    parser.add_argument("--duration", type=float, default=20.0, help="segundos de tráfico")
+    parser.add_argument("--think-time", type=float, default=2.0, help="segundos medios entre mensajes")
+    parser.add_argument("--url", help="ws://host:puerto para probar un servidor en marcha")
+    parser.add_argument("--database-url", help="base de datos donde sembrar usuarios y sesiones")
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--max-p95-ms", type=float)
+    parser.add_argument("--max-loop-lag-ms", type=float)
+    parser.add_argument("--min-connect-rate", type=float)
+    parser.add_argument("--max-connect-failures", type=int)
+    parser.add_argument("--output", help="ruta donde guardar el reporte JSON")
+    args = parser.parse_args()
+
+    # La configuración se lee al importar `app`, así que el entorno se prepara antes
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    elif not args.url:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ws_load_test.db')}"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from app.db.models import Base
+    from app.db.session import engine, SessionLocal
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        population = seed_population(db, args.students, args.tutors)
+    finally:
+        db.close()
+
+    report = asyncio.run(run_load_test(
+        population, args.duration, args.think_time, url=args.url,
+        connect_concurrency=args.connect_concurrency
+    ))
+    failures = check_thresholds(report, args)
+    report["gate"] = {"passed": not failures, "failures": failures}
+
+    output = json.dumps(report, indent=2, default=str)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()